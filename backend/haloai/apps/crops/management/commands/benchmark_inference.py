@@ -0,0 +1,149 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from services.inference_benchmark import (
+    DEFAULT_BATCH_SIZES,
+    InferenceBenchmark,
+    compare_to_baseline,
+    load_report,
+    save_report,
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark crop prediction inference and compare against a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--samples", type=int, default=200, help="Single-row latency samples"
+        )
+        parser.add_argument(
+            "--batch-sizes",
+            type=int,
+            nargs="+",
+            default=list(DEFAULT_BATCH_SIZES),
+            help="Batch sizes for the throughput measurement",
+        )
+        parser.add_argument("--seed", type=int, default=42, help="Input seed")
+        parser.add_argument("--output", type=str, help="Write the JSON report here")
+        parser.add_argument(
+            "--baseline",
+            type=str,
+            default=str(getattr(settings, "ML_BENCHMARK_BASELINE", "")),
+            help="Baseline report to compare against",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=getattr(settings, "ML_BENCHMARK_THRESHOLD", 0.2),
+            help="Allowed slowdown as a fraction (0.2 = 20%%)",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Store this run as the new baseline",
+        )
+        parser.add_argument(
+            "--check-parity",
+            action="store_true",
+            help=(
+                "Compare the compiled evaluators with the deployed models "
+                "instead of benchmarking (run before enabling "
+                "ML_INFERENCE_BACKEND=auto)"
+            ),
+        )
+        parser.add_argument(
+            "--parity-rows",
+            type=int,
+            default=10_000,
+            help="Synthetic rows scored by --check-parity",
+        )
+
+    def handle(self, *args, **options):
+        if options["check_parity"]:
+            return self.check_parity(options["parity_rows"], options["seed"])
+
+        report = InferenceBenchmark(
+            latency_samples=options["samples"],
+            batch_sizes=options["batch_sizes"],
+            seed=options["seed"],
+        ).run()
+
+        if options["output"]:
+            save_report(report, options["output"])
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+
+        if options["save_baseline"]:
+            save_report(report, options["baseline"])
+            self.stdout.write(
+                self.style.SUCCESS(f"Saved baseline to {options['baseline']}")
+            )
+            return
+
+        baseline = load_report(options["baseline"]) if options["baseline"] else None
+        if baseline is None:
+            self.stdout.write(
+                self.style.WARNING("No baseline found, skipping regression check")
+            )
+            return
+
+        regressions = compare_to_baseline(report, baseline, options["threshold"])
+        if regressions:
+            for item in regressions:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"{item['metric']}: {item['baseline']} -> {item['current']} "
+                        f"({item['regression']:+.0%})"
+                    )
+                )
+            raise CommandError(f"{len(regressions)} benchmark metrics regressed")
+
+        self.stdout.write(self.style.SUCCESS("No benchmark regressions"))
+
+    def check_parity(self, n_rows, seed):
+        """Fail unless every compiled evaluator predicts like its deployed model"""
+        import numpy as np
+
+        from services.inference_benchmark import synthetic_features
+        from services.model_registry import model_registry
+        from services.tree_compiler import compare_backends, compile_model
+
+        models = model_registry.get_models()
+        compiled = dict(model_registry.get_compiled_models())
+        # Check the opt-in SVM evaluator too, so it can be vetted before enabling
+        if "svm" in models and "svm" not in compiled:
+            evaluator = compile_model("svm", models["svm"], include_svm=True)
+            if evaluator is not None:
+                compiled["svm"] = evaluator
+        if not compiled:
+            raise CommandError("No compiled evaluators for the deployed models")
+
+        features = synthetic_features(n_rows, seed=seed)
+        mismatched = []
+        for model_name, evaluator in compiled.items():
+            model = models[model_name]
+            if hasattr(model, "predict_proba"):
+                report = compare_backends(model, evaluator, features)
+            else:
+                report = {
+                    "argmax_agreement": float(
+                        np.mean(model.predict(features) == evaluator.predict(features))
+                    )
+                }
+            self.stdout.write(f"{model_name}: {json.dumps(report)}")
+            if report["argmax_agreement"] < 1.0:
+                mismatched.append(model_name)
+
+        if mismatched:
+            raise CommandError(
+                f"Compiled {', '.join(mismatched)} disagree with the deployed models"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Compiled evaluators match on {n_rows} rows "
+                f"(model version {model_registry.version})"
+            )
+        )
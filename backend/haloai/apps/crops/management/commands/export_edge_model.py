@@ -0,0 +1,118 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from services.edge_export import FILE_FORMATS, THRESHOLD_TYPES
+
+
+class Command(BaseCommand):
+    help = (
+        "Distill the crop ensemble into a compact tree model for offline "
+        "scoring with services/edge_model.py"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            type=str,
+            help="Model file (default: <models dir>/edge/crop_edge_model.bin|.json)",
+        )
+        parser.add_argument("--format", choices=FILE_FORMATS, default="binary")
+        parser.add_argument(
+            "--thresholds",
+            choices=THRESHOLD_TYPES,
+            default="int16",
+            help="Storage type for split thresholds",
+        )
+        parser.add_argument(
+            "--trees",
+            type=int,
+            default=1,
+            help="1 for a single tree, more for a forest",
+        )
+        parser.add_argument("--max-depth", type=int, default=10)
+        parser.add_argument("--min-samples-leaf", type=int, default=5)
+        parser.add_argument(
+            "--samples",
+            type=int,
+            default=100_000,
+            help="Inputs labelled by the ensemble for distillation",
+        )
+        parser.add_argument(
+            "--no-history",
+            action="store_true",
+            help="Only sample synthetic inputs, not past prediction requests",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--bundle",
+            action="store_true",
+            help="Copy the standalone evaluator next to the model file",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the report as JSON"
+        )
+
+    def handle(self, *args, **options):
+        from services.container import real_ml_service
+        from services.edge_export import (
+            EdgeExporter,
+            bundle_evaluator,
+            history_features,
+        )
+
+        if options["trees"] < 1 or options["max_depth"] < 1:
+            raise CommandError("--trees and --max-depth must be at least 1")
+        if options["samples"] < 100:
+            raise CommandError("--samples must be at least 100")
+        if not real_ml_service.models:
+            raise CommandError("No crop models are loaded; nothing to distill")
+
+        output = options["output"]
+        if not output:
+            suffix = "json" if options["format"] == "json" else "bin"
+            output = (
+                Path(real_ml_service.model_registry.models_dir)
+                / "edge"
+                / f"crop_edge_model.{suffix}"
+            )
+
+        exporter = EdgeExporter(
+            trees=options["trees"],
+            max_depth=options["max_depth"],
+            min_samples_leaf=options["min_samples_leaf"],
+            thresholds=options["thresholds"],
+            seed=options["seed"],
+        )
+        history = None if options["no_history"] else history_features()
+        report = exporter.export(
+            output,
+            n_samples=options["samples"],
+            history=history,
+            file_format=options["format"],
+            progress=(lambda message: None) if options["json"] else print,
+        )
+        if options["bundle"]:
+            report["evaluator"] = str(bundle_evaluator(Path(output).parent))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {report['path']} ({report['size_bytes'] / 1024:.1f} KiB, "
+                f"{report['trees']} tree(s), {report['nodes']} nodes, "
+                f"{report['thresholds']} thresholds)"
+            )
+        )
+        for source, agreement in report["agreement"].items():
+            self.stdout.write(
+                f"  {source}: top-1 agreement {agreement['top1']:.1%}, "
+                f"ensemble pick in top 3 {agreement['top3']:.1%} "
+                f"(unquantized {agreement['unquantized_top1']:.1%}, "
+                f"{agreement['rows']} rows)"
+            )
+        if options["bundle"]:
+            self.stdout.write(f"Evaluator copied to {report['evaluator']}")
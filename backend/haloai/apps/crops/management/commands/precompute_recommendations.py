@@ -0,0 +1,135 @@
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _init_shard_worker():
+    """Configure Django in a freshly spawned shard process"""
+    import django
+
+    django.setup()
+
+
+def _run_shard(shard_index, shard_count, options):
+    """Score one shard; runs in a worker process"""
+    from services.model_registry import model_registry
+    from services.recommendation_precompute import RecommendationPrecomputer
+
+    # The shard processes share the machine between them
+    model_registry.thread_budget.configure(max(1, options["processes"]))
+
+    return RecommendationPrecomputer(
+        chunk_size=options["chunk_size"],
+        top_k=options["top_k"],
+        use_weather=not options["no_weather"],
+    ).run(shard_index, shard_count, options["sources"])
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute top-k crop recommendations for every IoT sensor set and "
+        "farmer field profile"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=1000, help="Rows per ensemble call"
+        )
+        parser.add_argument(
+            "--top-k", type=int, default=None, help="Crops stored per row"
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help=(
+                "Split the selected shard across this many parallel worker " "processes"
+            ),
+        )
+        parser.add_argument(
+            "--shard-index",
+            type=int,
+            default=0,
+            help="Only score this shard (for sharding across machines)",
+        )
+        parser.add_argument(
+            "--shard-count", type=int, default=1, help="Total number of shards"
+        )
+        parser.add_argument(
+            "--sources",
+            nargs="+",
+            choices=["sensor_set", "field_profile"],
+            default=["sensor_set", "field_profile"],
+        )
+        parser.add_argument(
+            "--no-weather",
+            action="store_true",
+            help="Use regional climate defaults instead of the weather API",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the final report as JSON"
+        )
+
+    def handle(self, *args, **options):
+        processes = options["processes"]
+        if not 0 <= options["shard_index"] < options["shard_count"]:
+            raise CommandError("--shard-index must be below --shard-count")
+
+        started = time.perf_counter()
+        if processes <= 1:
+            results = [
+                _run_shard(options["shard_index"], options["shard_count"], options)
+            ]
+        else:
+            # Rows of shard i out of M are exactly the rows of sub-shards
+            # i, i + M, ..., i + (P - 1) * M out of M * P
+            shard_count = options["shard_count"] * processes
+            shard_indices = [
+                options["shard_index"] + options["shard_count"] * k
+                for k in range(processes)
+            ]
+            worker_options = {
+                key: options[key]
+                for key in (
+                    "chunk_size",
+                    "top_k",
+                    "no_weather",
+                    "sources",
+                    "processes",
+                )
+            }
+            with ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_shard_worker,
+            ) as pool:
+                results = list(
+                    pool.map(
+                        _run_shard,
+                        shard_indices,
+                        [shard_count] * processes,
+                        [worker_options] * processes,
+                    )
+                )
+
+        elapsed = time.perf_counter() - started
+        total_rows = sum(result["rows"] for result in results)
+        report = {
+            "rows": total_rows,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(total_rows / elapsed, 1) if elapsed else 0.0,
+            "shards": results,
+        }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Precomputed {total_rows} recommendations in {elapsed:.1f}s "
+                    f"({report['rows_per_second']} rows/s)"
+                )
+            )
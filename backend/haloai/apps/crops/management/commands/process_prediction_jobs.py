@@ -0,0 +1,68 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from services.prediction_job_queue import prediction_job_queue
+
+
+class Command(BaseCommand):
+    help = "Process queued crop prediction requests in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=64, help="Jobs claimed per batch"
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds to sleep when the queue is empty",
+        )
+        parser.add_argument(
+            "--stale-minutes",
+            type=int,
+            default=10,
+            help="Requeue jobs stuck in processing for longer than this",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Drain the queue once and exit"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        poll_interval = options["poll_interval"]
+        stale_after = timedelta(minutes=options["stale_minutes"])
+
+        self.stdout.write(
+            f"Prediction worker {prediction_job_queue.worker_id} started "
+            f"(batch size {batch_size})"
+        )
+
+        try:
+            while True:
+                requeued = prediction_job_queue.requeue_stale(stale_after)
+                if requeued:
+                    self.stdout.write(
+                        self.style.WARNING(f"Requeued {requeued} stale jobs")
+                    )
+
+                jobs = prediction_job_queue.claim_batch(batch_size)
+                if not jobs:
+                    if options["once"]:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                started = time.perf_counter()
+                counts = prediction_job_queue.process_batch(jobs)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Processed {len(jobs)} jobs in {elapsed:.2f}s "
+                        f"({counts['completed']} completed, {counts['failed']} failed)"
+                    )
+                )
+
+        except KeyboardInterrupt:
+            self.stdout.write("Prediction worker stopped")
@@ -0,0 +1,193 @@
+import json
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from services.model_training import DEFAULT_ROUNDS, DEFAULT_TREES, TRAINABLE_MODELS
+
+
+class Command(BaseCommand):
+    help = (
+        "Retrain the crop models by streaming CSV seed data (and, opt-in, "
+        "prediction history) in chunks"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=50_000, help="Rows held in memory"
+        )
+        parser.add_argument(
+            "--seed-csv",
+            nargs="+",
+            default=[],
+            help="Training CSVs in the Crop_recommendation.csv layout",
+        )
+        parser.add_argument(
+            "--include-predictions",
+            action="store_true",
+            help=(
+                "Also train on completed prediction requests, labelled with the "
+                "ensemble's own top crop (self-training)"
+            ),
+        )
+        parser.add_argument(
+            "--since",
+            type=str,
+            help="Only use prediction requests from this date (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--models",
+            nargs="+",
+            choices=TRAINABLE_MODELS,
+            default=list(TRAINABLE_MODELS),
+        )
+        parser.add_argument(
+            "--trees",
+            type=int,
+            default=DEFAULT_TREES,
+            help="Random forest trees in total, spread over the chunks",
+        )
+        parser.add_argument(
+            "--rounds",
+            type=int,
+            default=DEFAULT_ROUNDS,
+            help="XGBoost boosting rounds in total, spread over the chunks",
+        )
+        parser.add_argument(
+            "--max-depth", type=int, default=12, help="Random forest tree depth"
+        )
+        parser.add_argument(
+            "--fine-tune",
+            action="store_true",
+            help="Continue boosting from the current XGBoost model",
+        )
+        parser.add_argument(
+            "--promote",
+            action="store_true",
+            help="Make the new version the one the model registry serves",
+        )
+        parser.add_argument(
+            "--allow-regression",
+            action="store_true",
+            help="Promote even if a model's holdout accuracy is below the current one",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the report as JSON"
+        )
+
+    def handle(self, *args, **options):
+        from services.container import real_ml_service
+        from services.model_registry import model_registry
+        from services.model_training import (
+            IncrementalTrainer,
+            TrainingRowSource,
+            holdout_regressions,
+            promote_version,
+            save_version,
+        )
+
+        if not options["seed_csv"] and not options["include_predictions"]:
+            raise CommandError(
+                "Nothing to train on: pass --seed-csv and/or --include-predictions"
+            )
+        if options["since"] and not options["include_predictions"]:
+            raise CommandError("--since only applies with --include-predictions")
+        if options["include_predictions"]:
+            self.stderr.write(
+                self.style.WARNING(
+                    "Prediction requests are labelled with the current ensemble's "
+                    "own top crop; training on them reinforces its mistakes"
+                )
+            )
+
+        since = None
+        if options["since"]:
+            try:
+                since = timezone.make_aware(
+                    datetime.strptime(options["since"], "%Y-%m-%d")
+                )
+            except ValueError:
+                raise CommandError("--since must be a YYYY-MM-DD date")
+
+        # Training is a batch job: it may use the whole machine
+        model_registry.thread_budget.configure(1)
+
+        crop_labels = real_ml_service.crop_labels
+        source = TrainingRowSource(
+            crop_labels,
+            chunk_size=options["chunk_size"],
+            seed_csvs=options["seed_csv"],
+            use_database=options["include_predictions"],
+            since=since,
+        )
+        init_models = {}
+        if options["fine_tune"] and "xgboost" in options["models"]:
+            current = model_registry.get("xgboost")
+            if current is None or not hasattr(current, "get_booster"):
+                raise CommandError("No XGBoost model to fine-tune")
+            init_models["xgboost"] = current
+
+        trainer = IncrementalTrainer(
+            crop_labels,
+            model_names=options["models"],
+            trees=options["trees"],
+            rounds=options["rounds"],
+            max_depth=options["max_depth"],
+            init_models=init_models,
+            baseline_models=model_registry.get_models(),
+            threads=model_registry.thread_budget.process_share,
+            progress=(lambda message: None) if options["json"] else None,
+        )
+
+        try:
+            models, report = trainer.train(source)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        version_dir = save_version(models, report, model_registry.models_dir)
+        report["version_dir"] = str(version_dir)
+        if options["promote"]:
+            regressions = holdout_regressions(report)
+            if regressions and not options["allow_regression"]:
+                raise CommandError(
+                    f"Not promoting {version_dir.name}: holdout accuracy regressed "
+                    + ", ".join(
+                        f"{name} {scores['current']} -> {scores['trained']}"
+                        for name, scores in regressions.items()
+                    )
+                    + " (use --allow-regression to promote anyway)"
+                )
+            report["promoted"] = promote_version(version_dir, model_registry.models_dir)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        peak = report["peak_rss_bytes"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Trained {', '.join(models)} on {report['training_rows']} rows "
+                f"in {report['seconds']}s ({report['rows_per_second']} rows/s), "
+                f"peak memory {peak / 1e6:.0f} MB"
+                if peak
+                else f"Trained {', '.join(models)} on {report['training_rows']} rows"
+            )
+        )
+        for name, accuracy in report["holdout_accuracy"].items():
+            current = report["baseline_holdout_accuracy"].get(name)
+            self.stdout.write(
+                f"  {name}: holdout accuracy {accuracy}"
+                + (f" (current model {current})" if current is not None else "")
+            )
+            replaces = report["estimators"][name].get("replaces")
+            if replaces:
+                self.stdout.write(
+                    f"  {name}: trained as {report['estimators'][name]['estimator']}"
+                    f", replacing {replaces}"
+                )
+        self.stdout.write(f"Saved version to {version_dir}")
+        if options["promote"]:
+            self.stdout.write(
+                self.style.SUCCESS(f"Promoted {', '.join(report['promoted'])}")
+            )
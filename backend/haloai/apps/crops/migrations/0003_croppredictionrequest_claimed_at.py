@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crops", "0002_croppredictionrequest_farmer_and_more"),
+        ("dashboard", "0001_initial"),
+        ("sensors", "0002_alter_iotsensorset_options_iotdevice_devicegroup_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="croppredictionrequest",
+            name="claimed_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When a queue worker picked up the request",
+                null=True,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="croppredictionrequest",
+            index=models.Index(
+                fields=["status", "requested_at"], name="crops_cropp_status_e2ca67_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crops", "0003_croppredictionrequest_claimed_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PrecomputedRecommendation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source_type",
+                    models.CharField(
+                        choices=[
+                            ("sensor_set", "IoT Sensor Set"),
+                            ("field_profile", "Farmer Field Profile"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "source_id",
+                    models.CharField(
+                        help_text="Primary key of the sensor set or field profile",
+                        max_length=64,
+                    ),
+                ),
+                ("region", models.CharField(blank=True, max_length=100)),
+                ("features", models.JSONField(default=list)),
+                (
+                    "predicted_crops",
+                    models.JSONField(
+                        default=list, help_text="Top-k crops with confidence scores"
+                    ),
+                ),
+                ("model_version", models.CharField(blank=True, max_length=50)),
+                ("computed_at", models.DateTimeField()),
+                (
+                    "farmer",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="precomputed_recommendations",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["farmer"], name="crops_preco_farmer__fcd412_idx"
+                    )
+                ],
+                "unique_together": {("source_type", "source_id")},
+            },
+        ),
+    ]
@@ -99,6 +99,9 @@ class CropPredictionRequest(models.Model):
     # Metadata
     requested_at = models.DateTimeField(auto_now_add=True)
     processed_at = models.DateTimeField(null=True, blank=True)
+    claimed_at = models.DateTimeField(
+        null=True, blank=True, help_text="When a queue worker picked up the request"
+    )
     notes = models.TextField(blank=True)
 
     class Meta:
@@ -107,6 +110,7 @@ class CropPredictionRequest(models.Model):
             models.Index(fields=["community_admin", "-requested_at"]),
             models.Index(fields=["sensor_set", "-requested_at"]),
             models.Index(fields=["status"]),
+            models.Index(fields=["status", "requested_at"]),
         ]
 
     def __str__(self):
@@ -231,3 +235,78 @@ class WeatherData(models.Model):
 
     def __str__(self):
         return f"{self.region} - {self.date} (Rainfall: {self.rainfall}mm)"
+
+
+class PrecomputedRecommendation(models.Model):
+    """Nightly top-k crop predictions per sensor set or farmer field profile"""
+
+    SOURCE_TYPES = [
+        ("sensor_set", "IoT Sensor Set"),
+        ("field_profile", "Farmer Field Profile"),
+    ]
+
+    source_type = models.CharField(max_length=20, choices=SOURCE_TYPES)
+    source_id = models.CharField(
+        max_length=64, help_text="Primary key of the sensor set or field profile"
+    )
+    farmer = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="precomputed_recommendations",
+        null=True,
+        blank=True,
+    )
+    region = models.CharField(max_length=100, blank=True)
+
+    # Model input in feature order [N, P, K, temperature, humidity, ph, rainfall]
+    features = models.JSONField(default=list)
+    predicted_crops = models.JSONField(
+        default=list, help_text="Top-k crops with confidence scores"
+    )
+    model_version = models.CharField(max_length=50, blank=True)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ["source_type", "source_id"]
+        indexes = [models.Index(fields=["farmer"])]
+
+    def __str__(self):
+        return f"Precomputed {self.source_type} {self.source_id} ({self.computed_at})"
+
+
+class BulkPredictionUpload(models.Model):
+    """Spreadsheet of soil test results scored in one bulk upload"""
+
+    UPLOAD_STATUS = [
+        ("processing", "Processing"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    uploaded_by = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="bulk_prediction_uploads"
+    )
+    file_name = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=20, choices=UPLOAD_STATUS, default="processing"
+    )
+
+    total_rows = models.PositiveIntegerField(default=0)
+    scored_rows = models.PositiveIntegerField(default=0)
+    invalid_rows = models.PositiveIntegerField(default=0)
+    result_file = models.FileField(
+        upload_to="bulk_predictions/",
+        blank=True,
+        help_text="Input rows with their status, errors and top crops",
+    )
+    error_message = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Bulk upload {self.file_name} ({self.status})"
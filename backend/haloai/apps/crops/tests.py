@@ -0,0 +1,1436 @@
+import json
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from services.tree_compiler import compare_backends, compile_model
+
+
+def _synthetic_dataset(n_rows=600, n_classes=4, seed=7):
+    """Crop-like feature rows with labels derived from a few thresholds"""
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(
+        [0, 5, 5, 8, 14, 3.5, 20], [140, 145, 205, 44, 100, 10, 300], (n_rows, 7)
+    )
+    y = (
+        (X[:, 0] > 70).astype(int) + (X[:, 3] > 26).astype(int) + (X[:, 6] > 160)
+    ) % n_classes
+    return X, y
+
+
+def _prediction_service(models):
+    """RealMLPredictionService scoring with the given models instead of the registry"""
+    from types import SimpleNamespace
+
+    from services.real_ml_prediction_service import RealMLPredictionService
+
+    service = RealMLPredictionService()
+    service.model_registry = SimpleNamespace(
+        version="test",
+        get_models=lambda: models,
+        models_for_batch=lambda n_rows: models,
+    )
+    return service
+
+
+class TreeCompilerParityTest(SimpleTestCase):
+    """Compiled evaluators must reproduce the source models' predictions"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.X, cls.y = _synthetic_dataset()
+        cls.probe = _synthetic_dataset(n_rows=300, seed=11)[0]
+
+    def assert_parity(self, model_name, model, atol):
+        compiled = compile_model(model_name, model)
+        self.assertIsNotNone(compiled)
+
+        native_proba = model.predict_proba(self.probe)
+        compiled_proba = compiled.predict_proba(self.probe)
+        self.assertEqual(native_proba.shape, compiled_proba.shape)
+        self.assertTrue(np.allclose(native_proba, compiled_proba, atol=atol))
+        np.testing.assert_array_equal(
+            model.predict(self.probe), compiled.predict(self.probe)
+        )
+
+        report = compare_backends(model, compiled, self.probe, repeats=2)
+        self.assertEqual(report["argmax_agreement"], 1.0)
+        for key in ("native_single_ms", "compiled_single_ms", "compiled_batch_ms"):
+            self.assertGreaterEqual(report[key], 0.0)
+
+    def test_random_forest_parity(self):
+        from sklearn.ensemble import RandomForestClassifier
+
+        model = RandomForestClassifier(n_estimators=15, max_depth=6, random_state=0)
+        model.fit(self.X, self.y)
+        self.assert_parity("random_forest", model, atol=1e-9)
+
+    def test_xgboost_parity(self):
+        try:
+            from xgboost import XGBClassifier
+        except ImportError:
+            self.skipTest("xgboost not installed")
+
+        model = XGBClassifier(n_estimators=20, max_depth=4, random_state=0)
+        model.fit(self.X, self.y)
+        self.assert_parity("xgboost", model, atol=1e-5)
+
+    def test_xgboost_missing_values_follow_default_branch(self):
+        try:
+            from xgboost import XGBClassifier
+        except ImportError:
+            self.skipTest("xgboost not installed")
+
+        X = self.X.copy()
+        X[::7, 2] = np.nan
+        model = XGBClassifier(n_estimators=10, max_depth=3, random_state=0)
+        model.fit(X, self.y)
+        compiled = compile_model("xgboost", model)
+
+        probe = self.probe.copy()
+        probe[::3, 2] = np.nan
+        self.assertTrue(
+            np.allclose(
+                model.predict_proba(probe), compiled.predict_proba(probe), atol=1e-5
+            )
+        )
+
+    def test_rbf_svm_parity(self):
+        from sklearn.svm import SVC
+
+        for shape in ("ovr", "ovo"):
+            model = SVC(decision_function_shape=shape).fit(self.X, self.y)
+            self.assertIsNone(compile_model("svm", model))
+            compiled = compile_model("svm", model, include_svm=True)
+            self.assertIsNotNone(compiled)
+            self.assertTrue(
+                np.allclose(
+                    model.decision_function(self.probe),
+                    compiled.decision_function(self.probe),
+                    atol=1e-9,
+                )
+            )
+            np.testing.assert_array_equal(
+                model.predict(self.probe), compiled.predict(self.probe)
+            )
+
+    def test_unsupported_model_is_not_compiled(self):
+        from sklearn.svm import SVC
+
+        self.assertIsNone(compile_model("svm", SVC(), include_svm=True))
+
+
+class CropRuleEngineTest(SimpleTestCase):
+    """Rule tables evaluated in batches must match the single-input rules"""
+
+    def setUp(self):
+        from services.crop_rules import crop_rule_engine
+
+        self.engine = crop_rule_engine
+        self.inputs = [
+            {"temperature": 20, "humidity": 85, "rainfall": 250, "ph": 6.5},
+            {"temperature": 30, "humidity": 80, "rainfall": 250, "ph": 4.5},
+            {"temperature": 36, "humidity": 95, "rainfall": 600, "ph": 8.5},
+            {"temperature": 12, "humidity": 30, "rainfall": 40, "ph": 6.0},
+        ]
+        self.X = self.engine.to_matrix(self.inputs)
+
+    def test_suitability_boundaries(self):
+        crops = [list(row) for row in self.engine.suitable_crops(self.X)]
+        self.assertEqual(
+            crops,
+            [["rice", "wheat", "maize"], ["default"], ["default"], ["lentil"]],
+        )
+
+    def test_risk_factors_keep_band_order_and_limit(self):
+        risks = self.engine.risk_factors(["rice"] * 4, self.X)
+        self.assertEqual(
+            risks[2],
+            [
+                "High temperature stress",
+                "High humidity may cause fungal diseases",
+                "Excessive rainfall may cause waterlogging",
+            ],
+        )
+        self.assertEqual(
+            risks[0],
+            ["Blast disease in high humidity", "Brown planthopper in warm conditions"],
+        )
+
+    def test_batch_matches_single_rows(self):
+        batch = self.engine.input_analysis(self.X)
+        for row, expected in zip(self.inputs, batch):
+            single = self.engine.input_analysis(self.engine.to_matrix([row]))[0]
+            self.assertEqual(single, expected)
+        self.assertEqual(batch[3]["ph"], "Optimal soil pH for nutrient availability")
+        self.assertEqual(batch[3]["nitrogen"], "Adequate nitrogen levels")
+
+
+class LatencyBudgetTest(SimpleTestCase):
+    """Models slower than their budget share leave the synchronous ensemble"""
+
+    def setUp(self):
+        from services.latency_budget import LatencyBudget
+
+        self.budget = LatencyBudget(budget_ms=30.0, policy="skip", min_samples=5)
+        for _ in range(10):
+            self.budget.record("xgboost", 1.0)
+            self.budget.record("random_forest", 2.0)
+            self.budget.record("svm", 25.0)
+
+    def test_slow_model_is_degraded(self):
+        active, degraded = self.budget.plan(["xgboost", "random_forest", "svm"])
+        self.assertEqual(active, ["xgboost", "random_forest"])
+        self.assertEqual(degraded, ["svm"])
+        self.assertTrue(self.budget.stats()["models"]["svm"]["degraded"])
+
+    def test_shares_and_fastest_model_are_kept(self):
+        self.budget.shares = {"svm": 28.0, "xgboost": 1.0, "random_forest": 1.0}
+        self.assertEqual(self.budget.plan(["xgboost", "svm"])[1], [])
+
+        self.budget.budget_ms = 0.5
+        active, degraded = self.budget.plan(["xgboost", "random_forest", "svm"])
+        self.assertEqual(active, ["xgboost"])
+        self.assertEqual(degraded, ["random_forest", "svm"])
+
+    def test_default_settings_keep_every_model_in_the_vote(self):
+        service = _prediction_service({})
+        self.assertFalse(service.latency_budget.enabled)
+        for _ in range(30):
+            service.latency_budget.record("xgboost", 2.0)
+            service.latency_budget.record("random_forest", 24.0)
+            service.latency_budget.record("svm", 5.0)
+
+        models = {"xgboost": object(), "random_forest": object(), "svm": object()}
+        selected = service._select_models(models, np.zeros((1, 7)))
+        self.assertEqual(list(selected), ["xgboost", "random_forest", "svm"])
+
+
+class EdgeModelExportTest(SimpleTestCase):
+    """Packed edge models must score like the sklearn trees they came from"""
+
+    def assert_round_trip(self, thresholds, file_format, min_agreement):
+        import tempfile
+        from pathlib import Path
+
+        from sklearn.ensemble import RandomForestClassifier
+
+        from services.edge_export import EdgeExporter
+        from services.edge_model import EdgeModel
+
+        X, y = _synthetic_dataset()
+        probe = _synthetic_dataset(n_rows=300, seed=11)[0]
+        forest = RandomForestClassifier(n_estimators=3, max_depth=6, random_state=0)
+        forest.fit(X, y)
+
+        exporter = EdgeExporter(thresholds=thresholds)
+        classes = [f"crop{i}" for i in range(4)]
+        header, arrays = exporter.pack(
+            [(tree, forest.classes_) for tree in forest.estimators_],
+            classes,
+            [f"f{i}" for i in range(7)],
+            X,
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "model.edge"
+            exporter.write(path, header, arrays, file_format)
+            model = EdgeModel.load(str(path))
+
+        expected = [classes[i] for i in forest.predict(probe)]
+        agreement = np.mean(np.array(model.predict(probe)) == np.array(expected))
+        self.assertGreaterEqual(agreement, min_agreement)
+        self.assertEqual(model.describe()["trees"], 3)
+
+    def test_float32_binary_round_trip(self):
+        self.assert_round_trip("float32", "binary", 0.99)
+
+    def test_int16_json_round_trip(self):
+        self.assert_round_trip("int16", "json", 0.98)
+
+
+@override_settings(ML_MODEL_RELOAD={"ENABLED": False})
+class ModelRegistryReloadTest(SimpleTestCase):
+    """Reloads swap in new artifacts and keep serving the old ones on failure"""
+
+    def setUp(self):
+        import tempfile
+        from pathlib import Path
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.models_dir = Path(self.tmp.name)
+        self.X, self.y = _synthetic_dataset()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_forest(self, n_estimators):
+        import os
+
+        import joblib
+        from sklearn.ensemble import RandomForestClassifier
+
+        model = RandomForestClassifier(n_estimators=n_estimators, random_state=0)
+        path = self.models_dir / "random_forest_model.pkl"
+        joblib.dump(model.fit(self.X, self.y), path)
+        # Deployments may preserve older mtimes; the registry must still notice
+        os.utime(path, ns=(10**9, 10**9))
+
+    def test_reload_swaps_and_rejects_broken_artifacts(self):
+        from services.model_registry import ModelRegistry
+
+        self.write_forest(3)
+        registry = ModelRegistry(self.models_dir)
+        old_model = registry.get("random_forest")
+        old_version = registry.version
+        self.assertFalse(registry.reload())
+
+        self.write_forest(5)
+        self.assertTrue(registry.reload())
+        self.assertNotEqual(registry.version, old_version)
+        self.assertEqual(len(registry.get("random_forest").estimators_), 5)
+        self.assertEqual(len(old_model.estimators_), 3)
+
+        (self.models_dir / "random_forest_model.pkl").write_bytes(b"broken")
+        swapped_version = registry.version
+        self.assertFalse(registry.reload())
+        self.assertEqual(registry.version, swapped_version)
+        self.assertEqual(registry.diagnostics()["reload"]["rejected"], 1)
+
+    def test_loading_models_does_not_start_the_watcher(self):
+        from services.model_registry import ModelRegistry
+
+        self.write_forest(3)
+        with self.settings(ML_MODEL_RELOAD={"ENABLED": True, "INTERVAL_SECONDS": 60}):
+            registry = ModelRegistry(self.models_dir)
+        registry.get_models()
+        self.assertFalse(registry.diagnostics()["reload"]["watching"])
+
+        registry.start_watching()
+        try:
+            self.assertTrue(registry.diagnostics()["reload"]["watching"])
+        finally:
+            registry.stop_watching()
+
+    def test_concurrent_conversions_publish_whole_artifacts(self):
+        import threading
+
+        from services.model_registry import ModelRegistry
+
+        self.write_forest(20)
+        registries = [ModelRegistry(self.models_dir) for _ in range(4)]
+        threads = [
+            threading.Thread(target=registry.get_models) for registry in registries
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        cache_dir = self.models_dir / ModelRegistry.CACHE_DIRNAME
+        self.assertEqual(list(cache_dir.glob(".tmp-*")), [])
+        fresh = ModelRegistry(self.models_dir)
+        self.assertEqual(len(fresh.get("random_forest").estimators_), 20)
+        self.assertEqual(fresh.memory_report()["random_forest"]["format"], "joblib")
+
+    def test_memory_report_counts_only_arrays_that_stay_mapped(self):
+        import joblib
+        from sklearn.svm import SVC
+
+        from services.model_registry import ModelRegistry
+
+        self.write_forest(5)
+        svm = SVC().fit(self.X, self.y)
+        joblib.dump(svm, self.models_dir / ModelRegistry.MODEL_FILES["svm"])
+        ModelRegistry(self.models_dir).get_models()
+
+        # The second registry loads the converted artifacts
+        registry = ModelRegistry(self.models_dir)
+        registry.get_models()
+        report = registry.memory_report()
+        self.assertGreaterEqual(
+            report["svm"]["mapped_bytes"], svm.support_vectors_.nbytes
+        )
+        # Unpickled sklearn trees copy their node arrays out of the map
+        forest = joblib.load(self.models_dir / "random_forest_model.pkl")
+        tree_bytes = sum(tree.tree_.value.nbytes for tree in forest.estimators_)
+        self.assertLess(report["random_forest"]["mapped_bytes"], tree_bytes)
+
+
+class ThreadBudgetTest(SimpleTestCase):
+    """Thread counts scale with batch size within each process's CPU share"""
+
+    def test_threads_follow_rows_and_process_share(self):
+        from services.thread_budget import ThreadBudget
+
+        budget = ThreadBudget(processes=2, cpus=16, rows_per_thread=1000)
+        self.assertEqual(budget.process_share, 8)
+        self.assertEqual(
+            [budget.threads_for(rows) for rows in (1, 500, 2500, 100_000)],
+            [1, 1, 3, 8],
+        )
+        budget.configure(processes=16)
+        self.assertEqual(budget.threads_for(100_000), 1)
+
+    def test_apply_returns_thread_limited_copies(self):
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.svm import SVC
+
+        from services.thread_budget import ThreadBudget
+
+        X, y = _synthetic_dataset()
+        forest = RandomForestClassifier(n_estimators=2).fit(X, y)
+        pipeline = Pipeline(
+            [("scaler", StandardScaler()), ("forest", RandomForestClassifier())]
+        )
+        svm = SVC()
+        budget = ThreadBudget(processes=1, cpus=4, rows_per_thread=100)
+        models = {"random_forest": forest, "pipeline": pipeline, "svm": svm}
+        batch = budget.apply(models, n_rows=1000)
+        single = budget.apply(models, n_rows=1)
+
+        self.assertIsNone(forest.n_jobs)
+        self.assertIsNone(pipeline.named_steps["forest"].n_jobs)
+        self.assertEqual(batch["random_forest"].n_jobs, 4)
+        self.assertEqual(batch["pipeline"].named_steps["forest"].n_jobs, 4)
+        self.assertEqual(single["random_forest"].n_jobs, 1)
+        self.assertIs(single["svm"], svm)
+        self.assertIs(
+            budget.apply(models, n_rows=1)["random_forest"], single["random_forest"]
+        )
+        self.assertIs(single["random_forest"].estimators_, forest.estimators_)
+
+    def test_xgboost_copies_get_their_own_booster(self):
+        import json
+
+        from xgboost import XGBClassifier
+
+        from services.thread_budget import ThreadBudget
+
+        X, y = _synthetic_dataset()
+        model = XGBClassifier(n_estimators=5, n_jobs=4).fit(X, y)
+        budget = ThreadBudget(processes=1, cpus=4, rows_per_thread=100)
+        single = budget.apply({"xgboost": model}, n_rows=1)["xgboost"]
+
+        def nthread(booster):
+            config = json.loads(booster.save_config())
+            return config["learner"]["generic_param"]["nthread"]
+
+        self.assertIsNot(single.get_booster(), model.get_booster())
+        self.assertEqual(nthread(single.get_booster()), "1")
+        self.assertEqual(nthread(model.get_booster()), "4")
+        np.testing.assert_array_equal(single.predict_proba(X), model.predict_proba(X))
+
+
+class SeasonPlannerTest(SimpleTestCase):
+    """Forecast days are bucketed and seasons ordered from the current one"""
+
+    def test_days_are_grouped_into_buckets(self):
+        from services.season_planner import SeasonPlanner
+
+        inputs = {"temperature": 25.0, "humidity": 70.0, "rainfall": 10.0}
+        rows = [
+            {
+                "date": f"2026-06-{day:02d}",
+                "inputs": inputs,
+                "recommendations": [
+                    {"crop": "rice" if day < 4 else "maize", "confidence": 0.6},
+                    {"crop": "maize" if day < 4 else "rice", "confidence": 0.3},
+                ],
+            }
+            for day in range(1, 6)
+        ]
+        timeline = SeasonPlanner().bucket_days_timeline(rows, bucket_days=3, top_k=2)
+
+        self.assertEqual([bucket["days"] for bucket in timeline], [3, 2])
+        self.assertEqual(timeline[0]["start"], "2026-06-01")
+        self.assertEqual(timeline[1]["end"], "2026-06-05")
+        first = timeline[0]["recommendations"][0]
+        self.assertEqual((first["crop"], first["days_on_top"]), ("rice", 3))
+        self.assertEqual(timeline[1]["recommendations"][0]["crop"], "maize")
+        self.assertEqual(timeline[1]["weather"]["rainfall"], 10.0)
+
+    def test_forecast_rainfall_is_a_monthly_total(self):
+        from unittest import mock
+
+        from services.enhanced_weather_service import DAYS_PER_MONTH
+        from services.season_planner import RAIN_WINDOW_DAYS, SeasonPlanner
+
+        forecast = [
+            {"date": f"2026-06-{day:02d}", "rainfall": rain, "humidity": 80.0}
+            for day, rain in enumerate([4.0, 0.0, 8.0] + [2.0] * 9, start=1)
+        ]
+        weather = mock.Mock(get_daily_forecast=mock.Mock(return_value=forecast))
+        base = {"temperature": 25.0, "humidity": 70.0, "rainfall": 150.0}
+        with mock.patch("services.season_planner.enhanced_weather_service", weather):
+            rows = SeasonPlanner().forecast_rows(base, "Bhairahawa-Butwal", 12)
+
+        self.assertEqual(rows[0]["inputs"]["rainfall"], round(4.0 * DAYS_PER_MONTH, 1))
+        self.assertEqual(rows[2]["inputs"]["rainfall"], round(4.0 * DAYS_PER_MONTH, 1))
+        self.assertEqual(rows[2]["rain_mm_per_day"], 8.0)
+        self.assertEqual(
+            rows[RAIN_WINDOW_DAYS + 2]["inputs"]["rainfall"],
+            round(2.0 * DAYS_PER_MONTH, 1),
+        )
+        self.assertEqual(rows[0]["inputs"]["temperature"], 25.0)
+        self.assertEqual(rows[0]["inputs"]["humidity"], 80.0)
+
+    def test_seasons_start_with_the_current_one(self):
+        from services.enhanced_weather_service import SEASON_MONTHS
+        from services.season_planner import SeasonPlanner
+
+        planner = SeasonPlanner()
+        self.assertEqual(
+            planner._season_order(10, SEASON_MONTHS), ["kharif", "rabi", "zaid"]
+        )
+        self.assertEqual(
+            planner._season_order(2, SEASON_MONTHS), ["rabi", "zaid", "kharif"]
+        )
+
+
+class BulkPredictionUploadTest(SimpleTestCase):
+    """Upload columns are mapped by header and validated column-wise"""
+
+    def test_batch_validation_matches_single_row_messages(self):
+        from apps.dashboard.regional_config import (
+            validate_soil_parameter_batch,
+            validate_soil_parameters,
+        )
+
+        errors = validate_soil_parameter_batch(
+            {
+                "nitrogen": np.array([90.0, 500.0, np.nan]),
+                "ph": np.array([6.5, 2.0, 7.0]),
+            }
+        )
+        self.assertEqual(errors[0], [])
+        self.assertEqual(
+            errors[1], validate_soil_parameters({"nitrogen": 500, "ph": 2})
+        )
+        self.assertEqual(errors[2], ["Nitrogen is missing or not a number"])
+
+    def test_csv_rows_are_streamed_and_columns_aliased(self):
+        import io
+        from types import SimpleNamespace
+
+        from services.bulk_prediction_upload import BulkPredictionUploader, read_rows
+
+        upload = io.BytesIO(
+            "﻿Farmer,N,P,K,pH,Rainfall (mm)\nram,90,42,43,6.5,\n".encode()
+        )
+        rows = read_rows(upload, "csv")
+        uploader = BulkPredictionUploader()
+        admin = SimpleNamespace(role="community_admin")
+        columns = uploader.column_map(next(rows), admin)
+
+        self.assertEqual(columns["nitrogen"], 1)
+        self.assertEqual(columns["farmer"], 0)
+        self.assertEqual(columns["rainfall"], 5)
+        self.assertEqual(next(rows), ["ram", "90", "42", "43", "6.5", ""])
+        with self.assertRaises(ValueError):
+            uploader.column_map(["N", "P", "K", "pH"], admin)
+
+
+@override_settings(ML_LATENCY_BUDGET={"ENABLED": False})
+class PredictBatchParityTest(SimpleTestCase):
+    """A batch must score every row exactly like a single-row request"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.svm import SVC
+
+        X, y = _synthetic_dataset()
+        labels = np.array(["rice", "maize", "chickpea", "lentil"])[y]
+        cls.models = {
+            "random_forest": RandomForestClassifier(
+                n_estimators=10, random_state=0
+            ).fit(X, labels),
+            "svm": SVC().fit(X, labels),
+        }
+        cls.probe = _synthetic_dataset(n_rows=25, seed=3)[0]
+
+    def test_soft_and_hard_batches_match_single_rows(self):
+        for mode in ("soft", "hard"):
+            service = _prediction_service(self.models)
+            service.ensemble_mode = mode
+            rows = [service.features_to_input(row) for row in self.probe]
+
+            batch = service.predict_batch(rows)
+            self.assertEqual(len(batch), len(rows))
+            self.assertEqual(
+                batch, [service.get_ensemble_prediction(row) for row in rows]
+            )
+            self.assertEqual(service.predict_batch(self.probe), batch)
+
+    def test_empty_and_malformed_batches(self):
+        service = _prediction_service(self.models)
+        self.assertEqual(service.predict_batch([]), [])
+        with self.assertRaises(ValueError):
+            service.predict_batch(np.zeros((2, 5)))
+
+
+class SoftVoteTest(SimpleTestCase):
+    """Soft voting ranks crops by weighted probability across every model"""
+
+    def test_top_k_follows_weighted_probabilities(self):
+        service = _prediction_service({})
+        n_crops = len(service.crop_labels)
+        forest = np.zeros((2, n_crops))
+        forest[0, [0, 1, 2]] = [0.5, 0.3, 0.2]
+        forest[1, [3, 4]] = [0.6, 0.4]
+        svm = np.zeros((2, n_crops))
+        svm[0, [1, 2]] = [0.9, 0.1]
+        svm[1, [4]] = [1.0]
+
+        service.ensemble_weights = {"random_forest": 1.0, "svm": 1.0}
+        rows = service._soft_vote({"random_forest": forest, "svm": svm}, top_k=3)
+        self.assertEqual(
+            [item["crop"] for item in rows[0]], ["maize", "rice", "chickpea"]
+        )
+        self.assertEqual([item["confidence"] for item in rows[0]], [0.6, 0.25, 0.15])
+        self.assertEqual(rows[0][0]["supporting_models"], ["svm"])
+        self.assertEqual(rows[0][1]["supporting_models"], ["random_forest"])
+        self.assertEqual(rows[1][0]["crop"], service.crop_labels[4])
+        self.assertEqual(rows[1][0]["model_agreement"], 1)
+
+        service.ensemble_weights = {"random_forest": 1.0, "svm": 0.0}
+        rows = service._soft_vote({"random_forest": forest, "svm": svm}, top_k=2)
+        self.assertEqual([item["crop"] for item in rows[0]], ["rice", "maize"])
+        self.assertEqual(len(rows[1]), 2)
+
+    def test_svm_scores_are_softmaxed_into_crop_columns(self):
+        from sklearn.svm import SVC
+
+        X, y = _synthetic_dataset()
+        # Sorted class order differs from the service's crop_labels order
+        labels = np.array(["rice", "maize", "chickpea", "lentil"])[y]
+        model = SVC().fit(X, labels)
+        service = _prediction_service({"svm": model})
+        probe = _synthetic_dataset(n_rows=50, seed=5)[0]
+
+        aligned = service._single_model_probabilities(model, probe)
+        self.assertEqual(aligned.shape, (50, len(service.crop_labels)))
+        np.testing.assert_allclose(aligned.sum(axis=1), 1.0)
+        columns = [service.crop_labels.index(label) for label in model.classes_]
+        others = np.setdiff1d(np.arange(len(service.crop_labels)), columns)
+        self.assertTrue(np.all(aligned[:, others] == 0))
+        np.testing.assert_array_equal(
+            np.array(service.crop_labels)[aligned.argmax(axis=1)], model.predict(probe)
+        )
+
+
+class SensitivityAnalysisTest(SimpleTestCase):
+    """What-if grids: shape, validation and the unknown-crop fallback"""
+
+    def setUp(self):
+        from types import SimpleNamespace
+        from unittest import mock
+
+        # Top crop follows the swept nitrogen column, confidence the ph column
+        def predict_top_crops(grid):
+            return (grid[:, 0] > 70).astype(int), grid[:, 5] / 10.0
+
+        service = SimpleNamespace(
+            crop_labels=["rice", "maize"], predict_top_crops=predict_top_crops
+        )
+        patcher = mock.patch("services.sensitivity_analysis.real_ml_service", service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_grid_shape_and_cells(self):
+        from services.sensitivity_analysis import sensitivity_analyzer
+
+        result = sensitivity_analyzer.analyze(
+            {"rainfall": 120},
+            [
+                {"feature": "nitrogen", "values": [20, 60, 100]},
+                {"feature": "ph", "min": 5, "max": 8, "steps": 4},
+            ],
+        )
+        self.assertEqual(result["cells"], 12)
+        self.assertEqual(result["base"]["rainfall"], 120.0)
+        self.assertEqual(result["axes"][1]["values"], [5.0, 6.0, 7.0, 8.0])
+        self.assertEqual(result["crops"], ["rice", "maize"])
+        self.assertEqual(result["top_crop"], [[0] * 4, [0] * 4, [1] * 4])
+        self.assertEqual(result["confidence"][2], [0.5, 0.6, 0.7, 0.8])
+
+    def test_invalid_sweeps_are_rejected(self):
+        from services.sensitivity_analysis import sensitivity_analyzer
+
+        invalid = {
+            "once": [{"feature": "ph"}, {"feature": "ph"}],
+            "Unknown feature": [{"feature": "sunlight"}],
+            "1 to 2": [{"feature": name} for name in ("ph", "nitrogen", "rainfall")],
+            "min must not exceed max": [{"feature": "ph", "min": 8, "max": 5}],
+            "steps allowed": [{"feature": "ph", "steps": 1000}],
+        }
+        for message, sweep in invalid.items():
+            with self.assertRaisesMessage(ValueError, message):
+                sensitivity_analyzer.analyze(None, sweep)
+
+    def test_endpoint_answers_bad_requests_with_400(self):
+        from django.test import RequestFactory
+
+        from apps.crops.views import crop_sensitivity_api
+
+        def post(body):
+            request = RequestFactory().post(
+                "/", data=json.dumps(body), content_type="application/json"
+            )
+            return crop_sensitivity_api(request)
+
+        response = post({"sweep": [{"feature": "sunlight"}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Unknown feature", json.loads(response.content)["message"])
+        self.assertEqual(post({"base": {"ph": "acidic"}, "sweep": []}).status_code, 400)
+        response = post({"sweep": [{"feature": "ph", "steps": 3}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["data"]["cells"], 3)
+
+    def test_unknown_top_crops_are_not_reported_as_rice(self):
+        from unittest import mock
+
+        service = _prediction_service({})
+        ranked = [
+            [
+                {"crop": "wheat", "confidence": 0.5},
+                {"crop": "maize", "confidence": 0.3},
+            ],
+            [{"crop": "wheat", "confidence": 0.7}],
+        ]
+        with mock.patch.object(service, "predict_batch", return_value=ranked):
+            top, confidence = service.predict_top_crops(np.zeros((2, 7)))
+        self.assertEqual(top.tolist(), [service.crop_labels.index("maize"), -1])
+        self.assertEqual(confidence.tolist(), [0.3, 0.0])
+
+
+class PredictionCacheTest(SimpleTestCase):
+    """Entries are keyed on quantized features, expire and coalesce misses"""
+
+    FEATURES = ["nitrogen", "temperature", "ph"]
+
+    @override_settings(
+        ML_PREDICTION_CACHE={
+            "TTL_SECONDS": 60,
+            "PRECISION": {"nitrogen": 0, "temperature": 1},
+        }
+    )
+    def test_nearby_inputs_share_a_quantized_key(self):
+        from services.prediction_cache import build_prediction_cache
+
+        cache = build_prediction_cache(self.FEATURES)
+        self.assertEqual(cache.precision, [0, 1, 2])
+        calls = []
+
+        def compute(row):
+            calls.append(row.tolist())
+            return {"row": row.tolist()}
+
+        first = cache.get_or_compute(np.array([90.4, 24.96, 6.501]), compute)
+        second = cache.get_or_compute(np.array([89.6, 25.04, 6.499]), compute)
+        self.assertEqual(first, second)
+        self.assertEqual(calls, [[90.0, 25.0, 6.5]])
+        cache.get_or_compute(np.array([90.0, 25.2, 6.5]), compute)
+        self.assertEqual(len(calls), 2)
+
+        second["row"].append("mutated")
+        self.assertEqual(cache.get_or_compute(np.array([90, 25, 6.5]), compute), first)
+        self.assertEqual(cache.stats()["hits"], 2)
+
+    def test_entries_expire_and_follow_the_model_version(self):
+        from unittest import mock
+
+        from services.prediction_cache import PredictionCache
+
+        version = ["v1"]
+        cache = PredictionCache(
+            self.FEATURES, ttl_seconds=10, version_provider=lambda: version[0]
+        )
+        compute = mock.Mock(return_value="crops")
+        row = np.array([90.0, 25.0, 6.5])
+        with mock.patch("services.prediction_cache.time.monotonic") as clock:
+            clock.return_value = 100.0
+            cache.get_or_compute(row, compute)
+            clock.return_value = 109.0
+            cache.get_or_compute(row, compute)
+            self.assertEqual(compute.call_count, 1)
+
+            clock.return_value = 111.0
+            cache.get_or_compute(row, compute)
+            self.assertEqual(compute.call_count, 2)
+            self.assertEqual(cache.stats()["expirations"], 1)
+
+            version[0] = "v2"
+            cache.get_or_compute(row, compute)
+            self.assertEqual(compute.call_count, 3)
+
+    @override_settings(
+        ML_PREDICTION_CACHE={"TTL_SECONDS": 60, "DEGRADED_TTL_SECONDS": 0}
+    )
+    def test_degraded_predictions_are_not_kept_for_the_full_ttl(self):
+        from unittest import mock
+
+        service = _prediction_service({"random_forest": object(), "svm": object()})
+        crops = [
+            {
+                "crop": "rice",
+                "confidence": 0.8,
+                "supporting_models": 1,
+                "model_agreement": 1.0,
+            }
+        ]
+        degraded = {"predictions": crops, "contributing_models": ["random_forest"]}
+        full = {"predictions": crops, "contributing_models": ["random_forest", "svm"]}
+        self.assertEqual(service._prediction_ttl(degraded), 0)
+        self.assertEqual(service._prediction_ttl(full), 60)
+
+        inputs = _manual_inputs()
+        with mock.patch.object(
+            service, "_cacheable_prediction", side_effect=[degraded, full]
+        ) as compute:
+            first = service.get_prediction_with_rationale(inputs)
+            second = service.get_prediction_with_rationale(inputs)
+            third = service.get_prediction_with_rationale(inputs)
+        self.assertEqual(compute.call_count, 2)
+        self.assertEqual(
+            first["model_details"]["contributing_models"], ["random_forest"]
+        )
+        self.assertEqual(
+            second["model_details"]["contributing_models"], ["random_forest", "svm"]
+        )
+        self.assertEqual(third["model_details"], second["model_details"])
+
+    def test_concurrent_misses_are_computed_once(self):
+        import threading
+        import time
+
+        from services.prediction_cache import PredictionCache
+
+        cache = PredictionCache(self.FEATURES)
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def compute(row):
+            calls.append(row)
+            started.set()
+            release.wait(5)
+            return ["rice"]
+
+        def request():
+            results.append(cache.get_or_compute(np.array([90, 25, 6.5]), compute))
+
+        owner = threading.Thread(target=request)
+        owner.start()
+        started.wait(5)
+        waiters = [threading.Thread(target=request) for _ in range(3)]
+        for thread in waiters:
+            thread.start()
+        while cache.stats()["coalesced"] < 3:
+            time.sleep(0.01)
+        release.set()
+        for thread in [owner, *waiters]:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [["rice"]] * 4)
+        self.assertEqual(cache.stats()["inflight"], 0)
+
+
+class InferenceExecutorTest(SimpleTestCase):
+    """Pool calls fall back on any failure and keep their slot until done"""
+
+    def executor(self, **kwargs):
+        from services.inference_executor import InferenceExecutor
+
+        executor = InferenceExecutor(
+            "unused", n_models=1, n_classes=4, enabled=True, **kwargs
+        )
+        self.addCleanup(executor.shutdown)
+        return executor
+
+    def thread_pool(self, executor):
+        from concurrent.futures import ThreadPoolExecutor
+
+        executor._pool = ThreadPoolExecutor(max_workers=2)
+        return executor
+
+    def test_pool_scores_like_in_process(self):
+        import tempfile
+        from pathlib import Path
+
+        import joblib
+        from sklearn.ensemble import RandomForestClassifier
+
+        from services.model_registry import ModelRegistry
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        X, y = _synthetic_dataset()
+        forest = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y)
+        joblib.dump(forest, Path(tmp.name) / "random_forest_model.pkl")
+        probe = _synthetic_dataset(n_rows=6, seed=2)[0]
+
+        executor = self.executor(workers=1, timeout_seconds=60)
+        executor.models_dir = tmp.name
+        executor.n_models, executor.n_classes = 3, 22
+        pooled = executor.model_probabilities(probe)
+
+        service = _prediction_service({})
+        service.model_registry = ModelRegistry(tmp.name)
+        expected = service._model_probabilities(probe)
+        self.assertEqual(list(pooled), ["random_forest"])
+        np.testing.assert_allclose(pooled["random_forest"], expected["random_forest"])
+        self.assertEqual(executor.stats()["submitted"], 1)
+
+    def test_worker_errors_become_unavailable(self):
+        from services.inference_executor import InferenceUnavailable
+
+        # Threads never ran the worker initializer, so the task itself fails
+        executor = self.thread_pool(self.executor())
+        with self.assertRaises(InferenceUnavailable):
+            executor.model_probabilities(np.zeros((2, 7)))
+        self.assertEqual(executor.stats()["errors"], 1)
+        self.assertTrue(executor._slots.acquire(blocking=False))
+
+    def test_timed_out_task_keeps_its_slot_until_it_finishes(self):
+        import threading
+        from unittest import mock
+
+        from services.inference_executor import InferenceUnavailable
+
+        release = threading.Event()
+        finished = threading.Event()
+        seen = []
+
+        def slow_worker(input_name, shape, output_name, output_shape):
+            from multiprocessing import shared_memory
+
+            release.wait(5)
+            # The caller gave up, but the blocks are still there to write into
+            block = shared_memory.SharedMemory(name=output_name)
+            seen.append(block.size)
+            block.close()
+            finished.set()
+            return []
+
+        executor = self.thread_pool(self.executor(max_queue=1, timeout_seconds=0.05))
+        with mock.patch(
+            "services.inference_executor._worker_probabilities", slow_worker
+        ):
+            with self.assertRaises(InferenceUnavailable):
+                executor.model_probabilities(np.zeros((2, 7)))
+            with self.assertRaisesMessage(InferenceUnavailable, "queue is full"):
+                executor.model_probabilities(np.zeros((2, 7)))
+
+            release.set()
+            finished.wait(5)
+            executor._pool.shutdown(wait=True)
+
+        self.assertEqual(len(seen), 1)
+        self.assertEqual(executor.stats()["timeouts"], 1)
+        self.assertEqual(executor.stats()["rejected"], 1)
+        self.assertTrue(executor._slots.acquire(blocking=False))
+
+
+def _manual_inputs(**overrides):
+    """Model inputs for a prediction request"""
+    inputs = {
+        "nitrogen": 90.0,
+        "phosphorus": 42.0,
+        "potassium": 43.0,
+        "temperature": 20.8,
+        "humidity": 82.0,
+        "ph": 6.5,
+        "rainfall": 202.9,
+    }
+    return {**inputs, **overrides}
+
+
+class PredictionJobQueueTest(TestCase):
+    """Jobs move pending -> processing -> completed/failed exactly once"""
+
+    def setUp(self):
+        from services.prediction_job_queue import PredictionJobQueue
+
+        self.queue = PredictionJobQueue(worker_id="test")
+        self.jobs = [self.queue.enqueue(**_manual_inputs()) for _ in range(3)]
+
+    def status(self, job):
+        job.refresh_from_db()
+        return job.status
+
+    def test_claim_complete_and_fail(self):
+        from types import SimpleNamespace
+        from unittest import mock
+
+        from apps.crops.models import CropRecommendation
+
+        self.assertEqual(self.queue.get_status(self.jobs[0].id)["status"], "pending")
+        claimed = self.queue.claim_batch(2)
+        self.assertEqual([job.id for job in claimed], [job.id for job in self.jobs[:2]])
+        self.assertEqual(self.status(self.jobs[0]), "processing")
+        self.assertEqual(
+            [job.id for job in self.queue.claim_batch(5)], [self.jobs[2].id]
+        )
+        self.assertEqual(self.queue.claim_batch(5), [])
+
+        predictions = [
+            {"crop": "rice", "confidence": 0.8},
+            {"crop": "maize", "confidence": 0.1},
+        ]
+        service = SimpleNamespace(predict_batch=lambda inputs: [predictions] * 2)
+        with mock.patch("services.real_ml_prediction_service.real_ml_service", service):
+            counts = self.queue.process_batch(claimed)
+        self.assertEqual(counts, {"completed": 2, "failed": 0})
+        status = self.queue.get_status(self.jobs[0].id)
+        self.assertEqual(status["status"], "completed")
+        self.assertEqual(status["predicted_crops"][0]["crop"], "rice")
+        self.assertEqual(
+            CropRecommendation.objects.filter(prediction_request=self.jobs[0]).count(),
+            2,
+        )
+
+        def broken(inputs):
+            raise RuntimeError("model crashed")
+
+        service.predict_batch = broken
+        with mock.patch("services.real_ml_prediction_service.real_ml_service", service):
+            counts = self.queue.process_batch([self.jobs[2]])
+        self.assertEqual(counts, {"completed": 0, "failed": 1})
+        status = self.queue.get_status(self.jobs[2].id)
+        self.assertEqual(status["status"], "failed")
+        self.assertEqual(status["error"], "Processing error: model crashed")
+
+    def test_stale_jobs_are_requeued(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from apps.crops.models import CropPredictionRequest
+
+        claimed = self.queue.claim_batch(2)
+        CropPredictionRequest.objects.filter(id=claimed[0].id).update(
+            claimed_at=timezone.now() - timedelta(minutes=30)
+        )
+        self.assertEqual(self.queue.requeue_stale(timedelta(minutes=10)), 1)
+        self.assertEqual(self.status(claimed[0]), "pending")
+        self.assertEqual(self.status(claimed[1]), "processing")
+        self.assertEqual(
+            [job.id for job in self.queue.claim_batch(5)],
+            [self.jobs[0].id, self.jobs[2].id],
+        )
+
+    def test_rows_claimed_by_another_worker_are_skipped(self):
+        from unittest import mock
+
+        from django.db import connection
+        from django.utils import timezone
+
+        from apps.crops.models import CropPredictionRequest
+
+        if connection.features.has_select_for_update_skip_locked:
+            self.skipTest("compare-and-set fallback is only used without SKIP LOCKED")
+
+        now = timezone.now()
+        calls = []
+
+        def clock():
+            # Another worker wins the second row between listing and update
+            if not calls:
+                CropPredictionRequest.objects.filter(id=self.jobs[1].id).update(
+                    status="processing", claimed_at=now
+                )
+            calls.append(now)
+            return now
+
+        with mock.patch("services.prediction_job_queue.timezone.now", clock):
+            claimed = self.queue.claim_batch(3)
+        self.assertEqual(
+            [job.id for job in claimed], [self.jobs[0].id, self.jobs[2].id]
+        )
+
+
+class PredictionJobStatusAccessTest(TestCase):
+    """Queued job status is only visible to its owner, staff and admins"""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+
+        from services.prediction_job_queue import prediction_job_queue
+
+        User = get_user_model()
+        self.farmer = User.objects.create(username="farmer", role="farmer")
+        self.other_farmer = User.objects.create(username="other", role="farmer")
+        self.admin = User.objects.create(username="admin", role="admin")
+        self.staff = User.objects.create(
+            username="staff", role="technician", is_staff=True
+        )
+        self.job = prediction_job_queue.enqueue(farmer=self.farmer, **_manual_inputs())
+
+    def status(self, user):
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import RequestFactory
+
+        from apps.crops.views import crop_prediction_job_status
+
+        request = RequestFactory().get("/")
+        request.user = user or AnonymousUser()
+        return crop_prediction_job_status(request, self.job.id)
+
+    def test_owner_staff_and_admin_see_the_job(self):
+        for user in (self.farmer, self.staff, self.admin):
+            response = self.status(user)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                json.loads(response.content)["data"]["id"], str(self.job.id)
+            )
+
+    def test_other_users_are_refused(self):
+        self.assertEqual(self.status(None).status_code, 401)
+        self.assertEqual(self.status(self.other_farmer).status_code, 404)
+
+
+class RecommendationWriterTest(TestCase):
+    """Recommendations are written with a fixed number of queries"""
+
+    def setUp(self):
+        from apps.crops.models import CropPredictionRequest, CropType
+        from services.recommendation_writer import RecommendationWriter
+
+        CropType.objects.create(name="rice")
+        self.writer = RecommendationWriter()
+        self.requests = [
+            CropPredictionRequest.objects.create(**_manual_inputs()) for _ in range(3)
+        ]
+
+    def rows(self, crops):
+        return [
+            {
+                "prediction_request": request,
+                "crop_name": crop,
+                "recommendation_type": "primary",
+                "confidence_score": 0.7,
+                "rationale": "",
+                "expected_yield": "",
+                "risk_factors": [],
+                "local_market_demand": "high",
+            }
+            for request in self.requests
+            for crop in crops
+        ]
+
+    def test_crop_types_are_created_once_and_cached(self):
+        from apps.crops.models import CropRecommendation, CropType
+
+        # Warm the name map, insert missing types, re-read them, insert rows
+        with self.assertNumQueries(4 + 2):
+            self.assertEqual(self.writer.write(self.rows(["rice", "maize", "jute"])), 9)
+        self.assertEqual(CropType.objects.filter(name="maize").count(), 1)
+        self.assertEqual(CropRecommendation.objects.count(), 9)
+
+        # Known crop types: only the bulk insert, inside its transaction
+        with self.assertNumQueries(3):
+            self.writer.write(self.rows(["rice", "maize"]))
+        self.assertEqual(CropRecommendation.objects.count(), 9)
+        self.assertEqual(self.writer.write([]), 0)
+
+    def test_persist_predictions_updates_requests_and_rows_together(self):
+        from apps.crops.models import CropRecommendation
+
+        for request in self.requests:
+            request.status = "completed"
+            request.confidence_score = 0.7
+        self.writer.persist_predictions(
+            self.requests, self.rows(["rice"]), ["status", "confidence_score"]
+        )
+        self.requests[0].refresh_from_db()
+        self.assertEqual(self.requests[0].status, "completed")
+        self.assertEqual(CropRecommendation.objects.count(), 3)
+
+        # A failing insert also rolls back the request update
+        self.requests[0].status = "failed"
+        with self.assertRaises(TypeError):
+            self.writer.persist_predictions(
+                self.requests[:1],
+                [{**self.rows(["rice"])[0], "unknown_field": 1}],
+                ["status"],
+            )
+        self.requests[0].refresh_from_db()
+        self.assertEqual(self.requests[0].status, "completed")
+        self.assertEqual(CropRecommendation.objects.count(), 3)
+
+
+class ServiceContainerTest(SimpleTestCase):
+    """Services are built on first use, once, behind a forwarding proxy"""
+
+    def setUp(self):
+        import sys
+        import types
+
+        from services.container import ServiceContainer
+
+        class Service:
+            built = 0
+
+            def __init__(self):
+                Service.built += 1
+                self.warmed = 0
+                self.threshold = 1
+
+            def warm(self):
+                self.warmed += 1
+
+            def double(self, value):
+                return value * 2
+
+        module = types.ModuleType("fake_container_services")
+        module.Service = Service
+        module.Broken = lambda: 1 / 0
+        sys.modules[module.__name__] = module
+        self.addCleanup(sys.modules.pop, module.__name__)
+
+        self.Service = Service
+        self.container = ServiceContainer()
+        self.container.register("service", module.__name__, "Service", "warm")
+        self.container.register("broken", module.__name__, "Broken")
+
+    def test_proxy_builds_on_first_attribute_access(self):
+        proxy = self.container.lazy("service")
+        self.assertEqual(repr(proxy), "<LazyService service (not built)>")
+        self.assertFalse(self.container.is_built("service"))
+        self.assertEqual(self.Service.built, 0)
+
+        self.assertEqual(proxy.double(4), 8)
+        proxy.threshold = 5
+        self.assertEqual(self.container.get("service").threshold, 5)
+        self.assertIs(self.container.lazy("service").double.__self__, proxy._resolve())
+        self.assertEqual(self.Service.built, 1)
+        self.assertIn(
+            "import_seconds", self.container.timing_report()["services"]["service"]
+        )
+
+    def test_concurrent_first_use_builds_once(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            instances = set(
+                map(id, pool.map(lambda _: self.container.get("service"), range(32)))
+            )
+        self.assertEqual(len(instances), 1)
+        self.assertEqual(self.Service.built, 1)
+
+    def test_warm_up_runs_once_and_survives_failures(self):
+        self.container.warm_up()
+        report = self.container.warm_up()
+        self.assertEqual(self.container.get("service").warmed, 1)
+        self.assertIn("warm_seconds", report["services"]["service"])
+        self.assertFalse(report["services"]["broken"]["built"])
+
+
+class PrecomputedPredictionAccessTest(TestCase):
+    """Precomputed rows are only served to their owner and without live inputs"""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from django.utils import timezone
+
+        from apps.crops.models import PrecomputedRecommendation
+        from apps.sensors.models import IoTSensorSet
+        from services.model_registry import model_registry
+
+        User = get_user_model()
+        self.admin = User.objects.create(username="admin", role="community_admin")
+        self.other_admin = User.objects.create(username="other", role="community_admin")
+        self.farmer = User.objects.create(username="farmer", role="farmer")
+        self.sensor_set = IoTSensorSet.objects.create(
+            name="north field",
+            community_admin=self.admin,
+            location_name="Butwal",
+            firebase_path="sensors/north",
+        )
+        row = {
+            "features": list(_manual_inputs().values()),
+            "predicted_crops": [{"crop": "rice", "confidence": 0.8}],
+            "model_version": model_registry.version,
+            "computed_at": timezone.now(),
+        }
+        PrecomputedRecommendation.objects.create(
+            source_type="sensor_set", source_id=str(self.sensor_set.id), **row
+        )
+        PrecomputedRecommendation.objects.create(
+            source_type="field_profile", source_id="1", farmer=self.farmer, **row
+        )
+
+    def precomputed(self, user, **data):
+        from types import SimpleNamespace
+        from unittest import mock
+
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import RequestFactory
+
+        from apps.crops.views import get_precomputed_prediction
+
+        request = RequestFactory().post("/")
+        request.user = user or AnonymousUser()
+        service = SimpleNamespace(
+            build_prediction_result=lambda inputs, crops: {
+                "recommended_crop": crops[0]["crop"],
+                "confidence": crops[0]["confidence"],
+                "rationale": "",
+            }
+        )
+        with mock.patch("apps.crops.views.real_ml_service", service):
+            return get_precomputed_prediction(request, data)
+
+    def test_sensor_sets_are_served_to_their_admin_only(self):
+        sensor_set_id = str(self.sensor_set.id)
+        result = self.precomputed(self.admin, sensor_set_id=sensor_set_id)
+        self.assertEqual(result["source"], "precomputed")
+        self.assertEqual(result["prediction_summary"]["primary_crop"], "Rice")
+
+        self.assertIsNone(
+            self.precomputed(self.other_admin, sensor_set_id=sensor_set_id)
+        )
+        self.assertIsNone(self.precomputed(None, sensor_set_id=sensor_set_id))
+        self.assertIsNone(self.precomputed(self.farmer, sensor_set_id=sensor_set_id))
+        self.assertIsNone(self.precomputed(self.admin, sensor_set_id="not-a-uuid"))
+
+    def test_any_supplied_input_falls_back_to_live_scoring(self):
+        self.assertIsNotNone(self.precomputed(self.farmer, notes="hello"))
+        for field in ("nitrogen", "temperature", "humidity", "rainfall"):
+            self.assertIsNone(self.precomputed(self.farmer, **{field: "20"}))
+        self.assertIsNone(self.precomputed(self.farmer, use_precomputed="false"))
+        self.assertIsNone(
+            self.precomputed(
+                self.admin, sensor_set_id=str(self.sensor_set.id), ph="6.1"
+            )
+        )
+
+
+class ModelTrainingTest(SimpleTestCase):
+    """Streaming training, versioned artifacts and promotion"""
+
+    crop_labels = ["rice", "maize", "jute", "cotton"]
+
+    def setUp(self):
+        import tempfile
+        from pathlib import Path
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.models_dir = Path(self.tmp.name)
+        X, y = _synthetic_dataset()
+        self.chunks = [(X[i : i + 200], y[i : i + 200]) for i in range(0, 600, 200)]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def train(self, **kwargs):
+        from services.model_training import IncrementalTrainer
+
+        trainer = IncrementalTrainer(
+            self.crop_labels, trees=15, rounds=10, progress=lambda _: None, **kwargs
+        )
+        return trainer.train(self.chunks)
+
+    def test_seed_csvs_are_the_default_source(self):
+        import pandas as pd
+
+        from services.model_training import CSV_FEATURE_COLUMNS, TrainingRowSource
+
+        X, y = self.chunks[0]
+        frame = pd.DataFrame(X, columns=CSV_FEATURE_COLUMNS)
+        frame["label"] = [self.crop_labels[label] for label in y]
+        frame.loc[0, "label"] = "durian"
+        path = self.models_dir / "seed.csv"
+        frame.to_csv(path, index=False)
+
+        # SimpleTestCase refuses database queries, so no rows come from the DB
+        source = TrainingRowSource(self.crop_labels, chunk_size=64, seed_csvs=[path])
+        chunks = list(source)
+        self.assertEqual(sum(len(labels) for _, labels in chunks), len(y) - 1)
+        self.assertEqual(source.skipped_rows, 1)
+        np.testing.assert_array_equal(np.concatenate([c[1] for c in chunks]), y[1:])
+
+    def test_trainer_reports_accuracy_baselines_and_the_svm_stand_in(self):
+        class AlwaysRice:
+            def predict(self, X):
+                return np.array(["Rice"] * len(X))
+
+        models, report = self.train(baseline_models={"random_forest": AlwaysRice()})
+        self.assertEqual(set(models), {"xgboost", "random_forest", "svm"})
+        self.assertEqual(report["training_rows"] + report["holdout_rows"], 600)
+        self.assertGreater(report["holdout_accuracy"]["random_forest"], 0.8)
+        self.assertLess(report["baseline_holdout_accuracy"]["random_forest"], 0.6)
+        self.assertEqual(set(report["baseline_holdout_accuracy"]), {"random_forest"})
+        self.assertIn("SVC", report["estimators"]["svm"]["replaces"])
+        self.assertNotIn("replaces", report["estimators"]["random_forest"])
+
+    def test_model_size_does_not_grow_with_the_number_of_chunks(self):
+        from services.model_training import IncrementalTrainer
+
+        X = np.concatenate([chunk[0] for chunk in self.chunks])
+        y = np.concatenate([chunk[1] for chunk in self.chunks])
+        for chunk_rows in (600, 200, 50):
+            chunks = [
+                (X[i : i + chunk_rows], y[i : i + chunk_rows])
+                for i in range(0, len(y), chunk_rows)
+            ]
+            trainer = IncrementalTrainer(
+                self.crop_labels,
+                model_names=["xgboost", "random_forest"],
+                trees=7,
+                rounds=6,
+                progress=lambda _: None,
+            )
+            models, _ = trainer.train(chunks)
+            self.assertEqual(len(models["random_forest"].estimators_), 7)
+            self.assertEqual(models["xgboost"].get_booster().num_boosted_rounds(), 6)
+
+    def test_holdout_regressions(self):
+        from services.model_training import holdout_regressions
+
+        report = {
+            "holdout_accuracy": {"svm": 0.9, "xgboost": 0.95, "random_forest": 0.8},
+            "baseline_holdout_accuracy": {"svm": 0.92, "xgboost": 0.9},
+        }
+        self.assertEqual(
+            holdout_regressions(report),
+            {"svm": {"trained": 0.9, "current": 0.92}},
+        )
+        self.assertEqual(holdout_regressions(report, tolerance=0.05), {})
+
+    def test_save_and_promote_version(self):
+        import json
+
+        import joblib
+
+        from services.model_registry import ModelRegistry
+        from services.model_training import promote_version, save_version
+
+        models, report = self.train(model_names=["random_forest", "svm"])
+        version_dir = save_version(models, report, self.models_dir)
+
+        self.assertEqual(list((self.models_dir / "versions").glob(".tmp-*")), [])
+        metadata = json.loads((version_dir / "metadata.json").read_text())
+        self.assertEqual(metadata["version"], version_dir.name)
+        self.assertEqual(metadata["models"], ["random_forest", "svm"])
+        self.assertIn("replaces", metadata["estimators"]["svm"])
+        self.assertEqual(metadata["training"]["rows"], report["rows"])
+
+        promoted = promote_version(version_dir, self.models_dir)
+        self.assertEqual(promoted, ["random_forest", "svm"])
+        self.assertEqual(
+            (self.models_dir / "VERSION").read_text().strip(), version_dir.name
+        )
+        self.assertEqual(list(self.models_dir.glob(".tmp-*")), [])
+        self.assertFalse((self.models_dir / "xgboost_model.pkl").exists())
+
+        registry = ModelRegistry(self.models_dir)
+        served = registry.get("random_forest")
+        original = joblib.load(version_dir / ModelRegistry.MODEL_FILES["random_forest"])
+        probe = self.chunks[0][0]
+        np.testing.assert_array_equal(served.predict(probe), original.predict(probe))
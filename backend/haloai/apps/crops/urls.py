@@ -9,6 +9,28 @@ urlpatterns = [
     path("prediction/", views.crop_prediction, name="prediction"),
     # API endpoints
     path("api/predict/", views.crop_prediction_api, name="api_predict"),
+    path("api/predict/jobs/", views.crop_prediction_job_api, name="api_predict_job"),
+    path(
+        "api/predict/jobs/<uuid:request_id>/",
+        views.crop_prediction_job_status,
+        name="api_predict_job_status",
+    ),
+    path(
+        "api/predict/sensitivity/",
+        views.crop_sensitivity_api,
+        name="api_predict_sensitivity",
+    ),
+    path(
+        "api/predict/season-plan/",
+        views.crop_season_plan_api,
+        name="api_predict_season_plan",
+    ),
+    path("api/predict/bulk/", views.crop_bulk_upload_api, name="api_predict_bulk"),
+    path(
+        "api/predict/bulk/<uuid:upload_id>/result/",
+        views.crop_bulk_upload_result,
+        name="api_predict_bulk_result",
+    ),
     # Legacy endpoint (kept for backward compatibility)
     path("api/real-time-data/", views.get_real_time_data, name="api_real_time_data"),
     # Enhanced endpoint (redirect to sensors app)
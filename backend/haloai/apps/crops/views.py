@@ -1,20 +1,32 @@
-from django.http import JsonResponse
+from django.http import FileResponse, JsonResponse
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.urls import reverse
 from django.utils import timezone
 import json
+import os
 from typing import Dict, Any
 
 # Import our enhanced services
-from services.enhanced_iot_service import enhanced_iot_service
-from services.enhanced_weather_service import enhanced_weather_service
-from services.real_ml_prediction_service import real_ml_service
+from services.bulk_prediction_upload import bulk_prediction_uploader
+from services.container import (
+    crop_prediction_service,
+    enhanced_iot_service,
+    enhanced_weather_service,
+    real_ml_service,
+)
+from services.prediction_job_queue import INPUT_FIELDS, prediction_job_queue
+from services.recommendation_precompute import get_precomputed
+from services.season_planner import season_planner
+from services.sensitivity_analysis import sensitivity_analyzer
 
 # Import models for saving predictions
-from .models import CropPredictionRequest
+from .models import BulkPredictionUpload, CropPredictionRequest
 from apps.dashboard.models import ManualCropInput
+from apps.sensors.models import IoTSensorSet
 
 
 # Create your views here.
@@ -47,6 +59,11 @@ def crop_prediction_api(request):
         else:
             data = request.POST.dict()
 
+        # Serve the nightly precomputed result when the request allows it
+        precomputed = get_precomputed_prediction(request, data)
+        if precomputed is not None:
+            return JsonResponse({"status": "success", "data": precomputed})
+
         # Collect real-time data
         prediction_input = collect_real_time_data(data)
 
@@ -105,6 +122,229 @@ def crop_prediction_api(request):
         )
 
 
+@csrf_exempt
+@require_http_methods(["POST"])
+def crop_prediction_job_api(request):
+    """
+    Queue a crop prediction and return straight away with a job id.
+    A prediction worker (manage.py process_prediction_jobs) scores the job;
+    clients poll crop_prediction_job_status for the result.
+    """
+    try:
+        if request.content_type == "application/json":
+            data = json.loads(request.body)
+        else:
+            data = request.POST.dict()
+
+        user = request.user if request.user.is_authenticated else None
+        sensor_set_id = data.get("sensor_set_id")
+
+        if sensor_set_id:
+            if user is None or user.role != "community_admin":
+                return JsonResponse(
+                    {
+                        "status": "error",
+                        "message": "Sensor set predictions require a community admin",
+                    },
+                    status=403,
+                )
+            sensor_set = IoTSensorSet.objects.get(
+                id=sensor_set_id, community_admin=user
+            )
+            prediction_request = crop_prediction_service.create_prediction_request(
+                user, sensor_set
+            )
+        else:
+            defaults = crop_prediction_service.regional_defaults["Bhairahawa-Butwal"]
+            prediction_request = prediction_job_queue.enqueue(
+                farmer=user if user is not None and user.role == "farmer" else None,
+                notes=data.get("notes", ""),
+                **{
+                    field: float(data.get(field, defaults[field]))
+                    for field in INPUT_FIELDS
+                },
+            )
+
+        return JsonResponse(
+            {
+                "status": "success",
+                "data": {
+                    "job_id": str(prediction_request.id),
+                    "job_status": prediction_request.status,
+                    "status_url": reverse(
+                        "crops:api_predict_job_status", args=[prediction_request.id]
+                    ),
+                },
+            },
+            status=202,
+        )
+
+    except IoTSensorSet.DoesNotExist:
+        return JsonResponse(
+            {"status": "error", "message": "Sensor set not found"}, status=404
+        )
+    except (ValueError, TypeError) as e:
+        return JsonResponse(
+            {"status": "error", "message": f"Invalid input: {str(e)}"}, status=400
+        )
+    except Exception as e:
+        return JsonResponse(
+            {"status": "error", "message": f"Could not queue prediction: {str(e)}"},
+            status=500,
+        )
+
+
+@require_http_methods(["GET"])
+def crop_prediction_job_status(request, request_id):
+    """Poll the status (and result, once finished) of a queued prediction
+
+    Farmers and community admins only see their own jobs; staff and platform
+    admins see all of them.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return JsonResponse(
+            {"status": "error", "message": "Authentication required"}, status=401
+        )
+
+    owner = None if user.is_staff or user.role == "admin" else user
+    job = prediction_job_queue.get_status(request_id, owner=owner)
+    if job is None:
+        return JsonResponse(
+            {"status": "error", "message": "Prediction job not found"}, status=404
+        )
+    return JsonResponse({"status": "success", "data": job})
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def crop_sensitivity_api(request):
+    """
+    What-if analysis: sweep one or two features over a grid around a base input
+    and return the top crop and confidence for every grid cell.
+    Body: {"base": {...}, "sweep": [{"feature": "ph", "min": 5, "max": 8, "steps": 50}]}
+    """
+    try:
+        data = json.loads(request.body)
+        result = sensitivity_analyzer.analyze(data.get("base"), data.get("sweep"))
+        return JsonResponse({"status": "success", "data": result})
+
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse(
+            {"status": "error", "message": f"Invalid input: {str(e)}"}, status=400
+        )
+    except Exception as e:
+        return JsonResponse(
+            {"status": "error", "message": f"Sensitivity analysis failed: {str(e)}"},
+            status=500,
+        )
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def crop_season_plan_api(request):
+    """
+    Season plan for a field: one row per forecast day (mode "forecast") or per
+    crop season (mode "seasons"), scored in one batched ensemble call.
+    Body: {"location": "...", "mode": "forecast", "days": 14, "bucket_days": 7,
+           "top_k": 3, "nitrogen": 90, "phosphorus": 42, "potassium": 43, "ph": 6.5}
+    """
+    try:
+        data = json.loads(request.body or b"{}")
+
+        # Farmers get their field's region and latest soil report by default
+        farmer = None
+        region = data.get("location")
+        if request.user.is_authenticated and request.user.role == "farmer":
+            farmer = request.user
+            if not region:
+                profile = getattr(request.user, "field_profile", None)
+                region = profile.region if profile else None
+
+        plan = season_planner.plan(
+            data,
+            region=region or "Bhairahawa-Butwal",
+            mode=data.get("mode", "forecast"),
+            days=data.get("days", 14),
+            bucket_days=data.get("bucket_days"),
+            top_k=data.get("top_k", 3),
+            farmer=farmer,
+        )
+        return JsonResponse({"status": "success", "data": plan})
+
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse(
+            {"status": "error", "message": f"Invalid input: {str(e)}"}, status=400
+        )
+    except Exception as e:
+        return JsonResponse(
+            {"status": "error", "message": f"Season planning failed: {str(e)}"},
+            status=500,
+        )
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def crop_bulk_upload_api(request):
+    """
+    Score a CSV/XLSX file of soil test results in one request.
+    Multipart field "file"; columns nitrogen, phosphorus, potassium, ph and
+    optionally temperature, humidity, rainfall, field_area, notes. Community
+    admins add a "farmer" column naming one of their farmers.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse(
+            {"status": "error", "message": "Authentication required"}, status=401
+        )
+
+    try:
+        uploaded_file = request.FILES.get("file")
+        if uploaded_file is None:
+            raise ValueError("No file uploaded")
+
+        summary = bulk_prediction_uploader.process(
+            uploaded_file,
+            request.user,
+            region=request.POST.get("region", "bhairahawa"),
+        )
+        summary["result_url"] = reverse(
+            "crops:api_predict_bulk_result", args=[summary["upload_id"]]
+        )
+        return JsonResponse({"status": "success", "data": summary})
+
+    except PermissionError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=403)
+    except ValueError as e:
+        return JsonResponse(
+            {"status": "error", "message": f"Invalid file: {str(e)}"}, status=400
+        )
+    except Exception as e:
+        return JsonResponse(
+            {"status": "error", "message": f"Bulk prediction failed: {str(e)}"},
+            status=500,
+        )
+
+
+@require_http_methods(["GET"])
+def crop_bulk_upload_result(request, upload_id):
+    """Download the result file of one of the user's bulk uploads"""
+    upload = BulkPredictionUpload.objects.filter(
+        id=upload_id,
+        uploaded_by_id=request.user.id if request.user.is_authenticated else None,
+        status="completed",
+    ).first()
+    if upload is None or not upload.result_file:
+        return JsonResponse(
+            {"status": "error", "message": "Bulk upload result not found"}, status=404
+        )
+
+    return FileResponse(
+        upload.result_file.open("rb"),
+        as_attachment=True,
+        filename=os.path.basename(upload.result_file.name),
+    )
+
+
 @csrf_exempt
 @require_http_methods(["GET"])
 def get_real_time_data(request):
@@ -123,7 +363,7 @@ def get_real_time_data(request):
 
         # Get regional NPK averages (as specified in requirements)
         npk_defaults = {
-            "nitrogen":1000,  # Bhairahawa regional average
+            "nitrogen": 1000,  # Bhairahawa regional average
             "phosphorus": 35.63,  # Regional average
             "potassium": 116.34,  # Regional average
         }
@@ -159,6 +399,49 @@ def get_real_time_data(request):
         )
 
 
+def get_precomputed_prediction(request, data: Dict[str, Any]):
+    """
+    Formatted precomputed prediction for a community admin's own sensor set, or
+    for a farmer; None when live prediction is needed, including whenever the
+    request supplies any model input of its own
+    """
+    if str(data.get("use_precomputed", "true")).lower() == "false":
+        return None
+    if any(data.get(field) not in (None, "") for field in INPUT_FIELDS):
+        return None
+
+    user = request.user
+    if data.get("sensor_set_id"):
+        # Same ownership rule as queued sensor set predictions
+        if not user.is_authenticated or user.role != "community_admin":
+            return None
+        try:
+            owned = IoTSensorSet.objects.filter(
+                id=data["sensor_set_id"], community_admin=user
+            ).exists()
+        except (ValueError, ValidationError):
+            owned = False
+        if not owned:
+            return None
+        row = get_precomputed("sensor_set", data["sensor_set_id"])
+    elif user.is_authenticated and user.role == "farmer":
+        row = get_precomputed(farmer=user)
+    else:
+        return None
+
+    if row is None or not row.predicted_crops:
+        return None
+
+    prediction_input = dict(zip(INPUT_FIELDS, row.features))
+    prediction_result = real_ml_service.build_prediction_result(
+        prediction_input, row.predicted_crops
+    )
+    response_data = format_prediction_response(prediction_result, prediction_input)
+    response_data["source"] = "precomputed"
+    response_data["computed_at"] = row.computed_at.isoformat()
+    return response_data
+
+
 def collect_real_time_data(user_input: Dict[str, Any]) -> Dict[str, float]:
     """
     Collect real-time data from various sources and merge with user input
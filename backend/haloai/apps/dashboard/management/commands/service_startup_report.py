@@ -0,0 +1,41 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from services.container import service_container
+
+
+class Command(BaseCommand):
+    help = "Build every service and report import/initialization time per service"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--services",
+            nargs="+",
+            help="Only build these services (default: all registered services)",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the report as JSON"
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        report = service_container.warm_up(options["services"])
+        report["wall_seconds"] = round(time.perf_counter() - started, 4)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"{'service':<28}{'import':>10}{'init':>10}{'warm':>10}")
+        for name, timing in report["services"].items():
+            if not timing["built"]:
+                continue
+            self.stdout.write(
+                f"{name:<28}"
+                f"{timing.get('import_seconds', 0):>10.3f}"
+                f"{timing.get('init_seconds', 0):>10.3f}"
+                f"{timing.get('warm_seconds', 0):>10.3f}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Total: {report['wall_seconds']:.3f}s"))
@@ -3,6 +3,7 @@ Regional configuration settings for Halo AI
 """
 
 import os
+import numpy as np
 from django.conf import settings
 
 
@@ -120,3 +121,30 @@ def validate_soil_parameters(params):
                 )
 
     return errors
+
+
+def validate_soil_parameter_batch(columns):
+    """
+    Vectorized validate_soil_parameters for many rows at once
+    columns maps parameter names to equal-length arrays, with NaN for missing
+    or non-numeric cells; returns the list of error messages for every row.
+    """
+    ranges = RegionalConfig.get_parameter_ranges()
+    n_rows = len(next(iter(columns.values()))) if columns else 0
+    errors = [[] for _ in range(n_rows)]
+
+    for param, values in columns.items():
+        if param in ranges:
+            min_val, max_val = ranges[param]
+            values = np.asarray(values, dtype=float)
+            missing = np.isnan(values)
+            out_of_range = ~missing & ((values < min_val) | (values > max_val))
+
+            for row in np.flatnonzero(missing):
+                errors[row].append(f"{param.title()} is missing or not a number")
+            for row in np.flatnonzero(out_of_range):
+                errors[row].append(
+                    f"{param.title()} must be between {min_val} and {max_val}"
+                )
+
+    return errors
@@ -16,6 +16,7 @@ from .models import (
 from apps.crops.models import CropPredictionRequest, CropRecommendation, WeatherData
 from apps.sensors.models import SensorReading
 from apps.users.models import FarmerProfile
+from services.recommendation_precompute import get_precomputed
 from .regional_config import (
     RegionalConfig,
     get_regional_defaults,
@@ -65,6 +66,9 @@ def farmer_dashboard(request):
     except FarmerFieldProfile.DoesNotExist:
         field_profile = None
 
+    # Nightly precomputed recommendation for the farmer's field, if fresh
+    precomputed_recommendation = get_precomputed(farmer=request.user)
+
     # Recent crop predictions (last 30 days)
     recent_predictions = CropPredictionRequest.objects.filter(
         farmer=request.user
@@ -155,6 +159,7 @@ def farmer_dashboard(request):
         "user": request.user,
         "subscription": subscription,
         "field_profile": field_profile,
+        "precomputed_recommendation": precomputed_recommendation,
         "recent_predictions": recent_predictions,
         "all_predictions": all_predictions,  # For predictions tab
         "sensor_readings": sensor_readings,
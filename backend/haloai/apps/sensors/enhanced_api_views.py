@@ -3,7 +3,8 @@ Enhanced IoT API Views for Real-time Sensor Data Management
 Provides robust endpoints for sensor data, health monitoring, and diagnostics
 """
 
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
@@ -12,7 +13,8 @@ import json
 import logging
 from datetime import datetime, timezone
 from typing import Dict, Any, List
-from services.enhanced_iot_service import enhanced_iot_service
+from services.container import enhanced_iot_service
+from services.sensor_stream import AsyncEventBody, SyncEventBody, sensor_stream_hub
 
 logger = logging.getLogger(__name__)
 
@@ -79,7 +81,8 @@ def get_all_sensors_data(request):
     try:
         logger.info("📡 Fetching data from all sensors")
 
-        all_sensors = enhanced_iot_service.get_all_sensors_data()
+        collected = enhanced_iot_service.collect_sensors_data()
+        all_sensors = collected["sensors"]
 
         if not all_sensors:
             return JsonResponse(
@@ -100,6 +103,8 @@ def get_all_sensors_data(request):
                 set(s.get("region", "unknown") for s in all_sensors.values())
             ),
             "sensor_types": list(enhanced_iot_service.sensor_locations.keys()),
+            "timed_out_sensors": collected["timed_out"],
+            "fetch_ms": collected["elapsed_ms"],
         }
 
         return JsonResponse(
@@ -363,7 +368,7 @@ def get_enhanced_realtime_data(request):
 
         # Get weather data (import here to avoid circular imports)
         try:
-            from services.enhanced_weather_service import enhanced_weather_service
+            from services.container import enhanced_weather_service
 
             weather_data = enhanced_weather_service.get_current_weather_data(region)
         except Exception as e:
@@ -462,16 +467,28 @@ def system_diagnostics(request):
 
         # Sensor health overview
         sensor_health = {}
-        for sensor_id in enhanced_iot_service.sensor_locations.keys():
-            sensor_health[sensor_id] = enhanced_iot_service.get_sensor_health_status(
-                sensor_id
-            )
+        health_report = enhanced_iot_service.fanout.fetch(
+            enhanced_iot_service.sensor_locations.keys(),
+            enhanced_iot_service.get_sensor_health_status,
+            kind="health",
+        )
+        sensor_health.update(health_report["results"])
+        for sensor_id in health_report["timed_out"]:
+            sensor_health[sensor_id] = {"sensor_id": sensor_id, "status": "timeout"}
 
         # Cache status
         cache_info = {
             "cached_sensors": len(enhanced_iot_service._readings_cache),
             "cache_ttl_seconds": enhanced_iot_service._cache_ttl,
             "cached_sensor_ids": list(enhanced_iot_service._readings_cache.keys()),
+            "rtdb_paths": enhanced_iot_service.path_resolver.stats(),
+            "rtdb_listener": (
+                enhanced_iot_service.rtdb_listener.stats()
+                if enhanced_iot_service.rtdb_listener
+                else {"running": False}
+            ),
+            "sensor_streams": sensor_stream_hub.stats(),
+            "sensor_fanout": enhanced_iot_service.fanout.stats(),
         }
 
         # Regional coverage
@@ -555,6 +572,11 @@ def get_realtime_sensor_data(request):
                 "realtime": True,
                 "cache_used": False,  # Always fresh data
                 "fetch_timestamp": sensor_data.get("timestamp"),
+                "served_from": (
+                    "listener" if "version" in sensor_data else "firebase_fetch"
+                ),
+                "version": sensor_data.get("version"),
+                "stale": sensor_data.get("stale", False),
             },
         }
 
@@ -581,7 +603,14 @@ def get_realtime_sensor_data(request):
 @csrf_exempt
 @require_http_methods(["GET"])
 def get_continuous_sensor_stream(request):
-    """Get sensor data with minimal delay for continuous monitoring"""
+    """
+    Get sensor data with minimal delay for continuous monitoring
+    EventSource clients (Accept: text/event-stream) get a Server-Sent Events
+    stream; other callers get a single JSON snapshot.
+    """
+    if "text/event-stream" in request.headers.get("Accept", ""):
+        return sensor_event_stream(request)
+
     try:
         sensor_id = request.GET.get("sensor_id", "bhairahawa_farm_1")
         include_diagnostics = request.GET.get("diagnostics", "false").lower() == "true"
@@ -624,6 +653,59 @@ def get_continuous_sensor_stream(request):
         )
 
 
+def sensor_event_stream(request):
+    """
+    Server-Sent Events of reading deltas for ?sensor_id=a,b or ?region=...
+    (all sensors by default), resuming from Last-Event-ID when possible
+    Needs an ASGI server: under WSGI each stream would pin a sync worker.
+    """
+    if not isinstance(request, ASGIRequest) and not sensor_stream_hub.allow_wsgi:
+        return JsonResponse(
+            {
+                "status": "error",
+                "message": "Sensor streams need the ASGI server (haloai.asgi)",
+                "data": None,
+            },
+            status=501,
+        )
+
+    sensor_ids = sensor_stream_hub.sensors_for(
+        request.GET.get("sensor_id"), request.GET.get("region")
+    )
+    if not sensor_ids:
+        return JsonResponse(
+            {"status": "error", "message": "No sensors to stream", "data": None},
+            status=404,
+        )
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get(
+        "last_event_id"
+    )
+    stream = sensor_stream_hub.open(sensor_ids, last_event_id)
+    if stream is None:
+        response = JsonResponse(
+            {
+                "status": "error",
+                "message": "Too many open sensor streams, retry shortly",
+                "data": None,
+            },
+            status=503,
+        )
+        response["Retry-After"] = str(sensor_stream_hub.retry_ms // 1000 or 1)
+        return response
+
+    logger.info(f"📡 SSE STREAM: {len(sensor_ids)} sensors")
+    body = (
+        AsyncEventBody(stream)
+        if isinstance(request, ASGIRequest)
+        else SyncEventBody(stream)
+    )
+    response = StreamingHttpResponse(body, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 @csrf_exempt
 @require_http_methods(["GET"])
 def realtime_dashboard(request):
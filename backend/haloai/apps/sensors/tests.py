@@ -0,0 +1,358 @@
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+
+class SensorPathResolverTest(SimpleTestCase):
+    """RTDB paths are probed once per sensor and re-probed only on failure"""
+
+    class FakeDatabase:
+        def __init__(self, data):
+            self.data = data
+            self.paths = []
+
+        def child(self, path):
+            self.paths.append(path)
+            node = self.data
+            for key in path.split("/"):
+                node = node.get(key) if isinstance(node, dict) else None
+            return type("Ref", (), {"get": lambda ref: node})()
+
+    def resolver(self, data):
+        from services.sensor_path_resolver import (
+            SensorPathResolver,
+            compile_field_reader,
+            payload_format,
+        )
+
+        def compile_parser(sensor_id, payload):
+            format_name = payload_format(payload)
+            if format_name is None:
+                return None
+            return format_name, compile_field_reader(format_name, payload)
+
+        database = self.FakeDatabase(data)
+        return database, SensorPathResolver(database, compile_parser)
+
+    def test_bound_path_is_read_with_one_get(self):
+        device = {"phValue": 6.8, "soilTemperature": 24.5, "humidity": 71}
+        database, resolver = self.resolver(
+            {"sensorData": {"other": {"phValue": 7.0}, "IOT_001": device}}
+        )
+
+        self.assertEqual(resolver.read("IOT_001")["ph"], 6.8)
+        self.assertEqual(resolver.binding("IOT_001").path, "sensorData/IOT_001")
+
+        database.paths.clear()
+        device["phValue"] = 6.9
+        self.assertEqual(resolver.read("IOT_001")["ph"], 6.9)
+        self.assertEqual(database.paths, ["sensorData/IOT_001"])
+        stats = resolver.stats()
+        self.assertEqual((stats["probes"], stats["hits"]), (1, 1))
+
+    def test_changed_payload_is_reprobed(self):
+        data = {"iot_data": {"IOT_002": {"phValue": 6.1, "soilTemperature": 22}}}
+        database, resolver = self.resolver(data)
+        resolver.read("IOT_002")
+
+        data["iot_data"]["IOT_002"] = "6.4, 23.5"
+        reading = resolver.read("IOT_002")
+
+        self.assertEqual(reading, {"ph": 6.4, "temperature": 23.5})
+        self.assertEqual(resolver.binding("IOT_002").payload_format, "csv")
+        self.assertEqual(resolver.stats()["reprobes"], 1)
+        self.assertIsNone(resolver.read("MISSING"))
+        self.assertIsNone(resolver.read("MISSING"))
+        self.assertEqual(resolver.stats()["not_found"], 1)
+
+
+class RTDBListenerTest(SimpleTestCase):
+    """Stream events update the versioned store; dead streams are reopened"""
+
+    def test_put_and_patch_events_update_the_snapshot(self):
+        from services.rtdb_listener import apply_event
+
+        snapshot = apply_event(None, "put", "/", {"phValue": 6.5, "humidity": 60})
+        snapshot = apply_event(snapshot, "patch", "/", {"phValue": 6.9})
+        snapshot = apply_event(snapshot, "put", "/humidity", None)
+        snapshot = apply_event(snapshot, "put", "/meta/battery", 87)
+
+        self.assertEqual(snapshot, {"phValue": 6.9, "meta": {"battery": 87}})
+
+    def test_listener_feeds_store_and_reconnects(self):
+        import threading
+        import time
+        from types import SimpleNamespace
+
+        from services.enhanced_iot_service import SensorReading
+        from services.rtdb_listener import LatestValueStore, RTDBListener
+
+        class Handle:
+            def __init__(self, callback):
+                self.callback = callback
+                self._thread = threading.Thread(target=lambda: None)
+
+            def close(self):
+                pass
+
+        handles = []
+        database = SimpleNamespace(
+            child=lambda path: SimpleNamespace(
+                listen=lambda callback: handles.append(Handle(callback)) or handles[-1]
+            )
+        )
+        binding = SimpleNamespace(path="sensorData/IOT_001")
+        resolver = SimpleNamespace(binding=lambda sensor_id: binding)
+
+        def parse(sensor_id, payload):
+            return SensorReading(
+                sensor_id, payload["phValue"], payload["soilTemperature"]
+            )
+
+        store = LatestValueStore(stale_seconds=600)
+        listener = RTDBListener(
+            database, resolver, parse, lambda: ["IOT_001"], store, 0.01, 0.02
+        )
+        listener._tick()
+        subscription = listener._subscriptions["sensorData/IOT_001"]
+        self.assertTrue(listener.is_live("IOT_001"))
+
+        event = SimpleNamespace(
+            event_type="put", path="/", data={"phValue": 6.4, "soilTemperature": 24}
+        )
+        handles[0].callback(event)
+        handles[0].callback(event)
+        handles[0].callback(
+            SimpleNamespace(event_type="patch", path="/", data={"phValue": 7.1})
+        )
+
+        reading = store.get("IOT_001")
+        self.assertEqual((reading["ph"], reading["version"]), (7.1, 2))
+        self.assertFalse(reading["stale"])
+        self.assertEqual(list(store.changes_since(1)), ["IOT_001"])
+
+        # The fake SDK thread never runs, so the next check finds the stream dead
+        listener._tick()
+        self.assertFalse(listener.is_live("IOT_001"))
+        time.sleep(0.03)
+        listener._tick()
+        self.assertTrue(listener.is_live("IOT_001"))
+        self.assertEqual((len(handles), subscription.reconnects), (2, 1))
+
+
+class SensorStreamTest(SimpleTestCase):
+    """Streams send a snapshot, then changed fields; ids resume a stream"""
+
+    def test_deltas_and_resume(self):
+        import json
+
+        from services.rtdb_listener import LatestValueStore
+        from services.sensor_stream import SensorStream, SensorStreamHub
+
+        store = LatestValueStore()
+        store.put("a", {"ph": 6.5, "temperature": 24.0})
+        store.put("b", {"ph": 7.0, "temperature": 26.0})
+        hub = SensorStreamHub()
+
+        stream = SensorStream(hub, ["a"], store=store)
+        opening = "".join(stream.opening_events())
+        self.assertIn("event: snapshot", opening)
+        self.assertNotIn('"b"', opening)
+
+        store.put("b", {"ph": 7.2, "temperature": 26.0})
+        self.assertEqual(stream.pending_events(), [])
+        store.put("a", {"ph": 6.9, "temperature": 24.0})
+        (update,) = stream.pending_events()
+        delta = json.loads(update.split("data: ")[1])["readings"]["a"]
+        self.assertEqual((delta["ph"], delta["version"]), (6.9, 4))
+        self.assertNotIn("temperature", delta)
+
+        event_id = f"{store.epoch}-3"
+        resumed = SensorStream(hub, ["a"], last_event_id=event_id, store=store)
+        self.assertEqual(resumed.resume_version, 3)
+        self.assertIn('"ph": 6.9', "".join(resumed.opening_events()))
+        other = SensorStream(hub, ["a"], last_event_id="other-3", store=store)
+        self.assertIsNone(other.resume_version)
+
+    def test_failing_watchers_do_not_stop_the_others(self):
+        import asyncio
+
+        from services.rtdb_listener import LatestValueStore
+
+        store = LatestValueStore()
+        loop = asyncio.new_event_loop()
+        loop.close()
+        seen = []
+
+        def closed_loop_watcher(version):
+            loop.call_soon_threadsafe(lambda: None)
+
+        store.add_watcher(closed_loop_watcher)
+        store.add_watcher(seen.append)
+        self.assertEqual(store.put("a", {"ph": 6.5}), 1)
+        self.assertEqual(seen, [1])
+
+    def test_streams_are_refused_under_wsgi(self):
+        from django.test import RequestFactory, override_settings
+
+        from apps.sensors.enhanced_api_views import sensor_event_stream
+        from services.sensor_stream import SensorStreamHub
+
+        request = RequestFactory().get("/", {"sensor_id": "a"})
+        with override_settings(IOT_SENSOR_STREAM={"ALLOW_WSGI": False}):
+            hub = SensorStreamHub()
+        with mock.patch("apps.sensors.enhanced_api_views.sensor_stream_hub", hub):
+            response = sensor_event_stream(request)
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(hub.open_streams, 0)
+
+
+class SensorFanoutTest(SimpleTestCase):
+    """Sensors are fetched concurrently and a deadline bounds the wait"""
+
+    def test_partial_results_after_deadline(self):
+        import time
+
+        from services.sensor_fanout import SensorFanout
+
+        def fetch(sensor_id):
+            time.sleep(1.0 if sensor_id == "slow" else 0.05)
+            if sensor_id == "broken":
+                raise ConnectionError("unreachable")
+            return {"sensor_id": sensor_id}
+
+        fanout = SensorFanout(max_concurrency=8, deadline_seconds=0.5)
+        sensor_ids = [f"s{index}" for index in range(6)] + ["slow", "broken"]
+        report = fanout.fetch(sensor_ids, fetch)
+
+        self.assertEqual(len(report["results"]), 6)
+        self.assertEqual(report["timed_out"], ["slow"])
+        self.assertEqual(report["failed"], {"broken": "unreachable"})
+        self.assertLess(report["elapsed_ms"], 900)
+
+        # The slow fetch is still running, so a second caller joins it
+        report = fanout.fetch(["slow"], fetch, deadline_seconds=2.0)
+        self.assertEqual(report["results"], {"slow": {"sensor_id": "slow"}})
+        self.assertEqual(fanout.stats()["shared"], 1)
+
+
+class RegionalAggregatesTest(SimpleTestCase):
+    """A sensor's new reading replaces its old one in the region statistics"""
+
+    def test_replacement_updates_running_statistics(self):
+        from services.regional_aggregates import RegionalAggregateStore
+
+        store = RegionalAggregateStore()
+        store.update("a", "west", {"ph": 6.0, "humidity": 50.0})
+        store.update("b", "west", {"ph": 7.0, "humidity": 70.0})
+        store.update("c", "west", {"ph": 8.0, "status": "default"})
+        store.update("c", "west", {"ph": 6.5})
+        store.update("b", "west", {"ph": 5.0, "humidity": None})
+
+        summary = store.summary("west")
+        ph = summary["statistics"]["ph"]
+        ph_values = np.array([6.0, 5.0, 6.5])
+        self.assertAlmostEqual(ph["mean"], ph_values.mean())
+        self.assertAlmostEqual(ph["std"], ph_values.std())
+        self.assertEqual((ph["min"], ph["max"]), (5.0, 6.5))
+        self.assertEqual(summary["statistics"]["humidity"]["count"], 1)
+        self.assertEqual((summary["sensor_count"], summary["active_sensors"]), (3, 3))
+
+        store.update("c", "east", {"ph": 7.5})
+        self.assertEqual(store.means("west", ("ph",)), {"ph": 5.5})
+        self.assertEqual(store.summary("west")["statistics"]["ph"]["max"], 6.0)
+        self.assertIsNone(store.summary("north"))
+
+    def test_old_readings_expire(self):
+        from services.regional_aggregates import RegionalAggregateStore
+
+        store = RegionalAggregateStore(max_age_seconds=60)
+        with mock.patch("services.regional_aggregates.time.monotonic") as clock:
+            clock.return_value = 1000.0
+            store.update("a", "west", {"ph": 6.0})
+            clock.return_value = 1030.0
+            store.update("b", "west", {"ph": 7.0})
+            self.assertTrue(store.covers("west", ["a", "b"]))
+
+            clock.return_value = 1070.0
+            self.assertEqual(store.means("west", ("ph",)), {"ph": 7.0})
+            self.assertFalse(store.covers("west", ["a", "b"]))
+            self.assertEqual(store.summary("west")["sensor_count"], 1)
+
+            clock.return_value = 1100.0
+            self.assertIsNone(store.summary("west"))
+
+    def test_merged_readings_keep_missing_fields(self):
+        from services.regional_aggregates import RegionalAggregateStore
+
+        store = RegionalAggregateStore()
+        store.update("a", "west", {"ph": 6.0, "humidity": 55.0})
+        store.update("a", "west", {"ph": 6.4}, merge=True)
+        self.assertEqual(store.means("west"), {"ph": 6.4, "humidity": 55.0})
+        store.update("a", "west", {"ph": 6.8})
+        self.assertEqual(store.means("west"), {"ph": 6.8})
+
+    def test_iot_data_service_records_air_temperature_separately(self):
+        from services.iot_data_service import IoTDataService
+        from services.regional_aggregates import RegionalAggregateStore
+
+        store = RegionalAggregateStore()
+        service = IoTDataService()
+        region = service.sensor_locations["bhairahawa_farm_1"]["region"]
+        store.update("bhairahawa_farm_1", region, {"temperature": 24.0})
+        with mock.patch("services.iot_data_service.regional_aggregates", store):
+            service._record_reading(
+                "bhairahawa_farm_1",
+                {"ph": 6.5, "temperature": 31.0, "soil_temperature": 26.0},
+            )
+            with mock.patch("services.iot_data_service.db") as db:
+                self.assertTrue(
+                    service.store_sensor_reading(
+                        "bhairahawa_farm_1", 6.9, 32.0, humidity=70.0
+                    )
+                )
+            db.reference.return_value.update.assert_called_once()
+
+        means = store.means(region)
+        self.assertEqual(means["temperature"], 24.0)
+        self.assertEqual(means["air_temperature"], 32.0)
+        self.assertEqual(means["soil_temperature"], 26.0)
+        self.assertEqual(means["humidity"], 70.0)
+        self.assertEqual(means["ph"], 6.9)
+
+    def test_sensor_read_through_both_services_counts_once(self):
+        from services.enhanced_iot_service import EnhancedIoTService
+        from services.iot_data_service import IoTDataService
+        from services.regional_aggregates import RegionalAggregateStore
+
+        store = RegionalAggregateStore()
+        enhanced = EnhancedIoTService()
+        enhanced.aggregates = store
+        iot_data = IoTDataService()
+        region = "Bhairahawa-Butwal"
+        for sensor_id in ("bhairahawa_farm_1", "butwal_farm_1"):
+            enhanced._record_reading(
+                sensor_id,
+                {"ph": 7.0, "temperature": 24.0, "humidity": 60.0, "status": "active"},
+            )
+        with mock.patch("services.iot_data_service.regional_aggregates", store):
+            iot_data._record_reading(
+                "bhairahawa_farm_1", {"ph": 7.0, "temperature": 31.0}
+            )
+
+            summary = store.summary(region)
+            self.assertEqual(summary["sensor_count"], 2)
+            self.assertEqual(summary["active_sensors"], 2)
+            self.assertEqual(
+                store.means(region, ("ph", "temperature")),
+                {"ph": 7.0, "temperature": 24.0},
+            )
+            self.assertEqual(store.means(region)["air_temperature"], 31.0)
+
+            # One service's refresh does not stop the other from fetching
+            store.mark_refreshed(region, source="enhanced_iot")
+            with mock.patch.object(iot_data, "get_latest_sensor_data") as fetch:
+                iot_data.get_regional_average_data(region)
+            self.assertEqual(fetch.call_count, 2)
+            self.assertTrue(store.is_fresh(region, 30, source="iot_data"))
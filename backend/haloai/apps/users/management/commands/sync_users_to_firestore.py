@@ -4,7 +4,7 @@ Django management command to sync existing users to Firestore
 
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
-from services.firestore_user_service import firestore_user_service
+from services.container import firestore_user_service
 
 User = get_user_model()
 
@@ -7,7 +7,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
-from services.firestore_user_service import firestore_user_service
+from services.container import firestore_user_service
 from django.utils import timezone
 
 
@@ -11,8 +11,7 @@ from datetime import datetime
 from .models import CustomUser, FarmerProfile
 from apps.sensors.models import IoTSensorSet
 from apps.crops.models import CropPredictionRequest
-from services.crop_prediction_service import CropPredictionService
-from services.firestore_user_service import firestore_user_service
+from services.container import firestore_user_service
 
 User = get_user_model()
 
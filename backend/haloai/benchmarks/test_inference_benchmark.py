@@ -0,0 +1,79 @@
+"""
+Inference benchmarks, run with plain pytest from backend/haloai:
+
+    pytest benchmarks/
+
+Compares against ML_BENCHMARK_BASELINE when that file exists; create it with
+``python manage.py benchmark_inference --save-baseline``.
+"""
+
+import os
+
+import pytest
+from django.conf import settings
+
+from services.inference_benchmark import (
+    DEFAULT_BATCH_SIZES,
+    InferenceBenchmark,
+    compare_to_baseline,
+    load_report,
+    save_report,
+)
+
+SAMPLES = int(os.environ.get("BENCHMARK_SAMPLES", "50"))
+
+
+@pytest.fixture(scope="module")
+def report():
+    return InferenceBenchmark(latency_samples=SAMPLES).run()
+
+
+def test_report_covers_every_metric(report):
+    assert report["cold_load"]["total_seconds"] > 0
+    for name in ("ensemble", "ensemble_with_rationale", "crop_prediction_service"):
+        assert name in report["latency_ms"]
+    assert set(report["throughput_rows_per_second"]) == {
+        str(size) for size in DEFAULT_BATCH_SIZES
+    }
+    assert set(report["memory_bytes"]) <= set(report["cold_load"])
+
+
+def test_latency_percentiles_are_ordered(report):
+    for name, stats in report["latency_ms"].items():
+        assert stats["samples"] == SAMPLES, name
+        assert 0 <= stats["p50"] <= stats["p95"] <= stats["p99"], name
+
+
+def test_report_round_trips_as_json(report, tmp_path):
+    path = tmp_path / "report.json"
+    save_report(report, path)
+    assert load_report(path) == report
+
+
+def test_no_regression_against_baseline(report):
+    baseline = load_report(settings.ML_BENCHMARK_BASELINE)
+    if baseline is None:
+        pytest.skip(f"No baseline at {settings.ML_BENCHMARK_BASELINE}")
+
+    regressions = compare_to_baseline(report, baseline, settings.ML_BENCHMARK_THRESHOLD)
+    assert not regressions, regressions
+
+
+def test_compare_to_baseline_directions():
+    baseline = {
+        "latency_ms": {"ensemble": {"p95": 10.0, "samples": 50}},
+        "throughput_rows_per_second": {"100": 1000.0},
+        "memory_bytes": {"svm": {"rss_bytes": 100}},
+    }
+    current = {
+        "latency_ms": {"ensemble": {"p95": 13.0, "samples": 80}},
+        "throughput_rows_per_second": {"100": 700.0},
+        "memory_bytes": {"svm": {"rss_bytes": 900}},
+    }
+
+    regressed = {item["metric"] for item in compare_to_baseline(current, baseline)}
+    assert regressed == {
+        "latency_ms.ensemble.p95",
+        "throughput_rows_per_second.100",
+    }
+    assert compare_to_baseline(current, baseline, threshold=0.5) == []
@@ -0,0 +1,9 @@
+import os
+
+import django
+
+
+def pytest_configure(config):
+    """Configure Django for tests run with plain pytest"""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "haloai.settings")
+    django.setup()
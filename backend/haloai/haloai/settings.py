@@ -180,6 +180,10 @@ def get_env_variable(var_name, default=None):
 FIREBASE_DATABASE_URL = get_env_variable("FIREBASE_DATABASE_URL")
 FIREBASE_PROJECT_ID = get_env_variable("FIREBASE_PROJECT_ID")
 FIREBASE_SERVICE_ACCOUNT_KEY = get_env_variable("FIREBASE_SERVICE_ACCOUNT_KEY")
+# Write a _connection_test node when the Firebase service starts (off by default)
+FIREBASE_CONNECTION_TEST = (
+    get_env_variable("FIREBASE_CONNECTION_TEST", "false").lower() == "true"
+)
 
 # Initialize Firebase Admin SDK
 if FIREBASE_DATABASE_URL:
@@ -240,6 +244,180 @@ else:
     print("🔄 Application will use mock service for IoT data")
     print("📖 Check FIREBASE_SETUP.md for configuration help")
 
+# Trained model artifacts (converted copies are written to ML_MODELS_DIR/registry)
+ML_MODELS_DIR = BASE_DIR.parent / "ml" / "models"
+
+# ML ensemble configuration for crop prediction
+# "soft" averages aligned class probabilities, "hard" keeps the legacy argmax voting
+ML_ENSEMBLE_MODE = get_env_variable("ML_ENSEMBLE_MODE", "soft")
+ML_ENSEMBLE_WEIGHTS = {
+    "xgboost": 1.0,
+    "random_forest": 1.0,
+    "svm": 1.0,
+}
+ML_ENSEMBLE_TOP_K = 3
+
+# Cache for ensemble predictions keyed on the rounded 7-feature input vector
+ML_PREDICTION_CACHE = {
+    "ENABLED": True,
+    "MAX_ENTRIES": 2048,
+    "TTL_SECONDS": 600,
+    # Lifetime of results missing a model (latency budget or model error);
+    # 0 leaves them uncached so the next request retries the full ensemble
+    "DEGRADED_TTL_SECONDS": 15,
+    # Decimal places kept per feature when building the cache key
+    "PRECISION": {
+        "nitrogen": 0,
+        "phosphorus": 0,
+        "potassium": 0,
+        "temperature": 1,
+        "humidity": 0,
+        "ph": 1,
+        "rainfall": 0,
+    },
+}
+
+# Optional process pool for CPU-bound model inference (falls back to in-process)
+ML_INFERENCE_EXECUTOR = {
+    "ENABLED": get_env_variable("ML_INFERENCE_EXECUTOR_ENABLED", "false").lower()
+    == "true",
+    "WORKERS": 2,
+    "MAX_QUEUE": 8,
+    "TIMEOUT_SECONDS": 5.0,
+    "START_METHOD": "spawn",
+}
+
+# Tree ensemble backend: "native", "compiled" or "auto" (compiled for small batches).
+# Compiled evaluation is opt-in: after deploying new artifacts, run
+# `python manage.py benchmark_inference --check-parity` and only then set
+# ML_INFERENCE_BACKEND=auto
+ML_INFERENCE_BACKEND = get_env_variable("ML_INFERENCE_BACKEND", "native")
+# Largest batch each compiled evaluator serves in "auto" mode
+# (the NumPy SVM kernel beats libsvm at every batch size)
+ML_COMPILED_MAX_ROWS = {"random_forest": 512, "xgboost": 1, "svm": 100_000}
+# Evaluate the RBF SVM with the NumPy kernel evaluator as well (off by default;
+# check it with `benchmark_inference --check-parity` before enabling)
+ML_SVM_COMPILER_ENABLED = (
+    get_env_variable("ML_SVM_COMPILER_ENABLED", "false").lower() == "true"
+)
+
+# Inference benchmark baseline and allowed slowdown before it counts as a regression
+ML_BENCHMARK_BASELINE = BASE_DIR / "benchmarks" / "baseline.json"
+ML_BENCHMARK_THRESHOLD = 0.2
+
+# Build and warm every service when a web worker starts, instead of on first request
+SERVICES_WARM_UP_ON_START = (
+    get_env_variable("SERVICES_WARM_UP_ON_START", "false").lower() == "true"
+)
+
+# Precomputed recommendations older than this are not served
+ML_PRECOMPUTE_MAX_AGE_HOURS = 26
+
+# Largest number of grid steps per swept feature in what-if sensitivity requests
+ML_SENSITIVITY_MAX_STEPS = 100
+
+# Per-request latency budget for single-input ensemble predictions. A model whose
+# recent p95 exceeds its share of BUDGET_MS (SHARES are relative weights, equal by
+# default) is run as a background "shadow" or "skip"ped and re-probed periodically.
+# Off by default: with three models a 50 ms budget gives each about 17 ms, which
+# the random forest exceeds under load; set BUDGET_MS from the
+# benchmark_inference baseline before enabling it
+ML_LATENCY_BUDGET = {
+    "ENABLED": get_env_variable("ML_LATENCY_BUDGET_ENABLED", "false").lower() == "true",
+    "BUDGET_MS": 50.0,
+    "SHARES": {},
+    "POLICY": "shadow",
+    "WINDOW": 200,
+    "WINDOW_SECONDS": 300,
+    "MIN_SAMPLES": 20,
+    "PROBE_SECONDS": 30,
+}
+
+# Hot reload of model artifacts: a watcher thread per web process polls the
+# models dir (or VERSION_FILE, when present) and swaps smoke-tested models in
+# without a restart. Off by default; only the WSGI/ASGI entry points start it.
+ML_MODEL_RELOAD = {
+    "ENABLED": get_env_variable("ML_MODEL_RELOAD_ENABLED", "false").lower() == "true",
+    "INTERVAL_SECONDS": 10,
+    "VERSION_FILE": "VERSION",
+    "SMOKE_ROWS": 64,
+}
+
+# CPU threads for model inference: each of PROCESSES web workers (gunicorn's
+# WEB_CONCURRENCY) gets an equal share of the CPUs; single-row requests use one
+# thread and batches one more per ROWS_PER_THREAD rows, up to that share.
+# Batch commands re-split the budget for their own processes.
+ML_THREAD_BUDGET = {
+    "ENABLED": True,
+    "PROCESSES": int(get_env_variable("WEB_CONCURRENCY", "1")),
+    "CPUS": None,
+    "SINGLE_ROW_MAX": 1,
+    "ROWS_PER_THREAD": 1000,
+}
+
+# Season planning: forecast days per plan (Open-Meteo serves at most 16), days
+# per timeline bucket, and how long forecast/archive responses are reused
+ML_SEASON_PLAN = {
+    "MAX_DAYS": 16,
+    "BUCKET_DAYS": 7,
+    "WEATHER_TTL_SECONDS": 1800,
+}
+
+# Bulk CSV/XLSX prediction uploads: rows per file, rows validated, scored and
+# inserted together, rows per INSERT, and row errors echoed in the response
+# (the result file lists them all)
+ML_BULK_UPLOAD = {
+    "MAX_ROWS": 200_000,
+    "CHUNK_ROWS": 5000,
+    "TOP_K": 3,
+    "INSERT_BATCH_SIZE": 1000,
+    "MAX_REPORTED_ERRORS": 50,
+}
+
+# Seconds before a sensor whose RTDB probe found nothing is probed again
+IOT_RTDB_PROBE_RETRY_SECONDS = 60
+
+# Push-based RTDB listener for the live sensor endpoints (one per web worker):
+# readings unchanged for STALE_SECONDS are flagged stale, dropped streams are
+# reopened with exponential backoff between the two limits
+IOT_RTDB_LISTENER = {
+    "ENABLED": get_env_variable("IOT_RTDB_LISTENER_ENABLED", "false").lower() == "true",
+    "STALE_SECONDS": 600,
+    "BACKOFF_MIN_SECONDS": 1,
+    "BACKOFF_MAX_SECONDS": 120,
+    "SUPERVISE_SECONDS": 5,
+}
+
+# Server-Sent Events sensor streams: open streams per worker, idle heartbeat,
+# how often sensors the RTDB listener does not push are fetched for streams,
+# client reconnect delay, and how long one stream lasts before the client
+# reconnects (resuming from its Last-Event-ID).
+# Streams need ASGI (uvicorn haloai.asgi:application): under WSGI each one pins
+# a sync worker for up to MAX_STREAM_SECONDS, so MAX_CONNECTIONS would not be
+# the real limit. ALLOW_WSGI serves them anyway, e.g. under runserver.
+IOT_SENSOR_STREAM = {
+    "ALLOW_WSGI": get_env_variable("IOT_SENSOR_STREAM_ALLOW_WSGI", "false").lower()
+    == "true",
+    "MAX_CONNECTIONS": 50,
+    "HEARTBEAT_SECONDS": 15,
+    "POLL_SECONDS": 5,
+    "RETRY_MILLISECONDS": 3000,
+    "MAX_STREAM_SECONDS": 900,
+}
+
+# Reading many sensors at once: sensors fetched concurrently per process, and
+# how long a request waits before answering with the sensors that responded
+IOT_SENSOR_FANOUT = {
+    "MAX_CONCURRENCY": 16,
+    "DEADLINE_SECONDS": 3.0,
+}
+
+# Regional sensor averages are served from running aggregates; without a live
+# RTDB listener a region's sensors are re-fetched at most this often
+IOT_REGIONAL_REFRESH_SECONDS = 30
+# Readings older than this leave the regional aggregates (None keeps them)
+IOT_REGIONAL_MAX_AGE_SECONDS = 1800
+
 # Custom User Model
 AUTH_USER_MODEL = "users.CustomUser"
 
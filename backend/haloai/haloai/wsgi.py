@@ -14,3 +14,18 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'haloai.settings')
 
 application = get_wsgi_application()
+
+# Build the services now rather than on the first request, if configured
+from services.container import service_container  # noqa: E402
+
+service_container.warm_up_if_configured()
+
+# Keep live sensor readings in memory via RTDB subscriptions, if configured
+from services.rtdb_listener import start_rtdb_listener_if_configured  # noqa: E402
+
+start_rtdb_listener_if_configured()
+
+# Poll for new model artifacts and hot-swap them, if configured
+from services.model_registry import start_model_reload_if_configured  # noqa: E402
+
+start_model_reload_if_configured()
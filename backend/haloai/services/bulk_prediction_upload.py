@@ -0,0 +1,425 @@
+"""
+Bulk Prediction Upload
+Scores a spreadsheet of soil test results in one request. CSV and XLSX files
+are read row by row (openpyxl read-only mode for XLSX) and handled in chunks:
+each chunk is parsed and range-checked column-wise, its valid rows are scored
+in one ensemble batch and stored with bulk inserts, and one result line per
+input row is streamed to a downloadable CSV result file.
+"""
+
+import csv
+import io
+import os
+import re
+import tempfile
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.crops.models import BulkPredictionUpload, CropPredictionRequest
+from apps.dashboard.models import ManualCropInput
+from apps.dashboard.regional_config import (
+    RegionalConfig,
+    validate_soil_parameter_batch,
+)
+
+from .container import real_ml_service
+from .prediction_job_queue import INPUT_FIELDS
+
+FILE_TYPES = ("csv", "xlsx")
+
+# Soil test columns every row needs; climate columns fall back to defaults
+SOIL_FIELDS = ("nitrogen", "phosphorus", "potassium", "ph")
+CLIMATE_FIELDS = ("temperature", "humidity", "rainfall")
+
+# Accepted spellings of column headers, after normalizing "Rainfall (mm)" to
+# "rainfall_mm"
+COLUMN_ALIASES = {
+    "n": "nitrogen",
+    "p": "phosphorus",
+    "k": "potassium",
+    "soil_ph": "ph",
+    "temp": "temperature",
+    "temperature_c": "temperature",
+    "humidity_pct": "humidity",
+    "rainfall_mm": "rainfall",
+    "rain": "rainfall",
+    "farmer_username": "farmer",
+    "username": "farmer",
+    "field_area_acres": "field_area",
+    "area": "field_area",
+    "note": "notes",
+}
+
+
+class BulkPredictionUploader:
+    """Streams an uploaded spreadsheet through validation, scoring and storage"""
+
+    def __init__(self):
+        config = getattr(settings, "ML_BULK_UPLOAD", {})
+        self.max_rows = int(config.get("MAX_ROWS", 200_000))
+        self.chunk_rows = int(config.get("CHUNK_ROWS", 5000))
+        self.top_k = int(config.get("TOP_K", 3))
+        self.insert_batch_size = int(config.get("INSERT_BATCH_SIZE", 1000))
+        self.max_reported_errors = int(config.get("MAX_REPORTED_ERRORS", 50))
+
+    def process(
+        self, uploaded_file: Any, user: Any, region: str = "bhairahawa"
+    ) -> Dict[str, Any]:
+        """
+        Score every row of an uploaded CSV/XLSX file
+        Farmers upload their own soil tests; community admins name one of
+        their managed farmers per row in a "farmer" column (username, email
+        or phone). Raises ValueError for unusable files.
+        """
+        started = time.perf_counter()
+        file_name = os.path.basename(getattr(uploaded_file, "name", "") or "upload")
+        file_type = file_name.rsplit(".", 1)[-1].lower() if "." in file_name else ""
+        if file_type not in FILE_TYPES:
+            raise ValueError(f"Upload a {' or '.join(FILE_TYPES)} file")
+        if user.role not in ("farmer", "community_admin"):
+            raise PermissionError("Only farmers and community admins can upload")
+
+        rows = read_rows(uploaded_file, file_type)
+        try:
+            columns = self.column_map(next(rows, None), user)
+        except Exception as e:
+            rows.close()
+            if isinstance(e, ValueError):
+                raise
+            raise ValueError(f"Could not read the {file_type} file: {e}") from e
+
+        upload = BulkPredictionUpload.objects.create(
+            uploaded_by=user, file_name=file_name[:255]
+        )
+        summary = {"rows": 0, "scored": 0, "invalid": 0, "errors": []}
+        defaults = RegionalConfig.get_soil_defaults(region)
+        farmers = FarmerResolver(user)
+
+        handle, result_path = tempfile.mkstemp(suffix=".csv")
+        os.close(handle)
+        try:
+            with ResultWriter(result_path, self.top_k) as writer:
+                for chunk in self._chunks(rows, summary):
+                    self._process_chunk(
+                        chunk, columns, defaults, farmers, writer, summary
+                    )
+
+            stem = file_name.rsplit(".", 1)[0]
+            with open(result_path, "rb") as result:
+                upload.result_file.save(
+                    f"{upload.id}/{stem}_predictions.csv",
+                    File(result),
+                    save=False,
+                )
+            upload.status = "completed"
+
+        except Exception as e:
+            upload.status = "failed"
+            upload.error_message = str(e)
+            raise
+
+        finally:
+            rows.close()
+            os.remove(result_path)
+            upload.total_rows = summary["rows"]
+            upload.scored_rows = summary["scored"]
+            upload.invalid_rows = summary["invalid"]
+            upload.completed_at = timezone.now()
+            upload.save()
+
+        return {
+            "upload_id": str(upload.id),
+            "file_name": upload.file_name,
+            "rows": summary["rows"],
+            "scored_rows": summary["scored"],
+            "invalid_rows": summary["invalid"],
+            "truncated": summary.get("truncated", False),
+            "errors": summary["errors"],
+            "elapsed_seconds": round(time.perf_counter() - started, 2),
+        }
+
+    # ==== PARSING ====
+
+    def column_map(self, header: Optional[Sequence[Any]], user: Any) -> Dict[str, int]:
+        """Position of every known column; raises ValueError for missing ones"""
+        if not header:
+            raise ValueError("The file is empty")
+
+        columns = {}
+        for position, title in enumerate(header):
+            name = re.sub(r"[^a-z0-9]+", "_", str(title or "").lower()).strip("_")
+            name = COLUMN_ALIASES.get(name, name)
+            if name not in columns:
+                columns[name] = position
+
+        required = list(SOIL_FIELDS)
+        if user.role == "community_admin":
+            required.append("farmer")
+        missing = [name for name in required if name not in columns]
+        if missing:
+            raise ValueError(f"Missing column(s): {', '.join(missing)}")
+        return columns
+
+    def _chunks(
+        self, rows: Iterator[Sequence[Any]], summary: Dict[str, Any]
+    ) -> Iterator[List[Any]]:
+        """(row number, cells) lists of up to chunk_rows non-blank rows"""
+        chunk = []
+        for number, cells in enumerate(rows, start=2):
+            if not any(cell not in (None, "") for cell in cells):
+                continue
+            if summary["rows"] >= self.max_rows:
+                summary["truncated"] = True
+                break
+            summary["rows"] += 1
+            chunk.append((number, cells))
+            if len(chunk) >= self.chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _column(self, cells: List[Sequence[Any]], position: Optional[int]) -> List[Any]:
+        """One column's raw cells; short rows read as blank"""
+        if position is None:
+            return [None] * len(cells)
+        return [row[position] if position < len(row) else None for row in cells]
+
+    def _numeric(self, values: List[Any]) -> np.ndarray:
+        """Parse a column to floats in one pass; blanks and text become NaN"""
+        parsed = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+        return parsed.to_numpy(dtype=float, copy=True)
+
+    # ==== CHUNKS ====
+
+    def _process_chunk(
+        self,
+        chunk: List[Any],
+        columns: Dict[str, int],
+        defaults: Dict[str, float],
+        farmers: "FarmerResolver",
+        writer: "ResultWriter",
+        summary: Dict[str, Any],
+    ):
+        """Validate, score and store one chunk, then write its result lines"""
+        numbers = [number for number, _ in chunk]
+        cells = [row for _, row in chunk]
+
+        features = {}
+        for name in INPUT_FIELDS:
+            values = self._numeric(self._column(cells, columns.get(name)))
+            if name in CLIMATE_FIELDS:
+                values[np.isnan(values)] = defaults[name]
+            features[name] = values
+        errors = validate_soil_parameter_batch(features)
+
+        farmer_keys = [
+            "" if value is None else str(value).strip()
+            for value in self._column(cells, columns.get("farmer"))
+        ]
+        farmer_ids = farmers.resolve(farmer_keys)
+        for index, farmer_id in enumerate(farmer_ids):
+            if farmer_id is None:
+                errors[index].append(f"Unknown farmer {farmer_keys[index]!r}")
+
+        areas = self._numeric(self._column(cells, columns.get("field_area")))
+        notes = [
+            "" if value is None else str(value)
+            for value in self._column(cells, columns.get("notes"))
+        ]
+
+        matrix = np.column_stack([features[name] for name in INPUT_FIELDS])
+        valid = np.array([not row_errors for row_errors in errors], dtype=bool)
+        predictions: List[Optional[List[Dict[str, Any]]]] = [None] * len(chunk)
+        request_ids: List[Optional[str]] = [None] * len(chunk)
+
+        valid_rows = np.flatnonzero(valid)
+        if len(valid_rows):
+            scored = real_ml_service.predict_batch(matrix[valid_rows], top_k=self.top_k)
+            for index, row_predictions in zip(valid_rows, scored):
+                predictions[index] = row_predictions
+            stored = self._store(
+                valid_rows, matrix, predictions, farmer_ids, areas, notes
+            )
+            for index, request_id in zip(valid_rows, stored):
+                request_ids[index] = request_id
+
+        for index, number in enumerate(numbers):
+            writer.write(
+                number,
+                farmer_keys[index],
+                matrix[index],
+                errors[index],
+                predictions[index],
+                request_ids[index],
+            )
+            if errors[index] and len(summary["errors"]) < self.max_reported_errors:
+                summary["errors"].append({"row": number, "errors": errors[index]})
+
+        summary["scored"] += len(valid_rows)
+        summary["invalid"] += len(chunk) - len(valid_rows)
+
+    def _store(
+        self,
+        rows: Iterable[int],
+        matrix: np.ndarray,
+        predictions: List[Optional[List[Dict[str, Any]]]],
+        farmer_ids: List[Optional[int]],
+        areas: np.ndarray,
+        notes: List[str],
+    ) -> List[str]:
+        """Bulk insert a ManualCropInput and a completed request per valid row"""
+        processed_at = timezone.now()
+        manual_inputs, prediction_requests = [], []
+        for index in rows:
+            values = dict(zip(INPUT_FIELDS, matrix[index].tolist()))
+            area = areas[index]
+            manual_input = ManualCropInput(
+                farmer_id=farmer_ids[index],
+                field_area=None if np.isnan(area) else round(float(area), 2),
+                notes=notes[index],
+                **values,
+            )
+            manual_inputs.append(manual_input)
+            prediction_requests.append(
+                CropPredictionRequest(
+                    farmer_id=farmer_ids[index],
+                    manual_input=manual_input,
+                    status="completed",
+                    predicted_crops=predictions[index],
+                    confidence_score=(
+                        predictions[index][0]["confidence"]
+                        if predictions[index]
+                        else 0.5
+                    ),
+                    processed_at=processed_at,
+                    notes=notes[index],
+                    **values,
+                )
+            )
+
+        with transaction.atomic():
+            ManualCropInput.objects.bulk_create(
+                manual_inputs, batch_size=self.insert_batch_size
+            )
+            CropPredictionRequest.objects.bulk_create(
+                prediction_requests, batch_size=self.insert_batch_size
+            )
+        return [
+            str(prediction_request.id) for prediction_request in prediction_requests
+        ]
+
+
+class FarmerResolver:
+    """Maps a row's farmer column to a farmer id the uploader may write for"""
+
+    def __init__(self, user: Any):
+        self.user = user
+        self._ids: Dict[str, Optional[int]] = {}
+
+    def resolve(self, keys: List[str]) -> List[Optional[int]]:
+        """Farmer id per key, None for unknown farmers; one query per chunk"""
+        if self.user.role == "farmer":
+            return [self.user.id] * len(keys)
+
+        unseen = {key for key in keys if key and key not in self._ids}
+        if unseen:
+            farmers = (
+                get_user_model()
+                .objects.filter(
+                    role="farmer", farmer_profile__community_admin=self.user
+                )
+                .filter(
+                    Q(username__in=unseen) | Q(email__in=unseen) | Q(phone__in=unseen)
+                )
+                .values_list("id", "username", "email", "phone")
+            )
+            for farmer_id, *names in farmers:
+                for name in names:
+                    if name in unseen:
+                        self._ids.setdefault(name, farmer_id)
+            for key in unseen:
+                self._ids.setdefault(key, None)
+
+        return [self._ids.get(key) for key in keys]
+
+
+class ResultWriter:
+    """
+    Streams result lines to a CSV file
+    XLSX uploads get a CSV result too: openpyxl takes longer to write 100k
+    rows than the rest of the upload takes to process them.
+    """
+
+    def __init__(self, path: str, top_k: int):
+        self.path = path
+        self.header = ["row", "farmer"] + INPUT_FIELDS + ["status", "errors"]
+        for rank in range(1, top_k + 1):
+            self.header += [f"crop_{rank}", f"confidence_{rank}"]
+        self.header.append("prediction_id")
+        self.top_k = top_k
+
+    def __enter__(self) -> "ResultWriter":
+        self._handle = open(self.path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._handle)
+        self._writer.writerow(self.header)
+        return self
+
+    def write(
+        self,
+        number: int,
+        farmer: str,
+        features: np.ndarray,
+        errors: List[str],
+        predictions: Optional[List[Dict[str, Any]]],
+        request_id: Optional[str],
+    ):
+        """One result line for an input row"""
+        line = [number, farmer]
+        line += [
+            "" if np.isnan(value) else round(float(value), 3) for value in features
+        ]
+        line += ["invalid" if errors else "scored", "; ".join(errors)]
+        for rank in range(self.top_k):
+            if predictions and rank < len(predictions):
+                line += [predictions[rank]["crop"], predictions[rank]["confidence"]]
+            else:
+                line += ["", ""]
+        line.append(request_id or "")
+        self._writer.writerow(line)
+
+    def __exit__(self, *exc_info):
+        self._handle.close()
+
+
+def read_rows(uploaded_file: Any, file_type: str) -> Iterator[Sequence[Any]]:
+    """Yield the header and then every row without loading the whole file"""
+    if file_type == "xlsx":
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+        return
+
+    binary = getattr(uploaded_file, "file", uploaded_file)
+    text = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+
+# Global instance
+bulk_prediction_uploader = BulkPredictionUploader()
@@ -0,0 +1,176 @@
+"""
+Service Container
+Lazily builds the global service singletons on first use instead of at
+import time, so management commands and worker boots only pay for the
+services they actually touch. Web workers can warm everything up front.
+"""
+
+import importlib
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+
+class ServiceContainer:
+    """Registry of lazily constructed services with per-service timings"""
+
+    def __init__(self):
+        self._specs: Dict[str, Dict[str, Optional[str]]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.RLock()
+
+    def register(
+        self,
+        name: str,
+        module_path: str,
+        factory_name: str,
+        warm_method: Optional[str] = None,
+    ):
+        """Declare a service; nothing is imported until it is first used"""
+        self._specs[name] = {
+            "module": module_path,
+            "factory": factory_name,
+            "warm": warm_method,
+        }
+
+    def lazy(self, name: str) -> "LazyService":
+        """Proxy that stands in for the service until it is first used"""
+        return LazyService(self, name)
+
+    def get(self, name: str) -> Any:
+        """Return the service instance, importing and constructing it if needed"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if name not in self._instances:
+                spec = self._specs[name]
+
+                started = time.perf_counter()
+                module = importlib.import_module(spec["module"])
+                imported = time.perf_counter()
+                instance = getattr(module, spec["factory"])()
+                built = time.perf_counter()
+
+                self._instances[name] = instance
+                self._timings[name] = {
+                    "import_seconds": round(imported - started, 4),
+                    "init_seconds": round(built - imported, 4),
+                }
+            return self._instances[name]
+
+    def is_built(self, name: str) -> bool:
+        """Whether a service has been constructed in this process"""
+        return name in self._instances
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Build the given services (all by default) and run their warm-up method,
+        e.g. loading ML models, so the first request does not pay for it.
+        """
+        for name in names or list(self._specs):
+            try:
+                instance = self.get(name)
+                warm_method = self._specs[name]["warm"]
+                if warm_method and "warm_seconds" not in self._timings[name]:
+                    started = time.perf_counter()
+                    getattr(instance, warm_method)()
+                    self._timings[name]["warm_seconds"] = round(
+                        time.perf_counter() - started, 4
+                    )
+            except Exception as e:
+                print(f"⚠️ Could not warm up {name}: {e}")
+        return self.timing_report()
+
+    def warm_up_if_configured(self):
+        """Warm every service when SERVICES_WARM_UP_ON_START is set (web workers)"""
+        from django.conf import settings
+
+        if getattr(settings, "SERVICES_WARM_UP_ON_START", False):
+            report = self.warm_up()
+            print(f"🚀 Services warmed up in {report['total_seconds']}s")
+
+    def timing_report(self) -> Dict[str, Any]:
+        """Import, construction and warm-up time per service built so far"""
+        services = {
+            name: {"built": name in self._instances, **self._timings.get(name, {})}
+            for name in self._specs
+        }
+        return {
+            "services": services,
+            "total_seconds": round(
+                sum(sum(timing.values()) for timing in self._timings.values()), 4
+            ),
+        }
+
+
+class LazyService:
+    """Attribute-forwarding proxy for a container-managed service"""
+
+    __slots__ = ("_container", "_name")
+
+    def __init__(self, container: ServiceContainer, name: str):
+        object.__setattr__(self, "_container", container)
+        object.__setattr__(self, "_name", name)
+
+    def _resolve(self) -> Any:
+        return self._container.get(self._name)
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._resolve(), item)
+
+    def __setattr__(self, item: str, value: Any):
+        setattr(self._resolve(), item, value)
+
+    def __repr__(self) -> str:
+        if self._container.is_built(self._name):
+            return repr(self._resolve())
+        return f"<LazyService {self._name} (not built)>"
+
+
+# Global instance
+service_container = ServiceContainer()
+
+service_container.register(
+    "firebase_service",
+    "services.firebase_service_refactored",
+    "RefactoredFirebaseService",
+)
+service_container.register(
+    "firestore_user_service",
+    "services.firestore_user_service",
+    "FirestoreUserService",
+)
+service_container.register(
+    "enhanced_iot_service", "services.enhanced_iot_service", "EnhancedIoTService"
+)
+service_container.register(
+    "iot_data_service", "services.iot_data_service", "IoTDataService"
+)
+service_container.register(
+    "enhanced_weather_service",
+    "services.enhanced_weather_service",
+    "EnhancedWeatherService",
+)
+service_container.register(
+    "real_ml_service",
+    "services.real_ml_prediction_service",
+    "RealMLPredictionService",
+    warm_method="load_models",
+)
+service_container.register(
+    "crop_prediction_service",
+    "services.crop_prediction_service",
+    "EnhancedCropPredictionService",
+)
+
+# Import-free handles for callers that should not load the service modules
+firebase_service = service_container.lazy("firebase_service")
+firestore_user_service = service_container.lazy("firestore_user_service")
+enhanced_iot_service = service_container.lazy("enhanced_iot_service")
+iot_data_service = service_container.lazy("iot_data_service")
+enhanced_weather_service = service_container.lazy("enhanced_weather_service")
+real_ml_service = service_container.lazy("real_ml_service")
+crop_prediction_service = service_container.lazy("crop_prediction_service")
@@ -3,16 +3,20 @@ Enhanced Crop Prediction Service
 ML-based crop recommendations with community admin role-based access control
 """
 
-import os
-import pickle
 import pandas as pd
 from datetime import datetime, timezone
 from typing import Dict, List, Tuple, Optional
 from django.conf import settings
-from apps.crops.models import CropPredictionRequest, CropRecommendation, CropType
+from apps.crops.models import CropPredictionRequest
 from apps.sensors.models import IoTSensorSet, SensorReading
 from .firebase_service_refactored import firebase_service
 from .enhanced_weather_service import enhanced_weather_service
+from .model_registry import model_registry
+from .prediction_job_queue import prediction_job_queue
+from .recommendation_writer import recommendation_writer
+from .container import service_container
+from .crop_rules import crop_rule_engine
+from .regional_aggregates import regional_aggregates
 
 
 class EnhancedCropPredictionService:
@@ -21,8 +25,7 @@ class EnhancedCropPredictionService:
     def __init__(self):
         self.firebase_service = firebase_service
         self.weather_service = enhanced_weather_service
-        self.models = {}
-        self.load_ml_models()
+        self.model_registry = model_registry
 
         # Regional defaults for Bhairahawa-Butwal (MVP)
         self.regional_defaults = {
@@ -37,30 +40,14 @@ class EnhancedCropPredictionService:
             }
         }
 
-    def load_ml_models(self):
-        """Load pre-trained ML models"""
-        try:
-            models_dir = os.path.join(settings.BASE_DIR.parent, "ml", "models")
-
-            model_files = [
-                ("random_forest", "random_forest_model.pkl"),
-                ("svm", "svm_model.pkl"),
-                ("xgboost", "xgboost_model.pkl"),
-            ]
-
-            for model_name, filename in model_files:
-                model_path = os.path.join(models_dir, filename)
-                if os.path.exists(model_path):
-                    with open(model_path, "rb") as f:
-                        self.models[model_name] = pickle.load(f)
-                    print(f"✅ Loaded {model_name} model")
-                else:
-                    print(f"⚠️ Model file not found: {model_path}")
+    @property
+    def models(self) -> Dict[str, object]:
+        """Trained models, loaded lazily from the shared model registry"""
+        return self.model_registry.get_models()
 
-        except Exception as e:
-            print(f"❌ Error loading ML models: {e}")
-            # Use mock predictions if models fail to load
-            self.models = {}
+    def load_ml_models(self):
+        """Load pre-trained ML models (warms the shared registry)"""
+        return self.models
 
     def collect_prediction_data(
         self, community_admin_id: str, sensor_set: IoTSensorSet
@@ -71,8 +58,9 @@ class EnhancedCropPredictionService:
                 sensor_set.region, self.regional_defaults["Bhairahawa-Butwal"]
             )
 
-            # Start with regional defaults
+            # Start with regional defaults, then live regional sensor means
             prediction_data = region_defaults.copy()
+            prediction_data.update(self.regional_sensor_means(sensor_set.region))
 
             # Try to get real sensor data from Firebase
             sensor_readings = self.firebase_service.get_latest_sensor_readings(
@@ -111,6 +99,15 @@ class EnhancedCropPredictionService:
             # Return defaults if anything fails
             return self.regional_defaults["Bhairahawa-Butwal"].copy()
 
+    def regional_sensor_means(self, region: str) -> Dict[str, float]:
+        """Current mean temperature/humidity/pH of the region's IoT sensors"""
+        return {
+            name: round(value, 2)
+            for name, value in regional_aggregates.means(
+                region, ("temperature", "humidity", "ph")
+            ).items()
+        }
+
     def create_prediction_request(
         self, community_admin_id: str, sensor_set_id: str
     ) -> Optional[CropPredictionRequest]:
@@ -168,62 +165,31 @@ class EnhancedCropPredictionService:
     def create_prediction_request(
         self, community_admin, sensor_set: IoTSensorSet
     ) -> CropPredictionRequest:
-        """Create a new crop prediction request"""
-        # Get current sensor data
-        sensor_data = self.get_sensor_data(sensor_set)
+        """Queue a crop prediction request (a single INSERT)"""
+        # Sensor and weather inputs are refreshed by the worker that claims the job
+        region_defaults = {
+            **self.regional_defaults.get(
+                sensor_set.region, self.regional_defaults["Bhairahawa-Butwal"]
+            ),
+            **self.regional_sensor_means(sensor_set.region),
+        }
 
-        # Create prediction request
-        prediction_request = CropPredictionRequest.objects.create(
+        return prediction_job_queue.enqueue(
             community_admin=community_admin,
             sensor_set=sensor_set,
-            nitrogen=sensor_data["nitrogen"],
-            phosphorus=sensor_data["phosphorus"],
-            potassium=sensor_data["potassium"],
-            temperature=sensor_data["temperature"],
-            humidity=sensor_data["humidity"],
-            ph=sensor_data["ph"],
-            rainfall=sensor_data["rainfall"],
-            status="processing",
+            nitrogen=sensor_set.default_nitrogen,
+            phosphorus=sensor_set.default_phosphorus,
+            potassium=sensor_set.default_potassium,
+            temperature=region_defaults["temperature"],
+            humidity=region_defaults["humidity"],
+            ph=region_defaults["ph"],
+            rainfall=region_defaults["rainfall"],
         )
 
-        # Process prediction asynchronously
-        self.process_prediction(prediction_request)
-
-        return prediction_request
-
     def process_prediction(self, prediction_request: CropPredictionRequest):
         """Process crop prediction using ML models"""
         try:
-            # Prepare input data
-            input_data = pd.DataFrame([prediction_request.input_parameters])
-
-            # Get predictions from available models
-            predictions = {}
-
-            if self.models:
-                for model_name, model in self.models.items():
-                    try:
-                        pred = model.predict(input_data)[0]
-                        prob = getattr(model, "predict_proba", lambda x: [[0.5, 0.5]])(
-                            input_data
-                        )[0]
-                        confidence = max(prob) if hasattr(prob, "__iter__") else 0.8
-
-                        predictions[model_name] = {
-                            "crop": pred,
-                            "confidence": confidence,
-                        }
-                    except Exception as e:
-                        print(f"Error with {model_name}: {e}")
-
-            # If no models available, use rule-based prediction
-            if not predictions:
-                predictions = self.rule_based_prediction(
-                    prediction_request.input_parameters
-                )
-
-            # Generate ensemble prediction
-            final_predictions = self.ensemble_prediction(predictions)
+            final_predictions = self.predict_crops(prediction_request.input_parameters)
 
             # Update prediction request
             prediction_request.predicted_crops = final_predictions
@@ -243,36 +209,42 @@ class EnhancedCropPredictionService:
             prediction_request.notes = f"Processing error: {str(e)}"
             prediction_request.save()
 
-    def rule_based_prediction(self, input_params: Dict[str, float]) -> Dict[str, Dict]:
-        """Rule-based prediction for Bhairahawa-Butwal region"""
-        temp = input_params["temperature"]
-        humidity = input_params["humidity"]
-        rainfall = input_params["rainfall"]
-        ph = input_params["ph"]
+    def predict_crops(self, input_params: Dict[str, float]) -> List[Dict]:
+        """Top crop predictions for one set of input parameters"""
+        # Prepare input data
+        input_data = pd.DataFrame([input_params])
 
+        # Get predictions from available models
         predictions = {}
 
-        # Rice - suitable for high humidity and rainfall
-        if humidity > 80 and rainfall > 200 and 20 <= temp <= 30:
-            predictions["rice"] = {"crop": "rice", "confidence": 0.85}
-
-        # Wheat - suitable for moderate conditions
-        if 15 <= temp <= 25 and rainfall < 300 and ph > 6:
-            predictions["wheat"] = {"crop": "wheat", "confidence": 0.75}
-
-        # Maize - versatile crop
-        if 18 <= temp <= 28 and rainfall > 100:
-            predictions["maize"] = {"crop": "maize", "confidence": 0.70}
-
-        # Lentil - good for dry conditions
-        if temp < 25 and rainfall < 200:
-            predictions["lentil"] = {"crop": "lentil", "confidence": 0.65}
-
-        # Default to rice if no specific conditions met
+        if self.models:
+            for model_name, model in self.models.items():
+                try:
+                    pred = model.predict(input_data)[0]
+                    prob = getattr(model, "predict_proba", lambda x: [[0.5, 0.5]])(
+                        input_data
+                    )[0]
+                    confidence = max(prob) if hasattr(prob, "__iter__") else 0.8
+
+                    predictions[model_name] = {
+                        "crop": pred,
+                        "confidence": confidence,
+                    }
+                except Exception as e:
+                    print(f"Error with {model_name}: {e}")
+
+        # If no models available, use rule-based prediction
         if not predictions:
-            predictions["default"] = {"crop": "rice", "confidence": 0.60}
+            predictions = self.rule_based_prediction(input_params)
 
-        return predictions
+        # Generate ensemble prediction
+        return self.ensemble_prediction(predictions)
+
+    def rule_based_prediction(self, input_params: Dict[str, float]) -> Dict[str, Dict]:
+        """Rule-based prediction for Bhairahawa-Butwal region"""
+        return crop_rule_engine.suitable_crops(
+            crop_rule_engine.to_matrix([input_params])
+        )[0]
 
     def ensemble_prediction(self, predictions: Dict[str, Dict]) -> List[Dict]:
         """Combine predictions from multiple models/rules"""
@@ -301,115 +273,58 @@ class EnhancedCropPredictionService:
         self, prediction_request: CropPredictionRequest, predictions: List[Dict]
     ):
         """Create crop recommendations based on predictions"""
+        recommendation_writer.write(
+            self.build_recommendation_rows(prediction_request, predictions)
+        )
+
+    def build_recommendation_rows(
+        self, prediction_request: CropPredictionRequest, predictions: List[Dict]
+    ) -> List[Dict]:
+        """Recommendation field values for the top predictions of one request"""
         recommendation_types = ["primary", "secondary", "alternative"]
+        predictions = predictions[: len(recommendation_types)]
+        crops = [pred["crop"] for pred in predictions]
 
-        for i, pred in enumerate(predictions):
-            if i >= len(recommendation_types):
-                break
+        # Rationales and risks for all recommended crops in one rule pass
+        X = crop_rule_engine.to_matrix(
+            [prediction_request.input_parameters] * len(crops)
+        )
+        rationales = crop_rule_engine.rationales(crops, X)
+        risk_factors = crop_rule_engine.risk_factors(crops, X)
+        rows = []
 
+        for i, pred in enumerate(predictions):
             crop_name = pred["crop"]
-            confidence = pred["confidence"]
-
-            # Get or create crop type
-            crop_type, created = CropType.objects.get_or_create(
-                name=crop_name,
-                defaults={
-                    "regional_success_rate": 0.7,
-                    "growing_season": "Multiple seasons",
-                },
+            rows.append(
+                {
+                    "prediction_request": prediction_request,
+                    "crop_name": crop_name,
+                    "recommendation_type": recommendation_types[i],
+                    "confidence_score": pred["confidence"],
+                    "rationale": rationales[i],
+                    "expected_yield": f"Regional average for {crop_name}",
+                    "risk_factors": risk_factors[i],
+                    "local_market_demand": (
+                        "high" if crop_name in ["rice", "wheat", "maize"] else "medium"
+                    ),
+                }
             )
 
-            # Generate rationale
-            rationale = self.generate_rationale(
-                crop_name, prediction_request.input_parameters
-            )
-
-            # Create recommendation
-            CropRecommendation.objects.create(
-                prediction_request=prediction_request,
-                crop_type=crop_type,
-                recommendation_type=recommendation_types[i],
-                confidence_score=confidence,
-                rationale=rationale,
-                expected_yield=f"Regional average for {crop_name}",
-                risk_factors=self.get_risk_factors(
-                    crop_name, prediction_request.input_parameters
-                ),
-                local_market_demand=(
-                    "high" if crop_name in ["rice", "wheat", "maize"] else "medium"
-                ),
-            )
+        return rows
 
     def generate_rationale(self, crop_name: str, input_params: Dict[str, float]) -> str:
         """Generate explanation for crop recommendation"""
-        temp = input_params["temperature"]
-        humidity = input_params["humidity"]
-        rainfall = input_params["rainfall"]
-
-        rationales = {
-            "rice": f"Rice is recommended due to high humidity ({humidity:.1f}%) and adequate rainfall ({rainfall:.1f}mm). Temperature ({temp:.1f}°C) is optimal for rice cultivation.",
-            "wheat": f"Wheat suits the moderate temperature ({temp:.1f}°C) and controlled moisture conditions. Regional climate is favorable for wheat production.",
-            "maize": f"Maize is versatile and adapts well to current conditions (T:{temp:.1f}°C, H:{humidity:.1f}%). Good market demand in the region.",
-            "lentil": f"Lentil is suitable for the current soil and climate conditions. Requires minimal water and suits the temperature range.",
-        }
-
-        return rationales.get(
-            crop_name,
-            f"{crop_name} is recommended based on current environmental conditions and regional suitability.",
-        )
+        return crop_rule_engine.rationales(
+            [crop_name], crop_rule_engine.to_matrix([input_params])
+        )[0]
 
     def get_risk_factors(
         self, crop_name: str, input_params: Dict[str, float]
     ) -> List[str]:
         """Identify potential risk factors for crop"""
-        risks = []
-
-        temp = input_params["temperature"]
-        humidity = input_params["humidity"]
-        rainfall = input_params["rainfall"]
-        ph = input_params["ph"]
-
-        # Temperature risks
-        if temp > 35:
-            risks.append("High temperature stress")
-        elif temp < 10:
-            risks.append("Low temperature may affect growth")
-
-        # Humidity risks
-        if humidity > 90:
-            risks.append("High humidity may cause fungal diseases")
-        elif humidity < 40:
-            risks.append("Low humidity may cause water stress")
-
-        # Rainfall risks
-        if rainfall > 500:
-            risks.append("Excessive rainfall may cause waterlogging")
-        elif rainfall < 50:
-            risks.append("Insufficient rainfall may require irrigation")
-
-        # pH risks
-        if ph > 8:
-            risks.append("Alkaline soil may affect nutrient uptake")
-        elif ph < 5:
-            risks.append("Acidic soil may limit crop growth")
-
-        # Crop-specific risks
-        crop_risks = {
-            "rice": [
-                "Blast disease in high humidity",
-                "Brown planthopper in warm conditions",
-            ],
-            "wheat": [
-                "Rust diseases in humid conditions",
-                "Heat stress during grain filling",
-            ],
-            "maize": ["Corn borer in warm weather", "Stalk rot in wet conditions"],
-        }
-
-        if crop_name in crop_risks:
-            risks.extend(crop_risks[crop_name])
-
-        return risks[:3]  # Limit to top 3 risks
+        return crop_rule_engine.risk_factors(
+            [crop_name], crop_rule_engine.to_matrix([input_params])
+        )[0]
 
     def get_prediction_history(self, community_admin) -> List[CropPredictionRequest]:
         """Get prediction history for community admin"""
@@ -420,3 +335,6 @@ class EnhancedCropPredictionService:
 
 # Compatibility alias for backward compatibility
 CropPredictionService = EnhancedCropPredictionService
+
+# Global instance
+crop_prediction_service = service_container.lazy("crop_prediction_service")
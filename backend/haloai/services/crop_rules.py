@@ -0,0 +1,284 @@
+"""
+Crop Rules
+Declarative agronomy rules for the Bhairahawa-Butwal region: crop
+suitability, risk factors, input condition analysis and rationale texts.
+Every threshold lives in the tables below; CropRuleEngine compiles them into
+NumPy comparisons so a whole batch of inputs is evaluated per rule instead
+of per row.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Features the rules can refer to, in model feature order
+RULE_FEATURES = [
+    "nitrogen",
+    "phosphorus",
+    "potassium",
+    "temperature",
+    "humidity",
+    "ph",
+    "rainfall",
+]
+
+OPERATORS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+}
+
+# ==== RULE TABLES ====
+
+# Rule-based fallback: every rule whose conditions all hold adds its crop
+SUITABILITY_RULES = [
+    {
+        # Rice - suitable for high humidity and rainfall
+        "crop": "rice",
+        "confidence": 0.85,
+        "when": [
+            ("humidity", ">", 80),
+            ("rainfall", ">", 200),
+            ("temperature", ">=", 20),
+            ("temperature", "<=", 30),
+        ],
+    },
+    {
+        # Wheat - suitable for moderate conditions
+        "crop": "wheat",
+        "confidence": 0.75,
+        "when": [
+            ("temperature", ">=", 15),
+            ("temperature", "<=", 25),
+            ("rainfall", "<", 300),
+            ("ph", ">", 6),
+        ],
+    },
+    {
+        # Maize - versatile crop
+        "crop": "maize",
+        "confidence": 0.70,
+        "when": [
+            ("temperature", ">=", 18),
+            ("temperature", "<=", 28),
+            ("rainfall", ">", 100),
+        ],
+    },
+    {
+        # Lentil - good for dry conditions
+        "crop": "lentil",
+        "confidence": 0.65,
+        "when": [("temperature", "<", 25), ("rainfall", "<", 200)],
+    },
+]
+
+# Used when no suitability rule matches
+DEFAULT_SUITABILITY = ("default", {"crop": "rice", "confidence": 0.60})
+
+# Environmental risks: per feature, the first matching band applies
+RISK_BANDS = {
+    "temperature": [
+        (">", 35, "High temperature stress"),
+        ("<", 10, "Low temperature may affect growth"),
+    ],
+    "humidity": [
+        (">", 90, "High humidity may cause fungal diseases"),
+        ("<", 40, "Low humidity may cause water stress"),
+    ],
+    "rainfall": [
+        (">", 500, "Excessive rainfall may cause waterlogging"),
+        ("<", 50, "Insufficient rainfall may require irrigation"),
+    ],
+    "ph": [
+        (">", 8, "Alkaline soil may affect nutrient uptake"),
+        ("<", 5, "Acidic soil may limit crop growth"),
+    ],
+}
+
+# Pests and diseases listed after the environmental risks
+CROP_RISKS = {
+    "rice": ["Blast disease in high humidity", "Brown planthopper in warm conditions"],
+    "wheat": ["Rust diseases in humid conditions", "Heat stress during grain filling"],
+    "maize": ["Corn borer in warm weather", "Stalk rot in wet conditions"],
+}
+
+MAX_RISK_FACTORS = 3
+
+# Input analysis: per feature, the first matching band, else the default text
+ANALYSIS_BANDS = {
+    "temperature": {
+        "bands": [
+            (">", 35, "High temperature - consider heat-resistant varieties"),
+            ("<", 15, "Low temperature - suitable for cool-season crops"),
+        ],
+        "default": "Optimal temperature range for most crops",
+    },
+    "humidity": {
+        "bands": [
+            (">", 80, "High humidity - monitor for fungal diseases"),
+            ("<", 40, "Low humidity - ensure adequate irrigation"),
+        ],
+        "default": "Good humidity levels for crop growth",
+    },
+    "rainfall": {
+        "bands": [
+            (">", 400, "High rainfall - ensure proper drainage"),
+            ("<", 100, "Low rainfall - supplemental irrigation needed"),
+        ],
+        "default": "Adequate rainfall for rain-fed agriculture",
+    },
+    "ph": {
+        "bands": [
+            (">", 8, "Alkaline soil - may need acid-forming fertilizers"),
+            ("<", 6, "Acidic soil - consider lime application"),
+        ],
+        "default": "Optimal soil pH for nutrient availability",
+    },
+    "nitrogen": {
+        "bands": [
+            ("<", 40, "Low nitrogen - consider nitrogen fertilizers"),
+            (">", 120, "High nitrogen - monitor for excessive vegetative growth"),
+        ],
+        "default": "Adequate nitrogen levels",
+    },
+}
+
+# Recommendation rationales, formatted with the row's input values
+RATIONALE_TEMPLATES = {
+    "rice": "Rice is recommended due to high humidity ({humidity:.1f}%) and adequate rainfall ({rainfall:.1f}mm). Temperature ({temperature:.1f}°C) is optimal for rice cultivation.",
+    "wheat": "Wheat suits the moderate temperature ({temperature:.1f}°C) and controlled moisture conditions. Regional climate is favorable for wheat production.",
+    "maize": "Maize is versatile and adapts well to current conditions (T:{temperature:.1f}°C, H:{humidity:.1f}%). Good market demand in the region.",
+    "lentil": "Lentil is suitable for the current soil and climate conditions. Requires minimal water and suits the temperature range.",
+}
+
+DEFAULT_RATIONALE = "{crop} is recommended based on current environmental conditions and regional suitability."
+
+
+class CropRuleEngine:
+    """Evaluates the rule tables for many inputs at once"""
+
+    def __init__(self):
+        self.feature_index = {name: i for i, name in enumerate(RULE_FEATURES)}
+        self.suitability = [
+            (rule["crop"], rule["confidence"], self._compile(rule["when"]))
+            for rule in SUITABILITY_RULES
+        ]
+
+    def to_matrix(
+        self,
+        inputs: Sequence[Dict[str, Any]],
+        defaults: Optional[Dict[str, float]] = None,
+    ) -> np.ndarray:
+        """
+        (N, 7) matrix in RULE_FEATURES order
+        Missing values take the given defaults, or NaN, which matches no rule.
+        """
+        defaults = defaults or {}
+        return np.array(
+            [
+                [
+                    float(row.get(name, defaults.get(name, np.nan)))
+                    for name in RULE_FEATURES
+                ]
+                for row in inputs
+            ],
+            dtype=float,
+        ).reshape(len(inputs), len(RULE_FEATURES))
+
+    # ==== BATCH EVALUATION ====
+
+    def suitable_crops(self, X: np.ndarray) -> List[Dict[str, Dict[str, Any]]]:
+        """Rule-based crop predictions per row, keyed like the per-model output"""
+        masks = np.column_stack(
+            [self._evaluate(conditions, X) for _, _, conditions in self.suitability]
+        )
+
+        results = []
+        for row_mask in masks:
+            predictions = {
+                crop: {"crop": crop, "confidence": confidence}
+                for (crop, confidence, _), matched in zip(self.suitability, row_mask)
+                if matched
+            }
+            if not predictions:
+                key, prediction = DEFAULT_SUITABILITY
+                predictions[key] = dict(prediction)
+            results.append(predictions)
+        return results
+
+    def risk_factors(self, crops: Sequence[str], X: np.ndarray) -> List[List[str]]:
+        """Up to MAX_RISK_FACTORS environmental and crop risks per (crop, row)"""
+        messages = [
+            self._first_band(bands, X[:, self.feature_index[feature]])
+            for feature, bands in RISK_BANDS.items()
+        ]
+
+        results = []
+        for row, crop in enumerate(crops):
+            risks = [column[row] for column in messages if column[row] is not None]
+            risks.extend(CROP_RISKS.get(crop, []))
+            results.append(risks[:MAX_RISK_FACTORS])
+        return results
+
+    def input_analysis(self, X: np.ndarray) -> List[Dict[str, str]]:
+        """Per-feature condition insights for every row"""
+        columns = {}
+        for feature, table in ANALYSIS_BANDS.items():
+            column = self._first_band(table["bands"], X[:, self.feature_index[feature]])
+            columns[feature] = [
+                message if message is not None else table["default"]
+                for message in column
+            ]
+
+        return [
+            {feature: column[row] for feature, column in columns.items()}
+            for row in range(X.shape[0])
+        ]
+
+    def rationales(self, crops: Sequence[str], X: np.ndarray) -> List[str]:
+        """Recommendation rationale per (crop, row)"""
+        results = []
+        for crop, row in zip(crops, X):
+            template = RATIONALE_TEMPLATES.get(crop)
+            if template is None:
+                results.append(DEFAULT_RATIONALE.format(crop=crop))
+            else:
+                values = dict(zip(RULE_FEATURES, row))
+                results.append(template.format(**values))
+        return results
+
+    # ==== COMPILATION ====
+
+    def _compile(
+        self, conditions: List[Tuple[str, str, float]]
+    ) -> List[Tuple[int, Any, float]]:
+        """Resolve feature names and operators once"""
+        return [
+            (self.feature_index[feature], OPERATORS[op], float(threshold))
+            for feature, op, threshold in conditions
+        ]
+
+    def _evaluate(
+        self, conditions: List[Tuple[int, Any, float]], X: np.ndarray
+    ) -> np.ndarray:
+        """Boolean mask of rows satisfying every condition"""
+        mask = np.ones(X.shape[0], dtype=bool)
+        for column, op, threshold in conditions:
+            mask &= op(X[:, column], threshold)
+        return mask
+
+    def _first_band(
+        self, bands: List[Tuple[str, float, str]], values: np.ndarray
+    ) -> List[Optional[str]]:
+        """Message of the first band each value falls in, None if none does"""
+        masks = np.column_stack(
+            [OPERATORS[op](values, threshold) for op, threshold, _ in bands]
+        )
+        first = masks.argmax(axis=1)
+        matched = masks.any(axis=1)
+        return [bands[index][2] if hit else None for index, hit in zip(first, matched)]
+
+
+# Global instance
+crop_rule_engine = CropRuleEngine()
@@ -0,0 +1,378 @@
+"""
+Edge Export
+Distills the crop ensemble into a small decision tree (or shallow forest)
+for offline scoring on low-memory gateways. Inputs are sampled across the
+training ranges and from prediction history, labelled with the ensemble's
+top crop, fitted with a shallow sklearn tree, then packed with float32 or
+int16 thresholds and uint8 leaf distributions in the layout read by
+services/edge_model.py.
+"""
+
+import json
+import os
+import shutil
+import struct
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .edge_model import FORMAT_NAME, FORMAT_VERSION, MAGIC, EdgeModel
+
+THRESHOLD_TYPES = ("float32", "int16")
+FILE_FORMATS = ("binary", "json")
+
+# Rows labelled by the ensemble per call, to bound memory
+LABEL_CHUNK_ROWS = 20_000
+
+# Fraction of the sampled rows kept out of the fit for the agreement report
+HOLDOUT_FRACTION = 0.2
+
+INT16_MAX = 32767
+LEAF_SCALE = 255
+
+
+class EdgeExporter:
+    """Distills, quantizes and writes the edge model"""
+
+    def __init__(
+        self,
+        trees: int = 1,
+        max_depth: int = 10,
+        min_samples_leaf: int = 5,
+        thresholds: str = "int16",
+        seed: int = 42,
+    ):
+        if thresholds not in THRESHOLD_TYPES:
+            raise ValueError(f"thresholds must be one of {THRESHOLD_TYPES}")
+        self.trees = trees
+        self.max_depth = max_depth
+        self.min_samples_leaf = min_samples_leaf
+        self.thresholds = thresholds
+        self.seed = seed
+
+    # ==== SAMPLING AND LABELLING ====
+
+    def sample_inputs(
+        self, n_samples: int, history: Optional[np.ndarray] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Inputs to distill on, keyed by source
+        "synthetic" covers the training ranges uniformly; "history" resamples
+        real inputs with a little jitter so common regions get more splits.
+        """
+        from .inference_benchmark import synthetic_features
+        from .real_ml_prediction_service import FEATURE_ORDER, FEATURE_RANGES
+
+        sources = {}
+        n_history = 0
+        if history is not None and len(history):
+            n_history = n_samples // 2
+            rng = np.random.default_rng(self.seed)
+            picked = history[rng.integers(0, len(history), n_history)]
+            spread = np.array(
+                [
+                    FEATURE_RANGES[name][1] - FEATURE_RANGES[name][0]
+                    for name in FEATURE_ORDER
+                ]
+            )
+            sources["history"] = picked + rng.normal(0.0, 0.01, picked.shape) * spread
+        sources["synthetic"] = synthetic_features(n_samples - n_history, self.seed)
+        return sources
+
+    def label(self, features: np.ndarray) -> np.ndarray:
+        """Ensemble top crop index (into crop_labels) per row"""
+        from .container import real_ml_service
+
+        labels = [
+            real_ml_service.predict_top_crops(
+                features[start : start + LABEL_CHUNK_ROWS]
+            )[0]
+            for start in range(0, len(features), LABEL_CHUNK_ROWS)
+        ]
+        return np.concatenate(labels).astype(int) if labels else np.zeros(0, int)
+
+    # ==== DISTILLATION ====
+
+    def distill(self, X: np.ndarray, y: np.ndarray) -> List[Tuple[Any, np.ndarray]]:
+        """
+        Fit the student model
+        Returns (decision tree, crop index per tree output column) pairs; a
+        forest's trees are fitted on encoded labels, so they carry the
+        forest's classes instead of their own.
+        """
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.tree import DecisionTreeClassifier
+
+        if self.trees == 1:
+            student = DecisionTreeClassifier(
+                max_depth=self.max_depth,
+                min_samples_leaf=self.min_samples_leaf,
+                random_state=self.seed,
+            )
+            student.fit(X, y)
+            return [(student, student.classes_.astype(int))]
+
+        student = RandomForestClassifier(
+            n_estimators=self.trees,
+            max_depth=self.max_depth,
+            min_samples_leaf=self.min_samples_leaf,
+            random_state=self.seed,
+        )
+        student.fit(X, y)
+        classes = student.classes_.astype(int)
+        return [(estimator, classes) for estimator in student.estimators_]
+
+    # ==== PACKING ====
+
+    def pack(
+        self,
+        estimators: Sequence[Tuple[Any, np.ndarray]],
+        classes: Sequence[str],
+        feature_names: Sequence[str],
+        X: np.ndarray,
+    ) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """Flatten the trees into global node arrays plus a JSON header"""
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        n_nodes = 0
+        n_leaves = 0
+
+        for estimator, tree_classes in estimators:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            leaf_rows = np.cumsum(is_leaf) - 1 + n_leaves
+
+            roots.append(n_nodes)
+            features.append(np.where(is_leaf, -1, tree.feature))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            lefts.append(np.where(is_leaf, leaf_rows, tree.children_left + n_nodes))
+            rights.append(np.where(is_leaf, -1, tree.children_right + n_nodes))
+
+            shares = tree.value[is_leaf, 0, :]
+            shares = shares / np.maximum(shares.sum(axis=1, keepdims=True), 1e-12)
+            leaf_values = np.zeros((shares.shape[0], len(classes)))
+            leaf_values[:, tree_classes] = shares
+            values.append(np.rint(leaf_values * LEAF_SCALE))
+
+            n_nodes += tree.node_count
+            n_leaves += int(is_leaf.sum())
+
+        feature = np.concatenate(features)
+        threshold = np.concatenate(thresholds)
+        index_dtype = np.int16 if n_nodes <= INT16_MAX else np.int32
+        arrays = {
+            "feature": feature.astype(np.int8),
+            "left": np.concatenate(lefts).astype(index_dtype),
+            "right": np.concatenate(rights).astype(index_dtype),
+            "values": np.concatenate(values).astype(np.uint8),
+            "roots": np.array(roots, dtype=np.int32),
+        }
+
+        quantization = {"thresholds": self.thresholds}
+        if self.thresholds == "int16":
+            offset, scale = self._int16_grid(feature, threshold, X)
+            quantized = np.rint(
+                (threshold - offset[np.maximum(feature, 0)])
+                / scale[np.maximum(feature, 0)]
+            )
+            arrays["threshold"] = np.clip(quantized, -INT16_MAX, INT16_MAX).astype(
+                np.int16
+            )
+            quantization.update(
+                {
+                    "offset": offset.tolist(),
+                    "scale": scale.tolist(),
+                    "qmax": INT16_MAX,
+                }
+            )
+        else:
+            arrays["threshold"] = threshold.astype(np.float32)
+
+        header = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "features": list(feature_names),
+            "classes": list(classes),
+            "max_depth": int(max(estimator.get_depth() for estimator, _ in estimators)),
+            "leaf_scale": LEAF_SCALE,
+            "quantization": quantization,
+        }
+        return header, arrays
+
+    def _int16_grid(
+        self, feature: np.ndarray, threshold: np.ndarray, X: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-feature offset and step spanning the data and every threshold"""
+        low, high = X.min(axis=0), X.max(axis=0)
+        for column in range(X.shape[1]):
+            used = threshold[feature == column]
+            if used.size:
+                low[column] = min(low[column], used.min())
+                high[column] = max(high[column], used.max())
+        offset = (low + high) / 2.0
+        scale = np.maximum((high - low) / (2.0 * INT16_MAX), 1e-9)
+        return offset, scale
+
+    # ==== WRITING ====
+
+    def write(
+        self,
+        path: os.PathLike,
+        header: Dict[str, Any],
+        arrays: Dict[str, np.ndarray],
+        file_format: str = "binary",
+    ) -> int:
+        """Write the model atomically; returns the file size in bytes"""
+        if file_format not in FILE_FORMATS:
+            raise ValueError(f"file_format must be one of {FILE_FORMATS}")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".tmp-{path.name}")
+
+        if file_format == "json":
+            document = {
+                **header,
+                "data": {
+                    name: array.ravel().tolist() for name, array in arrays.items()
+                },
+            }
+            tmp_path.write_text(json.dumps(document, separators=(",", ":")))
+        else:
+            layout, blobs, offset = {}, [], 0
+            for name, array in arrays.items():
+                data = np.ascontiguousarray(array).astype(array.dtype.newbyteorder("<"))
+                layout[name] = {
+                    "dtype": data.dtype.str,
+                    "itemsize": data.dtype.itemsize,
+                    "count": int(data.size),
+                    "offset": offset,
+                    "shape": list(data.shape),
+                }
+                blobs.append(data.tobytes())
+                offset += len(blobs[-1])
+            encoded = json.dumps(
+                {**header, "arrays": layout}, separators=(",", ":")
+            ).encode("utf-8")
+            with open(tmp_path, "wb") as f:
+                f.write(MAGIC)
+                f.write(struct.pack("<I", len(encoded)))
+                f.write(encoded)
+                for blob in blobs:
+                    f.write(blob)
+
+        os.replace(tmp_path, path)
+        return path.stat().st_size
+
+    # ==== PIPELINE ====
+
+    def export(
+        self,
+        path: os.PathLike,
+        n_samples: int = 100_000,
+        history: Optional[np.ndarray] = None,
+        file_format: str = "binary",
+        progress=print,
+    ) -> Dict[str, Any]:
+        """Sample, label, distill, write and report agreement with the ensemble"""
+        from .container import real_ml_service
+        from .real_ml_prediction_service import FEATURE_ORDER
+
+        started = time.perf_counter()
+        rng = np.random.default_rng(self.seed)
+        sources = self.sample_inputs(n_samples, history)
+
+        X = np.concatenate(list(sources.values()))
+        source_of = np.concatenate(
+            [np.full(len(rows), name, dtype=object) for name, rows in sources.items()]
+        )
+        progress(f"🏷️ Labelling {len(X)} inputs with the ensemble")
+        y = self.label(X)
+        # Inputs the ensemble gave no known crop for teach the student nothing
+        labelled = y >= 0
+        X, y, source_of = X[labelled], y[labelled], source_of[labelled]
+
+        holdout = rng.random(len(X)) < HOLDOUT_FRACTION
+        progress(f"🌳 Distilling into {self.trees} tree(s) of depth {self.max_depth}")
+        estimators = self.distill(X[~holdout], y[~holdout])
+
+        header, arrays = self.pack(
+            estimators, real_ml_service.crop_labels, FEATURE_ORDER, X
+        )
+        header["source"] = {
+            "model_version": real_ml_service.model_registry.version,
+            "samples": int(len(X)),
+            "trees": self.trees,
+        }
+        size = self.write(path, header, arrays, file_format)
+
+        # Score the holdout through the written file, exactly as a gateway would
+        edge_model = EdgeModel.load(str(path))
+        edge_proba = edge_model.predict_proba(X[holdout])
+        edge_top3 = np.argsort(-edge_proba, axis=1)[:, :3]
+        student_top = self._student_predict(
+            estimators, X[holdout], len(header["classes"])
+        )
+
+        agreement = {}
+        for name in [*sources, "all"]:
+            mask = slice(None) if name == "all" else source_of[holdout] == name
+            expected = y[holdout][mask]
+            if not len(expected):
+                continue
+            agreement[name] = {
+                "rows": int(len(expected)),
+                "top1": round(float(np.mean(edge_top3[mask, 0] == expected)), 4),
+                "top3": round(
+                    float(np.mean((edge_top3[mask] == expected[:, None]).any(axis=1))),
+                    4,
+                ),
+                "unquantized_top1": round(
+                    float(np.mean(student_top[mask] == expected)), 4
+                ),
+            }
+
+        return {
+            "path": str(path),
+            "format": file_format,
+            "size_bytes": size,
+            **edge_model.describe(),
+            "agreement": agreement,
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+
+    def _student_predict(
+        self,
+        estimators: Sequence[Tuple[Any, np.ndarray]],
+        X: np.ndarray,
+        n_classes: int,
+    ) -> np.ndarray:
+        """Top class of the unquantized student, for the quantization loss"""
+        totals = np.zeros((len(X), n_classes))
+        for estimator, tree_classes in estimators:
+            totals[:, tree_classes] += estimator.predict_proba(X)
+        return totals.argmax(axis=1)
+
+
+def history_features(limit: int = 200_000) -> Optional[np.ndarray]:
+    """Inputs of completed prediction requests (most recent first), if any"""
+    from apps.crops.models import CropPredictionRequest
+
+    from .prediction_job_queue import INPUT_FIELDS
+
+    rows = list(
+        CropPredictionRequest.objects.filter(status="completed")
+        .order_by("-pk")
+        .values_list(*INPUT_FIELDS)[:limit]
+    )
+    if not rows:
+        return None
+    features = np.array(rows, dtype=float)
+    return features[np.all(np.isfinite(features), axis=1)]
+
+
+def bundle_evaluator(directory: os.PathLike) -> Path:
+    """Copy the standalone evaluator next to an exported model"""
+    target = Path(directory) / "edge_model.py"
+    shutil.copyfile(Path(__file__).with_name("edge_model.py"), target)
+    return target
@@ -0,0 +1,271 @@
+"""
+Edge Model
+Standalone evaluator for the distilled crop model written by
+`manage.py export_edge_model`. It imports nothing from Django, sklearn or
+xgboost and only uses NumPy when it is installed, so the file can be copied
+to a gateway on its own:
+
+    model = EdgeModel.load("crop_edge_model.bin")
+    model.predict_crops([{"nitrogen": 90, "phosphorus": 42, ...}], top_k=3)
+
+File layout (binary): the 8-byte magic, a little-endian uint32 header length,
+a UTF-8 JSON header, then the raw little-endian arrays at the offsets the
+header lists. The JSON layout holds the same header with the arrays inline.
+
+Arrays, all trees concatenated with global node indices:
+    feature    int8    split feature per node, -1 for leaves
+    threshold  float32 or int16 (quantized, see header["quantization"])
+    left       int16/int32  left child, or the leaf row for leaves
+    right      int16/int32  right child
+    values     uint8   (n_leaves, n_classes) class shares scaled to leaf_scale
+    roots      int32   root node of every tree
+"""
+
+import json
+import struct
+import sys
+from array import array
+from typing import Any, Dict, List, Sequence, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised on gateways without NumPy
+    np = None
+
+MAGIC = b"HALOEDG1"
+FORMAT_NAME = "halo-edge"
+FORMAT_VERSION = 1
+
+# NumPy dtype strings used in the header, with their array module typecodes
+TYPECODES = {"|i1": "b", "|u1": "B", "<i2": "h", "<i4": "i", "<f4": "f"}
+
+ARRAY_NAMES = ("feature", "threshold", "left", "right", "values", "roots")
+
+
+class EdgeModelError(Exception):
+    """Raised for files that are not valid edge models"""
+
+
+class EdgeModel:
+    """Scores inputs with a quantized decision tree ensemble"""
+
+    def __init__(self, header: Dict[str, Any], arrays: Dict[str, Any]):
+        missing = [name for name in ARRAY_NAMES if name not in arrays]
+        if missing:
+            raise EdgeModelError(f"Missing arrays: {', '.join(missing)}")
+        self.header = header
+        self.features: List[str] = list(header["features"])
+        self.classes: List[str] = list(header["classes"])
+        self.max_depth = int(header["max_depth"])
+        self.leaf_scale = float(header.get("leaf_scale", 255))
+
+        quantization = header.get("quantization", {})
+        self.threshold_dtype = quantization.get("thresholds", "float32")
+        self.offsets = quantization.get("offset")
+        self.scales = quantization.get("scale")
+        self.qmax = int(quantization.get("qmax", 32767))
+
+        n_classes = len(self.classes)
+        if np is not None:
+            self.arrays = {name: np.asarray(value) for name, value in arrays.items()}
+            self.arrays["values"] = self.arrays["values"].reshape(-1, n_classes)
+        else:
+            self.arrays = {name: list(value) for name, value in arrays.items()}
+            flat = self.arrays["values"]
+            self.arrays["values"] = [
+                flat[i : i + n_classes] for i in range(0, len(flat), n_classes)
+            ]
+
+    # ==== LOADING ====
+
+    @classmethod
+    def load(cls, path: str) -> "EdgeModel":
+        """Read a binary or JSON edge model file"""
+        with open(path, "rb") as handle:
+            data = handle.read()
+        if data[: len(MAGIC)] == MAGIC:
+            return cls.from_bytes(data)
+        return cls.from_json(data.decode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "EdgeModel":
+        """Parse the binary layout"""
+        if data[: len(MAGIC)] != MAGIC:
+            raise EdgeModelError("Not an edge model file")
+        (header_length,) = struct.unpack_from("<I", data, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(data[start : start + header_length].decode("utf-8"))
+        cls._check_header(header)
+
+        body = start + header_length
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            offset = body + int(spec["offset"])
+            size = int(spec["count"]) * int(spec["itemsize"])
+            arrays[name] = _decode_array(data[offset : offset + size], spec["dtype"])
+        return cls(header, arrays)
+
+    @classmethod
+    def from_json(cls, text: str) -> "EdgeModel":
+        """Parse the JSON layout"""
+        document = json.loads(text)
+        header = {key: value for key, value in document.items() if key != "data"}
+        cls._check_header(header)
+        return cls(header, document["data"])
+
+    @staticmethod
+    def _check_header(header: Dict[str, Any]):
+        if header.get("format") != FORMAT_NAME:
+            raise EdgeModelError("Not an edge model file")
+        if int(header.get("version", 0)) > FORMAT_VERSION:
+            raise EdgeModelError(
+                f"Edge model version {header['version']} is newer than this evaluator"
+            )
+
+    # ==== SCORING ====
+
+    def predict_proba(self, rows: Sequence[Any]) -> Any:
+        """
+        (N, n_classes) class probabilities
+        rows are feature sequences in header["features"] order or dicts keyed
+        by feature name. Returns an ndarray with NumPy, else a list of lists.
+        """
+        matrix = [self._row(row) for row in rows]
+        if np is None:
+            return [self._score_row(row) for row in matrix]
+        return self._score_matrix(np.asarray(matrix, dtype=np.float64))
+
+    def predict(self, rows: Sequence[Any]) -> List[str]:
+        """Most likely crop per row"""
+        return [crops[0]["crop"] for crops in self.predict_crops(rows, top_k=1)]
+
+    def predict_crops(
+        self, rows: Sequence[Any], top_k: int = 3
+    ) -> List[List[Dict[str, Union[str, float]]]]:
+        """Top-k crops with confidence per row, shaped like the server's output"""
+        results = []
+        for probabilities in self.predict_proba(rows):
+            probabilities = [float(value) for value in probabilities]
+            order = sorted(
+                range(len(probabilities)), key=lambda index: -probabilities[index]
+            )
+            results.append(
+                [
+                    {
+                        "crop": self.classes[index],
+                        "confidence": round(probabilities[index], 3),
+                    }
+                    for index in order[:top_k]
+                ]
+            )
+        return results
+
+    def _row(self, row: Any) -> List[float]:
+        """One input as floats in feature order"""
+        if isinstance(row, dict):
+            try:
+                return [float(row[name]) for name in self.features]
+            except KeyError as e:
+                raise ValueError(f"Missing feature {e.args[0]!r}")
+        values = [float(value) for value in row]
+        if len(values) != len(self.features):
+            raise ValueError(f"Expected {len(self.features)} features")
+        return values
+
+    def _quantize(self, value: float, feature: int) -> float:
+        """Map an input value onto the int16 threshold grid"""
+        scaled = round((value - self.offsets[feature]) / self.scales[feature])
+        return max(-self.qmax, min(self.qmax, scaled))
+
+    def _score_matrix(self, X: "np.ndarray") -> "np.ndarray":
+        """Vectorized traversal: every row descends one level per step"""
+        arrays = self.arrays
+        if self.threshold_dtype == "int16":
+            offsets = np.asarray(self.offsets)
+            scales = np.asarray(self.scales)
+            X = np.clip(np.rint((X - offsets) / scales), -self.qmax, self.qmax)
+
+        rows = np.arange(X.shape[0])
+        feature = arrays["feature"].astype(np.int64)
+        threshold = arrays["threshold"].astype(np.float64)
+        left = arrays["left"].astype(np.int64)
+        right = arrays["right"].astype(np.int64)
+
+        totals = np.zeros((X.shape[0], len(self.classes)))
+        for root in arrays["roots"]:
+            node = np.full(X.shape[0], int(root), dtype=np.int64)
+            for _ in range(self.max_depth):
+                split = feature[node]
+                internal = split >= 0
+                if not internal.any():
+                    break
+                goes_left = X[rows, np.maximum(split, 0)] <= threshold[node]
+                node = np.where(
+                    internal, np.where(goes_left, left[node], right[node]), node
+                )
+            totals += arrays["values"][left[node]]
+
+        sums = totals.sum(axis=1, keepdims=True)
+        sums[sums == 0] = 1.0
+        return totals / sums
+
+    def _score_row(self, row: List[float]) -> List[float]:
+        """Pure-Python traversal of one row"""
+        arrays = self.arrays
+        quantized = self.threshold_dtype == "int16"
+        if quantized:
+            row = [self._quantize(value, index) for index, value in enumerate(row)]
+
+        totals = [0.0] * len(self.classes)
+        for root in arrays["roots"]:
+            node = int(root)
+            while arrays["feature"][node] >= 0:
+                split = arrays["feature"][node]
+                if row[split] <= arrays["threshold"][node]:
+                    node = arrays["left"][node]
+                else:
+                    node = arrays["right"][node]
+            for index, value in enumerate(arrays["values"][arrays["left"][node]]):
+                totals[index] += value
+
+        total = sum(totals) or 1.0
+        return [value / total for value in totals]
+
+    def describe(self) -> Dict[str, Any]:
+        """Size summary for reports"""
+        return {
+            "trees": len(self.arrays["roots"]),
+            "nodes": len(self.arrays["feature"]),
+            "leaves": len(self.arrays["values"]),
+            "max_depth": self.max_depth,
+            "thresholds": self.threshold_dtype,
+            "classes": len(self.classes),
+        }
+
+
+def _decode_array(raw: bytes, dtype: str) -> Any:
+    """Little-endian bytes to an ndarray, or an array.array without NumPy"""
+    if dtype not in TYPECODES:
+        raise EdgeModelError(f"Unsupported array type {dtype}")
+    if np is not None:
+        return np.frombuffer(raw, dtype=np.dtype(dtype)).copy()
+    values = array(TYPECODES[dtype])
+    values.frombytes(raw)
+    if sys.byteorder == "big" and values.itemsize > 1:
+        values.byteswap()
+    return values
+
+
+def _main(argv: List[str]) -> int:
+    """python edge_model.py MODEL N P K TEMPERATURE HUMIDITY PH RAINFALL"""
+    if len(argv) != 9:
+        print(_main.__doc__)
+        return 2
+    model = EdgeModel.load(argv[1])
+    for prediction in model.predict_crops([argv[2:]])[0]:
+        print(f"{prediction['crop']}: {prediction['confidence']:.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv))
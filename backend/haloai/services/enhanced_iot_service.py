@@ -6,10 +6,20 @@ Provides improved error handling, data validation, and real-time sensor monitori
 import json
 import logging
 from datetime import datetime, timezone, timedelta
-from typing import Dict, Optional, List, Union, Any, Tuple
+from typing import Dict, Optional, List, Union, Any, Tuple, Callable
 from dataclasses import dataclass, asdict
+from django.conf import settings
 from firebase_admin import db, firestore
 from .firebase_service_refactored import firebase_service
+from .container import service_container
+from .sensor_path_resolver import (
+    SensorPathResolver,
+    compile_field_reader,
+    payload_format,
+)
+from .rtdb_listener import LatestValueStore, build_rtdb_listener
+from .sensor_fanout import build_sensor_fanout
+from .regional_aggregates import regional_aggregates, regional_average_result
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -102,6 +112,29 @@ class EnhancedIoTService:
         self._readings_cache = {}
         self._cache_ttl = 30  # 30 seconds cache TTL for more frequent updates
 
+        # Each sensor's RTDB path, probed once so later reads are a single GET
+        self.path_resolver = SensorPathResolver(
+            self.db_ref,
+            self._compile_parser,
+            retry_seconds=getattr(settings, "IOT_RTDB_PROBE_RETRY_SECONDS", 60),
+        )
+
+        # Latest reading per sensor, kept current by the RTDB listener when it runs
+        listener_config = getattr(settings, "IOT_RTDB_LISTENER", {})
+        self.latest_values = LatestValueStore(
+            stale_seconds=float(listener_config.get("STALE_SECONDS", 600))
+        )
+        self.rtdb_listener = None
+
+        # Concurrent, deadline-limited fetches when many sensors are read at once
+        self.fanout = build_sensor_fanout()
+
+        # Running per-region statistics, shared with the other IoT consumers
+        self.aggregates = regional_aggregates
+        self._aggregates_refresh_seconds = getattr(
+            settings, "IOT_REGIONAL_REFRESH_SECONDS", 30
+        )
+
     def _initialize_connections(self):
         """Initialize Firebase connections with error handling"""
         try:
@@ -120,6 +153,20 @@ class EnhancedIoTService:
         except Exception as e:
             logger.error(f"❌ Firebase connection failed: {e}")
 
+    def start_listener(self) -> bool:
+        """Subscribe to the sensors' RTDB paths; False without a database"""
+        if not self.db_ref:
+            return False
+        if self.rtdb_listener is None:
+            self.rtdb_listener = build_rtdb_listener(self)
+        return self.rtdb_listener.start()
+
+    def _listener_reading(self, sensor_id: str) -> Optional[Dict[str, Any]]:
+        """In-memory reading, if the listener is connected for this sensor"""
+        if self.rtdb_listener is None or not self.rtdb_listener.is_live(sensor_id):
+            return None
+        return self.latest_values.get(sensor_id)
+
     def get_latest_sensor_data(
         self, sensor_id: str = "bhairahawa_farm_1", use_cache: bool = True
     ) -> Dict[str, Union[float, int, str, None]]:
@@ -128,6 +175,11 @@ class EnhancedIoTService:
         """
         logger.info(f"🔍 Fetching data for sensor: {sensor_id}")
 
+        # Pushed readings are always current while the listener is connected
+        live = self._listener_reading(sensor_id)
+        if live is not None:
+            return live
+
         # Check cache first
         if use_cache and self._is_cache_valid(sensor_id):
             logger.info(f"📋 Using cached data for sensor: {sensor_id}")
@@ -135,15 +187,13 @@ class EnhancedIoTService:
 
         try:
             # Try Firebase Realtime Database first
-            sensor_data = self._fetch_from_realtime_db(sensor_id)
+            reading = self._read_from_realtime_db(sensor_id)
 
-            if sensor_data:
-                reading = self._parse_sensor_data(sensor_id, sensor_data)
-                if reading and reading.is_valid():
-                    result = reading.to_dict()
-                    self._update_cache(sensor_id, result)
-                    logger.info(f"✅ Successfully fetched valid data for {sensor_id}")
-                    return result
+            if reading and reading.is_valid():
+                result = reading.to_dict()
+                self._update_cache(sensor_id, result)
+                logger.info(f"✅ Successfully fetched valid data for {sensor_id}")
+                return result
 
             # Fallback to Firestore if available
             if self.firestore_client:
@@ -168,73 +218,22 @@ class EnhancedIoTService:
             logger.error(f"❌ Error fetching sensor data for {sensor_id}: {e}")
             return self._get_intelligent_default_data(sensor_id)
 
-    def _fetch_from_realtime_db(self, sensor_id: str) -> Optional[Dict[str, Any]]:
-        """Fetch data from Firebase Realtime Database"""
+    def _read_from_realtime_db(self, sensor_id: str) -> Optional[SensorReading]:
+        """
+        Fetch and parse a sensor's reading from Firebase Realtime Database
+        The path resolver probes the candidate paths on the first read and
+        then reads only the path (and payload format) that worked.
+        """
         if not self.db_ref:
             return None
 
         try:
-            # Try multiple path patterns based on actual Firebase structure
-            paths_to_try = [
-                f"sensorData",  # Root level sensor data
-                f"sensorData/{sensor_id}",  # Sensor-specific data
-                f"iot_sensors/{sensor_id}/latest",  # Our structured format
-                f"sensors/{sensor_id}/latest",  # Alternative structured format
-                f"sensor_data/{sensor_id}/current",  # Current reading format
-                f"iot_data/{sensor_id}",  # Simple IoT data format
-                f"{sensor_id}",  # Direct sensor ID path
-                f"data/{sensor_id}",  # Data subfolder
-                f"realtime/{sensor_id}",  # Realtime subfolder
-            ]
-
-            for path in paths_to_try:
-                logger.debug(f"🔍 Trying Firebase path: {path}")
-                ref = self.db_ref.child(path)
-                data = ref.get()
-
-                if data:
-                    logger.info(f"📊 Found data at Firebase path: {path}")
-                    logger.debug(f"Raw data: {data}")
-
-                    # If we got the root sensorData, return it directly
-                    if path == "sensorData" and isinstance(data, dict):
-                        # Check if it has the expected format (prioritize soilTemperature)
-                        if any(
-                            key in data
-                            for key in [
-                                "soilTemperature",
-                                "phValue",
-                                "humidity",
-                                "airTemperature",
-                            ]
-                        ):
-                            return data
-                        # If it's a nested structure, try to find sensor data
-                        for key, value in data.items():
-                            if isinstance(value, dict) and any(
-                                subkey in value
-                                for subkey in [
-                                    "soilTemperature",
-                                    "phValue",
-                                    "airTemperature",
-                                ]
-                            ):
-                                logger.info(
-                                    f"📊 Found nested sensor data under key: {key}"
-                                )
-                                return value
-
-                    # For other paths, validate the data structure
-                    if isinstance(data, dict):
-                        return data
-                    elif isinstance(data, str):
-                        # Handle string data format
-                        return {"raw_data": data}
-
-            logger.warning(
-                f"⚠️ No data found for sensor {sensor_id} in any Firebase path"
-            )
-            return None
+            reading = self.path_resolver.read(sensor_id)
+            if reading is None:
+                logger.warning(
+                    f"⚠️ No data found for sensor {sensor_id} in any Firebase path"
+                )
+            return reading
 
         except Exception as e:
             logger.error(f"❌ Firebase Realtime DB fetch error for {sensor_id}: {e}")
@@ -264,92 +263,50 @@ class EnhancedIoTService:
         self, sensor_id: str, raw_data: Any
     ) -> Optional[SensorReading]:
         """Parse raw sensor data into SensorReading object"""
-        try:
-            location_info = self.sensor_locations.get(sensor_id, {})
-
-            # Handle different data formats
-            if isinstance(raw_data, dict):
-                # Check for the actual Firebase format first (prioritize soilTemperature)
-                if (
-                    "soilTemperature" in raw_data
-                    or "phValue" in raw_data
-                    or "airTemperature" in raw_data
-                ):
-                    # Firebase format: airTemperature, humidity, phValue, soilTemperature
-                    # Use soilTemperature as primary temperature value
-                    logger.info(f"📊 Parsing Firebase format data for {sensor_id}")
-                    return SensorReading(
-                        sensor_id=sensor_id,
-                        ph=float(raw_data.get("phValue", 6.5)),
-                        temperature=float(raw_data.get("soilTemperature", 25.0)),
-                        humidity=float(raw_data.get("humidity", 60.0)),
-                        soil_temperature=float(raw_data.get("soilTemperature", 25.0)),
-                        timestamp=raw_data.get("timestamp"),
-                        location=location_info.get("farm_name"),
-                        region=location_info.get("region", "Bhairahawa-Butwal"),
-                        status="active",  # Mark as active since we have real data
-                    )
-
-                # Fallback to generic structured format
-                else:
-                    logger.info(f"📊 Parsing generic format data for {sensor_id}")
-                    return SensorReading(
-                        sensor_id=sensor_id,
-                        ph=float(raw_data.get("ph", raw_data.get("phValue", 6.5))),
-                        temperature=float(
-                            raw_data.get(
-                                "temperature",
-                                raw_data.get(
-                                    "soilTemperature",
-                                    raw_data.get("airTemperature", 25.0),
-                                ),
-                            )
-                        ),
-                        humidity=float(raw_data.get("humidity", 60.0)),
-                        soil_temperature=float(
-                            raw_data.get(
-                                "soil_temperature",
-                                raw_data.get("soilTemperature", 25.0),
-                            )
-                        ),
-                        timestamp=raw_data.get("timestamp"),
-                        location=location_info.get("farm_name"),
-                        region=location_info.get("region", "Bhairahawa-Butwal"),
-                        status="active",
-                    )
-
-            elif isinstance(raw_data, str):
-                # Handle string data format
-                if "," in raw_data:
-                    # Legacy comma-separated format: "ph,temperature"
-                    values = raw_data.split(",")
-                    if len(values) >= 2:
-                        logger.info(f"📊 Parsing CSV format data for {sensor_id}")
-                        return SensorReading(
-                            sensor_id=sensor_id,
-                            ph=float(values[0].strip()),
-                            temperature=float(values[1].strip()),
-                            location=location_info.get("farm_name"),
-                            region=location_info.get("region", "Bhairahawa-Butwal"),
-                            status="active",
-                        )
-                elif raw_data:
-                    # Single value string - treat as raw data
-                    logger.info(
-                        f"📊 Parsing raw string data for {sensor_id}: {raw_data}"
-                    )
-                    return None  # Cannot parse single string value
-
+        compiled = self._compile_parser(sensor_id, raw_data)
+        if compiled is None:
             logger.warning(
                 f"⚠️ Unrecognized data format for {sensor_id}: {type(raw_data)}"
             )
             return None
 
-        except (ValueError, TypeError) as e:
+        try:
+            return compiled[1](raw_data)
+
+        except (ValueError, TypeError, KeyError, IndexError) as e:
             logger.error(f"❌ Error parsing sensor data for {sensor_id}: {e}")
             logger.error(f"Raw data: {raw_data}")
             return None
 
+    def _compile_parser(
+        self, sensor_id: str, raw_data: Any
+    ) -> Optional[Tuple[str, Callable[[Any], SensorReading]]]:
+        """
+        (format, parser) for payloads shaped like raw_data
+        Formats: Firebase camelCase (phValue, soilTemperature, ...), generic
+        structured keys, or a legacy "ph,temperature" string.
+        """
+        format_name = payload_format(raw_data)
+        if format_name is None:
+            return None
+
+        logger.info(f"📊 Using {format_name} format parser for {sensor_id}")
+        read_fields = compile_field_reader(format_name, raw_data)
+        location_info = self.sensor_locations.get(sensor_id, {})
+        location = location_info.get("farm_name")
+        region = location_info.get("region", "Bhairahawa-Butwal")
+
+        def parse(payload: Any) -> SensorReading:
+            return SensorReading(
+                sensor_id=sensor_id,
+                location=location,
+                region=region,
+                status="active",  # Mark as active since we have real data
+                **read_fields(payload),
+            )
+
+        return format_name, parse
+
     def _is_cache_valid(self, sensor_id: str) -> bool:
         """Check if cached data is still valid"""
         if sensor_id not in self._readings_cache:
@@ -366,6 +323,19 @@ class EnhancedIoTService:
             "data": data,
             "timestamp": datetime.now(timezone.utc),
         }
+        self._record_reading(sensor_id, data)
+
+    def _record_reading(self, sensor_id: str, data: Dict[str, Any]):
+        """
+        Merge the sensor's reading into the regional aggregates
+        IoTDataService's air_temperature for the same sensor is kept.
+        """
+        if data.get("status") == "default":
+            return
+        region = self.sensor_locations.get(sensor_id, {}).get("region")
+        self.aggregates.update(
+            sensor_id, region or data.get("region"), data, merge=True
+        )
 
     def _get_intelligent_default_data(
         self, sensor_id: str
@@ -413,97 +383,117 @@ class EnhancedIoTService:
         self._update_cache(sensor_id, result)
         return result
 
-    def get_all_sensors_data(
+    def collect_sensors_data(
         self,
-    ) -> Dict[str, Dict[str, Union[float, int, str, None]]]:
-        """Get data from all available IoT sensors with location info"""
-        all_data = {}
+        sensor_ids: Optional[List[str]] = None,
+        deadline_seconds: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Fetch sensors (all by default) concurrently within a deadline
+        Returns {"sensors", "timed_out", "failed", "elapsed_ms"}; sensors that
+        missed the deadline are left out of "sensors" and listed in "timed_out".
+        """
+        if sensor_ids is None:
+            sensor_ids = list(self.sensor_locations)
+        report = self.fanout.fetch(
+            sensor_ids, self.get_latest_sensor_data, deadline_seconds=deadline_seconds
+        )
 
-        for sensor_id, location_info in self.sensor_locations.items():
-            try:
-                sensor_data = self.get_latest_sensor_data(sensor_id)
+        all_data = {}
+        for sensor_id in sensor_ids:
+            location_info = self.sensor_locations.get(sensor_id, {})
+            if sensor_id in report["results"]:
+                sensor_data = report["results"][sensor_id]
                 if sensor_data:
                     # Merge sensor data with location info
-                    combined_data = {**sensor_data, **location_info}
-                    all_data[sensor_id] = combined_data
-
-            except Exception as e:
-                logger.error(f"❌ Error fetching data for {sensor_id}: {e}")
+                    all_data[sensor_id] = {**sensor_data, **location_info}
+            elif sensor_id in report["failed"]:
+                logger.error(
+                    f"❌ Error fetching data for {sensor_id}: "
+                    f"{report['failed'][sensor_id]}"
+                )
                 # Still include the sensor with default data
                 default_data = self._get_intelligent_default_data(sensor_id)
                 all_data[sensor_id] = {**default_data, **location_info}
 
-        return all_data
+        return {
+            "sensors": all_data,
+            "timed_out": report["timed_out"],
+            "failed": list(report["failed"]),
+            "elapsed_ms": report["elapsed_ms"],
+        }
+
+    def get_all_sensors_data(
+        self,
+    ) -> Dict[str, Dict[str, Union[float, int, str, None]]]:
+        """Get data from all available IoT sensors with location info"""
+        return self.collect_sensors_data()["sensors"]
 
     def get_regional_average_data(
         self, region: str = "Bhairahawa-Butwal"
     ) -> Dict[str, Union[float, int, str]]:
-        """Get regional average of all sensors with enhanced statistics"""
-        all_data = self.get_all_sensors_data()
-        region_sensors = [
-            data for data in all_data.values() if data.get("region") == region
+        """
+        Get regional average of all sensors with enhanced statistics
+        Served from the running regional aggregates; the region's sensors are
+        only fetched when neither the RTDB listener nor a recent fetch keeps
+        the aggregates current.
+        """
+        region_sensor_ids = [
+            sensor_id
+            for sensor_id, location in self.sensor_locations.items()
+            if location.get("region") == region
         ]
-
-        if not region_sensors:
+        if not region_sensor_ids:
             logger.warning(f"⚠️ No sensors found for region: {region}")
             return self._get_regional_defaults(region)
 
-        # Calculate comprehensive statistics
-        ph_values = []
-        temp_values = []
-        soil_temp_values = []
-        humidity_values = []
-        active_sensors = 0
-
-        for sensor in region_sensors:
-            if sensor.get("status") in ["active", "default"]:
-                active_sensors += 1
-
-            # Safely extract and validate values
-            for value_list, key in [
-                (ph_values, "ph"),
-                (temp_values, "temperature"),
-                (soil_temp_values, "soil_temperature"),
-                (humidity_values, "humidity"),
-            ]:
-                val = sensor.get(key)
-                if val is not None:
-                    try:
-                        value_list.append(float(val))
-                    except (ValueError, TypeError):
-                        logger.warning(f"⚠️ Invalid {key} value: {val}")
-
-        # Calculate averages with fallbacks
+        timed_out = []
+        if not self._aggregates_current(region, region_sensor_ids):
+            # Fetched readings land in the aggregates through _update_cache
+            timed_out = self.collect_sensors_data(region_sensor_ids)["timed_out"]
+            self.aggregates.mark_refreshed(region, source="enhanced_iot")
+
+        summary = self.aggregates.summary(region)
+        if summary is None:
+            logger.warning(f"⚠️ No live sensor readings for region: {region}")
+            return {
+                **self._get_regional_defaults(region),
+                "timed_out_sensors": timed_out,
+            }
+
         result = {
-            "ph": round(sum(ph_values) / len(ph_values) if ph_values else 6.5, 2),
-            "temperature": round(
-                sum(temp_values) / len(temp_values) if temp_values else 29.6, 1
-            ),
-            "soil_temperature": round(
-                (
-                    sum(soil_temp_values) / len(soil_temp_values)
-                    if soil_temp_values
-                    else 25.0
-                ),
-                1,
-            ),
-            "humidity": round(
-                (
-                    sum(humidity_values) / len(humidity_values)
-                    if humidity_values
-                    else 60.0
-                ),
-                1,
+            **regional_average_result(
+                summary,
+                {
+                    "ph": 6.5,
+                    "temperature": 29.6,
+                    "soil_temperature": 25.0,
+                    "humidity": 60.0,
+                },
             ),
-            "sensor_count": len(region_sensors),
-            "active_sensors": active_sensors,
             "region": region,
-            "last_updated": datetime.now(timezone.utc).isoformat(),
+            "last_updated": summary["last_updated"],
+            "timed_out_sensors": timed_out,
         }
 
         logger.info(f"📊 Regional averages for {region}: {result}")
         return result
 
+    def _aggregates_current(self, region: str, sensor_ids: List[str]) -> bool:
+        """Whether the region's aggregates can be served without fetching"""
+        if self.aggregates.is_fresh(
+            region, self._aggregates_refresh_seconds, source="enhanced_iot"
+        ):
+            return True
+        # Live streams only push changes, so a quiet sensor's reading may have
+        # aged out of the aggregates and needs fetching again
+        listener = self.rtdb_listener
+        return (
+            listener is not None
+            and all(listener.is_live(sensor_id) for sensor_id in sensor_ids)
+            and self.aggregates.covers(region, sensor_ids)
+        )
+
     def _get_regional_defaults(self, region: str) -> Dict[str, Union[float, int, str]]:
         """Get default values for a region when no sensors are available"""
         regional_defaults = {
@@ -771,22 +761,28 @@ class EnhancedIoTService:
     ) -> Dict[str, Union[float, int, str, None]]:
         """
         Get real-time IoT sensor data WITHOUT caching - always fetches fresh data
-        This method bypasses the cache and directly queries Firebase for live updates
+        This method bypasses the cache and directly queries Firebase for live updates,
+        unless the RTDB listener is connected: its pushed readings are already fresh
+        and come with version, age_seconds and stale fields
         """
         logger.info(f"🔴 REAL-TIME: Fetching live data for sensor: {sensor_id}")
 
+        # Served from memory while the RTDB listener is connected
+        live = self._listener_reading(sensor_id)
+        if live is not None:
+            return live
+
         try:
             # Always fetch fresh data from Firebase - no cache
-            sensor_data = self._fetch_from_realtime_db(sensor_id)
+            reading = self._read_from_realtime_db(sensor_id)
 
-            if sensor_data:
-                reading = self._parse_sensor_data(sensor_id, sensor_data)
-                if reading and reading.is_valid():
-                    result = reading.to_dict()
-                    # Update cache but don't use it for this request
-                    self._update_cache(sensor_id, result)
-                    logger.info(f"✅ REAL-TIME: Fresh data retrieved for {sensor_id}")
-                    return result
+            if reading and reading.is_valid():
+                result = reading.to_dict()
+                # Update cache but don't use it for this request
+                self._update_cache(sensor_id, result)
+                self.latest_values.put(sensor_id, result, source="poll")
+                logger.info(f"✅ REAL-TIME: Fresh data retrieved for {sensor_id}")
+                return result
 
             # Fallback to Firestore if available
             if self.firestore_client:
@@ -813,4 +809,4 @@ class EnhancedIoTService:
 
 
 # Global instance
-enhanced_iot_service = EnhancedIoTService()
+enhanced_iot_service = service_container.lazy("enhanced_iot_service")
@@ -8,6 +8,36 @@ import pandas as pd
 from datetime import datetime, timedelta
 from typing import Dict, Optional, List, Union, Any
 import json
+from .container import service_container
+
+# Season-specific adjustments for Bhairahawa region
+SEASON_ADJUSTMENTS = {
+    "kharif": {  # Monsoon season (June-October)
+        "rainfall_multiplier": 1.5,
+        "humidity_adjustment": 5.0,
+    },
+    "rabi": {  # Winter season (November-April)
+        "rainfall_multiplier": 0.3,
+        "humidity_adjustment": -10.0,
+    },
+    "zaid": {  # Summer season (March-June)
+        "rainfall_multiplier": 0.5,
+        "humidity_adjustment": -5.0,
+    },
+}
+
+# Calendar months of each crop season
+SEASON_MONTHS = {
+    "kharif": (6, 7, 8, 9, 10),
+    "rabi": (11, 12, 1, 2, 3, 4),
+    "zaid": (3, 4, 5, 6),
+}
+
+# Open-Meteo serves at most 16 forecast days
+MAX_FORECAST_DAYS = 16
+
+# Mean daily rainfall times this gives a season's average monthly total
+DAYS_PER_MONTH = 30.44
 
 
 class EnhancedWeatherService:
@@ -86,14 +116,27 @@ class EnhancedWeatherService:
         self, region: str = "Bhairahawa-Butwal"
     ) -> List[Dict[str, float]]:
         """Get 7-day weather forecast for the region"""
+        return self.get_daily_forecast(region, days=7)
+
+    def get_daily_forecast(
+        self, region: str = "Bhairahawa-Butwal", days: int = 7
+    ) -> List[Dict[str, float]]:
+        """
+        Daily forecast for up to 16 days
+        Returns: [{"date", "temperature": °C, "rainfall": mm, "humidity": %}]
+        """
         try:
             coords = self.region_coords.get(region, self.region_coords["default"])
 
             params = {
                 "latitude": coords["lat"],
                 "longitude": coords["lon"],
-                "daily": ["rain_sum", "relative_humidity_2m_mean"],
-                "forecast_days": 7,
+                "daily": [
+                    "temperature_2m_mean",
+                    "rain_sum",
+                    "relative_humidity_2m_mean",
+                ],
+                "forecast_days": max(1, min(days, MAX_FORECAST_DAYS)),
             }
 
             response = requests.get(self.base_url, params=params, timeout=10)
@@ -103,26 +146,28 @@ class EnhancedWeatherService:
                 daily = data.get("daily", {})
 
                 dates = daily.get("time", [])
+                temperature = daily.get("temperature_2m_mean", [])
                 rainfall = daily.get("rain_sum", [])
                 humidity = daily.get("relative_humidity_2m_mean", [])
 
                 forecast = []
                 for i, date in enumerate(dates):
                     if i < len(rainfall) and i < len(humidity):
-                        forecast.append(
-                            {
-                                "date": date,
-                                "rainfall": rainfall[i] or 0.0,
-                                "humidity": humidity[i] or 65.0,
-                            }
-                        )
+                        day = {
+                            "date": date,
+                            "rainfall": rainfall[i] or 0.0,
+                            "humidity": humidity[i] or 65.0,
+                        }
+                        if i < len(temperature) and temperature[i] is not None:
+                            day["temperature"] = temperature[i]
+                        forecast.append(day)
 
                 return forecast
 
             return []
 
         except Exception as e:
-            print(f"Error fetching weekly forecast: {e}")
+            print(f"Error fetching daily forecast: {e}")
             return []
 
     def get_historical_data(
@@ -187,6 +232,70 @@ class EnhancedWeatherService:
                 "region": region,
             }
 
+    def get_seasonal_averages(
+        self, region: str = "Bhairahawa-Butwal"
+    ) -> Dict[str, Dict[str, float]]:
+        """
+        Per-season weather from the past year of daily archive data, in one call
+        Returns: {"kharif": {"temperature", "humidity", "rainfall", "days"}, ...}
+        where rainfall is the season's average monthly total. Empty on failure.
+        """
+        try:
+            coords = self.region_coords.get(region, self.region_coords["default"])
+
+            # The archive lags real time by a few days
+            end_date = datetime.now().date() - timedelta(days=5)
+            start_date = end_date - timedelta(days=365)
+
+            params = {
+                "latitude": coords["lat"],
+                "longitude": coords["lon"],
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat(),
+                "daily": [
+                    "temperature_2m_mean",
+                    "rain_sum",
+                    "relative_humidity_2m_mean",
+                ],
+            }
+
+            archive_url = "https://archive-api.open-meteo.com/v1/archive"
+            response = requests.get(archive_url, params=params, timeout=15)
+
+            if response.status_code != 200:
+                return {}
+
+            daily = response.json().get("daily", {})
+            frame = pd.DataFrame(
+                {
+                    "date": pd.to_datetime(daily.get("time", [])),
+                    "temperature": daily.get("temperature_2m_mean", []),
+                    "rainfall": daily.get("rain_sum", []),
+                    "humidity": daily.get("relative_humidity_2m_mean", []),
+                }
+            ).dropna()
+            if frame.empty:
+                return {}
+
+            averages = {}
+            for season, months in SEASON_MONTHS.items():
+                days = frame[frame["date"].dt.month.isin(months)]
+                if days.empty:
+                    continue
+                averages[season] = {
+                    "temperature": round(float(days["temperature"].mean()), 1),
+                    "humidity": round(float(days["humidity"].mean()), 1),
+                    "rainfall": round(
+                        float(days["rainfall"].mean()) * DAYS_PER_MONTH, 1
+                    ),
+                    "days": int(len(days)),
+                }
+            return averages
+
+        except Exception as e:
+            print(f"Error fetching seasonal weather averages: {e}")
+            return {}
+
     def get_crop_season_weather(
         self, region: str = "Bhairahawa-Butwal", season: str = "kharif"
     ) -> Dict[str, Union[float, str]]:
@@ -195,24 +304,13 @@ class EnhancedWeatherService:
         Season types: kharif (monsoon), rabi (winter), zaid (summer)
         """
         current_weather = self.get_current_weather_data(region)
+        return self.adjust_for_season(current_weather, region, season)
 
-        # Season-specific adjustments for Bhairahawa region
-        season_adjustments = {
-            "kharif": {  # Monsoon season (June-October)
-                "rainfall_multiplier": 1.5,
-                "humidity_adjustment": 5.0,
-            },
-            "rabi": {  # Winter season (November-April)
-                "rainfall_multiplier": 0.3,
-                "humidity_adjustment": -10.0,
-            },
-            "zaid": {  # Summer season (March-June)
-                "rainfall_multiplier": 0.5,
-                "humidity_adjustment": -5.0,
-            },
-        }
-
-        adjustments = season_adjustments.get(season, season_adjustments["kharif"])
+    def adjust_for_season(
+        self, current_weather: Dict[str, Any], region: str, season: str
+    ) -> Dict[str, Union[float, str]]:
+        """Apply a season's rainfall/humidity adjustments to a weather reading"""
+        adjustments = SEASON_ADJUSTMENTS.get(season, SEASON_ADJUSTMENTS["kharif"])
 
         # Apply seasonal adjustments with proper type conversion
         rainfall_val = current_weather.get("rainfall", 22.5)
@@ -280,7 +378,7 @@ class EnhancedWeatherService:
 
 
 # Global instance
-enhanced_weather_service = EnhancedWeatherService()
+enhanced_weather_service = service_container.lazy("enhanced_weather_service")
 
 
 # Example usage and testing
@@ -7,6 +7,8 @@ from datetime import datetime, timezone
 from typing import Dict, List, Optional, Any
 from firebase_admin import db, firestore
 import firebase_admin
+from django.conf import settings
+from .container import service_container
 
 
 class RefactoredFirebaseService:
@@ -33,7 +35,9 @@ class RefactoredFirebaseService:
                     print("🔄 Continuing with Realtime Database only")
                     self.firestore_client = None
 
-                self._test_connection()
+                # Opt-in: the check is a network write on every worker start
+                if getattr(settings, "FIREBASE_CONNECTION_TEST", False):
+                    self._test_connection()
             else:
                 raise Exception("Firebase not initialized in Django settings")
         except Exception as e:
@@ -446,4 +450,4 @@ class RefactoredFirebaseService:
 
 
 # Global instance
-firebase_service = RefactoredFirebaseService()
+firebase_service = service_container.lazy("firebase_service")
@@ -9,6 +9,7 @@ from firebase_admin import firestore
 import firebase_admin
 from django.contrib.auth import get_user_model
 import logging
+from .container import service_container
 
 logger = logging.getLogger(__name__)
 
@@ -293,4 +294,4 @@ class FirestoreUserService:
 
 
 # Global instance
-firestore_user_service = FirestoreUserService()
+firestore_user_service = service_container.lazy("firestore_user_service")
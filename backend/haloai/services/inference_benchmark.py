@@ -0,0 +1,247 @@
+"""
+Inference Benchmark
+Measures the crop prediction stack on synthetic inputs drawn from the
+training feature ranges: cold model load, single-row latency percentiles,
+batch throughput and per-model memory. Results are plain JSON so runs can
+be stored and compared against a baseline.
+"""
+
+import json
+import platform
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .real_ml_prediction_service import FEATURE_ORDER, FEATURE_RANGES
+
+DEFAULT_BATCH_SIZES = (1, 100, 10_000)
+
+# Metric direction: latency and load time should not grow, throughput not shrink
+LOWER_IS_BETTER = ("latency_ms", "cold_load")
+HIGHER_IS_BETTER = ("throughput_rows_per_second",)
+
+# Reported but too noisy run-to-run to gate on
+UNGATED_METRICS = (".p99", ".mean", ".samples")
+
+
+def synthetic_features(n_rows: int, seed: int = 42) -> np.ndarray:
+    """(n_rows, 7) matrix sampled uniformly from the training ranges"""
+    rng = np.random.default_rng(seed)
+    low = np.array([FEATURE_RANGES[name][0] for name in FEATURE_ORDER])
+    high = np.array([FEATURE_RANGES[name][1] for name in FEATURE_ORDER])
+    return rng.uniform(low, high, size=(n_rows, len(FEATURE_ORDER)))
+
+
+def percentiles(samples_ms: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99 and mean of a list of latencies in milliseconds"""
+    values = np.asarray(samples_ms, dtype=float)
+    return {
+        "p50": round(float(np.percentile(values, 50)), 4),
+        "p95": round(float(np.percentile(values, 95)), 4),
+        "p99": round(float(np.percentile(values, 99)), 4),
+        "mean": round(float(values.mean()), 4),
+        "samples": int(len(values)),
+    }
+
+
+def time_calls(fn: Callable[[Any], Any], inputs: Sequence[Any]) -> List[float]:
+    """Wall-clock milliseconds of fn for each input"""
+    samples = []
+    for item in inputs:
+        started = time.perf_counter()
+        fn(item)
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return samples
+
+
+class InferenceBenchmark:
+    """Benchmark runner for RealMLPredictionService and EnhancedCropPredictionService"""
+
+    def __init__(
+        self,
+        latency_samples: int = 200,
+        batch_sizes: Sequence[int] = DEFAULT_BATCH_SIZES,
+        seed: int = 42,
+        min_throughput_seconds: float = 0.5,
+    ):
+        self.latency_samples = latency_samples
+        self.batch_sizes = list(batch_sizes)
+        self.seed = seed
+        self.min_throughput_seconds = min_throughput_seconds
+
+    def run(self) -> Dict[str, Any]:
+        """Run every measurement and return the JSON-serialisable report"""
+        from .model_registry import ModelRegistry
+        from .real_ml_prediction_service import RealMLPredictionService
+
+        # A private registry so the load is cold even if the shared one is warm
+        registry = ModelRegistry()
+        started = time.perf_counter()
+        registry.get_models()
+        cold_load_seconds = time.perf_counter() - started
+
+        service = RealMLPredictionService()
+        service.model_registry = registry
+        service.prediction_cache.enabled = False
+        service.latency_budget.enabled = False
+
+        features = synthetic_features(self.latency_samples, self.seed)
+        rows = [features[i : i + 1] for i in range(len(features))]
+        inputs = [service.features_to_input(row[0]) for row in rows]
+
+        # Warm each path once so one-off allocations are not sampled
+        service.predict_batch(rows[0])
+
+        # Per-model timings use the backend the ensemble picks for one row
+        latency = {}
+        for model_name, model in registry.models_for_batch(1).items():
+            latency[model_name] = percentiles(
+                time_calls(
+                    lambda row, model=model: service._single_model_probabilities(
+                        model, row
+                    ),
+                    rows,
+                )
+            )
+        latency["ensemble"] = percentiles(time_calls(service.predict_batch, rows))
+        latency["ensemble_with_rationale"] = percentiles(
+            time_calls(service.get_prediction_with_rationale, inputs)
+        )
+        latency["crop_prediction_service"] = self._crop_service_latency(
+            registry, inputs
+        )
+
+        throughput = {}
+        for batch_size in self.batch_sizes:
+            batch = synthetic_features(batch_size, self.seed + batch_size)
+            # Repeat small batches so the figure is not a single noisy call
+            calls = 0
+            started = time.perf_counter()
+            while True:
+                service.predict_batch(batch)
+                calls += 1
+                elapsed = time.perf_counter() - started
+                if elapsed >= self.min_throughput_seconds:
+                    break
+            throughput[str(batch_size)] = round(batch_size * calls / elapsed, 2)
+
+        memory = registry.memory_report()
+        return {
+            "meta": {
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "model_version": registry.version,
+                "ensemble_mode": service.ensemble_mode,
+                "latency_samples": self.latency_samples,
+                "seed": self.seed,
+            },
+            "cold_load": {
+                "total_seconds": round(cold_load_seconds, 4),
+                **{name: stats.get("load_seconds") for name, stats in memory.items()},
+            },
+            "latency_ms": latency,
+            "throughput_rows_per_second": throughput,
+            "memory_bytes": {
+                name: {
+                    "rss_bytes": stats.get("rss_bytes"),
+                    "file_bytes": stats.get("file_bytes"),
+                    "format": stats.get("format"),
+                }
+                for name, stats in memory.items()
+            },
+        }
+
+    def _crop_service_latency(self, registry, inputs: List[Dict[str, float]]):
+        """Single-row latency of EnhancedCropPredictionService.predict_crops"""
+        from .crop_prediction_service import EnhancedCropPredictionService
+
+        crop_service = EnhancedCropPredictionService()
+        crop_service.model_registry = registry
+        params = [
+            {
+                "N": item["nitrogen"],
+                "P": item["phosphorus"],
+                "K": item["potassium"],
+                "temperature": item["temperature"],
+                "humidity": item["humidity"],
+                "ph": item["ph"],
+                "rainfall": item["rainfall"],
+            }
+            for item in inputs
+        ]
+        crop_service.predict_crops(params[0])
+        return percentiles(time_calls(crop_service.predict_crops, params))
+
+
+# ==== BASELINE COMPARISON ====
+
+
+def _flatten(report: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """Flatten nested numeric metrics into dotted keys"""
+    flat = {}
+    for key, value in report.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = float(value)
+    return flat
+
+
+def compare_to_baseline(
+    report: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.2
+) -> List[Dict[str, Any]]:
+    """
+    Metrics that regressed by more than threshold (0.2 = 20%) versus baseline
+    Only p50/p95 latency, total cold load and throughput are compared; tail
+    latencies, per-model load times and memory vary too much between runs.
+    """
+    current = _flatten(report)
+    previous = _flatten(baseline)
+    regressions = []
+
+    for key, old in previous.items():
+        new = current.get(key)
+        if new is None or old <= 0 or key.endswith(UNGATED_METRICS):
+            continue
+        if key.startswith("cold_load.") and key != "cold_load.total_seconds":
+            continue
+        section = key.split(".", 1)[0]
+        if section in LOWER_IS_BETTER:
+            change = (new - old) / old
+        elif section in HIGHER_IS_BETTER:
+            change = (old - new) / old
+        else:
+            continue
+        if change > threshold:
+            regressions.append(
+                {
+                    "metric": key,
+                    "baseline": old,
+                    "current": new,
+                    "regression": round(change, 4),
+                }
+            )
+
+    return regressions
+
+
+def load_report(path: Path) -> Optional[Dict[str, Any]]:
+    """Read a stored benchmark report, or None if it does not exist"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_report(report: Dict[str, Any], path: Path):
+    """Write a benchmark report as indented JSON"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
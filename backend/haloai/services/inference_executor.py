@@ -0,0 +1,265 @@
+"""
+Inference Executor
+Optional pool of worker processes for CPU-bound model inference.
+Each worker loads the model registry once; feature matrices and class
+probabilities are exchanged through shared memory instead of pickling.
+"""
+
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+
+class InferenceUnavailable(Exception):
+    """Raised when the pool cannot take or finish a call (full, timed out, broken)"""
+
+
+# ==== WORKER PROCESS SIDE ====
+
+_worker_service = None
+
+
+def _init_worker(models_dir: str, pool_workers: int = 1):
+    """Load the models once per worker process"""
+    global _worker_service
+
+    import django
+
+    django.setup()
+
+    from .model_registry import ModelRegistry
+    from .real_ml_prediction_service import RealMLPredictionService
+
+    _worker_service = RealMLPredictionService()
+    _worker_service.model_registry = ModelRegistry(models_dir)
+    # Every web process may run its own pool, so split the CPUs across both
+    budget = _worker_service.model_registry.thread_budget
+    budget.configure(budget.processes * pool_workers, profile="inference-pool")
+    _worker_service.model_registry.get_models()
+
+
+def _worker_probabilities(
+    input_name: str,
+    shape: Tuple[int, int],
+    output_name: str,
+    output_shape: Tuple[int, int, int],
+) -> List[str]:
+    """Score a shared-memory feature matrix and write probabilities back"""
+    input_block = shared_memory.SharedMemory(name=input_name)
+    output_block = shared_memory.SharedMemory(name=output_name)
+    try:
+        features = np.ndarray(shape, dtype=np.float64, buffer=input_block.buf)
+        output = np.ndarray(output_shape, dtype=np.float64, buffer=output_block.buf)
+
+        probabilities = _worker_service._model_probabilities(features)
+        model_names = list(probabilities.keys())[: output_shape[0]]
+        for index, model_name in enumerate(model_names):
+            output[index] = probabilities[model_name]
+
+        del features, output
+        return model_names
+    finally:
+        input_block.close()
+        output_block.close()
+
+
+# ==== PARENT PROCESS SIDE ====
+
+
+class _PoolCall:
+    """
+    Shared memory and queue slot of one pool call
+    Both are freed once the caller and, if submitted, the task are done
+    with them, whichever finishes last.
+    """
+
+    def __init__(self, slots: threading.BoundedSemaphore):
+        self.slots = slots
+        self.input_block: Optional[shared_memory.SharedMemory] = None
+        self.output_block: Optional[shared_memory.SharedMemory] = None
+        self._holders = 1
+        self._lock = threading.Lock()
+
+    def hold(self):
+        with self._lock:
+            self._holders += 1
+
+    def read_output(
+        self, output_shape: Tuple[int, int, int], model_names: List[str]
+    ) -> Dict[str, np.ndarray]:
+        """Copy each model's probabilities out of the output block"""
+        output = np.ndarray(
+            output_shape, dtype=np.float64, buffer=self.output_block.buf
+        )
+        try:
+            return {
+                name: output[index].copy() for index, name in enumerate(model_names)
+            }
+        finally:
+            # Views must be gone before the block can be closed
+            del output
+
+    def release(self):
+        with self._lock:
+            self._holders -= 1
+            if self._holders:
+                return
+        for block in (self.input_block, self.output_block):
+            if block is not None:
+                block.close()
+                block.unlink()
+        self.slots.release()
+
+
+class InferenceExecutor:
+    """Runs ensemble probability computation in a bounded pool of processes"""
+
+    def __init__(
+        self,
+        models_dir: str,
+        n_models: int,
+        n_classes: int,
+        enabled: bool = False,
+        workers: int = 2,
+        max_queue: int = 8,
+        timeout_seconds: float = 5.0,
+        start_method: str = "spawn",
+    ):
+        self.models_dir = str(models_dir)
+        self.n_models = n_models
+        self.n_classes = n_classes
+        self.enabled = enabled
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout_seconds = timeout_seconds
+        self.start_method = start_method
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._counters = {"submitted": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+
+    def model_probabilities(self, features: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Compute aligned class probabilities for a feature matrix in the pool
+        Raises InferenceUnavailable when the queue is full, the call times out
+        or fails in the pool for any reason; callers fall back to in-process
+        execution.
+        """
+        if not self._slots.acquire(blocking=False):
+            self._counters["rejected"] += 1
+            raise InferenceUnavailable("Inference queue is full")
+
+        call = _PoolCall(self._slots)
+        try:
+            features = np.ascontiguousarray(features, dtype=np.float64)
+            output_shape = (self.n_models, features.shape[0], self.n_classes)
+            call.input_block = shared_memory.SharedMemory(
+                create=True, size=max(1, features.nbytes)
+            )
+            call.output_block = shared_memory.SharedMemory(
+                create=True, size=max(1, int(np.prod(output_shape)) * 8)
+            )
+            np.ndarray(features.shape, dtype=np.float64, buffer=call.input_block.buf)[
+                :
+            ] = features
+
+            future = self._get_pool().submit(
+                _worker_probabilities,
+                call.input_block.name,
+                features.shape,
+                call.output_block.name,
+                output_shape,
+            )
+            self._counters["submitted"] += 1
+            # A running task cannot be cancelled: it keeps its shared memory
+            # and its queue slot until it actually finishes
+            call.hold()
+            future.add_done_callback(lambda _: call.release())
+
+            try:
+                model_names = future.result(timeout=self.timeout_seconds)
+            except FutureTimeoutError:
+                future.cancel()
+                self._counters["timeouts"] += 1
+                raise InferenceUnavailable(
+                    f"Inference timed out after {self.timeout_seconds}s"
+                )
+            return call.read_output(output_shape, model_names)
+
+        except InferenceUnavailable:
+            raise
+        except BrokenProcessPool as e:
+            self._counters["errors"] += 1
+            self._reset_pool()
+            raise InferenceUnavailable(f"Inference pool failed: {e}")
+        except Exception as e:
+            self._counters["errors"] += 1
+            raise InferenceUnavailable(f"Inference failed in the pool: {e}")
+
+        finally:
+            call.release()
+
+    def stats(self) -> Dict[str, object]:
+        """Pool configuration and call counters"""
+        return {
+            "enabled": self.enabled,
+            "running": self._pool is not None,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "timeout_seconds": self.timeout_seconds,
+            **self._counters,
+        }
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Start the pool on first use"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context(self.start_method),
+                        initializer=_init_worker,
+                        initargs=(self.models_dir, self.workers),
+                    )
+                    atexit.register(self.shutdown)
+        return self._pool
+
+    def _reset_pool(self):
+        """Discard a broken pool so the next call starts a fresh one"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def build_inference_executor(
+    models_dir: str, model_names: Sequence[str], n_classes: int
+) -> InferenceExecutor:
+    """Create an InferenceExecutor from the ML_INFERENCE_EXECUTOR setting"""
+    config = getattr(settings, "ML_INFERENCE_EXECUTOR", {})
+    return InferenceExecutor(
+        models_dir,
+        n_models=len(model_names),
+        n_classes=n_classes,
+        enabled=bool(config.get("ENABLED", False)),
+        workers=int(config.get("WORKERS", 2)),
+        max_queue=int(config.get("MAX_QUEUE", 8)),
+        timeout_seconds=float(config.get("TIMEOUT_SECONDS", 5.0)),
+        start_method=config.get("START_METHOD", "spawn"),
+    )
@@ -8,8 +8,11 @@ Example: 6.5,29.6
 import json
 from datetime import datetime
 from typing import Dict, Optional, Tuple, Union, Any
+from django.conf import settings
 from firebase_admin import db
 from .firebase_service_refactored import firebase_service
+from .container import service_container
+from .regional_aggregates import regional_aggregates, regional_average_result
 
 
 class IoTDataService:
@@ -63,17 +66,20 @@ class IoTDataService:
                         "timestamp": sensor_data.get("timestamp", None),
                     }
                     print(f"✅ Successfully mapped Firebase data: {mapped_data}")
+                    self._record_reading(sensor_id, mapped_data)
                     return mapped_data
 
                 # Legacy support for comma-separated format
                 elif isinstance(sensor_data, str) and "," in sensor_data:
                     values = sensor_data.split(",")
                     if len(values) >= 2:
-                        return {
+                        mapped_data = {
                             "ph": float(values[0].strip()),
                             "temperature": float(values[1].strip()),
                             "timestamp": None,
                         }
+                        self._record_reading(sensor_id, mapped_data)
+                        return mapped_data
 
             # No data found
             print("⚠️ No valid sensor data found, using defaults")
@@ -105,13 +111,18 @@ class IoTDataService:
         """
         Get regional average of all sensors in the specified region
         Now includes all sensor data: ph, temperature, soil_temperature, humidity
+        Served from the shared regional aggregates, refreshed by fetching the
+        region's sensors when they are older than IOT_REGIONAL_REFRESH_SECONDS
         """
-        all_data = self.get_all_sensors_data()
-        region_sensors = [
-            data for data in all_data.values() if data.get("region") == region
-        ]
-
-        if not region_sensors:
+        refresh_seconds = getattr(settings, "IOT_REGIONAL_REFRESH_SECONDS", 30)
+        if not regional_aggregates.is_fresh(region, refresh_seconds, source="iot_data"):
+            for sensor_id, location in self.sensor_locations.items():
+                if location.get("region") == region:
+                    self.get_latest_sensor_data(sensor_id)
+            regional_aggregates.mark_refreshed(region, source="iot_data")
+
+        summary = regional_aggregates.summary(region)
+        if summary is None:
             return {
                 "ph": 6.5,
                 "temperature": 29.6,
@@ -120,51 +131,36 @@ class IoTDataService:
                 "sensor_count": 0,
             }
 
-        # Calculate averages for all sensor types
-        ph_values = []
-        temp_values = []
-        soil_temp_values = []
-        humidity_values = []
-
-        for sensor in region_sensors:
-            # Extract values safely
-            for value_list, key in [
-                (ph_values, "ph"),
-                (temp_values, "temperature"),
-                (soil_temp_values, "soil_temperature"),
-                (humidity_values, "humidity"),
-            ]:
-                val = sensor.get(key)
-                if val is not None:
-                    try:
-                        value_list.append(float(val))
-                    except (ValueError, TypeError):
-                        pass
-
-        # Calculate averages with fallbacks
-        avg_ph = sum(ph_values) / len(ph_values) if ph_values else 6.5
-        avg_temp = sum(temp_values) / len(temp_values) if temp_values else 29.6
-        avg_soil_temp = (
-            sum(soil_temp_values) / len(soil_temp_values) if soil_temp_values else 25.0
-        )
-        avg_humidity = (
-            sum(humidity_values) / len(humidity_values) if humidity_values else 60.0
+        result = regional_average_result(
+            summary,
+            self._get_default_sensor_data(),
+            temperature_field="air_temperature",
         )
-
         return {
-            "ph": round(avg_ph, 2),
-            "temperature": round(avg_temp, 1),
-            "soil_temperature": round(avg_soil_temp, 1),
-            "humidity": round(avg_humidity, 1),
-            "sensor_count": len(region_sensors),
+            name: result[name]
+            for name in (
+                "ph",
+                "temperature",
+                "soil_temperature",
+                "humidity",
+                "sensor_count",
+                "active_sensors",
+                "statistics",
+            )
         }
 
     def store_sensor_reading(
-        self, sensor_id: str, ph: float, temperature: float
+        self,
+        sensor_id: str,
+        ph: float,
+        temperature: float,
+        humidity: Optional[float] = None,
+        soil_temperature: Optional[float] = None,
     ) -> bool:
         """
         Store new sensor reading to Firebase
-        Format: ph,temperature
+        Format: ph,temperature (humidity and soil temperature, when given, are
+        stored alongside)
         """
         try:
             ref = db.reference(f"iot_sensors/{sensor_id}")
@@ -172,14 +168,26 @@ class IoTDataService:
 
             # Store in comma-separated format as specified
             data_string = f"{ph},{temperature}"
+            extra = {
+                name: value
+                for name, value in (
+                    ("humidity", humidity),
+                    ("soil_temperature", soil_temperature),
+                )
+                if value is not None
+            }
 
             ref.update(
                 {
                     "latest": data_string,
                     "timestamp": timestamp,
                     "history": {timestamp: data_string},
+                    **extra,
                 }
             )
+            self._record_reading(
+                sensor_id, {"ph": ph, "temperature": temperature, **extra}
+            )
 
             return True
 
@@ -187,6 +195,25 @@ class IoTDataService:
             print(f"Error storing sensor data: {e}")
             return False
 
+    def _record_reading(self, sensor_id: str, data: Dict[str, Any]):
+        """
+        Merge the sensor's reading into the shared regional aggregates
+        This service's temperature is the air temperature, so it is recorded as
+        air_temperature. Fields the reading lacks, including those
+        EnhancedIoTService recorded for the same sensor, keep their values.
+        """
+        region = self.sensor_locations.get(sensor_id, {}).get(
+            "region", "Bhairahawa-Butwal"
+        )
+        reading = {
+            name: data[name]
+            for name in ("ph", "soil_temperature", "humidity")
+            if name in data
+        }
+        if "temperature" in data:
+            reading["air_temperature"] = data["temperature"]
+        regional_aggregates.update(sensor_id, region, reading, merge=True)
+
     def _get_default_sensor_data(self) -> Dict[str, Union[float, int, None]]:
         """Return default sensor values when real data is unavailable"""
         return {
@@ -226,4 +253,4 @@ class IoTDataService:
 
 
 # Global instance
-iot_data_service = IoTDataService()
+iot_data_service = service_container.lazy("iot_data_service")
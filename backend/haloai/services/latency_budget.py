@@ -0,0 +1,247 @@
+"""
+Latency Budget
+Per-model inference timing for single-input ensemble requests. Every model
+call is recorded in a latency histogram; when a model's recent p95 exceeds
+its share of the per-request budget it is taken out of the synchronous
+ensemble and either run as a background shadow (so its timings stay fresh)
+or skipped and only re-probed now and then.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+# Upper bounds of the histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 250.0, 500.0, 1000.0)
+
+POLICIES = ("shadow", "skip")
+
+
+class ModelLatency:
+    """Cumulative histogram plus a sliding window of recent samples"""
+
+    def __init__(self, window: int, window_seconds: float):
+        self.window_seconds = window_seconds
+        self.samples: "deque[Tuple[float, float]]" = deque(maxlen=window)
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def record(self, elapsed_ms: float, now: float):
+        """Add one timing sample"""
+        self.samples.append((now, elapsed_ms))
+        self.buckets[np.searchsorted(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+
+    def recent(self, now: float) -> List[float]:
+        """Samples inside the time window, oldest first"""
+        while self.samples and now - self.samples[0][0] > self.window_seconds:
+            self.samples.popleft()
+        return [elapsed for _, elapsed in self.samples]
+
+    def histogram(self) -> Dict[str, int]:
+        """Bucket counts keyed by upper bound ("+inf" for the overflow bucket)"""
+        labels = [f"<={bound:g}ms" for bound in LATENCY_BUCKETS_MS] + ["+inf"]
+        return dict(zip(labels, self.buckets))
+
+
+class LatencyBudget:
+    """Tracks model latencies and decides which models a request waits for"""
+
+    def __init__(
+        self,
+        budget_ms: float = 50.0,
+        shares: Optional[Dict[str, float]] = None,
+        policy: str = "shadow",
+        enabled: bool = True,
+        window: int = 200,
+        window_seconds: float = 300.0,
+        min_samples: int = 20,
+        probe_seconds: float = 30.0,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Latency budget policy must be one of {POLICIES}")
+        self.budget_ms = budget_ms
+        self.shares = dict(shares or {})
+        self.policy = policy
+        self.enabled = enabled
+        self.window = window
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.probe_seconds = probe_seconds
+
+        self._latencies: Dict[str, ModelLatency] = {}
+        self._degraded_since: Dict[str, float] = {}
+        self._last_probe: Dict[str, float] = {}
+        self._pending: set = set()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._counters = {"degraded_requests": 0, "shadow_runs": 0, "shadow_dropped": 0}
+
+    # ==== TIMING ====
+
+    def record(self, model_name: str, elapsed_ms: float):
+        """Add one timing sample for a model"""
+        with self._lock:
+            latency = self._latencies.get(model_name)
+            if latency is None:
+                latency = ModelLatency(self.window, self.window_seconds)
+                self._latencies[model_name] = latency
+            latency.record(elapsed_ms, time.monotonic())
+
+    def timed(self, model_name: str, call: Callable[[], Any]) -> Any:
+        """Run call() and record how long it took"""
+        started = time.perf_counter()
+        try:
+            return call()
+        finally:
+            self.record(model_name, (time.perf_counter() - started) * 1000.0)
+
+    def p95_ms(self, model_name: str) -> Optional[float]:
+        """Recent p95 latency, or None until min_samples have been seen"""
+        with self._lock:
+            return self._p95(model_name, time.monotonic())
+
+    def share_ms(self, model_name: str, model_names: Sequence[str]) -> float:
+        """Part of the request budget a model may use"""
+        weights = {name: float(self.shares.get(name, 1.0)) for name in model_names}
+        total = sum(weights.values()) or 1.0
+        return self.budget_ms * weights.get(model_name, 1.0) / total
+
+    # ==== PLANNING ====
+
+    def plan(self, model_names: Sequence[str]) -> Tuple[List[str], List[str]]:
+        """
+        Split models into (synchronous, degraded)
+        A model is degraded when its recent p95 exceeds its budget share. The
+        fastest model always stays synchronous so a request never has no vote.
+        """
+        model_names = list(model_names)
+        if not self.enabled or len(model_names) < 2:
+            return model_names, []
+
+        now = time.monotonic()
+        with self._lock:
+            p95 = {name: self._p95(name, now) for name in model_names}
+            degraded = [
+                name
+                for name in model_names
+                if p95[name] is not None
+                and p95[name] > self.share_ms(name, model_names)
+            ]
+            if len(degraded) == len(model_names):
+                degraded.remove(min(degraded, key=lambda name: p95[name]))
+
+            for name in model_names:
+                if name in degraded:
+                    self._degraded_since.setdefault(name, now)
+                else:
+                    self._degraded_since.pop(name, None)
+            if degraded:
+                self._counters["degraded_requests"] += 1
+
+        return [name for name in model_names if name not in degraded], degraded
+
+    def run_degraded(self, model_name: str, call: Callable[[], Any]):
+        """
+        Run a degraded model off the request path
+        "shadow" runs it for every request (one pending run per model);
+        "skip" only probes it every probe_seconds so it can recover.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if model_name in self._pending:
+                self._counters["shadow_dropped"] += 1
+                return
+            if (
+                self.policy == "skip"
+                and now - self._last_probe.get(model_name, 0.0) < self.probe_seconds
+            ):
+                return
+            self._pending.add(model_name)
+            self._last_probe[model_name] = now
+            self._counters["shadow_runs"] += 1
+
+        def shadow():
+            try:
+                self.timed(model_name, call)
+            except Exception as e:
+                print(f"⚠️ Shadow run of {model_name} failed: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(model_name)
+
+        self._get_executor().submit(shadow)
+
+    def stats(self) -> Dict[str, Any]:
+        """Budget configuration, per-model latency summaries and histograms"""
+        now = time.monotonic()
+        with self._lock:
+            models = {}
+            for name, latency in self._latencies.items():
+                recent = latency.recent(now)
+                models[name] = {
+                    "count": latency.count,
+                    "mean_ms": (
+                        round(latency.total_ms / latency.count, 3)
+                        if latency.count
+                        else 0.0
+                    ),
+                    "p50_ms": (
+                        round(float(np.percentile(recent, 50)), 3) if recent else None
+                    ),
+                    "p95_ms": self._p95(name, now),
+                    "recent_samples": len(recent),
+                    "degraded": name in self._degraded_since,
+                    "histogram": latency.histogram(),
+                }
+            return {
+                "enabled": self.enabled,
+                "budget_ms": self.budget_ms,
+                "policy": self.policy,
+                "models": models,
+                **self._counters,
+            }
+
+    # ==== INTERNALS ====
+
+    def _p95(self, model_name: str, now: float) -> Optional[float]:
+        """Recent p95 for a model (lock held)"""
+        latency = self._latencies.get(model_name)
+        if latency is None:
+            return None
+        recent = latency.recent(now)
+        if len(recent) < self.min_samples:
+            return None
+        return round(float(np.percentile(recent, 95)), 3)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Single background thread for shadow runs, started on first use"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=1, thread_name_prefix="ml-shadow"
+                    )
+        return self._executor
+
+
+def build_latency_budget() -> LatencyBudget:
+    """Create a LatencyBudget from the ML_LATENCY_BUDGET setting"""
+    config = getattr(settings, "ML_LATENCY_BUDGET", {})
+    return LatencyBudget(
+        budget_ms=float(config.get("BUDGET_MS", 50.0)),
+        shares=config.get("SHARES"),
+        policy=config.get("POLICY", "shadow"),
+        enabled=bool(config.get("ENABLED", False)),
+        window=int(config.get("WINDOW", 200)),
+        window_seconds=float(config.get("WINDOW_SECONDS", 300)),
+        min_samples=int(config.get("MIN_SAMPLES", 20)),
+        probe_seconds=float(config.get("PROBE_SECONDS", 30)),
+    )
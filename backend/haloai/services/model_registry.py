@@ -0,0 +1,582 @@
+"""
+Model Registry
+Single, lazily-loaded home for the trained crop prediction models.
+Artifacts are converted once into faster-loading formats. Only arrays that
+survive unpickling are memory-mapped and shared by forked workers: the SVM's
+support vectors and coefficients, and the compiled evaluators' arrays.
+sklearn trees copy their node arrays when unpickled and XGBoost reads its
+UBJ model into its own heap, so each worker holds a private copy of those.
+A watcher thread notices new artifacts, loads and smoke-tests them off to
+the side and swaps the whole model set in at once, so deployments need no
+worker restart and in-flight predictions finish on the models they started
+with.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Any, Tuple
+
+import joblib
+import numpy as np
+from django.conf import settings
+
+from .thread_budget import build_thread_budget
+
+
+class ModelGeneration:
+    """One loaded set of models, replaced as a whole on reload"""
+
+    def __init__(
+        self,
+        version: str,
+        models: Optional[Dict[str, Any]] = None,
+        stats: Optional[Dict[str, Dict[str, Any]]] = None,
+        compiled: Optional[Dict[str, Any]] = None,
+    ):
+        self.version = version
+        self.models = models or {}
+        self.stats = stats or {}
+        self.compiled = compiled
+        self.loaded_at = time.time()
+
+
+class ModelRegistry:
+    """Loads each model artifact once per process, on first use"""
+
+    MODEL_FILES = {
+        "xgboost": "xgboost_model.pkl",
+        "random_forest": "random_forest_model.pkl",
+        "svm": "svm_model.pkl",
+    }
+
+    # Sub-directory of the models dir holding the converted artifacts
+    CACHE_DIRNAME = "registry"
+
+    def __init__(self, models_dir: Optional[os.PathLike] = None):
+        self.models_dir = Path(
+            models_dir
+            or getattr(
+                settings,
+                "ML_MODELS_DIR",
+                Path(settings.BASE_DIR).parent / "ml" / "models",
+            )
+        )
+        self.cache_dir = self.models_dir / self.CACHE_DIRNAME
+        reload_config = getattr(settings, "ML_MODEL_RELOAD", {})
+        self.reload_enabled = bool(reload_config.get("ENABLED", False))
+        self.reload_interval = float(reload_config.get("INTERVAL_SECONDS", 10))
+        self.version_file = self.models_dir / reload_config.get(
+            "VERSION_FILE", "VERSION"
+        )
+        self.smoke_rows = int(reload_config.get("SMOKE_ROWS", 64))
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._watcher_pid: Optional[int] = None
+        self._stop_watching: Optional[threading.Event] = None
+        self._reload_stats = {
+            "reloads": 0,
+            "rejected": 0,
+            "last_reload_at": None,
+            "last_reload_seconds": None,
+            "last_error": None,
+        }
+        self.thread_budget = build_thread_budget()
+        self._generation = ModelGeneration(self._compute_version())
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    @property
+    def version(self) -> str:
+        """Fingerprint of the artifacts the current models were loaded from"""
+        return self._generation.version
+
+    # ==== PUBLIC API ====
+
+    def get_models(self) -> Dict[str, Any]:
+        """Return every available model, loading them on first access"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    version = self._compute_version()
+                    models, stats = self._load_all()
+                    self._generation = ModelGeneration(version, models, stats)
+                    self._loaded = True
+                    self.thread_budget.limit_native_pools()
+                    print(f"📊 Model registry ready with {len(models)} models")
+        # Threads do not survive fork: restart a watcher the parent process ran
+        if self._watcher is not None and self._watcher_pid != os.getpid():
+            self.start_watching()
+        return self._generation.models
+
+    def get(self, model_name: str) -> Optional[Any]:
+        """Return a single model by name, or None if it is unavailable"""
+        return self.get_models().get(model_name)
+
+    def get_compiled_models(self) -> Dict[str, Any]:
+        """
+        Array-backed evaluators for the tree ensembles, compiled on first access
+        The RBF SVM is included only with ML_SVM_COMPILER_ENABLED; models that
+        cannot be compiled are not included.
+        """
+        self.get_models()
+        return self._compiled_for(self._generation)
+
+    def models_for_batch(self, n_rows: int) -> Dict[str, Any]:
+        """
+        Models to score a batch of n_rows with, per ML_INFERENCE_BACKEND
+        "auto" uses a compiled evaluator only up to its ML_COMPILED_MAX_ROWS
+        entry, where it beats the library's per-call overhead; larger batches
+        go to the native model. Thread counts follow the thread budget for
+        n_rows.
+        """
+        backend = getattr(settings, "ML_INFERENCE_BACKEND", "native")
+        self.get_models()
+        # One generation for the whole batch, even if a reload swaps mid-call
+        generation = self._generation
+        if backend == "native":
+            return self.thread_budget.apply(generation.models, n_rows)
+
+        max_rows = getattr(settings, "ML_COMPILED_MAX_ROWS", {})
+        selected = dict(generation.models)
+        for model_name, evaluator in self._compiled_for(generation).items():
+            if backend == "compiled" or n_rows <= max_rows.get(model_name, 0):
+                selected[model_name] = evaluator
+        return self.thread_budget.apply(selected, n_rows)
+
+    def is_loaded(self) -> bool:
+        """Whether the registry has already loaded its artifacts"""
+        return self._loaded
+
+    def memory_report(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-model load statistics
+        rss_bytes is the growth in process resident memory while the model was
+        loaded; mapped_bytes is the part of the model left in memory-mapped
+        arrays, which only counts once touched and is shared between workers.
+        """
+        return {name: dict(stats) for name, stats in self._generation.stats.items()}
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Summary of the registry state for status endpoints"""
+        generation = self._generation
+        return {
+            "models_dir": str(self.models_dir),
+            "version": generation.version,
+            "loaded": self._loaded,
+            "loaded_at": generation.loaded_at,
+            "backend": getattr(settings, "ML_INFERENCE_BACKEND", "native"),
+            "models": self.memory_report(),
+            "compiled": {
+                name: evaluator.describe()
+                for name, evaluator in (generation.compiled or {}).items()
+            },
+            "threads": self.thread_budget.describe(),
+            "reload": {
+                "enabled": self.reload_enabled,
+                "watching": self._watcher is not None and self._watcher.is_alive(),
+                "interval_seconds": self.reload_interval,
+                "version_file": str(self.version_file),
+                **self._reload_stats,
+            },
+        }
+
+    # ==== HOT RELOAD ====
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Load changed artifacts next to the current ones, smoke-test them and
+        swap them in. Predictions keep using the current generation until the
+        swap, which is a single assignment. Returns True if models were swapped.
+        """
+        with self._reload_lock:
+            version = self._compute_version()
+            if not force and self._loaded and version == self.version:
+                return False
+
+            started = time.perf_counter()
+            print(f"🔄 Loading model version {version} in the background")
+            models, stats = self._load_all()
+            try:
+                missing = set(self._generation.models) - set(models)
+                if missing:
+                    raise ValueError(f"could not load {', '.join(sorted(missing))}")
+                compiled = self._compile_all(models)
+                self._smoke_test(models, compiled)
+            except Exception as e:
+                self._reload_stats["rejected"] += 1
+                self._reload_stats["last_error"] = f"{version}: {e}"
+                print(f"⚠️ Rejected model version {version}: {e}")
+                return False
+
+            generation = ModelGeneration(version, models, stats, compiled)
+            with self._lock:
+                previous, self._generation = self._generation, generation
+                self._loaded = True
+
+            elapsed = round(time.perf_counter() - started, 3)
+            self._reload_stats.update(
+                {
+                    "reloads": self._reload_stats["reloads"] + 1,
+                    "last_reload_at": generation.loaded_at,
+                    "last_reload_seconds": elapsed,
+                    "last_error": None,
+                }
+            )
+            print(
+                f"✅ Swapped model version {previous.version} -> {version} "
+                f"({elapsed}s)"
+            )
+            return True
+
+    def start_watching(self):
+        """Start the background watcher in this process (idempotent)"""
+        with self._lock:
+            # Threads do not survive fork, so each worker starts its own
+            if self._watcher_pid == os.getpid() and self._watcher is not None:
+                return
+            self._stop_watching = threading.Event()
+            self._watcher = threading.Thread(
+                target=self._watch,
+                args=(self._stop_watching,),
+                name="model-registry-watch",
+                daemon=True,
+            )
+            self._watcher_pid = os.getpid()
+            self._watcher.start()
+
+    def stop_watching(self):
+        """Stop the background watcher"""
+        if self._stop_watching is not None:
+            self._stop_watching.set()
+        self._watcher = None
+        self._watcher_pid = None
+
+    def _watch(self, stop: threading.Event):
+        """
+        Poll for new artifacts every reload_interval seconds
+        With a version file, only a change to its content triggers a reload,
+        so deployments can copy every artifact first and write it last.
+        Otherwise the artifact fingerprint must be unchanged over two polls,
+        so a copy still in progress is not picked up.
+        """
+        applied = self._watch_token()
+        pending = None
+        while not stop.wait(self.reload_interval):
+            try:
+                token = self._watch_token()
+                if token == applied:
+                    pending = None
+                    continue
+                if not self.version_file.exists() and token != pending:
+                    pending = token
+                    continue
+                applied, pending = token, None
+                self.reload()
+            except Exception as e:
+                self._reload_stats["last_error"] = str(e)
+                print(f"⚠️ Model watcher error: {e}")
+
+    def _watch_token(self) -> str:
+        """Version file content when present, else the artifact fingerprint"""
+        try:
+            return "file:" + self.version_file.read_text().strip()
+        except OSError:
+            return self._compute_version()
+
+    def _smoke_test(self, models: Dict[str, Any], compiled: Dict[str, Any]):
+        """Raise ValueError unless every model scores a synthetic batch sanely"""
+        from .inference_benchmark import synthetic_features
+
+        features = synthetic_features(self.smoke_rows, seed=0)
+        for model_name, model in models.items():
+            if hasattr(model, "predict_proba"):
+                scores = model.predict_proba(features)
+            else:
+                scores = model.decision_function(features)
+            scores = np.asarray(scores, dtype=float)
+            if scores.shape[0] != len(features) or not np.all(np.isfinite(scores)):
+                raise ValueError(f"{model_name} returned invalid scores")
+
+            evaluator = compiled.get(model_name)
+            if evaluator is not None:
+                agreement = np.mean(
+                    np.asarray(model.predict(features))
+                    == np.asarray(evaluator.predict(features))
+                )
+                if agreement < 0.99:
+                    raise ValueError(
+                        f"compiled {model_name} agrees on only {agreement:.0%} of rows"
+                    )
+
+    # ==== LOADING ====
+
+    def _load_all(self) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """Load every available artifact into fresh dicts"""
+        models, stats = {}, {}
+        for model_name in self.MODEL_FILES:
+            self._load(model_name, models, stats)
+        return models, stats
+
+    def _compiled_for(self, generation: ModelGeneration) -> Dict[str, Any]:
+        """A generation's compiled evaluators, compiled on first access"""
+        if generation.compiled is None:
+            with self._lock:
+                if generation.compiled is None:
+                    generation.compiled = self._compile_all(generation.models)
+        return generation.compiled
+
+    def _compile_all(self, models: Dict[str, Any]) -> Dict[str, Any]:
+        """Compiled evaluators for the models that support one"""
+        compiled = {}
+        svm_enabled = getattr(settings, "ML_SVM_COMPILER_ENABLED", False)
+        for model_name, model in models.items():
+            if model_name == "svm" and not svm_enabled:
+                continue
+            evaluator = self._load_compiled(model_name, model)
+            if evaluator is not None:
+                compiled[model_name] = evaluator
+        return compiled
+
+    def _load(
+        self,
+        model_name: str,
+        models: Dict[str, Any],
+        stats: Dict[str, Dict[str, Any]],
+    ):
+        """Load one model, preferring the converted memory-mappable artifact"""
+        source_path = self.models_dir / self.MODEL_FILES[model_name]
+        if not source_path.exists():
+            print(f"⚠️ Model file not found: {source_path}")
+            return
+
+        if model_name == "xgboost":
+            # Import the library up front so its footprint is not billed to the model
+            try:
+                import xgboost  # noqa: F401
+            except ImportError:
+                pass
+
+        rss_before = _current_rss_bytes()
+        started = time.perf_counter()
+
+        try:
+            model, artifact_format = self._load_converted(model_name, source_path)
+            if model is None:
+                # joblib.load also reads plain pickle files
+                model = joblib.load(source_path)
+                artifact_format = "pickle"
+                self._convert(model_name, model, source_path)
+
+            models[model_name] = model
+            rss_after = _current_rss_bytes()
+            stats[model_name] = {
+                "format": artifact_format,
+                "source": str(source_path),
+                "file_bytes": source_path.stat().st_size,
+                "mapped_bytes": _mapped_bytes(model),
+                "load_seconds": round(time.perf_counter() - started, 4),
+                "rss_bytes": (
+                    max(0, rss_after - rss_before)
+                    if rss_before is not None and rss_after is not None
+                    else None
+                ),
+            }
+            print(f"✅ Loaded {model_name} model ({artifact_format})")
+
+        except Exception as e:
+            print(f"⚠️ Error loading {model_name} model: {e}")
+
+    def _converted_path(self, model_name: str) -> Path:
+        """Location of the memory-mappable artifact for a model"""
+        suffix = ".ubj" if model_name == "xgboost" else ".joblib"
+        return self.cache_dir / f"{model_name}{suffix}"
+
+    def _load_converted(self, model_name: str, source_path: Path):
+        """Load the converted artifact if it was made from the current source"""
+        converted_path = self._converted_path(model_name)
+        if not self._is_fresh(converted_path, source_path):
+            return None, None
+
+        try:
+            if converted_path.suffix == ".ubj":
+                from xgboost import XGBClassifier
+
+                model = XGBClassifier()
+                model.load_model(str(converted_path))
+                return model, "xgboost-ubj"
+
+            # How much of it actually stays mapped is reported as mapped_bytes
+            return joblib.load(converted_path, mmap_mode="r"), "joblib"
+
+        except Exception as e:
+            print(f"⚠️ Converted artifact for {model_name} unusable, reloading: {e}")
+            return None, None
+
+    def _convert(self, model_name: str, model: Any, source_path: Path):
+        """Write a memory-mappable copy of a freshly unpickled model"""
+        converted_path = self._converted_path(model_name)
+        if converted_path.suffix == ".ubj" and not hasattr(model, "save_model"):
+            return
+        tmp_path = None
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # Keeps the suffix, so XGBoost picks the UBJ encoding
+            tmp_path = temp_path_beside(converted_path)
+            if converted_path.suffix == ".ubj":
+                model.save_model(str(tmp_path))
+            else:
+                # Uncompressed so numpy arrays can be memory-mapped on load
+                joblib.dump(model, tmp_path)
+            self._publish(tmp_path, converted_path, source_path)
+        except Exception as e:
+            _remove_quietly(tmp_path)
+            print(f"⚠️ Could not write converted artifact for {model_name}: {e}")
+
+    def _load_compiled(self, model_name: str, model: Any) -> Optional[Any]:
+        """Compiled evaluator for a model, reusing the cached arrays when fresh"""
+        from .tree_compiler import compile_model
+
+        source_path = self.models_dir / self.MODEL_FILES[model_name]
+        compiled_path = self.cache_dir / f"{model_name}.compiled.joblib"
+        if self._is_fresh(compiled_path, source_path):
+            try:
+                return joblib.load(compiled_path, mmap_mode="r")
+            except Exception as e:
+                print(
+                    f"⚠️ Compiled artifact for {model_name} unusable, rebuilding: {e}"
+                )
+
+        try:
+            evaluator = compile_model(model_name, model, include_svm=True)
+        except Exception as e:
+            print(f"⚠️ Could not compile {model_name} model: {e}")
+            return None
+        if evaluator is None:
+            return None
+
+        tmp_path = None
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = temp_path_beside(compiled_path)
+            joblib.dump(evaluator, tmp_path)
+            self._publish(tmp_path, compiled_path, source_path)
+        except Exception as e:
+            _remove_quietly(tmp_path)
+            print(f"⚠️ Could not write compiled artifact for {model_name}: {e}")
+
+        print(f"✅ Compiled {model_name} model ({evaluator.describe()['kind']})")
+        return evaluator
+
+    def _is_fresh(self, artifact_path: Path, source_path: Path) -> bool:
+        """
+        Whether a cached artifact was derived from the current source file
+        Compared on the source's size and mtime recorded next to the artifact,
+        so sources deployed with preserved (older) mtimes are still picked up.
+        """
+        stamp_path = artifact_path.with_name(f"{artifact_path.name}.source")
+        try:
+            return artifact_path.exists() and stamp_path.read_text() == _source_stamp(
+                source_path
+            )
+        except OSError:
+            return False
+
+    def _publish(self, tmp_path: Path, artifact_path: Path, source_path: Path):
+        """Move a written artifact into place and record which source it came from"""
+        os.replace(tmp_path, artifact_path)
+        stamp_path = artifact_path.with_name(f"{artifact_path.name}.source")
+        tmp_stamp = temp_path_beside(stamp_path)
+        tmp_stamp.write_text(_source_stamp(source_path))
+        os.replace(tmp_stamp, stamp_path)
+
+    def _compute_version(self) -> str:
+        """
+        Short fingerprint of the source artifacts (name, size, mtime) and of
+        the version file, if there is one
+        """
+        digest = hashlib.sha1()
+        if self.version_file.exists():
+            digest.update(f"version:{self.version_file.read_text().strip()};".encode())
+        for model_name, filename in sorted(self.MODEL_FILES.items()):
+            path = self.models_dir / filename
+            if path.exists():
+                stat = path.stat()
+                digest.update(
+                    f"{model_name}:{stat.st_size}:{stat.st_mtime_ns};".encode()
+                )
+        return digest.hexdigest()[:12]
+
+
+def temp_path_beside(path: Path) -> Path:
+    """
+    New, uniquely named empty file in path's directory, keeping its suffix
+    Processes and threads writing the same artifact each get their own temp
+    file, so an os.replace never publishes interleaved writes.
+    """
+    fd, name = tempfile.mkstemp(
+        dir=path.parent, prefix=f".tmp-{path.stem}-", suffix=path.suffix
+    )
+    os.close(fd)
+    return Path(name)
+
+
+def _remove_quietly(path: Optional[Path]):
+    """Delete a leftover temp file, if there is one"""
+    if path is not None:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+def _source_stamp(path: Path) -> str:
+    """Size and modification time identifying one version of a source file"""
+    stat = path.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _mapped_bytes(obj: Any, seen: Optional[set] = None) -> int:
+    """Bytes of the numpy arrays reachable from obj that are memory-mapped"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        base = obj
+        while base is not None and not isinstance(base, np.memmap):
+            base = getattr(base, "base", None)
+        return obj.nbytes if base is not None else 0
+    if isinstance(obj, dict):
+        children = obj.values()
+    elif isinstance(obj, (list, tuple)):
+        children = obj
+    else:
+        children = getattr(obj, "__dict__", {}).values()
+    return sum(_mapped_bytes(child, seen) for child in children)
+
+
+def _current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process in bytes (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# Global instance
+model_registry = ModelRegistry()
+
+
+def start_model_reload_if_configured():
+    """
+    Start the registry's watcher when ML_MODEL_RELOAD is enabled
+    Called from the WSGI/ASGI entry points, so management commands never poll.
+    """
+    if model_registry.reload_enabled:
+        model_registry.start_watching()
@@ -0,0 +1,667 @@
+"""
+Model Training
+Streaming (re)training of the crop models. Labelled rows are read in chunks
+from CSV seed files (and, opt-in, completed prediction requests), so memory
+is bounded by the chunk size instead of the dataset size. Trained models are
+written as versioned artifacts in the model registry layout.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import joblib
+import numpy as np
+
+from .prediction_job_queue import INPUT_FIELDS
+
+# Seed CSV columns (Crop_recommendation.csv layout), in INPUT_FIELDS order
+CSV_FEATURE_COLUMNS = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+CSV_LABEL_COLUMN = "label"
+
+TRAINABLE_MODELS = ("xgboost", "random_forest", "svm")
+
+# Every HOLDOUT_EVERY-th row is kept out of training and used for evaluation
+HOLDOUT_EVERY = 20
+MAX_HOLDOUT_ROWS = 20_000
+
+# Rows remembered per class and replayed into chunks that lack that class
+REPLAY_PER_CLASS = 8
+
+# Uniform sample used to fit the SVM's kernel approximation
+KERNEL_SAMPLE_ROWS = 2_000
+
+# Total forest trees and boosting rounds, however many rows are trained on
+DEFAULT_TREES = 50
+DEFAULT_ROUNDS = 50
+
+Chunk = Tuple[np.ndarray, np.ndarray]
+
+
+class TrainingRowSource:
+    """
+    Re-iterable stream of (features, label index) chunks
+    Labels are indices into crop_labels, the order the prediction service
+    decodes integer classes with. Database rows are opt-in: they are completed
+    prediction requests labelled with the ensemble's own top predicted crop,
+    so training on them reinforces the current models' mistakes.
+    """
+
+    def __init__(
+        self,
+        crop_labels: Sequence[str],
+        chunk_size: int = 50_000,
+        seed_csvs: Sequence[os.PathLike] = (),
+        use_database: bool = False,
+        since: Optional[datetime] = None,
+    ):
+        self.crop_labels = list(crop_labels)
+        self.label_index = {name: i for i, name in enumerate(self.crop_labels)}
+        self.chunk_size = chunk_size
+        self.seed_csvs = [Path(path) for path in seed_csvs]
+        self.use_database = use_database
+        self.since = since
+        self.skipped_rows = 0
+
+    def __iter__(self) -> Iterator[Chunk]:
+        self.skipped_rows = 0
+        for path in self.seed_csvs:
+            yield from self._csv_chunks(path)
+        if self.use_database:
+            yield from self._request_chunks()
+
+    def _encode(self, features: np.ndarray, names: Iterable[Any]) -> Chunk:
+        """Label indices for crop names; rows with unknown crops are dropped"""
+        labels = np.array(
+            [self.label_index.get(str(name).lower(), -1) for name in names], dtype=int
+        )
+        keep = (labels >= 0) & np.all(np.isfinite(features), axis=1)
+        self.skipped_rows += int((~keep).sum())
+        return features[keep], labels[keep]
+
+    def _csv_chunks(self, path: Path) -> Iterator[Chunk]:
+        """Seed data in the training CSV layout (N, P, K, ... or full names)"""
+        import pandas as pd
+
+        header = list(pd.read_csv(path, nrows=0).columns)
+        columns = (
+            CSV_FEATURE_COLUMNS
+            if all(column in header for column in CSV_FEATURE_COLUMNS)
+            else INPUT_FIELDS
+        )
+
+        for frame in pd.read_csv(
+            path, usecols=columns + [CSV_LABEL_COLUMN], chunksize=self.chunk_size
+        ):
+            features = frame[columns].to_numpy(dtype=float)
+            yield self._encode(features, frame[CSV_LABEL_COLUMN])
+
+    def _request_chunks(self) -> Iterator[Chunk]:
+        """Completed prediction requests, streamed with a server-side cursor"""
+        from apps.crops.models import CropPredictionRequest
+
+        queryset = CropPredictionRequest.objects.filter(status="completed")
+        if self.since is not None:
+            queryset = queryset.filter(requested_at__gte=self.since)
+        rows = queryset.order_by("pk").values_list(*INPUT_FIELDS, "predicted_crops")
+
+        features, names = [], []
+        for row in rows.iterator(chunk_size=self.chunk_size):
+            predicted = row[-1]
+            if not predicted or not isinstance(predicted, list):
+                self.skipped_rows += 1
+                continue
+            features.append(row[:-1])
+            names.append(predicted[0].get("crop", ""))
+            if len(features) >= self.chunk_size:
+                yield self._encode(np.array(features, dtype=float), names)
+                features, names = [], []
+        if features:
+            yield self._encode(np.array(features, dtype=float), names)
+
+
+# ==== LEARNERS ====
+
+
+class XGBoostLearner:
+    """
+    Continued boosting: each chunk adds rounds to the same booster
+    The rounds are shared out over the chunks by row count, so the booster
+    always ends with the same number of rounds.
+    """
+
+    name = "xgboost"
+    estimator = "xgboost.XGBClassifier"
+
+    def __init__(
+        self,
+        n_classes: int,
+        rounds: int = DEFAULT_ROUNDS,
+        max_depth: int = 6,
+        learning_rate: float = 0.1,
+        init_model: Any = None,
+        random_state: int = 42,
+        threads: Optional[int] = None,
+    ):
+        self.rounds = rounds
+        self.params = {
+            "objective": "multi:softprob",
+            "num_class": n_classes,
+            "max_depth": max_depth,
+            "eta": learning_rate,
+            "subsample": 0.8,
+            "colsample_bytree": 0.8,
+            "tree_method": "hist",
+            "seed": random_state,
+        }
+        if threads:
+            self.params["nthread"] = threads
+        # Start from an existing model to fine-tune it on new rows
+        self.booster = init_model.get_booster() if init_model is not None else None
+        self.feature_names = self.booster.feature_names if self.booster else None
+        self.schedule: Optional[_ChunkSchedule] = None
+
+    def prepare(self, scan: Dict[str, Any]):
+        self.schedule = _ChunkSchedule(self.rounds, scan["rows"])
+
+    def partial_fit(self, X: np.ndarray, y: np.ndarray):
+        import xgboost as xgb
+
+        rounds = self.schedule.share(len(y))
+        if not rounds:
+            return
+        self.booster = xgb.train(
+            self.params,
+            xgb.DMatrix(X, label=y, feature_names=self.feature_names),
+            num_boost_round=rounds,
+            xgb_model=self.booster,
+        )
+
+    def finalize(self) -> Any:
+        """XGBClassifier over the booster, decoding to all crop_labels indices"""
+        from xgboost import XGBClassifier
+
+        model = XGBClassifier()
+        model.load_model(self.booster.save_raw(raw_format="ubj"))
+        return model
+
+
+class RandomForestLearner:
+    """
+    Warm-started forest: each chunk grows a fresh batch of trees
+    The trees are shared out over the chunks by row count, so the forest
+    always ends with the same number of trees.
+    """
+
+    name = "random_forest"
+    estimator = "sklearn.ensemble.RandomForestClassifier"
+
+    def __init__(
+        self,
+        trees: int = DEFAULT_TREES,
+        max_depth: Optional[int] = 12,
+        random_state: int = 42,
+        threads: Optional[int] = None,
+    ):
+        from sklearn.ensemble import RandomForestClassifier
+
+        self.trees = trees
+        self.model = RandomForestClassifier(
+            n_estimators=0,
+            max_depth=max_depth,
+            min_samples_leaf=2,
+            warm_start=True,
+            random_state=random_state,
+            n_jobs=threads,
+        )
+        self.replay: Optional[Chunk] = None
+        self.schedule: Optional[_ChunkSchedule] = None
+
+    def prepare(self, scan: Dict[str, Any]):
+        self.replay = scan["replay"]
+        self.schedule = _ChunkSchedule(self.trees, scan["rows"])
+
+    def partial_fit(self, X: np.ndarray, y: np.ndarray):
+        trees = self.schedule.share(len(y))
+        if not trees:
+            return
+        # Every fit must see every class so the trees share one classes_ layout
+        replay_X, replay_y = self.replay
+        missing = ~np.isin(replay_y, y)
+        X = np.vstack([X, replay_X[missing]])
+        y = np.concatenate([y, replay_y[missing]])
+
+        self.model.n_estimators += trees
+        self.model.fit(X, y)
+
+    def finalize(self) -> Any:
+        return self.model
+
+
+class KernelSGDLearner:
+    """
+    Streaming stand-in for the RBF SVM: scaled inputs, a Nystroem RBF feature
+    map fitted on a uniform sample, and an SGD linear classifier trained with
+    partial_fit. Saved as a sklearn Pipeline under the svm name, so the
+    version metadata records it as a replacement for the RBF SVC.
+    """
+
+    name = "svm"
+    estimator = "sklearn.pipeline.Pipeline(StandardScaler, Nystroem, SGDClassifier)"
+    replaces = "sklearn.svm.SVC(kernel='rbf')"
+
+    def __init__(
+        self,
+        n_components: int = 300,
+        passes_per_chunk: int = 3,
+        batch_rows: int = 4096,
+        random_state: int = 42,
+    ):
+        self.n_components = n_components
+        self.passes_per_chunk = passes_per_chunk
+        self.batch_rows = batch_rows
+        self.random_state = random_state
+        self.rng = np.random.default_rng(random_state)
+
+    def prepare(self, scan: Dict[str, Any]):
+        from sklearn.kernel_approximation import Nystroem
+        from sklearn.linear_model import SGDClassifier
+
+        self.classes = scan["classes"]
+        self.scaler = scan["scaler"]
+        sample = self.scaler.transform(scan["sample"])
+        self.kernel = Nystroem(
+            gamma=1.0 / sample.shape[1],
+            n_components=min(self.n_components, len(sample)),
+            random_state=self.random_state,
+        ).fit(sample)
+        self.classifier = SGDClassifier(
+            loss="modified_huber", alpha=1e-4, random_state=self.random_state
+        )
+
+    def partial_fit(self, X: np.ndarray, y: np.ndarray):
+        # Kernel features are n_components wide, so map small shuffled slices
+        for _ in range(self.passes_per_chunk):
+            order = self.rng.permutation(len(y))
+            for start in range(0, len(order), self.batch_rows):
+                rows = order[start : start + self.batch_rows]
+                Z = self.kernel.transform(self.scaler.transform(X[rows]))
+                self.classifier.partial_fit(Z, y[rows], classes=self.classes)
+
+    def finalize(self) -> Any:
+        from sklearn.pipeline import Pipeline
+
+        return Pipeline(
+            [
+                ("scaler", self.scaler),
+                ("kernel", self.kernel),
+                ("classifier", self.classifier),
+            ]
+        )
+
+
+# ==== TRAINER ====
+
+
+class IncrementalTrainer:
+    """
+    Two streaming passes over a row source
+    The first pass learns the class set, scaling statistics, a per-class
+    replay buffer and bounded samples; the second feeds each chunk to every
+    learner. Only a chunk and the bounded samples are ever held in memory.
+    """
+
+    def __init__(
+        self,
+        crop_labels: Sequence[str],
+        model_names: Sequence[str] = TRAINABLE_MODELS,
+        trees: int = DEFAULT_TREES,
+        rounds: int = DEFAULT_ROUNDS,
+        max_depth: Optional[int] = 12,
+        init_models: Optional[Dict[str, Any]] = None,
+        baseline_models: Optional[Dict[str, Any]] = None,
+        random_state: int = 42,
+        threads: Optional[int] = None,
+        progress=None,
+    ):
+        self.crop_labels = list(crop_labels)
+        self.model_names = list(model_names)
+        self.trees = trees
+        self.rounds = rounds
+        self.max_depth = max_depth
+        self.init_models = init_models or {}
+        # Currently served models, scored on the same holdout for comparison
+        self.baseline_models = baseline_models or {}
+        self.random_state = random_state
+        self.threads = threads
+        self.progress = progress or print
+
+    def train(self, source: Iterable[Chunk]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Fit every requested model; returns (models, training report)"""
+        started = time.perf_counter()
+        peak_before = _peak_rss_bytes()
+
+        scan = self._scan(source)
+        if scan["rows"] == 0:
+            raise ValueError("No labelled training rows found")
+        self.progress(
+            f"📊 Scanned {scan['rows']} rows, {len(scan['classes'])} crops "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+        learners = self._build_learners()
+        for learner in learners:
+            learner.prepare(scan)
+
+        train_started = time.perf_counter()
+        trained_rows = 0
+        for X, y in self._split(source, holdout=False):
+            for learner in learners:
+                learner.partial_fit(X, y)
+            trained_rows += len(y)
+            elapsed = time.perf_counter() - train_started
+            self.progress(
+                f"🌱 Trained on {trained_rows} rows "
+                f"({trained_rows / elapsed:.0f} rows/s)"
+            )
+        train_seconds = time.perf_counter() - train_started
+
+        models = {learner.name: learner.finalize() for learner in learners}
+        holdout_X, holdout_y = scan["holdout"]
+        evaluation = {
+            name: self._accuracy(model, holdout_X, holdout_y)
+            for name, model in models.items()
+        }
+        baseline = {
+            name: self._accuracy(self.baseline_models[name], holdout_X, holdout_y)
+            for name in models
+            if self.baseline_models.get(name) is not None
+        }
+
+        peak_after = _peak_rss_bytes()
+        report = {
+            "rows": scan["rows"],
+            "training_rows": trained_rows,
+            "holdout_rows": int(len(holdout_y)),
+            "skipped_rows": getattr(source, "skipped_rows", 0),
+            "class_counts": {
+                self.crop_labels[index]: int(count)
+                for index, count in zip(scan["classes"], scan["class_counts"])
+            },
+            "holdout_accuracy": evaluation,
+            "baseline_holdout_accuracy": baseline,
+            "estimators": {
+                learner.name: _describe_learner(learner) for learner in learners
+            },
+            "seconds": round(time.perf_counter() - started, 3),
+            "training_seconds": round(train_seconds, 3),
+            "rows_per_second": (
+                round(trained_rows / train_seconds, 1) if train_seconds else 0.0
+            ),
+            "peak_rss_bytes": peak_after,
+            "peak_rss_growth_bytes": (
+                max(0, peak_after - peak_before)
+                if peak_after is not None and peak_before is not None
+                else None
+            ),
+        }
+        return models, report
+
+    def _accuracy(self, model: Any, X: np.ndarray, y: np.ndarray) -> Optional[float]:
+        """Holdout accuracy; crop-name predictions are mapped to label indices"""
+        if not len(y):
+            return None
+        try:
+            predicted = np.asarray(model.predict(X))
+        except Exception as e:
+            self.progress(f"⚠️ Could not score {type(model).__name__}: {e}")
+            return None
+        if predicted.dtype.kind not in "iu":
+            index = {name: i for i, name in enumerate(self.crop_labels)}
+            predicted = np.array(
+                [index.get(str(label).lower(), -1) for label in predicted]
+            )
+        return round(float(np.mean(predicted == y)), 4)
+
+    def _build_learners(self) -> List[Any]:
+        learners = []
+        for name in self.model_names:
+            if name == "xgboost":
+                learners.append(
+                    XGBoostLearner(
+                        len(self.crop_labels),
+                        rounds=self.rounds,
+                        init_model=self.init_models.get("xgboost"),
+                        random_state=self.random_state,
+                        threads=self.threads,
+                    )
+                )
+            elif name == "random_forest":
+                learners.append(
+                    RandomForestLearner(
+                        trees=self.trees,
+                        max_depth=self.max_depth,
+                        random_state=self.random_state,
+                        threads=self.threads,
+                    )
+                )
+            elif name == "svm":
+                learners.append(KernelSGDLearner(random_state=self.random_state))
+            else:
+                raise ValueError(f"Unknown model {name!r}")
+        return learners
+
+    def _split(self, source: Iterable[Chunk], holdout: bool) -> Iterator[Chunk]:
+        """Training (or holdout) rows of each chunk, by global row position"""
+        offset = 0
+        for X, y in source:
+            positions = offset + np.arange(len(y))
+            offset += len(y)
+            mask = (positions % HOLDOUT_EVERY == 0) == holdout
+            if mask.any():
+                yield X[mask], y[mask]
+
+    def _scan(self, source: Iterable[Chunk]) -> Dict[str, Any]:
+        """First pass: class set, scaler statistics and bounded samples"""
+        from sklearn.preprocessing import StandardScaler
+
+        rng = np.random.default_rng(self.random_state)
+        scaler = StandardScaler()
+        counts = np.zeros(len(self.crop_labels), dtype=np.int64)
+        sample = _BottomKSample(KERNEL_SAMPLE_ROWS, rng)
+        holdout = _BottomKSample(MAX_HOLDOUT_ROWS, rng)
+        replay = {}
+
+        offset = rows = 0
+        for X, y in source:
+            positions = offset + np.arange(len(y))
+            offset += len(y)
+            is_holdout = positions % HOLDOUT_EVERY == 0
+            holdout.add(X[is_holdout], y[is_holdout])
+
+            X, y = X[~is_holdout], y[~is_holdout]
+            if not len(y):
+                continue
+            rows += len(y)
+            scaler.partial_fit(X)
+            counts += np.bincount(y, minlength=len(counts))
+            sample.add(X, y)
+            for label in np.unique(y):
+                replay.setdefault(
+                    int(label), _BottomKSample(REPLAY_PER_CLASS, rng)
+                ).add(X[y == label], y[y == label])
+
+        classes = np.flatnonzero(counts)
+        replay_parts = [replay[int(label)].arrays() for label in classes]
+        return {
+            "rows": rows,
+            "classes": classes,
+            "class_counts": counts[classes],
+            "scaler": scaler,
+            "sample": sample.arrays()[0],
+            "holdout": holdout.arrays(),
+            "replay": (
+                (
+                    np.vstack([part[0] for part in replay_parts]),
+                    np.concatenate([part[1] for part in replay_parts]),
+                )
+                if replay_parts
+                else (np.empty((0, len(INPUT_FIELDS))), np.empty(0, dtype=int))
+            ),
+        }
+
+
+class _ChunkSchedule:
+    """
+    Shares a fixed total (trees, rounds) out over chunks by their row counts
+    Each chunk gets the total's share of the rows trained so far, less what
+    earlier chunks got, so the shares always add up to the total. The first
+    chunk gets at least one; a chunk whose share rounds to zero gets none.
+    """
+
+    def __init__(self, total: int, rows: int):
+        self.total = total
+        self.rows = rows
+        self.seen_rows = 0
+        self.allocated = 0
+
+    def share(self, chunk_rows: int) -> int:
+        self.seen_rows += chunk_rows
+        target = self.total * min(self.seen_rows, self.rows) // max(self.rows, 1)
+        share = max(target - self.allocated, 0 if self.allocated else 1)
+        self.allocated += share
+        return share
+
+
+class _BottomKSample:
+    """Uniform fixed-size sample of a stream: keep the k smallest random keys"""
+
+    def __init__(self, k: int, rng: np.random.Generator):
+        self.k = k
+        self.rng = rng
+        self.keys = np.empty(0)
+        self.X = np.empty((0, len(INPUT_FIELDS)))
+        self.y = np.empty(0, dtype=int)
+
+    def add(self, X: np.ndarray, y: np.ndarray):
+        if not len(y):
+            return
+        keys = np.concatenate([self.keys, self.rng.random(len(y))])
+        X = np.vstack([self.X, X])
+        y = np.concatenate([self.y, y])
+        if len(keys) > self.k:
+            keep = np.argpartition(keys, self.k)[: self.k]
+            keys, X, y = keys[keep], X[keep], y[keep]
+        self.keys, self.X, self.y = keys, X, y
+
+    def arrays(self) -> Chunk:
+        return self.X, self.y
+
+
+def _describe_learner(learner: Any) -> Dict[str, str]:
+    """Estimator a learner produces, and the model type it stands in for"""
+    description = {"estimator": learner.estimator}
+    if getattr(learner, "replaces", None):
+        description["replaces"] = learner.replaces
+    return description
+
+
+def holdout_regressions(
+    report: Dict[str, Any], tolerance: float = 0.0
+) -> Dict[str, Dict[str, float]]:
+    """
+    Models whose holdout accuracy is below the served model's
+    Models without a baseline or a holdout score are not compared.
+    """
+    regressions = {}
+    for name, current in report.get("baseline_holdout_accuracy", {}).items():
+        trained = report["holdout_accuracy"].get(name)
+        if trained is None or current is None:
+            continue
+        if trained < current - tolerance:
+            regressions[name] = {"trained": trained, "current": current}
+    return regressions
+
+
+# ==== VERSIONED ARTIFACTS ====
+
+
+def save_version(
+    models: Dict[str, Any], report: Dict[str, Any], models_dir: os.PathLike
+) -> Path:
+    """Write models and metadata to <models_dir>/versions/<version>/"""
+    from .model_registry import ModelRegistry
+
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    versions_dir = Path(models_dir) / "versions"
+    version_dir = versions_dir / version
+    versions_dir.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(dir=versions_dir, prefix=f".tmp-{version}-"))
+
+    for name, model in models.items():
+        joblib.dump(model, tmp_dir / ModelRegistry.MODEL_FILES[name])
+    with open(tmp_dir / "metadata.json", "w") as f:
+        json.dump(
+            {
+                "version": version,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "models": sorted(models),
+                "estimators": report.get("estimators", {}),
+                "training": {
+                    key: value for key, value in report.items() if key != "estimators"
+                },
+            },
+            f,
+            indent=2,
+        )
+
+    # The version directory appears complete or not at all
+    os.replace(tmp_dir, version_dir)
+    return version_dir
+
+
+def promote_version(version_dir: os.PathLike, models_dir: os.PathLike) -> List[str]:
+    """
+    Replace the registry's source artifacts with a saved version's models
+    The version file is written last, so watching registries only reload
+    once every artifact is in place.
+    """
+    from django.conf import settings
+
+    from .model_registry import ModelRegistry, temp_path_beside
+
+    version_dir, models_dir = Path(version_dir), Path(models_dir)
+    promoted = []
+    for name, filename in ModelRegistry.MODEL_FILES.items():
+        source = version_dir / filename
+        if not source.exists():
+            continue
+        tmp_path = temp_path_beside(models_dir / filename)
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, models_dir / filename)
+        promoted.append(name)
+
+    if promoted:
+        version_file = models_dir / getattr(settings, "ML_MODEL_RELOAD", {}).get(
+            "VERSION_FILE", "VERSION"
+        )
+        tmp_path = temp_path_beside(version_file)
+        tmp_path.write_text(f"{version_dir.name}\n")
+        os.replace(tmp_path, version_file)
+    return promoted
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process in bytes (Unix only)"""
+    try:
+        import resource
+
+        # ru_maxrss is reported in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return None
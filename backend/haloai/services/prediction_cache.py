@@ -0,0 +1,180 @@
+"""
+Prediction Cache
+LRU + TTL cache for ensemble crop predictions keyed on quantized feature vectors.
+Concurrent requests for the same key are coalesced into a single computation.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+# Decimal places kept for features without a configured precision
+FALLBACK_PRECISION = 2
+
+
+class PredictionCache:
+    """Thread-safe LRU cache with per-entry TTL and in-flight request coalescing"""
+
+    def __init__(
+        self,
+        feature_order: Sequence[str],
+        max_entries: int = 1024,
+        ttl_seconds: float = 300.0,
+        precision: Optional[Dict[str, int]] = None,
+        version_provider: Optional[Callable[[], str]] = None,
+        enabled: bool = True,
+    ):
+        self.feature_order = list(feature_order)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        # Per-feature precision comes from ML_PREDICTION_CACHE["PRECISION"]
+        precision = precision or {}
+        self.precision = [
+            int(precision.get(name, FALLBACK_PRECISION)) for name in self.feature_order
+        ]
+        self.version_provider = version_provider
+
+        # key -> (expires_at, value)
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple, Future] = {}
+        self._lock = threading.Lock()
+        self._version = self._current_version()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def quantize(self, features: np.ndarray) -> np.ndarray:
+        """Round a single feature row to the configured per-feature precision"""
+        row = np.asarray(features, dtype=float).reshape(-1)
+        return np.array(
+            [round(float(value), digits) for value, digits in zip(row, self.precision)]
+        )
+
+    def get_or_compute(
+        self,
+        features: np.ndarray,
+        compute: Callable[[np.ndarray], Any],
+        ttl_for: Optional[Callable[[Any], float]] = None,
+    ) -> Any:
+        """
+        Return the cached result for a feature row, computing it on a miss
+        compute receives the quantized row, so every caller sharing a key gets
+        the same answer regardless of which of them populated the entry.
+        ttl_for may shorten a computed value's lifetime; 0 leaves it uncached.
+        """
+        quantized = self.quantize(features)
+        if not self.enabled:
+            return compute(quantized)
+
+        key = tuple(quantized.tolist())
+        now = time.monotonic()
+
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if now < expires_at:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+                self._counters["expirations"] += 1
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                owner = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                self._counters["misses"] += 1
+                owner = True
+            version = self._version
+
+        if not owner:
+            return copy.deepcopy(future.result())
+
+        try:
+            value = compute(quantized)
+            ttl_seconds = self.ttl_seconds
+            if ttl_for is not None:
+                ttl_seconds = min(ttl_seconds, ttl_for(value))
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._inflight.pop(key, None)
+            # Skip storing results computed against a model version now replaced
+            if version == self._version and ttl_seconds > 0:
+                self._entries[key] = (time.monotonic() + ttl_seconds, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._counters["evictions"] += 1
+        future.set_result(value)
+
+        return copy.deepcopy(value)
+
+    def invalidate(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+            self._counters["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current occupancy"""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "inflight": len(self._inflight),
+                "hit_rate": (
+                    round(self._counters["hits"] / lookups, 3) if lookups else 0.0
+                ),
+                "model_version": self._version,
+                "enabled": self.enabled,
+            }
+
+    def _current_version(self) -> Optional[str]:
+        """Version reported by the model registry, if one is attached"""
+        return self.version_provider() if self.version_provider else None
+
+    def _check_version(self):
+        """Clear the cache when the model registry version changes (lock held)"""
+        version = self._current_version()
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+            self._counters["invalidations"] += 1
+
+
+def build_prediction_cache(
+    feature_order: Sequence[str], version_provider: Optional[Callable[[], str]] = None
+) -> PredictionCache:
+    """Create a PredictionCache from the ML_PREDICTION_CACHE setting"""
+    config = getattr(settings, "ML_PREDICTION_CACHE", {})
+    return PredictionCache(
+        feature_order,
+        max_entries=int(config.get("MAX_ENTRIES", 1024)),
+        ttl_seconds=float(config.get("TTL_SECONDS", 300)),
+        precision=config.get("PRECISION"),
+        version_provider=version_provider,
+        enabled=bool(config.get("ENABLED", True)),
+    )
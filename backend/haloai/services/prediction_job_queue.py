@@ -0,0 +1,198 @@
+"""
+Prediction Job Queue
+Database-backed queue on CropPredictionRequest.status: requests are inserted
+as "pending", claimed by workers as "processing" and finished as
+"completed" or "failed". Claimed jobs are scored in one ensemble batch.
+"""
+
+import os
+import socket
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.crops.models import CropPredictionRequest
+
+from .recommendation_writer import recommendation_writer
+
+# Model input fields, in the feature order the models expect
+INPUT_FIELDS = [
+    "nitrogen",
+    "phosphorus",
+    "potassium",
+    "temperature",
+    "humidity",
+    "ph",
+    "rainfall",
+]
+
+# Columns written back when a job completes
+RESULT_FIELDS = INPUT_FIELDS + [
+    "predicted_crops",
+    "confidence_score",
+    "status",
+    "processed_at",
+]
+
+
+class PredictionJobQueue:
+    """Enqueue, claim and process crop prediction jobs"""
+
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+
+    # ==== PRODUCER SIDE ====
+
+    def enqueue(self, **fields) -> CropPredictionRequest:
+        """Insert a pending prediction request; nothing else runs in the caller"""
+        fields["status"] = "pending"
+        return CropPredictionRequest.objects.create(**fields)
+
+    def get_status(self, request_id, owner=None) -> Optional[Dict[str, Any]]:
+        """Lightweight status lookup for polling clients
+
+        With an owner, only jobs submitted by or for that user are found.
+        """
+        jobs = CropPredictionRequest.objects.filter(id=request_id)
+        if owner is not None:
+            jobs = jobs.filter(Q(farmer=owner) | Q(community_admin=owner))
+        row = jobs.values(
+            "id",
+            "status",
+            "predicted_crops",
+            "confidence_score",
+            "requested_at",
+            "processed_at",
+            "notes",
+        ).first()
+        if row is None:
+            return None
+
+        done = row["status"] in ("completed", "failed")
+        return {
+            "id": str(row["id"]),
+            "status": row["status"],
+            "predicted_crops": row["predicted_crops"] if done else [],
+            "confidence_score": row["confidence_score"],
+            "requested_at": row["requested_at"].isoformat(),
+            "processed_at": (
+                row["processed_at"].isoformat() if row["processed_at"] else None
+            ),
+            "error": row["notes"] if row["status"] == "failed" else None,
+        }
+
+    # ==== WORKER SIDE ====
+
+    def claim_batch(self, batch_size: int) -> List[CropPredictionRequest]:
+        """
+        Atomically move up to batch_size pending jobs to "processing"
+        Uses SELECT ... FOR UPDATE SKIP LOCKED where the database supports it,
+        so concurrent workers never block on or double-claim the same rows.
+        SQLite falls back to a per-row compare-and-set update.
+        """
+        pending = CropPredictionRequest.objects.filter(status="pending").order_by(
+            "requested_at"
+        )
+
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                claimed_ids = list(
+                    pending.select_for_update(skip_locked=True).values_list(
+                        "id", flat=True
+                    )[:batch_size]
+                )
+                if claimed_ids:
+                    CropPredictionRequest.objects.filter(id__in=claimed_ids).update(
+                        status="processing", claimed_at=timezone.now()
+                    )
+        else:
+            claimed_ids = []
+            for request_id in pending.values_list("id", flat=True)[:batch_size]:
+                # Only one worker's update can see the row still pending
+                if CropPredictionRequest.objects.filter(
+                    id=request_id, status="pending"
+                ).update(status="processing", claimed_at=timezone.now()):
+                    claimed_ids.append(request_id)
+
+        if not claimed_ids:
+            return []
+        return list(
+            CropPredictionRequest.objects.filter(id__in=claimed_ids)
+            .select_related("sensor_set")
+            .order_by("requested_at")
+        )
+
+    def requeue_stale(self, older_than: timedelta) -> int:
+        """Return jobs stuck in "processing" (e.g. a crashed worker) to the queue"""
+        return CropPredictionRequest.objects.filter(
+            status="processing", claimed_at__lt=timezone.now() - older_than
+        ).update(status="pending", claimed_at=None)
+
+    def process_batch(self, jobs: List[CropPredictionRequest]) -> Dict[str, int]:
+        """Refresh sensor inputs, score every job in one ensemble call, store results"""
+        from .crop_prediction_service import crop_prediction_service
+        from .real_ml_prediction_service import real_ml_service
+
+        counts = {"completed": 0, "failed": 0}
+        if not jobs:
+            return counts
+
+        inputs, ready = [], []
+        for job in jobs:
+            try:
+                if job.sensor_set_id:
+                    # Sensor and weather fetches happen here, not in the request
+                    fresh = crop_prediction_service.collect_prediction_data(
+                        str(job.community_admin_id), job.sensor_set
+                    )
+                    for field in INPUT_FIELDS:
+                        setattr(job, field, float(fresh[field]))
+                inputs.append({field: getattr(job, field) for field in INPUT_FIELDS})
+                ready.append(job)
+            except Exception as e:
+                self._mark_failed(job, f"Input collection error: {e}")
+                counts["failed"] += 1
+
+        try:
+            batch_predictions = real_ml_service.predict_batch(inputs)
+        except Exception as e:
+            for job in ready:
+                self._mark_failed(job, f"Processing error: {e}")
+            counts["failed"] += len(ready)
+            return counts
+
+        processed_at = timezone.now()
+        rows = []
+        for job, predictions in zip(ready, batch_predictions):
+            job.predicted_crops = predictions
+            job.confidence_score = predictions[0]["confidence"] if predictions else 0.5
+            job.status = "completed"
+            job.processed_at = processed_at
+            rows.extend(
+                crop_prediction_service.build_recommendation_rows(job, predictions)
+            )
+
+        try:
+            # One bulk_update for the requests, one bulk_create for recommendations
+            recommendation_writer.persist_predictions(ready, rows, RESULT_FIELDS)
+            counts["completed"] += len(ready)
+        except Exception as e:
+            for job in ready:
+                self._mark_failed(job, f"Persistence error: {e}")
+            counts["failed"] += len(ready)
+
+        return counts
+
+    def _mark_failed(self, job: CropPredictionRequest, message: str):
+        """Record a job failure"""
+        print(f"⚠️ Prediction job {job.id} failed: {message}")
+        CropPredictionRequest.objects.filter(id=job.id).update(
+            status="failed", notes=message, processed_at=timezone.now()
+        )
+
+
+# Global instance
+prediction_job_queue = PredictionJobQueue()
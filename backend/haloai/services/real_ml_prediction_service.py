@@ -3,19 +3,46 @@ Real ML Prediction Service
 Uses actual trained XGBoost, Random Forest, and SVM models for crop prediction
 """
 
-import os
-import pickle
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, Sequence, Union
 from django.conf import settings
+from .container import service_container
+from .crop_rules import crop_rule_engine
+from .inference_executor import InferenceUnavailable, build_inference_executor
+from .latency_budget import build_latency_budget
+from .model_registry import model_registry
+from .prediction_cache import build_prediction_cache
+
+# Feature order expected by the trained models: [N, P, K, temperature, humidity, ph, rainfall]
+FEATURE_ORDER = [
+    "nitrogen",
+    "phosphorus",
+    "potassium",
+    "temperature",
+    "humidity",
+    "ph",
+    "rainfall",
+]
+DEFAULT_FEATURE_VALUES = [85.0, 50.0, 40.0, 25.0, 75.0, 6.8, 200.0]
+
+# Min/max of each feature in the crop recommendation training data
+FEATURE_RANGES = {
+    "nitrogen": (0.0, 140.0),
+    "phosphorus": (5.0, 145.0),
+    "potassium": (5.0, 205.0),
+    "temperature": (8.8, 43.7),
+    "humidity": (14.3, 99.9),
+    "ph": (3.5, 9.9),
+    "rainfall": (20.2, 298.6),
+}
 
 
 class RealMLPredictionService:
     """Service for making actual ML predictions using trained models"""
 
     def __init__(self):
-        self.models = {}
+        self.model_registry = model_registry
         self.label_encoder = None
         self.crop_labels = [
             "rice",
@@ -41,36 +68,28 @@ class RealMLPredictionService:
             "jute",
             "coffee",
         ]
-        self.load_models()
-
-    def load_models(self):
-        """Load the pre-trained ML models"""
-        try:
-            models_dir = os.path.join(settings.BASE_DIR.parent, "ml", "models")
-
-            model_files = {
-                "xgboost": "xgboost_model.pkl",
-                "random_forest": "random_forest_model.pkl",
-                "svm": "svm_model.pkl",
-            }
-
-            for model_name, filename in model_files.items():
-                model_path = os.path.join(models_dir, filename)
-                if os.path.exists(model_path):
-                    try:
-                        with open(model_path, "rb") as f:
-                            self.models[model_name] = pickle.load(f)
-                        print(f"✅ Loaded {model_name} model successfully")
-                    except Exception as e:
-                        print(f"⚠️ Error loading {model_name} model: {e}")
-                else:
-                    print(f"⚠️ Model file not found: {model_path}")
+        self.ensemble_mode = getattr(settings, "ML_ENSEMBLE_MODE", "soft")
+        self.ensemble_weights = dict(getattr(settings, "ML_ENSEMBLE_WEIGHTS", {}))
+        self.top_k = int(getattr(settings, "ML_ENSEMBLE_TOP_K", 3))
+        self.prediction_cache = build_prediction_cache(
+            FEATURE_ORDER, version_provider=lambda: self.model_registry.version
+        )
+        self.inference_executor = build_inference_executor(
+            self.model_registry.models_dir,
+            list(self.model_registry.MODEL_FILES),
+            len(self.crop_labels),
+        )
+        self.latency_budget = build_latency_budget()
 
-            print(f"📊 Loaded {len(self.models)} ML models")
+    @property
+    def models(self) -> Dict[str, Any]:
+        """Trained models, loaded lazily from the shared model registry"""
+        return self.model_registry.get_models()
 
-        except Exception as e:
-            print(f"❌ Error loading ML models: {e}")
-            self.models = {}
+    def load_models(self):
+        """Load the pre-trained ML models (warms the shared registry)"""
+        models = self.models
+        print(f"📊 Loaded {len(models)} ML models")
 
     def preprocess_input(self, input_data: Dict[str, float]) -> np.ndarray:
         """
@@ -94,67 +113,75 @@ class RealMLPredictionService:
         except Exception as e:
             print(f"Error preprocessing input: {e}")
             # Return default values if preprocessing fails
-            return np.array([[85.0, 50.0, 40.0, 25.0, 75.0, 6.8, 200.0]])
+            return np.array([DEFAULT_FEATURE_VALUES])
 
-    def make_prediction(
-        self, input_data: Dict[str, float]
-    ) -> Dict[str, List[Dict[str, Any]]]:
+    def preprocess_batch(
+        self, inputs: Union[Sequence[Dict[str, float]], np.ndarray]
+    ) -> np.ndarray:
         """
-        Make crop predictions using all available models
-        Returns predictions from each model with confidence scores
+        Build an (N, 7) feature matrix from a list of input dicts or an array
+        Columns follow FEATURE_ORDER: [N, P, K, temperature, humidity, ph, rainfall]
+        """
+        if isinstance(inputs, np.ndarray):
+            features = np.asarray(inputs, dtype=float)
+            if features.ndim == 1:
+                features = features.reshape(1, -1)
+            if features.ndim != 2 or features.shape[1] != len(FEATURE_ORDER):
+                raise ValueError(
+                    f"Expected an (N, {len(FEATURE_ORDER)}) feature matrix, "
+                    f"got shape {features.shape}"
+                )
+            return features
+
+        if not inputs:
+            return np.empty((0, len(FEATURE_ORDER)), dtype=float)
+
+        return np.vstack([self.preprocess_input(row) for row in inputs])
+
+    def features_to_input(self, row: np.ndarray) -> Dict[str, float]:
+        """Convert one feature row back into the named input dict"""
+        return {name: float(value) for name, value in zip(FEATURE_ORDER, row)}
+
+    def _run_models(self, features: np.ndarray) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Run every loaded model once over the whole feature matrix
+        Returns one prediction dict per row for each model
         """
         results = {}
+        n_rows = features.shape[0]
 
-        if not self.models:
-            print("⚠️ No ML models loaded, using fallback prediction")
-            return self._fallback_prediction(input_data)
-
-        # Preprocess input
-        features = self.preprocess_input(input_data)
-
-        for model_name, model in self.models.items():
+        for model_name, model in self._select_models(self.models, features).items():
             try:
-                # Make prediction
-                prediction = model.predict(features)[0]
+                # Make predictions for the whole batch
+                predictions = self._call_model(
+                    model_name, n_rows, lambda: model.predict(features)
+                )
 
-                # Get confidence score if available
-                confidence = 0.8  # Default confidence
+                # Get confidence scores if available
+                confidences = np.full(n_rows, 0.8)  # Default confidence
                 if hasattr(model, "predict_proba"):
                     try:
-                        probabilities = model.predict_proba(features)[0]
-                        confidence = float(np.max(probabilities))
+                        probabilities = model.predict_proba(features)
+                        confidences = np.max(probabilities, axis=1)
                     except Exception:
                         pass
                 elif hasattr(model, "decision_function"):
                     try:
-                        decision_scores = model.decision_function(features)[0]
+                        decision_scores = model.decision_function(features)
+                        if decision_scores.ndim == 1:
+                            decision_scores = decision_scores.reshape(-1, 1)
                         # Normalize decision scores to 0-1 range
-                        confidence = min(
-                            1.0, max(0.1, abs(decision_scores.max()) / 10.0)
+                        confidences = np.clip(
+                            np.abs(decision_scores.max(axis=1)) / 10.0, 0.1, 1.0
                         )
                     except Exception:
                         pass
 
-                # Convert prediction to crop name
-                if isinstance(prediction, (int, np.integer)):
-                    if 0 <= prediction < len(self.crop_labels):
-                        crop_name = self.crop_labels[prediction]
-                    else:
-                        crop_name = "rice"  # Default fallback
-                else:
-                    crop_name = str(prediction).lower()
-
                 results[model_name] = [
-                    {
-                        "crop": crop_name,
-                        "confidence": round(confidence, 3),
-                        "model": model_name,
-                        "prediction_index": (
-                            int(prediction)
-                            if isinstance(prediction, (int, np.integer))
-                            else -1
-                        ),
-                    }
+                    self._format_model_prediction(
+                        model_name, prediction, float(confidence)
+                    )
+                    for prediction, confidence in zip(predictions, confidences)
                 ]
 
             except Exception as e:
@@ -167,19 +194,300 @@ class RealMLPredictionService:
                         "model": model_name,
                         "error": str(e),
                     }
+                    for _ in range(n_rows)
                 ]
 
         return results
 
-    def get_ensemble_prediction(
+    def _model_probabilities(self, features: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Run each model once and return (N, n_crops) class probabilities
+        Columns are aligned to crop_labels. Models without predict_proba
+        (e.g. the SVM) have their decision_function scores softmax-normalised.
+        """
+        results = {}
+        n_rows = features.shape[0]
+        models = self._select_models(
+            self.model_registry.models_for_batch(n_rows), features
+        )
+
+        for model_name, model in models.items():
+            try:
+                aligned = self._call_model(
+                    model_name,
+                    n_rows,
+                    lambda: self._single_model_probabilities(model, features),
+                )
+                if aligned is not None:
+                    results[model_name] = aligned
+            except Exception as e:
+                print(f"Error making prediction with {model_name}: {e}")
+
+        return results
+
+    def _select_models(
+        self, models: Dict[str, Any], features: np.ndarray
+    ) -> Dict[str, Any]:
+        """
+        Models a single-input request waits for under the latency budget
+        Degraded models are handed to the budget to run off the request path.
+        Batches always use every model.
+        """
+        if features.shape[0] != 1:
+            return models
+
+        active, degraded = self.latency_budget.plan(list(models))
+        for model_name in degraded:
+            self.latency_budget.run_degraded(
+                model_name,
+                lambda model=models[model_name]: self._single_model_probabilities(
+                    model, features
+                ),
+            )
+        return {model_name: models[model_name] for model_name in active}
+
+    def _call_model(self, model_name: str, n_rows: int, call) -> Any:
+        """Run one model call, timing it when it serves a single input"""
+        if n_rows == 1:
+            return self.latency_budget.timed(model_name, call)
+        return call()
+
+    def _single_model_probabilities(
+        self, model: Any, features: np.ndarray
+    ) -> Optional[np.ndarray]:
+        """Aligned (N, n_crops) probabilities from one model, or None"""
+        scores = None
+        if hasattr(model, "predict_proba"):
+            try:
+                scores = np.asarray(model.predict_proba(features), dtype=float)
+            except Exception:
+                scores = None
+        if scores is None and hasattr(model, "decision_function"):
+            decision_scores = np.asarray(model.decision_function(features), dtype=float)
+            if decision_scores.ndim == 1:
+                # Binary classifier: scores for the positive class only
+                decision_scores = np.column_stack([-decision_scores, decision_scores])
+            shifted = decision_scores - decision_scores.max(axis=1, keepdims=True)
+            exp_scores = np.exp(shifted)
+            scores = exp_scores / exp_scores.sum(axis=1, keepdims=True)
+        if scores is None:
+            return None
+
+        classes = getattr(model, "classes_", np.arange(scores.shape[1]))
+        aligned = np.zeros((features.shape[0], len(self.crop_labels)))
+        for column, label in enumerate(classes):
+            index = self._class_index(label)
+            if index is not None:
+                aligned[:, index] += scores[:, column]
+
+        return aligned
+
+    def _compute_probabilities(self, features: np.ndarray) -> Dict[str, np.ndarray]:
+        """Class probabilities from the inference pool, or in-process as fallback"""
+        if self.inference_executor.enabled:
+            try:
+                return self.inference_executor.model_probabilities(features)
+            except InferenceUnavailable as e:
+                print(f"⚠️ Inference pool unavailable, running in-process: {e}")
+        return self._model_probabilities(features)
+
+    def _class_index(self, label: Any) -> Optional[int]:
+        """Map a model class label (encoded index or crop name) to crop_labels"""
+        if isinstance(label, (int, np.integer)):
+            return int(label) if 0 <= label < len(self.crop_labels) else None
+        name = str(label).lower()
+        return self.crop_labels.index(name) if name in self.crop_labels else None
+
+    def _soft_vote(
+        self, probabilities: Dict[str, np.ndarray], top_k: int
+    ) -> List[List[Dict[str, Any]]]:
+        """Weighted average of aligned probability vectors, top-k crops per row"""
+        model_names = list(probabilities.keys())
+        stacked = np.stack([probabilities[name] for name in model_names])
+        averaged = self._weighted_average(probabilities)
+        model_votes = stacked.argmax(axis=2)  # (n_models, N)
+
+        top_k = max(1, min(top_k, len(self.crop_labels)))
+        top_indices = np.argsort(-averaged, axis=1)[:, :top_k]
+
+        results = []
+        for row, indices in enumerate(top_indices):
+            row_predictions = []
+            for index in indices:
+                supporting = [
+                    name
+                    for name, vote in zip(model_names, model_votes[:, row])
+                    if vote == index
+                ]
+                row_predictions.append(
+                    {
+                        "crop": self.crop_labels[index],
+                        "confidence": round(float(averaged[row, index]), 3),
+                        "supporting_models": supporting,
+                        "model_agreement": len(supporting),
+                    }
+                )
+            results.append(row_predictions)
+
+        return results
+
+    def _weighted_average(self, probabilities: Dict[str, np.ndarray]) -> np.ndarray:
+        """(N, n_crops) average of the models' probabilities by ensemble weight"""
+        model_names = list(probabilities.keys())
+        weights = np.array(
+            [float(self.ensemble_weights.get(name, 1.0)) for name in model_names]
+        )
+        if weights.sum() <= 0:
+            weights = np.ones(len(model_names))
+        weights = weights / weights.sum()
+
+        stacked = np.stack([probabilities[name] for name in model_names])
+        return np.tensordot(weights, stacked, axes=1)
+
+    def _format_model_prediction(
+        self, model_name: str, prediction: Any, confidence: float
+    ) -> Dict[str, Any]:
+        """Convert a raw model output into a crop prediction dict"""
+        # Convert prediction to crop name
+        if isinstance(prediction, (int, np.integer)):
+            if 0 <= prediction < len(self.crop_labels):
+                crop_name = self.crop_labels[prediction]
+            else:
+                crop_name = "rice"  # Default fallback
+        else:
+            crop_name = str(prediction).lower()
+
+        return {
+            "crop": crop_name,
+            "confidence": round(confidence, 3),
+            "model": model_name,
+            "prediction_index": (
+                int(prediction) if isinstance(prediction, (int, np.integer)) else -1
+            ),
+        }
+
+    def make_prediction(
         self, input_data: Dict[str, float]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Make crop predictions using all available models
+        Returns predictions from each model with confidence scores
+        """
+        if not self.models:
+            print("⚠️ No ML models loaded, using fallback prediction")
+            return self._fallback_prediction(input_data)
+
+        # Preprocess input
+        features = self.preprocess_input(input_data)
+
+        if self.ensemble_mode == "soft":
+            probabilities = self._model_probabilities(features)
+            if probabilities:
+                # Derive each model's pick from the single predict_proba pass
+                return {
+                    model_name: [
+                        self._format_model_prediction(
+                            model_name,
+                            int(np.argmax(scores[0])),
+                            float(np.max(scores[0])),
+                        )
+                    ]
+                    for model_name, scores in probabilities.items()
+                }
+
+        return {
+            model_name: [predictions[0]]
+            for model_name, predictions in self._run_models(features).items()
+        }
+
+    def predict_batch(
+        self,
+        inputs: Union[Sequence[Dict[str, float]], np.ndarray],
+        top_k: Optional[int] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Get ensemble predictions for many inputs at once
+        Accepts a list of input dicts or an (N, 7) feature matrix and runs each
+        model a single time over the whole batch. Returns the top-k crop
+        recommendations for every row, in input order.
+        """
+        return self._predict_with_models(inputs, top_k)[0]
+
+    def _predict_with_models(
+        self,
+        inputs: Union[Sequence[Dict[str, float]], np.ndarray],
+        top_k: Optional[int] = None,
+    ) -> Tuple[List[List[Dict[str, Any]]], List[str]]:
+        """predict_batch output plus the names of the models that contributed"""
+        features = self.preprocess_batch(inputs)
+        n_rows = features.shape[0]
+        if n_rows == 0:
+            return [], []
+
+        if not self.models:
+            print("⚠️ No ML models loaded, using fallback prediction")
+            fallback = self._fallback_prediction({})
+            rows = [self._aggregate_predictions(fallback) for _ in range(n_rows)]
+            return rows, list(fallback)
+
+        if self.ensemble_mode == "soft":
+            probabilities = self._compute_probabilities(features)
+            if probabilities:
+                rows = self._soft_vote(probabilities, top_k or self.top_k)
+                return rows, list(probabilities)
+
+        model_predictions = self._run_models(features)
+
+        rows = [
+            self._aggregate_predictions(
+                {
+                    model_name: [predictions[row]]
+                    for model_name, predictions in model_predictions.items()
+                }
+            )
+            for row in range(n_rows)
+        ]
+        return rows, list(model_predictions)
+
+    def predict_top_crops(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top crop index (into crop_labels) and confidence for every row of an
+        (N, 7) feature matrix, without building per-row prediction dicts
+        Rows whose ranked crops are all outside crop_labels get index -1 and
+        confidence 0.
+        """
+        features = self.preprocess_batch(features)
+        if self.models and self.ensemble_mode == "soft" and len(features):
+            probabilities = self._compute_probabilities(features)
+            if probabilities:
+                averaged = self._weighted_average(probabilities)
+                top = averaged.argmax(axis=1)
+                return top, averaged[np.arange(len(top)), top]
+
+        top = np.full(len(features), -1, dtype=int)
+        confidence = np.zeros(len(features))
+        for row, predictions in enumerate(self.predict_batch(features)):
+            # Highest-ranked crop the caller can decode, e.g. not fallback "wheat"
+            for item in predictions:
+                index = self._class_index(item["crop"])
+                if index is not None:
+                    top[row], confidence[row] = index, item["confidence"]
+                    break
+        return top, confidence
+
+    def get_ensemble_prediction(
+        self, input_data: Dict[str, float], top_k: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Get ensemble prediction by combining results from all models
-        Returns top 3 crop recommendations
+        Returns the top-k crop recommendations (3 by default)
         """
-        model_predictions = self.make_prediction(input_data)
+        return self.predict_batch([input_data], top_k=top_k)[0]
 
+    def _aggregate_predictions(
+        self, model_predictions: Dict[str, List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """Combine per-model predictions for a single input into the top 3 crops"""
         # Aggregate predictions
         crop_scores = {}
 
@@ -226,12 +534,50 @@ class RealMLPredictionService:
     ) -> Dict[str, Any]:
         """
         Get prediction with detailed rationale and analysis
+        Ensemble output is cached on the quantized feature vector; the rationale
+        and input analysis are always built from the exact input values.
         """
-        ensemble_predictions = self.get_ensemble_prediction(input_data)
+        cached = self.prediction_cache.get_or_compute(
+            self.preprocess_input(input_data)[0],
+            self._cacheable_prediction,
+            ttl_for=self._prediction_ttl,
+        )
+        return self.build_prediction_result(
+            input_data, cached["predictions"], cached["contributing_models"]
+        )
+
+    def _cacheable_prediction(self, features: np.ndarray) -> Dict[str, Any]:
+        """Ensemble output for one row together with the models behind it"""
+        rows, contributing = self._predict_with_models(features)
+        return {"predictions": rows[0], "contributing_models": contributing}
 
+    def _prediction_ttl(self, cached: Dict[str, Any]) -> float:
+        """
+        Cache lifetime of one prediction: the full TTL when every loaded model
+        contributed, ML_PREDICTION_CACHE["DEGRADED_TTL_SECONDS"] otherwise
+        """
+        if set(self.models) <= set(cached["contributing_models"]):
+            return self.prediction_cache.ttl_seconds
+        config = getattr(settings, "ML_PREDICTION_CACHE", {})
+        return float(config.get("DEGRADED_TTL_SECONDS", 15))
+
+    def build_prediction_result(
+        self,
+        input_data: Dict[str, float],
+        ensemble_predictions: List[Dict[str, Any]],
+        contributing_models: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Attach rationale and input analysis to one row of ensemble output
+        (live, cached or precomputed). contributing_models defaults to every
+        loaded model, since batch results are never latency-budgeted.
+        """
         if not ensemble_predictions:
             return self._fallback_prediction_with_rationale(input_data)
 
+        if contributing_models is None:
+            contributing_models = list(self.models)
+
         top_prediction = ensemble_predictions[0]
 
         # Generate rationale based on input conditions
@@ -249,6 +595,12 @@ class RealMLPredictionService:
                 "supporting_models": top_prediction["supporting_models"],
                 "model_agreement": top_prediction["model_agreement"],
                 "total_models": len(self.models),
+                "ensemble_mode": self.ensemble_mode,
+                "contributing_models": contributing_models,
+                "degraded_models": [
+                    name for name in self.models if name not in contributing_models
+                ],
+                "degradation_policy": self.latency_budget.policy,
             },
         }
 
@@ -283,61 +635,17 @@ class RealMLPredictionService:
 
     def _analyze_input_conditions(self, input_data: Dict[str, float]) -> Dict[str, str]:
         """Analyze input conditions and provide insights"""
-        analysis = {}
-
-        temp = input_data.get("temperature", 25.0)
-        humidity = input_data.get("humidity", 75.0)
-        rainfall = input_data.get("rainfall", 200.0)
-        ph = input_data.get("ph", 6.8)
-        nitrogen = input_data.get("nitrogen", 85.0)
-        phosphorus = input_data.get("phosphorus", 50.0)
-        potassium = input_data.get("potassium", 40.0)
-
-        # Temperature analysis
-        if temp > 35:
-            analysis["temperature"] = (
-                "High temperature - consider heat-resistant varieties"
+        return self.analyze_input_batch([input_data])[0]
+
+    def analyze_input_batch(
+        self, inputs: Sequence[Dict[str, float]]
+    ) -> List[Dict[str, str]]:
+        """Input condition insights for many inputs in one rule pass"""
+        return crop_rule_engine.input_analysis(
+            crop_rule_engine.to_matrix(
+                inputs, dict(zip(FEATURE_ORDER, DEFAULT_FEATURE_VALUES))
             )
-        elif temp < 15:
-            analysis["temperature"] = "Low temperature - suitable for cool-season crops"
-        else:
-            analysis["temperature"] = "Optimal temperature range for most crops"
-
-        # Humidity analysis
-        if humidity > 80:
-            analysis["humidity"] = "High humidity - monitor for fungal diseases"
-        elif humidity < 40:
-            analysis["humidity"] = "Low humidity - ensure adequate irrigation"
-        else:
-            analysis["humidity"] = "Good humidity levels for crop growth"
-
-        # Rainfall analysis
-        if rainfall > 400:
-            analysis["rainfall"] = "High rainfall - ensure proper drainage"
-        elif rainfall < 100:
-            analysis["rainfall"] = "Low rainfall - supplemental irrigation needed"
-        else:
-            analysis["rainfall"] = "Adequate rainfall for rain-fed agriculture"
-
-        # pH analysis
-        if ph > 8:
-            analysis["ph"] = "Alkaline soil - may need acid-forming fertilizers"
-        elif ph < 6:
-            analysis["ph"] = "Acidic soil - consider lime application"
-        else:
-            analysis["ph"] = "Optimal soil pH for nutrient availability"
-
-        # NPK analysis
-        if nitrogen < 40:
-            analysis["nitrogen"] = "Low nitrogen - consider nitrogen fertilizers"
-        elif nitrogen > 120:
-            analysis["nitrogen"] = (
-                "High nitrogen - monitor for excessive vegetative growth"
-            )
-        else:
-            analysis["nitrogen"] = "Adequate nitrogen levels"
-
-        return analysis
+        )
 
     def _fallback_prediction(
         self, input_data: Dict[str, float]
@@ -377,7 +685,7 @@ class RealMLPredictionService:
 
 
 # Global instance
-real_ml_service = RealMLPredictionService()
+real_ml_service = service_container.lazy("real_ml_service")
 
 
 # Example usage
@@ -0,0 +1,249 @@
+"""
+Recommendation Precompute
+Scores every IoT sensor set and farmer field profile in vectorized chunks
+and stores the top-k crops in PrecomputedRecommendation, so dashboards and
+the prediction API can answer without running the models live.
+"""
+
+import time
+import uuid
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from apps.crops.models import PrecomputedRecommendation
+from apps.dashboard.models import FarmerFieldProfile, SoilHealthReport
+from apps.sensors.models import IoTSensorSet
+
+from .prediction_job_queue import INPUT_FIELDS
+
+SOURCE_TYPES = ("sensor_set", "field_profile")
+
+
+def shard_of(pk: Any, shard_count: int) -> int:
+    """Stable shard number for an integer or UUID primary key"""
+    if isinstance(pk, uuid.UUID):
+        return pk.int % shard_count
+    return int(pk) % shard_count
+
+
+class RecommendationPrecomputer:
+    """Batch scorer that fills the PrecomputedRecommendation table"""
+
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        top_k: Optional[int] = None,
+        use_weather: bool = True,
+        progress: Optional[Callable[[str], None]] = None,
+    ):
+        self.chunk_size = chunk_size
+        self.top_k = top_k
+        self.use_weather = use_weather
+        self.progress = progress or print
+        self._climate: Dict[str, Dict[str, float]] = {}
+
+    def run(
+        self, shard_index: int = 0, shard_count: int = 1, sources=SOURCE_TYPES
+    ) -> Dict[str, Any]:
+        """Score every row of this shard and upsert the results"""
+        from .container import real_ml_service
+
+        started = time.perf_counter()
+        stats = {"shard": shard_index, "shards": shard_count, "sources": {}}
+
+        for source_type in sources:
+            rows = chunks = 0
+            source_started = time.perf_counter()
+
+            for chunk in self._iter_chunks(source_type, shard_index, shard_count):
+                features, metadata = self._build_features(source_type, chunk)
+                # One vectorized ensemble call per chunk
+                predictions = real_ml_service.predict_batch(features, top_k=self.top_k)
+                self._store(
+                    source_type,
+                    metadata,
+                    features,
+                    predictions,
+                    real_ml_service.model_registry.version,
+                )
+
+                rows += len(chunk)
+                chunks += 1
+                elapsed = time.perf_counter() - source_started
+                self.progress(
+                    f"[shard {shard_index + 1}/{shard_count}] {source_type}: "
+                    f"{rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)"
+                )
+
+            stats["sources"][source_type] = {
+                "rows": rows,
+                "chunks": chunks,
+                "seconds": round(time.perf_counter() - source_started, 3),
+            }
+
+        total_rows = sum(item["rows"] for item in stats["sources"].values())
+        stats["rows"] = total_rows
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        stats["rows_per_second"] = (
+            round(total_rows / stats["seconds"], 1) if stats["seconds"] else 0.0
+        )
+        return stats
+
+    # ==== INPUT ASSEMBLY ====
+
+    def _iter_chunks(
+        self, source_type: str, shard_index: int, shard_count: int
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Stream lightweight rows from the DB, grouped into chunks"""
+        if source_type == "sensor_set":
+            queryset = IoTSensorSet.objects.values(
+                "id",
+                "region",
+                "default_nitrogen",
+                "default_phosphorus",
+                "default_potassium",
+            )
+        else:
+            queryset = FarmerFieldProfile.objects.values("id", "farmer_id", "region")
+
+        chunk = []
+        for row in queryset.order_by("pk").iterator(chunk_size=self.chunk_size):
+            if shard_count > 1 and shard_of(row["id"], shard_count) != shard_index:
+                continue
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _build_features(
+        self, source_type: str, chunk: List[Dict[str, Any]]
+    ) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """(N, 7) feature matrix plus per-row metadata for a chunk"""
+        soil = {}
+        if source_type == "field_profile":
+            soil = self._latest_soil_reports([row["farmer_id"] for row in chunk])
+
+        features = np.empty((len(chunk), len(INPUT_FIELDS)))
+        metadata = []
+        for i, row in enumerate(chunk):
+            values = dict(self._region_climate(row["region"]))
+            if source_type == "sensor_set":
+                values["nitrogen"] = row["default_nitrogen"]
+                values["phosphorus"] = row["default_phosphorus"]
+                values["potassium"] = row["default_potassium"]
+                farmer_id = None
+            else:
+                farmer_id = row["farmer_id"]
+                values.update(soil.get(farmer_id, {}))
+
+            features[i] = [float(values[name]) for name in INPUT_FIELDS]
+            metadata.append(
+                {
+                    "source_id": str(row["id"]),
+                    "farmer_id": farmer_id,
+                    "region": row["region"] or "",
+                }
+            )
+
+        return features, metadata
+
+    def _latest_soil_reports(
+        self, farmer_ids: List[int]
+    ) -> Dict[int, Dict[str, float]]:
+        """Measured N/P/K/pH from each farmer's most recent soil report"""
+        latest = {}
+        reports = (
+            SoilHealthReport.objects.filter(farmer_id__in=farmer_ids)
+            .order_by("farmer_id", "-test_date")
+            .values("farmer_id", "nitrogen", "phosphorus", "potassium", "ph")
+        )
+        for report in reports:
+            if report["farmer_id"] in latest:
+                continue
+            latest[report["farmer_id"]] = {
+                name: report[name]
+                for name in ("nitrogen", "phosphorus", "potassium", "ph")
+                if report[name] is not None
+            }
+        return latest
+
+    def _region_climate(self, region: str) -> Dict[str, float]:
+        """Regional defaults with live rainfall/humidity, fetched once per region"""
+        if region not in self._climate:
+            from .container import crop_prediction_service, enhanced_weather_service
+
+            defaults = crop_prediction_service.regional_defaults
+            climate = dict(defaults.get(region, defaults["Bhairahawa-Butwal"]))
+            if self.use_weather:
+                try:
+                    weather = enhanced_weather_service.get_current_weather_data(region)
+                    for name in ("rainfall", "humidity"):
+                        if weather and weather.get(name) is not None:
+                            climate[name] = float(weather[name])
+                except Exception as e:
+                    print(f"Weather API error for {region}: {e}")
+            self._climate[region] = climate
+        return self._climate[region]
+
+    # ==== STORAGE ====
+
+    def _store(
+        self,
+        source_type: str,
+        metadata: List[Dict[str, Any]],
+        features: np.ndarray,
+        predictions: List[List[Dict[str, Any]]],
+        model_version: str,
+    ):
+        """Upsert one chunk of results in a single statement"""
+        computed_at = timezone.now()
+        PrecomputedRecommendation.objects.bulk_create(
+            [
+                PrecomputedRecommendation(
+                    source_type=source_type,
+                    source_id=meta["source_id"],
+                    farmer_id=meta["farmer_id"],
+                    region=meta["region"],
+                    features=[round(float(value), 3) for value in row],
+                    predicted_crops=row_predictions,
+                    model_version=model_version,
+                    computed_at=computed_at,
+                )
+                for meta, row, row_predictions in zip(metadata, features, predictions)
+            ],
+            update_conflicts=True,
+            unique_fields=["source_type", "source_id"],
+            update_fields=[
+                "farmer",
+                "region",
+                "features",
+                "predicted_crops",
+                "model_version",
+                "computed_at",
+            ],
+        )
+
+
+def get_precomputed(
+    source_type: Optional[str] = None, source_id: Any = None, farmer=None
+) -> Optional[PrecomputedRecommendation]:
+    """Fresh precomputed result for a sensor set, field profile or farmer"""
+    max_age = timedelta(hours=getattr(settings, "ML_PRECOMPUTE_MAX_AGE_HOURS", 26))
+    from .model_registry import model_registry
+
+    # Results from a replaced model are ignored until the next precompute run
+    queryset = PrecomputedRecommendation.objects.filter(
+        computed_at__gte=timezone.now() - max_age,
+        model_version=model_registry.version,
+    )
+    if farmer is not None:
+        queryset = queryset.filter(source_type="field_profile", farmer=farmer)
+    else:
+        queryset = queryset.filter(source_type=source_type, source_id=str(source_id))
+    return queryset.first()
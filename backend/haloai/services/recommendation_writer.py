@@ -0,0 +1,108 @@
+"""
+Recommendation Writer
+Bulk persistence for crop recommendations. Crop types are resolved from an
+in-process name map, missing ones are created in one bulk insert, and the
+recommendations of many prediction requests are written in one transaction.
+"""
+
+import threading
+from typing import Any, Dict, Iterable, List
+
+from django.db import transaction
+
+from apps.crops.models import CropPredictionRequest, CropRecommendation, CropType
+
+# Field defaults for crop types first seen in a prediction
+NEW_CROP_TYPE_DEFAULTS = {
+    "regional_success_rate": 0.7,
+    "growing_season": "Multiple seasons",
+}
+
+
+class RecommendationWriter:
+    """Writes CropRecommendation rows with a constant number of queries"""
+
+    def __init__(self):
+        self._crop_types: Dict[str, CropType] = {}
+        self._warmed = False
+        self._lock = threading.Lock()
+
+    def warm(self) -> int:
+        """Load every existing crop type into the name map"""
+        crop_types = {crop_type.name: crop_type for crop_type in CropType.objects.all()}
+        with self._lock:
+            self._crop_types.update(crop_types)
+            self._warmed = True
+        return len(crop_types)
+
+    def resolve_crop_types(self, names: Iterable[str]) -> Dict[str, CropType]:
+        """Map crop names to CropType rows, creating any that do not exist yet"""
+        if not self._warmed:
+            self.warm()
+
+        names = set(names)
+        missing = [name for name in names if name not in self._crop_types]
+        if missing:
+            # Another process may insert the same names concurrently
+            CropType.objects.bulk_create(
+                [CropType(name=name, **NEW_CROP_TYPE_DEFAULTS) for name in missing],
+                ignore_conflicts=True,
+            )
+            created = {
+                crop_type.name: crop_type
+                for crop_type in CropType.objects.filter(name__in=missing)
+            }
+            with self._lock:
+                self._crop_types.update(created)
+
+        return {name: self._crop_types[name] for name in names}
+
+    def write(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Insert recommendation rows in a single bulk_create
+        Each row holds CropRecommendation field values plus "crop_name" in place
+        of crop_type. Rows already present for a request are skipped.
+        """
+        if not rows:
+            return 0
+
+        with transaction.atomic():
+            crop_types = self.resolve_crop_types(row["crop_name"] for row in rows)
+            recommendations = [
+                CropRecommendation(
+                    crop_type=crop_types[row["crop_name"]],
+                    **{key: value for key, value in row.items() if key != "crop_name"},
+                )
+                for row in rows
+            ]
+            CropRecommendation.objects.bulk_create(
+                recommendations, ignore_conflicts=True
+            )
+
+        return len(recommendations)
+
+    def persist_predictions(
+        self,
+        prediction_requests: List[CropPredictionRequest],
+        rows: List[Dict[str, Any]],
+        fields: List[str],
+    ) -> int:
+        """
+        Persistence stage for batch scoring: save the given request fields with
+        one bulk_update and all their recommendations with one bulk_create,
+        inside a single transaction.
+        """
+        with transaction.atomic():
+            if prediction_requests:
+                CropPredictionRequest.objects.bulk_update(prediction_requests, fields)
+            return self.write(rows)
+
+    def invalidate(self):
+        """Forget cached crop types (e.g. after they were edited in the admin)"""
+        with self._lock:
+            self._crop_types.clear()
+            self._warmed = False
+
+
+# Global instance
+recommendation_writer = RecommendationWriter()
@@ -0,0 +1,295 @@
+"""
+Regional Aggregates
+Running per-region statistics of the latest reading of every sensor. Each
+stored or received reading replaces that sensor's previous one: its values
+are subtracted from the region's count/sum/sum-of-squares and the new values
+added, so means, standard deviations and sensor counts are read without
+touching the sensors. Readings older than IOT_REGIONAL_MAX_AGE_SECONDS are
+dropped before statistics are read, so a sensor that stops reporting leaves
+its region's averages. One store per process is shared by the IoT services
+and the crop prediction data collectors: both services key readings by the
+physical sensor id and merge their fields into that sensor's entry, so a
+sensor read through both counts once.
+"""
+
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+
+# Reading fields aggregated per region. "temperature" is the sensor's own
+# temperature reading as EnhancedIoTService parses it; IoTDataService's
+# airTemperature is kept apart as "air_temperature" in the same sensor entry.
+AGGREGATE_FIELDS = (
+    "ph",
+    "temperature",
+    "soil_temperature",
+    "humidity",
+    "air_temperature",
+)
+
+
+class RunningStats:
+    """Count, sum, sum of squares, min and max of one field"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.minimum: Optional[float] = None
+        self.maximum: Optional[float] = None
+        # Set when the current min or max was removed; recomputed on next read
+        self.bounds_dirty = False
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.total_squares += value * value
+        if not self.bounds_dirty:
+            if self.minimum is None or value < self.minimum:
+                self.minimum = value
+            if self.maximum is None or value > self.maximum:
+                self.maximum = value
+
+    def remove(self, value: float):
+        self.count -= 1
+        self.total -= value
+        self.total_squares -= value * value
+        if self.count == 0:
+            self.total = self.total_squares = 0.0
+            self.minimum = self.maximum = None
+            self.bounds_dirty = False
+        elif value == self.minimum or value == self.maximum:
+            self.bounds_dirty = True
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    @property
+    def std(self) -> Optional[float]:
+        """Population standard deviation"""
+        if not self.count:
+            return None
+        variance = self.total_squares / self.count - self.mean**2
+        return math.sqrt(max(variance, 0.0))
+
+
+class RegionAggregate:
+    """Running statistics of one region's sensors"""
+
+    def __init__(self):
+        self.fields = {name: RunningStats() for name in AGGREGATE_FIELDS}
+        self.sensors = 0
+        self.active_sensors = 0
+        self.updated_at: Optional[str] = None
+        # source -> when that service last fetched all of the region's sensors
+        self.refreshed_at: Dict[str, float] = {}
+        # sensor_id -> when its reading was recorded, oldest first
+        self.recorded_at: "OrderedDict[str, float]" = OrderedDict()
+
+
+class RegionalAggregateStore:
+    """Latest values per sensor and running aggregates per region"""
+
+    def __init__(self, max_age_seconds: Optional[float] = None):
+        self.max_age_seconds = max_age_seconds
+        # sensor_id -> (region, {field: value}, active)
+        self._readings: Dict[str, Tuple[str, Dict[str, float], bool]] = {}
+        self._regions: Dict[str, RegionAggregate] = {}
+        self._lock = threading.Lock()
+
+    def update(
+        self,
+        sensor_id: str,
+        region: str,
+        reading: Dict[str, Any],
+        merge: bool = False,
+    ):
+        """
+        Replace a sensor's reading in its region's aggregates (O(1))
+        With merge, fields the reading lacks keep the sensor's previous values.
+        """
+        values = {}
+        for name in AGGREGATE_FIELDS:
+            try:
+                value = float(reading[name])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if math.isfinite(value):
+                values[name] = value
+        active = reading.get("status", "active") == "active"
+
+        with self._lock:
+            previous = self._readings.get(sensor_id)
+            if merge and previous is not None and previous[0] == region:
+                values = {**previous[1], **values}
+            self._discard(sensor_id)
+            aggregate = self._regions.get(region)
+            if aggregate is None:
+                aggregate = self._regions[region] = RegionAggregate()
+            for name, value in values.items():
+                aggregate.fields[name].add(value)
+            aggregate.sensors += 1
+            aggregate.active_sensors += int(active)
+            aggregate.updated_at = datetime.now(timezone.utc).isoformat()
+            aggregate.recorded_at[sensor_id] = time.monotonic()
+            self._readings[sensor_id] = (region, values, active)
+
+    def remove(self, sensor_id: str):
+        """Take a sensor out of its region's aggregates"""
+        with self._lock:
+            self._discard(sensor_id)
+
+    def mark_refreshed(self, region: str, source: str = "default"):
+        """Record that source just fetched all of a region's sensors"""
+        with self._lock:
+            aggregate = self._regions.get(region)
+            if aggregate is None:
+                aggregate = self._regions[region] = RegionAggregate()
+            aggregate.refreshed_at[source] = time.monotonic()
+
+    def is_fresh(
+        self, region: str, max_age_seconds: float, source: str = "default"
+    ) -> bool:
+        """Whether source fetched the region within max_age_seconds"""
+        with self._lock:
+            aggregate = self._regions.get(region)
+            refreshed_at = aggregate.refreshed_at.get(source) if aggregate else None
+        return (
+            refreshed_at is not None
+            and time.monotonic() - refreshed_at < max_age_seconds
+        )
+
+    def covers(self, region: str, sensor_ids: Iterable[str]) -> bool:
+        """Whether every sensor has an unexpired reading in the region"""
+        with self._lock:
+            self._expire(region)
+            aggregate = self._regions.get(region)
+            return aggregate is not None and all(
+                sensor_id in aggregate.recorded_at for sensor_id in sensor_ids
+            )
+
+    def summary(self, region: str) -> Optional[Dict[str, Any]]:
+        """Per-field statistics and sensor counts, or None without readings"""
+        with self._lock:
+            self._expire(region)
+            aggregate = self._regions.get(region)
+            if aggregate is None or not aggregate.sensors:
+                return None
+            statistics = {}
+            for name, stats in aggregate.fields.items():
+                if not stats.count:
+                    continue
+                if stats.bounds_dirty:
+                    self._recompute_bounds(region, name, stats)
+                statistics[name] = {
+                    "mean": stats.mean,
+                    "std": stats.std,
+                    "min": stats.minimum,
+                    "max": stats.maximum,
+                    "count": stats.count,
+                }
+            return {
+                "region": region,
+                "sensor_count": aggregate.sensors,
+                "active_sensors": aggregate.active_sensors,
+                "statistics": statistics,
+                "last_updated": aggregate.updated_at,
+            }
+
+    def means(self, region: str, fields: Iterable[str] = AGGREGATE_FIELDS):
+        """Mean of each requested field that has readings in the region"""
+        summary = self.summary(region)
+        if summary is None:
+            return {}
+        return {
+            name: summary["statistics"][name]["mean"]
+            for name in fields
+            if name in summary["statistics"]
+        }
+
+    def _discard(self, sensor_id: str):
+        """Subtract a sensor's previous reading (lock held)"""
+        previous = self._readings.pop(sensor_id, None)
+        if previous is None:
+            return
+        region, values, active = previous
+        aggregate = self._regions[region]
+        for name, value in values.items():
+            aggregate.fields[name].remove(value)
+        aggregate.sensors -= 1
+        aggregate.active_sensors -= int(active)
+        aggregate.recorded_at.pop(sensor_id, None)
+
+    def _expire(self, region: str):
+        """Drop the region's readings older than max_age_seconds (lock held)"""
+        aggregate = self._regions.get(region)
+        if aggregate is None or self.max_age_seconds is None:
+            return
+        cutoff = time.monotonic() - self.max_age_seconds
+        while aggregate.recorded_at:
+            sensor_id, recorded_at = next(iter(aggregate.recorded_at.items()))
+            if recorded_at >= cutoff:
+                break
+            self._discard(sensor_id)
+
+    def _recompute_bounds(self, region: str, name: str, stats: RunningStats):
+        """Min/max after their sensor left: one pass over the region (lock held)"""
+        values = [
+            readings[name]
+            for sensor_region, readings, _ in self._readings.values()
+            if sensor_region == region and name in readings
+        ]
+        stats.minimum = min(values) if values else None
+        stats.maximum = max(values) if values else None
+        stats.bounds_dirty = False
+
+
+def regional_average_result(
+    summary: Dict[str, Any],
+    defaults: Dict[str, float],
+    temperature_field: str = "temperature",
+) -> Dict[str, Any]:
+    """
+    Rounded regional means (defaults for fields without readings)
+    temperature is the mean of temperature_field, or of "temperature" when
+    that field has no readings.
+    """
+    means = {name: stats["mean"] for name, stats in summary["statistics"].items()}
+    temperature = means.get(temperature_field, means.get("temperature"))
+    return {
+        "ph": round(means.get("ph", defaults["ph"]), 2),
+        "temperature": round(
+            temperature if temperature is not None else defaults["temperature"], 1
+        ),
+        "soil_temperature": round(
+            means.get("soil_temperature", defaults["soil_temperature"]), 1
+        ),
+        "humidity": round(means.get("humidity", defaults["humidity"]), 1),
+        "sensor_count": summary["sensor_count"],
+        "active_sensors": summary["active_sensors"],
+        "statistics": {
+            name: {
+                key: round(value, 3) if isinstance(value, float) else value
+                for key, value in stats.items()
+            }
+            for name, stats in summary["statistics"].items()
+        },
+    }
+
+
+def build_regional_aggregates() -> RegionalAggregateStore:
+    """Create a RegionalAggregateStore from the IOT_REGIONAL_MAX_AGE_SECONDS setting"""
+    max_age = getattr(settings, "IOT_REGIONAL_MAX_AGE_SECONDS", 1800)
+    return RegionalAggregateStore(
+        max_age_seconds=float(max_age) if max_age is not None else None
+    )
+
+
+# Global instance
+regional_aggregates = build_regional_aggregates()
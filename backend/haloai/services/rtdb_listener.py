@@ -0,0 +1,428 @@
+"""
+RTDB Listener
+Keeps the latest reading of every sensor in memory by subscribing to the
+sensors' Realtime Database paths instead of polling them. Each update is
+parsed into a SensorReading and stored with a version number, so the live
+endpoints answer from memory and can tell clients what changed and how old
+a reading is. A supervisor thread reopens dropped subscriptions with
+exponential backoff.
+"""
+
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+
+class LatestValueStore:
+    """Latest reading per sensor, versioned by a store-wide change counter"""
+
+    def __init__(self, stale_seconds: float = 600.0):
+        self.stale_seconds = stale_seconds
+        self.version = 0
+        # Versions only mean something within this process's store
+        self.epoch = uuid.uuid4().hex[:8]
+
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._changed = threading.Condition()
+        self._watchers: List[Callable[[int], None]] = []
+
+    def put(
+        self, sensor_id: str, reading: Dict[str, Any], source: str = "listener"
+    ) -> Optional[int]:
+        """
+        Store a sensor's reading; returns its new version, or None when the
+        values are unchanged (a re-sent snapshot only refreshes seen_at)
+        """
+        now = time.monotonic()
+        with self._changed:
+            entry = self._entries.get(sensor_id)
+            if entry is not None and _same_values(entry["reading"], reading):
+                entry["seen_at"] = now
+                return None
+
+            self.version += 1
+            self._entries[sensor_id] = {
+                "reading": dict(reading),
+                "version": self.version,
+                "source": source,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "changed_at": now,
+                "seen_at": now,
+            }
+            self._changed.notify_all()
+            version, watchers = self.version, list(self._watchers)
+
+        # A failing watcher (e.g. a stream whose event loop closed) must not
+        # stop the others or the writer
+        for watcher in watchers:
+            try:
+                watcher(version)
+            except Exception as e:
+                print(f"⚠️ Sensor store watcher failed: {e}")
+        return version
+
+    def get(self, sensor_id: str) -> Optional[Dict[str, Any]]:
+        """Reading with its version and staleness, or None if never seen"""
+        with self._changed:
+            entry = self._entries.get(sensor_id)
+            if entry is None:
+                return None
+            return self._with_freshness(entry)
+
+    def changes_since(self, version: int) -> Dict[str, Dict[str, Any]]:
+        """Readings of every sensor whose version is newer than version"""
+        with self._changed:
+            return {
+                sensor_id: self._with_freshness(entry)
+                for sensor_id, entry in self._entries.items()
+                if entry["version"] > version
+            }
+
+    def wait_for_change(self, version: int, timeout: float) -> int:
+        """Block until the store moves past version (or timeout); current version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version > version, timeout=timeout)
+            return self.version
+
+    def add_watcher(self, callback: Callable[[int], None]):
+        """Call callback(version) after every change (for async waiters)"""
+        with self._changed:
+            self._watchers.append(callback)
+
+    def remove_watcher(self, callback: Callable[[int], None]):
+        with self._changed:
+            if callback in self._watchers:
+                self._watchers.remove(callback)
+
+    def sensor_ids(self) -> List[str]:
+        with self._changed:
+            return list(self._entries)
+
+    def _with_freshness(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        age = time.monotonic() - entry["changed_at"]
+        return {
+            **entry["reading"],
+            "version": entry["version"],
+            "source": entry["source"],
+            "updated_at": entry["updated_at"],
+            "age_seconds": round(age, 1),
+            "stale": age > self.stale_seconds,
+        }
+
+
+def _same_values(previous: Dict[str, Any], reading: Dict[str, Any]) -> bool:
+    """Equal readings, ignoring timestamps the parser filled in itself"""
+    keys = (set(previous) | set(reading)) - {"timestamp"}
+    return all(previous.get(key) == reading.get(key) for key in keys)
+
+
+@dataclass
+class PathSubscription:
+    """One RTDB listener and the sensors whose data lives at its path"""
+
+    path: str
+    sensor_ids: List[str]
+    handle: Any = None
+    snapshot: Any = None
+    connected: bool = False
+    events: int = 0
+    reconnects: int = 0
+    failures: int = 0
+    retry_at: float = 0.0
+    last_event_at: Optional[float] = None
+    last_error: Optional[str] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class RTDBListener:
+    """Subscribes to each bound sensor path and feeds a LatestValueStore"""
+
+    def __init__(
+        self,
+        db_ref: Any,
+        path_resolver: Any,
+        parse_payload: Callable[[str, Any], Any],
+        sensor_ids: Callable[[], Iterable[str]],
+        store: LatestValueStore,
+        backoff_min_seconds: float = 1.0,
+        backoff_max_seconds: float = 120.0,
+        supervise_seconds: float = 5.0,
+        on_reading: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ):
+        self.db_ref = db_ref
+        self.path_resolver = path_resolver
+        self.parse_payload = parse_payload
+        self.sensor_ids = sensor_ids
+        self.store = store
+        self.backoff_min_seconds = backoff_min_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.supervise_seconds = supervise_seconds
+        self.on_reading = on_reading
+
+        self._subscriptions: Dict[str, PathSubscription] = {}
+        self._sensor_paths: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ==== LIFECYCLE ====
+
+    def start(self) -> bool:
+        """Start the supervisor thread; False when there is no database"""
+        if self.db_ref is None:
+            return False
+        if self._thread is not None and self._thread.is_alive():
+            return True
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._supervise, name="rtdb-listener", daemon=True
+        )
+        self._thread.start()
+        print("📡 RTDB listener started")
+        return True
+
+    def stop(self):
+        """Close every subscription and stop the supervisor"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.supervise_seconds + 1)
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+            self._subscriptions.clear()
+            self._sensor_paths.clear()
+        for subscription in subscriptions:
+            self._close(subscription)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def is_live(self, sensor_id: str) -> bool:
+        """Whether the sensor's path is subscribed and the stream is connected"""
+        path = self._sensor_paths.get(sensor_id)
+        subscription = self._subscriptions.get(path) if path else None
+        return subscription is not None and subscription.connected
+
+    def stats(self) -> Dict[str, Any]:
+        """Connection state per subscribed path"""
+        now = time.monotonic()
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+        return {
+            "running": self.running,
+            "store_version": self.store.version,
+            "stale_seconds": self.store.stale_seconds,
+            "subscriptions": {
+                subscription.path: {
+                    "sensors": list(subscription.sensor_ids),
+                    "connected": subscription.connected,
+                    "events": subscription.events,
+                    "reconnects": subscription.reconnects,
+                    "failures": subscription.failures,
+                    "seconds_since_event": (
+                        round(now - subscription.last_event_at, 1)
+                        if subscription.last_event_at is not None
+                        else None
+                    ),
+                    "last_error": subscription.last_error,
+                }
+                for subscription in subscriptions
+            },
+        }
+
+    # ==== SUPERVISOR ====
+
+    def _supervise(self):
+        while not self._stop.is_set():
+            try:
+                self._tick()
+            except Exception as e:
+                print(f"⚠️ RTDB listener supervisor error: {e}")
+            self._stop.wait(self.supervise_seconds)
+
+    def _tick(self):
+        """Bind new sensors, then (re)open any subscription that is down"""
+        self._bind_sensors()
+        now = time.monotonic()
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+        for subscription in subscriptions:
+            if subscription.connected and not _handle_alive(subscription.handle):
+                self._disconnected(subscription, "listener thread exited")
+            if not subscription.connected and now >= subscription.retry_at:
+                self._open(subscription)
+
+    def _bind_sensors(self):
+        """
+        Group sensors by the path the resolver bound them to; sensors whose
+        data has not been found yet are retried on the resolver's schedule
+        """
+        for sensor_id in self.sensor_ids():
+            if sensor_id in self._sensor_paths:
+                continue
+            binding = self.path_resolver.binding(sensor_id)
+            if binding is None:
+                reading = self.path_resolver.read(sensor_id)
+                binding = self.path_resolver.binding(sensor_id)
+                if binding is None:
+                    continue
+                self._store_reading(sensor_id, reading, source="probe")
+
+            with self._lock:
+                subscription = self._subscriptions.get(binding.path)
+                if subscription is None:
+                    subscription = PathSubscription(binding.path, [])
+                    self._subscriptions[binding.path] = subscription
+                subscription.sensor_ids.append(sensor_id)
+                self._sensor_paths[sensor_id] = binding.path
+
+    def _open(self, subscription: PathSubscription):
+        """Start listening on the path; the first event is a full snapshot"""
+        self._close(subscription)
+        try:
+            subscription.handle = self.db_ref.child(subscription.path).listen(
+                lambda event: self._on_event(subscription, event)
+            )
+        except Exception as e:
+            self._disconnected(subscription, str(e))
+            return
+        subscription.connected = True
+        if subscription.events or subscription.failures:
+            subscription.reconnects += 1
+        print(f"📡 Listening on RTDB path {subscription.path}")
+
+    def _disconnected(self, subscription: PathSubscription, reason: str):
+        """Mark the subscription down and schedule a reconnect with backoff"""
+        subscription.connected = False
+        subscription.failures += 1
+        subscription.last_error = reason
+        delay = min(
+            self.backoff_max_seconds,
+            self.backoff_min_seconds * 2 ** (subscription.failures - 1),
+        )
+        delay = random.uniform(delay / 2, delay)
+        subscription.retry_at = time.monotonic() + delay
+        print(
+            f"⚠️ RTDB listener on {subscription.path} down ({reason}), "
+            f"retrying in {delay:.1f}s"
+        )
+
+    def _close(self, subscription: PathSubscription):
+        handle, subscription.handle = subscription.handle, None
+        if handle is not None:
+            try:
+                handle.close()
+            except Exception:
+                pass
+
+    # ==== EVENTS ====
+
+    def _on_event(self, subscription: PathSubscription, event: Any):
+        """
+        Apply a put/patch to the path's snapshot and re-parse its sensors;
+        exceptions stay here so they cannot end the SDK's listener thread
+        """
+        try:
+            with subscription.lock:
+                subscription.snapshot = apply_event(
+                    subscription.snapshot,
+                    event.event_type,
+                    event.path,
+                    event.data,
+                )
+                snapshot = subscription.snapshot
+                subscription.events += 1
+                subscription.last_event_at = time.monotonic()
+                subscription.failures = 0
+
+            for sensor_id in list(subscription.sensor_ids):
+                reading = self.parse_payload(sensor_id, snapshot) if snapshot else None
+                self._store_reading(sensor_id, reading, source="listener")
+        except Exception as e:
+            subscription.last_error = f"event handling failed: {e}"
+            print(f"⚠️ RTDB listener event on {subscription.path} failed: {e}")
+
+    def _store_reading(self, sensor_id: str, reading: Any, source: str):
+        if reading is not None and reading.is_valid():
+            data = reading.to_dict()
+            self.store.put(sensor_id, data, source=source)
+            if self.on_reading is not None:
+                self.on_reading(sensor_id, data)
+
+
+def apply_event(snapshot: Any, event_type: str, path: str, data: Any) -> Any:
+    """
+    New snapshot after an RTDB stream event: "put" replaces the value at
+    path (None deletes it), "patch" merges data's children into it
+    """
+    keys = [key for key in (path or "/").split("/") if key]
+    if event_type == "patch":
+        merged = _child(snapshot, keys)
+        merged = dict(merged) if isinstance(merged, dict) else {}
+        for key, value in (data or {}).items():
+            merged = _replace(merged, [k for k in key.split("/") if k], value)
+        data = merged
+    elif event_type != "put":
+        return snapshot
+    return _replace(snapshot, keys, data)
+
+
+def _child(node: Any, keys: List[str]) -> Any:
+    for key in keys:
+        node = node.get(key) if isinstance(node, dict) else None
+    return node
+
+
+def _replace(node: Any, keys: List[str], value: Any) -> Any:
+    """Copy of node with value at keys (dropped when value is None)"""
+    if not keys:
+        return value
+    node = dict(node) if isinstance(node, dict) else {}
+    child = _replace(node.get(keys[0]), keys[1:], value)
+    if child is None:
+        node.pop(keys[0], None)
+    else:
+        node[keys[0]] = child
+    return node or None
+
+
+def _handle_alive(handle: Any) -> bool:
+    """
+    firebase_admin's SSE client retries plain disconnects itself, but its
+    thread exits when a reconnect attempt fails; treat that as down
+    """
+    thread = getattr(handle, "_thread", None)
+    return handle is not None and (thread is None or thread.is_alive())
+
+
+def build_rtdb_listener(service: Any) -> RTDBListener:
+    """RTDBListener for an EnhancedIoTService, configured by IOT_RTDB_LISTENER"""
+    config = getattr(settings, "IOT_RTDB_LISTENER", {})
+    return RTDBListener(
+        service.db_ref,
+        service.path_resolver,
+        service._parse_sensor_data,
+        lambda: list(service.sensor_locations),
+        service.latest_values,
+        backoff_min_seconds=float(config.get("BACKOFF_MIN_SECONDS", 1)),
+        backoff_max_seconds=float(config.get("BACKOFF_MAX_SECONDS", 120)),
+        supervise_seconds=float(config.get("SUPERVISE_SECONDS", 5)),
+        on_reading=service._record_reading,
+    )
+
+
+def start_rtdb_listener_if_configured():
+    """Start the IoT service's listener when IOT_RTDB_LISTENER is enabled"""
+    config = getattr(settings, "IOT_RTDB_LISTENER", {})
+    if not config.get("ENABLED", False):
+        return
+    from .container import enhanced_iot_service
+
+    if not enhanced_iot_service.start_listener():
+        print("⚠️ RTDB listener not started: Realtime Database unavailable")
@@ -0,0 +1,310 @@
+"""
+Season Planner
+Crop plan for a field in one request: one feature row per forecast day (or
+per crop season, from the past year's weather), all rows scored with a single
+batched ensemble call, and the recommendations grouped into a timeline of day
+ranges or seasons.
+"""
+
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .container import (
+    crop_prediction_service,
+    enhanced_weather_service,
+    real_ml_service,
+)
+
+MODES = ("forecast", "seasons")
+SOIL_FIELDS = ("nitrogen", "phosphorus", "potassium", "ph")
+WEATHER_FIELDS = ("temperature", "humidity", "rainfall")
+MAX_TOP_K = 10
+
+# Units of the weather inputs; rainfall is a monthly total, as in training
+WEATHER_UNITS = {"temperature": "°C", "humidity": "%", "rainfall": "mm/month"}
+
+# Forecast days averaged (trailing) into each day's monthly rainfall estimate
+RAIN_WINDOW_DAYS = 7
+
+
+class SeasonPlanner:
+    """Builds per-day or per-season feature rows for a field and scores them"""
+
+    def __init__(self):
+        config = getattr(settings, "ML_SEASON_PLAN", {})
+        self.max_days = int(config.get("MAX_DAYS", 16))
+        self.bucket_days = int(config.get("BUCKET_DAYS", 7))
+        self.weather_ttl = float(config.get("WEATHER_TTL_SECONDS", 1800))
+
+        # (kind, region, days) -> (fetched_at, weather), shared by all requests
+        self._weather: Dict[Tuple[str, str, int], Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def plan(
+        self,
+        field: Optional[Dict[str, Any]] = None,
+        region: str = "Bhairahawa-Butwal",
+        mode: str = "forecast",
+        days: int = 14,
+        bucket_days: Optional[int] = None,
+        top_k: int = 3,
+        farmer: Any = None,
+    ) -> Dict[str, Any]:
+        """
+        Score a field's season plan
+        field holds optional soil (and fallback weather) values; missing soil
+        values come from the farmer's latest soil report, then regional
+        defaults. Raises ValueError for invalid requests.
+        """
+        from .real_ml_prediction_service import FEATURE_ORDER
+
+        started = time.perf_counter()
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        days = int(days)
+        if not 1 <= days <= self.max_days:
+            raise ValueError(f"days must be between 1 and {self.max_days}")
+        bucket_days = int(bucket_days or self.bucket_days)
+        if bucket_days < 1:
+            raise ValueError("bucket_days must be at least 1")
+        top_k = int(top_k)
+        if not 1 <= top_k <= MAX_TOP_K:
+            raise ValueError(f"top_k must be between 1 and {MAX_TOP_K}")
+
+        base, soil_sources = self.field_inputs(field or {}, region, farmer)
+
+        rows: List[Dict[str, Any]] = []
+        requested = mode
+        if mode == "forecast":
+            rows = self.forecast_rows(base, region, days)
+            if not rows:
+                print(f"⚠️ No forecast for {region}, planning by season instead")
+                mode = "seasons"
+        if mode == "seasons":
+            rows = self.season_rows(base, region)
+
+        # One batched ensemble call for every day or season
+        matrix = np.array(
+            [[row["inputs"][name] for name in FEATURE_ORDER] for row in rows],
+            dtype=float,
+        )
+        predictions = real_ml_service.predict_batch(matrix, top_k=top_k)
+        for row, recommendations in zip(rows, predictions):
+            row["recommendations"] = recommendations
+
+        if mode == "forecast":
+            timeline = self.bucket_days_timeline(rows, bucket_days, top_k)
+        else:
+            timeline = rows
+
+        return {
+            "region": region,
+            "mode": mode,
+            "requested_mode": requested,
+            "soil": {name: base[name] for name in SOIL_FIELDS},
+            "soil_sources": soil_sources,
+            "units": WEATHER_UNITS,
+            "timeline": timeline,
+            "days": rows if mode == "forecast" else [],
+            "rows": len(rows),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 2),
+        }
+
+    # ==== FEATURE ROWS ====
+
+    def field_inputs(
+        self, field: Dict[str, Any], region: str, farmer: Any = None
+    ) -> Tuple[Dict[str, float], Dict[str, str]]:
+        """
+        Base feature values and where each soil value came from
+        Priority: request > latest soil report > regional defaults
+        """
+        defaults = crop_prediction_service.regional_defaults
+        base = {
+            name: float(value)
+            for name, value in defaults.get(
+                region, defaults["Bhairahawa-Butwal"]
+            ).items()
+        }
+        sources = {name: "regional_default" for name in SOIL_FIELDS}
+
+        if farmer is not None:
+            for name, value in self._latest_soil_report(farmer).items():
+                base[name] = float(value)
+                sources[name] = "soil_report"
+
+        for name in SOIL_FIELDS + WEATHER_FIELDS:
+            if field.get(name) not in (None, ""):
+                base[name] = float(field[name])
+                if name in sources:
+                    sources[name] = "request"
+        return base, sources
+
+    def forecast_rows(
+        self, base: Dict[str, float], region: str, days: int
+    ) -> List[Dict[str, Any]]:
+        """
+        One row per forecast day; weather the forecast lacks keeps the base
+        The model's rainfall is a monthly total, so each day's rainfall is the
+        mean daily rain of the trailing RAIN_WINDOW_DAYS times DAYS_PER_MONTH;
+        the forecast's own mm/day value is kept as rain_mm_per_day.
+        """
+        from .enhanced_weather_service import DAYS_PER_MONTH
+
+        forecast = self._cached_weather(
+            ("forecast", region, days),
+            lambda: enhanced_weather_service.get_daily_forecast(region, days),
+        )
+        rows = []
+        window: List[float] = []
+        for day in forecast[:days]:
+            inputs = dict(base)
+            for name in ("temperature", "humidity"):
+                if day.get(name) is not None:
+                    inputs[name] = float(day[name])
+            row = {"date": day["date"], "inputs": inputs}
+            if day.get("rainfall") is not None:
+                window = (window + [float(day["rainfall"])])[-RAIN_WINDOW_DAYS:]
+                inputs["rainfall"] = round(
+                    sum(window) / len(window) * DAYS_PER_MONTH, 1
+                )
+                row["rain_mm_per_day"] = float(day["rainfall"])
+            rows.append(row)
+        return rows
+
+    def season_rows(self, base: Dict[str, float], region: str) -> List[Dict[str, Any]]:
+        """
+        One row per crop season, starting with the current one
+        Uses last year's seasonal averages, or today's weather with the season
+        adjustments when the archive is unavailable.
+        """
+        from .enhanced_weather_service import SEASON_MONTHS
+
+        averages = self._cached_weather(
+            ("seasons", region, 0),
+            lambda: enhanced_weather_service.get_seasonal_averages(region),
+        )
+        current = None
+        if len(averages) < len(SEASON_MONTHS):
+            current = enhanced_weather_service.get_current_weather_data(region)
+
+        rows = []
+        for season in self._season_order(date.today().month, SEASON_MONTHS):
+            inputs = dict(base)
+            if season in averages:
+                weather = averages[season]
+                source = "open-meteo-archive"
+            else:
+                weather = enhanced_weather_service.adjust_for_season(
+                    current, region, season
+                )
+                source = weather.get("source", "default")
+            for name in WEATHER_FIELDS:
+                if weather.get(name) is not None:
+                    inputs[name] = float(weather[name])
+            rows.append(
+                {
+                    "season": season,
+                    "months": list(SEASON_MONTHS[season]),
+                    "weather_source": source,
+                    "inputs": inputs,
+                }
+            )
+        return rows
+
+    def _season_order(
+        self, month: int, season_months: Dict[str, Tuple[int, ...]]
+    ) -> List[str]:
+        """Seasons by how soon they start; ones under way come first"""
+
+        def months_until(season: str) -> int:
+            months = season_months[season]
+            if month in months:
+                return 0
+            return (months[0] - month) % 12
+
+        return sorted(season_months, key=months_until)
+
+    def _latest_soil_report(self, farmer: Any) -> Dict[str, float]:
+        """Measured N/P/K/pH from the farmer's most recent soil report"""
+        from apps.dashboard.models import SoilHealthReport
+
+        report = (
+            SoilHealthReport.objects.filter(farmer=farmer)
+            .order_by("-test_date")
+            .values(*SOIL_FIELDS)
+            .first()
+        )
+        if not report:
+            return {}
+        return {name: value for name, value in report.items() if value is not None}
+
+    def _cached_weather(self, key: Tuple[str, str, int], fetch: Callable[[], Any]):
+        """Weather responses are shared across requests for WEATHER_TTL_SECONDS"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._weather.get(key)
+        if cached and now - cached[0] < self.weather_ttl:
+            return cached[1]
+
+        weather = fetch()
+        if weather:
+            with self._lock:
+                self._weather[key] = (now, weather)
+        return weather
+
+    # ==== TIMELINE ====
+
+    def bucket_days_timeline(
+        self, rows: List[Dict[str, Any]], bucket_days: int, top_k: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Group consecutive days into buckets of bucket_days
+        A crop's bucket confidence is its mean over the bucket's days (0 on days
+        it is not in the top-k); days_on_top counts the days it ranked first.
+        """
+        timeline = []
+        for start in range(0, len(rows), bucket_days):
+            bucket = rows[start : start + bucket_days]
+            totals: Dict[str, float] = {}
+            days_on_top: Dict[str, int] = {}
+            for row in bucket:
+                for rank, prediction in enumerate(row["recommendations"]):
+                    crop = prediction["crop"]
+                    totals[crop] = totals.get(crop, 0.0) + prediction["confidence"]
+                    if rank == 0:
+                        days_on_top[crop] = days_on_top.get(crop, 0) + 1
+
+            ranked = sorted(totals.items(), key=lambda item: -item[1])[:top_k]
+            timeline.append(
+                {
+                    "start": bucket[0]["date"],
+                    "end": bucket[-1]["date"],
+                    "days": len(bucket),
+                    "weather": {
+                        name: round(
+                            float(np.mean([row["inputs"][name] for row in bucket])),
+                            1,
+                        )
+                        for name in WEATHER_FIELDS
+                    },
+                    "recommendations": [
+                        {
+                            "crop": crop,
+                            "confidence": round(total / len(bucket), 3),
+                            "days_on_top": days_on_top.get(crop, 0),
+                        }
+                        for crop, total in ranked
+                    ],
+                }
+            )
+        return timeline
+
+
+# Global instance
+season_planner = SeasonPlanner()
@@ -0,0 +1,128 @@
+"""
+Sensitivity Analysis
+What-if sweeps for crop predictions: one or two input features are varied
+over a grid around a base input, the whole grid is scored with a single
+batched ensemble call, and the top crop and confidence of every cell come
+back as compact matrices. With the default (libsvm) SVM a 50x50 grid takes
+about 230-320 ms, two thirds of it in the SVM, so it misses a 200 ms target.
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .container import real_ml_service
+
+DEFAULT_STEPS = 25
+
+
+class SensitivityAnalyzer:
+    """Builds feature grids and scores them in one vectorized pass"""
+
+    def __init__(self):
+        self.max_axes = 2
+        self.max_steps = int(getattr(settings, "ML_SENSITIVITY_MAX_STEPS", 100))
+
+    def analyze(
+        self, base: Optional[Dict[str, Any]], sweep: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Score a what-if grid
+        sweep holds one or two axes, each {"feature", "min", "max", "steps"} or
+        {"feature", "values"}; unswept features keep their base value.
+        Raises ValueError for invalid requests.
+        """
+        from .real_ml_prediction_service import (
+            DEFAULT_FEATURE_VALUES,
+            FEATURE_ORDER,
+            FEATURE_RANGES,
+        )
+
+        started = time.perf_counter()
+        if not isinstance(sweep, list) or not 1 <= len(sweep) <= self.max_axes:
+            raise ValueError(f"sweep must list 1 to {self.max_axes} features")
+
+        base = base or {}
+        base_row = np.array(
+            [
+                float(base.get(name, default))
+                for name, default in zip(FEATURE_ORDER, DEFAULT_FEATURE_VALUES)
+            ]
+        )
+        axes = [self._axis(spec, FEATURE_ORDER, FEATURE_RANGES) for spec in sweep]
+        if len({name for name, _ in axes}) != len(axes):
+            raise ValueError("Each feature can only be swept once")
+
+        grid = self.build_grid(base_row, axes, FEATURE_ORDER)
+        top, confidence = real_ml_service.predict_top_crops(grid)
+
+        # Cells refer to a short legend of the crops that actually appear
+        shape = tuple(len(values) for _, values in axes)
+        legend, codes = np.unique(top, return_inverse=True)
+        crops = [
+            real_ml_service.crop_labels[index] if index >= 0 else None
+            for index in legend
+        ]
+
+        return {
+            "base": dict(zip(FEATURE_ORDER, base_row.round(3).tolist())),
+            "axes": [
+                {"feature": name, "values": values.round(3).tolist()}
+                for name, values in axes
+            ],
+            "crops": crops,
+            "top_crop": codes.reshape(shape).tolist(),
+            "confidence": np.round(confidence, 3).reshape(shape).tolist(),
+            "cells": int(grid.shape[0]),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 2),
+        }
+
+    def build_grid(
+        self,
+        base_row: np.ndarray,
+        axes: List[Tuple[str, np.ndarray]],
+        feature_order: List[str],
+    ) -> np.ndarray:
+        """(cells, 7) matrix: base_row repeated, swept columns from a meshgrid"""
+        mesh = np.meshgrid(*[values for _, values in axes], indexing="ij")
+        grid = np.tile(base_row, (mesh[0].size, 1))
+        for (name, _), coordinates in zip(axes, mesh):
+            grid[:, feature_order.index(name)] = coordinates.ravel()
+        return grid
+
+    def _axis(
+        self,
+        spec: Dict[str, Any],
+        feature_order: List[str],
+        feature_ranges: Dict[str, Tuple[float, float]],
+    ) -> Tuple[str, np.ndarray]:
+        """Validate one sweep axis and return (feature, grid values)"""
+        if not isinstance(spec, dict):
+            raise ValueError("Each sweep entry must be an object")
+        name = spec.get("feature")
+        if name not in feature_order:
+            raise ValueError(
+                f"Unknown feature {name!r}; expected one of {', '.join(feature_order)}"
+            )
+
+        if spec.get("values") is not None:
+            values = np.asarray(spec["values"], dtype=float).ravel()
+        else:
+            low, high = feature_ranges[name]
+            low = float(spec.get("min", low))
+            high = float(spec.get("max", high))
+            if low > high:
+                raise ValueError(f"{name}: min must not exceed max")
+            values = np.linspace(low, high, int(spec.get("steps", DEFAULT_STEPS)))
+
+        if not 1 <= len(values) <= self.max_steps:
+            raise ValueError(f"{name}: between 1 and {self.max_steps} steps allowed")
+        if not np.all(np.isfinite(values)):
+            raise ValueError(f"{name}: values must be finite numbers")
+        return name, values
+
+
+# Global instance
+sensitivity_analyzer = SensitivityAnalyzer()
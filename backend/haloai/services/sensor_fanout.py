@@ -0,0 +1,124 @@
+"""
+Sensor Fanout
+Fetches many sensors at once on a bounded thread pool, so reading N sensors
+costs about one Firebase round trip instead of N. Every call has a deadline:
+sensors that have not answered by then are reported as timed out and the
+caller gets what did arrive. A sensor already being fetched for another
+request is not fetched twice; both requests wait on the same fetch.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+
+
+class SensorFanout:
+    """Bounded-concurrency, deadline-limited fetch of many sensors"""
+
+    def __init__(self, max_concurrency: int = 16, deadline_seconds: float = 3.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.deadline_seconds = deadline_seconds
+
+        # (kind, sensor_id) -> fetch in progress, shared by concurrent callers
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._counters = {"calls": 0, "fetches": 0, "shared": 0, "timed_out": 0}
+
+    def fetch(
+        self,
+        sensor_ids: Iterable[str],
+        fetch_one: Callable[[str], Any],
+        kind: str = "reading",
+        deadline_seconds: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run fetch_one for every sensor concurrently
+        Returns {"results", "timed_out", "failed", "elapsed_ms"}; results only
+        holds sensors that answered before the deadline. kind keeps different
+        fetch functions for the same sensor from being shared.
+        """
+        started = time.perf_counter()
+        deadline = (
+            self.deadline_seconds if deadline_seconds is None else deadline_seconds
+        )
+        futures = {
+            sensor_id: self._submit(kind, sensor_id, fetch_one)
+            for sensor_id in dict.fromkeys(sensor_ids)
+        }
+        done, _ = wait(futures.values(), timeout=deadline)
+
+        results, failed, timed_out = {}, {}, []
+        for sensor_id, future in futures.items():
+            if future not in done:
+                timed_out.append(sensor_id)
+            elif future.exception() is not None:
+                failed[sensor_id] = str(future.exception())
+            else:
+                results[sensor_id] = future.result()
+
+        with self._lock:
+            self._counters["calls"] += 1
+            self._counters["timed_out"] += len(timed_out)
+        if timed_out:
+            print(
+                f"⏱️ {len(timed_out)} of {len(futures)} sensors missed the "
+                f"{deadline}s deadline"
+            )
+        return {
+            "results": results,
+            "timed_out": timed_out,
+            "failed": failed,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 2),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "deadline_seconds": self.deadline_seconds,
+                "in_flight": len(self._inflight),
+                **self._counters,
+            }
+
+    def _submit(
+        self, kind: str, sensor_id: str, fetch_one: Callable[[str], Any]
+    ) -> Future:
+        """Start a fetch, or join the one already running for this sensor"""
+        key = (kind, sensor_id)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counters["shared"] += 1
+                return future
+            future = self._get_executor().submit(fetch_one, sensor_id)
+            self._inflight[key] = future
+            self._counters["fetches"] += 1
+        # A fetch that outlives its deadline still finishes and fills the caches
+        future.add_done_callback(lambda _: self._finished(key, future))
+        return future
+
+    def _finished(self, key: Tuple[str, str], future: Future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Pool shared by all requests in this process, started on first use"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix="sensor-fetch"
+            )
+        return self._executor
+
+
+def build_sensor_fanout() -> SensorFanout:
+    """Create a SensorFanout from the IOT_SENSOR_FANOUT setting"""
+    config = getattr(settings, "IOT_SENSOR_FANOUT", {})
+    return SensorFanout(
+        max_concurrency=int(config.get("MAX_CONCURRENCY", 16)),
+        deadline_seconds=float(config.get("DEADLINE_SECONDS", 3.0)),
+    )
@@ -0,0 +1,300 @@
+"""
+Sensor Path Resolver
+Remembers where each sensor's data lives in the Firebase Realtime Database.
+The first read of a sensor probes the candidate paths in order; the path and
+payload format that worked are bound to the sensor together with a parser
+compiled for that payload's keys, so later reads are one GET of one path.
+A bound read that fails (nothing at the path, an error, or a payload the
+parser no longer fits) drops the binding and the sensor is probed again.
+"""
+
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Candidate RTDB paths, in probe order
+RTDB_PATH_TEMPLATES = (
+    "sensorData",  # Root level sensor data
+    "sensorData/{sensor_id}",  # Sensor-specific data
+    "iot_sensors/{sensor_id}/latest",  # Our structured format
+    "sensors/{sensor_id}/latest",  # Alternative structured format
+    "sensor_data/{sensor_id}/current",  # Current reading format
+    "iot_data/{sensor_id}",  # Simple IoT data format
+    "{sensor_id}",  # Direct sensor ID path
+    "data/{sensor_id}",  # Data subfolder
+    "realtime/{sensor_id}",  # Realtime subfolder
+)
+
+# Keys of the device payload in Firebase camelCase format
+FIREBASE_KEYS = ("soilTemperature", "phValue", "airTemperature")
+
+# Reading field -> payload keys it may come from, in order of preference
+FIELD_KEYS = {
+    "firebase": {
+        "ph": ("phValue",),
+        "temperature": ("soilTemperature",),
+        "humidity": ("humidity",),
+        "soil_temperature": ("soilTemperature",),
+        "timestamp": ("timestamp",),
+    },
+    "generic": {
+        "ph": ("ph", "phValue"),
+        "temperature": ("temperature", "soilTemperature", "airTemperature"),
+        "humidity": ("humidity",),
+        "soil_temperature": ("soil_temperature", "soilTemperature"),
+        "timestamp": ("timestamp",),
+    },
+}
+
+# Legacy comma-separated payload: "ph,temperature"
+CSV_FIELDS = ("ph", "temperature")
+
+# Values for fields a payload does not carry
+READING_DEFAULTS = {
+    "ph": 6.5,
+    "temperature": 25.0,
+    "humidity": 60.0,
+    "soil_temperature": 25.0,
+    "timestamp": None,
+}
+
+
+def payload_format(payload: Any) -> Optional[str]:
+    """Format of a fetched value: firebase, generic or csv (None if unusable)"""
+    if isinstance(payload, dict):
+        if any(key in payload for key in FIREBASE_KEYS):
+            return "firebase"
+        return "generic"
+    if isinstance(payload, str) and "," in payload:
+        if len(payload.split(",")) >= len(CSV_FIELDS):
+            return "csv"
+    return None
+
+
+def compile_field_reader(
+    payload_format_name: str, payload: Any
+) -> Callable[[Any], Dict[str, Any]]:
+    """
+    Reader for payloads shaped like this one
+    The payload key behind every reading field is picked once; a later
+    payload missing a picked key raises KeyError instead of silently
+    falling back, which tells the resolver the format has changed.
+    """
+    if payload_format_name == "csv":
+
+        def read_csv(value: str) -> Dict[str, Any]:
+            parts = value.split(",")
+            return {
+                name: float(parts[index].strip())
+                for index, name in enumerate(CSV_FIELDS)
+            }
+
+        return read_csv
+
+    plan = [
+        (field, next((key for key in keys if key in payload), None))
+        for field, keys in FIELD_KEYS[payload_format_name].items()
+    ]
+
+    def read_fields(value: Dict[str, Any]) -> Dict[str, Any]:
+        fields = {}
+        for field, key in plan:
+            raw = READING_DEFAULTS[field] if key is None else value[key]
+            fields[field] = raw if field == "timestamp" else float(raw)
+        return fields
+
+    return read_fields
+
+
+@dataclass
+class PathBinding:
+    """Where a sensor's data was found and how to parse it"""
+
+    path: str
+    payload_format: str
+    parse: Callable[[Any], Any]
+    bound_at: float
+    reads: int = 0
+
+
+class SensorPathResolver:
+    """Per-sensor RTDB path cache with probe, hit and byte counters"""
+
+    def __init__(
+        self,
+        db_ref: Any,
+        compile_parser: Callable[[str, Any], Optional[Tuple[str, Callable]]],
+        retry_seconds: float = 60.0,
+        path_templates: Tuple[str, ...] = RTDB_PATH_TEMPLATES,
+    ):
+        self.db_ref = db_ref
+        self.compile_parser = compile_parser
+        self.retry_seconds = retry_seconds
+        self.path_templates = path_templates
+
+        self._bindings: Dict[str, PathBinding] = {}
+        self._not_found: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "reads": 0,
+            "hits": 0,
+            "probes": 0,
+            "reprobes": 0,
+            "not_found": 0,
+            "gets": 0,
+            "probe_gets": 0,
+            "bytes_fetched": 0,
+        }
+
+    def read(self, sensor_id: str) -> Optional[Any]:
+        """
+        Parsed reading for a sensor, or None
+        Bound sensors cost one GET; others are probed, unless a probe found
+        nothing within the last retry_seconds.
+        """
+        if self.db_ref is None:
+            return None
+        self._count("reads")
+
+        binding = self._bindings.get(sensor_id)
+        if binding is not None:
+            reading = self._read_bound(binding)
+            if reading is not None:
+                self._count("hits")
+                return reading
+            with self._lock:
+                self._bindings.pop(sensor_id, None)
+            self._count("reprobes")
+        elif self._recently_not_found(sensor_id):
+            return None
+
+        return self._probe(sensor_id)
+
+    def binding(self, sensor_id: str) -> Optional[PathBinding]:
+        """Current binding of a sensor, if any"""
+        return self._bindings.get(sensor_id)
+
+    def invalidate(self, sensor_id: Optional[str] = None):
+        """Forget one sensor's binding, or all of them"""
+        with self._lock:
+            if sensor_id is None:
+                self._bindings.clear()
+                self._not_found.clear()
+            else:
+                self._bindings.pop(sensor_id, None)
+                self._not_found.pop(sensor_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and current bindings for diagnostics"""
+        with self._lock:
+            counters = dict(self._counters)
+            bindings = {
+                sensor_id: {
+                    "path": binding.path,
+                    "format": binding.payload_format,
+                    "reads": binding.reads,
+                }
+                for sensor_id, binding in self._bindings.items()
+            }
+        counters["hit_rate"] = (
+            round(counters["hits"] / counters["reads"], 3) if counters["reads"] else 0.0
+        )
+        return {**counters, "bindings": bindings, "retry_seconds": self.retry_seconds}
+
+    # ==== READS ====
+
+    def _read_bound(self, binding: PathBinding) -> Optional[Any]:
+        """One GET of the bound path; None when it no longer yields a reading"""
+        try:
+            payload = self._get(binding.path)
+            if not payload or payload_format(payload) != binding.payload_format:
+                return None
+            reading = binding.parse(payload)
+        except Exception:
+            return None
+        binding.reads += 1
+        return reading
+
+    def _probe(self, sensor_id: str) -> Optional[Any]:
+        """Try every candidate path in order and bind the first that parses"""
+        self._count("probes")
+        for template in self.path_templates:
+            path = template.format(sensor_id=sensor_id)
+            try:
+                payload = self._get(path, probe=True)
+            except Exception as e:
+                print(f"⚠️ RTDB probe of {path} failed: {e}")
+                continue
+            if not payload:
+                continue
+
+            if "{sensor_id}" not in template and isinstance(payload, dict):
+                path, payload = self._device_node(path, payload, sensor_id)
+
+            compiled = self.compile_parser(sensor_id, payload)
+            if compiled is None:
+                continue
+            format_name, parse = compiled
+            try:
+                reading = parse(payload)
+            except (ValueError, TypeError, KeyError, IndexError):
+                continue
+
+            with self._lock:
+                self._bindings[sensor_id] = PathBinding(
+                    path=path,
+                    payload_format=format_name,
+                    parse=parse,
+                    bound_at=time.time(),
+                    reads=1,
+                )
+                self._not_found.pop(sensor_id, None)
+            print(f"📍 Bound sensor {sensor_id} to RTDB path {path} ({format_name})")
+            return reading
+
+        with self._lock:
+            self._not_found[sensor_id] = time.monotonic()
+        self._count("not_found")
+        return None
+
+    def _device_node(
+        self, path: str, payload: Dict[str, Any], sensor_id: str
+    ) -> Tuple[str, Any]:
+        """
+        For a shared node such as the root sensorData: the node itself when it
+        is a device payload, else the child holding one (the sensor's own child
+        first), so later reads fetch that child instead of the whole subtree
+        """
+        if any(key in payload for key in FIREBASE_KEYS + ("humidity",)):
+            return path, payload
+
+        children = list(payload.items())
+        children.sort(key=lambda item: item[0] != sensor_id)
+        for key, value in children:
+            if isinstance(value, dict) and any(k in value for k in FIREBASE_KEYS):
+                return f"{path}/{key}", value
+        return path, payload
+
+    def _recently_not_found(self, sensor_id: str) -> bool:
+        """Whether a probe found nothing for the sensor within retry_seconds"""
+        failed_at = self._not_found.get(sensor_id)
+        return (
+            failed_at is not None and time.monotonic() - failed_at < self.retry_seconds
+        )
+
+    def _get(self, path: str, probe: bool = False) -> Any:
+        """GET one path, counting requests and (JSON-encoded) bytes"""
+        payload = self.db_ref.child(path).get()
+        size = len(json.dumps(payload, separators=(",", ":"), default=str))
+        with self._lock:
+            self._counters["gets"] += 1
+            self._counters["bytes_fetched"] += size
+            if probe:
+                self._counters["probe_gets"] += 1
+        return payload
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
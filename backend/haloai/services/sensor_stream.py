@@ -0,0 +1,315 @@
+"""
+Sensor Stream
+Server-Sent Events for live sensor readings. A client subscribes to sensors
+(or a region) once and receives a snapshot, then only the fields that changed
+as the latest-value store moves, plus periodic heartbeats. Event ids carry
+the store version so a reconnecting EventSource resumes from Last-Event-ID.
+Streams are asynchronous generators over the store, so an idle stream does
+not hold a thread; they need an ASGI server. Under WSGI every stream would
+hold a sync worker for up to MAX_STREAM_SECONDS, so WSGI streams are refused
+unless IOT_SENSOR_STREAM["ALLOW_WSGI"] is set (e.g. for runserver).
+"""
+
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .container import enhanced_iot_service
+
+# Per-reading fields that change on every read and are not worth a delta
+VOLATILE_FIELDS = ("age_seconds",)
+
+
+class SensorStreamHub:
+    """Per-worker connection cap and shared server-side refresh of sensors"""
+
+    def __init__(self):
+        config = getattr(settings, "IOT_SENSOR_STREAM", {})
+        self.max_connections = int(config.get("MAX_CONNECTIONS", 50))
+        self.heartbeat_seconds = float(config.get("HEARTBEAT_SECONDS", 15))
+        self.poll_seconds = float(config.get("POLL_SECONDS", 5))
+        self.retry_ms = int(config.get("RETRY_MILLISECONDS", 3000))
+        self.max_stream_seconds = float(config.get("MAX_STREAM_SECONDS", 900))
+        self.allow_wsgi = bool(config.get("ALLOW_WSGI", False))
+
+        self.open_streams = 0
+        self.total_streams = 0
+        self.rejected = 0
+        # sensor_id -> when it was last fetched for streams (shared by all)
+        self._refreshed_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def open(
+        self, sensor_ids: List[str], last_event_id: Optional[str] = None
+    ) -> Optional["SensorStream"]:
+        """A stream for the sensors, or None when the worker is at its cap"""
+        with self._lock:
+            if self.open_streams >= self.max_connections:
+                self.rejected += 1
+                return None
+            self.open_streams += 1
+            self.total_streams += 1
+        return SensorStream(self, sensor_ids, last_event_id)
+
+    def release(self):
+        with self._lock:
+            self.open_streams = max(0, self.open_streams - 1)
+
+    def sensors_for(
+        self, sensor_ids: Optional[str] = None, region: Optional[str] = None
+    ) -> List[str]:
+        """Sensors named in a comma-separated list, or a region's, or all"""
+        locations = enhanced_iot_service.sensor_locations
+        if sensor_ids:
+            return [s.strip() for s in sensor_ids.split(",") if s.strip()]
+        if region:
+            return [
+                sensor_id
+                for sensor_id, location in locations.items()
+                if location.get("region") == region
+            ]
+        return list(locations)
+
+    def refresh(self, sensor_ids: List[str]):
+        """
+        Fetch sensors the RTDB listener does not push, at most once per
+        POLL_SECONDS for all streams together, into the latest-value store
+        """
+        listener = enhanced_iot_service.rtdb_listener
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for sensor_id in sensor_ids:
+                if listener is not None and listener.is_live(sensor_id):
+                    continue
+                if now - self._refreshed_at.get(sensor_id, 0.0) >= self.poll_seconds:
+                    self._refreshed_at[sensor_id] = now
+                    due.append(sensor_id)
+
+        store = enhanced_iot_service.latest_values
+        for sensor_id in due:
+            reading = enhanced_iot_service.get_realtime_sensor_data(sensor_id)
+            if reading and "version" not in reading:
+                source = "poll" if reading.get("status") == "active" else "default"
+                store.put(sensor_id, reading, source=source)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "open_streams": self.open_streams,
+            "max_connections": self.max_connections,
+            "total_streams": self.total_streams,
+            "rejected": self.rejected,
+        }
+
+
+class SensorStream:
+    """One client's subscription: what it has been sent and up to which version"""
+
+    def __init__(
+        self,
+        hub: SensorStreamHub,
+        sensor_ids: List[str],
+        last_event_id: Optional[str] = None,
+        store: Any = None,
+    ):
+        self.hub = hub
+        self.store = store or enhanced_iot_service.latest_values
+        self.sensor_ids = sensor_ids
+        self.resume_version = self._parse_event_id(last_event_id)
+        self.version = 0
+        self.sent: Dict[str, Dict[str, Any]] = {}
+        self._closed = False
+
+    def close(self):
+        """Give the connection slot back (safe to call more than once)"""
+        if not self._closed:
+            self._closed = True
+            self.hub.release()
+
+    # ==== EVENTS ====
+
+    def opening_events(self) -> List[str]:
+        """
+        Reconnect delay, then either the changes since Last-Event-ID (same
+        store epoch) or a snapshot of every subscribed sensor
+        """
+        events = [f"retry: {self.hub.retry_ms}\n\n"]
+        if self.resume_version is not None:
+            self.version = self.resume_version
+            readings = self._changed_readings()
+            self.sent.update(readings)
+            events.append(self._event("update", {"readings": readings}))
+            return events
+
+        self.version = self.store.version
+        readings = {}
+        for sensor_id in self.sensor_ids:
+            reading = self.store.get(sensor_id)
+            if reading is not None:
+                readings[sensor_id] = reading
+        self.sent = dict(readings)
+        events.append(self._event("snapshot", {"readings": readings}))
+        return events
+
+    def pending_events(self) -> List[str]:
+        """An update event with each changed sensor's changed fields, if any"""
+        if self.store.version <= self.version:
+            return []
+        deltas = {}
+        for sensor_id, reading in self._changed_readings().items():
+            previous = self.sent.get(sensor_id, {})
+            delta = {
+                key: value
+                for key, value in reading.items()
+                if key not in VOLATILE_FIELDS and previous.get(key) != value
+            }
+            self.sent[sensor_id] = reading
+            if delta:
+                deltas[sensor_id] = {**delta, "version": reading["version"]}
+        if not deltas:
+            return []
+        return [self._event("update", {"readings": deltas})]
+
+    def heartbeat(self) -> str:
+        """Keeps proxies from closing an idle stream; lists stale sensors"""
+        stale = []
+        for sensor_id in self.sensor_ids:
+            reading = self.store.get(sensor_id)
+            if reading is not None and reading["stale"]:
+                stale.append(sensor_id)
+        payload = {"version": self.version, "stale": stale, "time": time.time()}
+        return f"event: heartbeat\ndata: {json.dumps(payload)}\n\n"
+
+    def _changed_readings(self) -> Dict[str, Dict[str, Any]]:
+        """Subscribed sensors changed since self.version, which moves forward"""
+        changes = self.store.changes_since(self.version)
+        readings = {
+            sensor_id: reading
+            for sensor_id, reading in changes.items()
+            if sensor_id in self.sensor_ids
+        }
+        if changes:
+            self.version = max(reading["version"] for reading in changes.values())
+        return readings
+
+    def _event(self, name: str, payload: Dict[str, Any]) -> str:
+        event_id = f"{self.store.epoch}-{self.version}"
+        data = json.dumps(payload, default=str)
+        return f"id: {event_id}\nevent: {name}\ndata: {data}\n\n"
+
+    def _parse_event_id(self, last_event_id: Optional[str]) -> Optional[int]:
+        """Version to resume from, if the id came from this store"""
+        epoch, _, version = (last_event_id or "").partition("-")
+        if epoch != self.store.epoch or not version.isdigit():
+            return None
+        version = int(version)
+        return version if version <= self.store.version else None
+
+    # ==== GENERATORS ====
+
+    def _timing(self, started: float, last_sent: float) -> Tuple[bool, float]:
+        """(stream expired, seconds to wait before the next check)"""
+        now = time.monotonic()
+        if now - started >= self.hub.max_stream_seconds:
+            return True, 0.0
+        until_heartbeat = self.hub.heartbeat_seconds - (now - last_sent)
+        return False, max(0.0, min(until_heartbeat, self.hub.poll_seconds))
+
+    def events(self) -> Iterator[str]:
+        """Blocking event generator for WSGI workers"""
+        try:
+            self.hub.refresh(self.sensor_ids)
+            yield "".join(self.opening_events())
+            started = last_sent = time.monotonic()
+            while True:
+                expired, wait = self._timing(started, last_sent)
+                if expired:
+                    return
+                self.store.wait_for_change(self.version, timeout=wait)
+                self.hub.refresh(self.sensor_ids)
+                events = self.pending_events()
+                if not events and (
+                    time.monotonic() - last_sent >= self.hub.heartbeat_seconds
+                ):
+                    events = [self.heartbeat()]
+                if events:
+                    last_sent = time.monotonic()
+                    yield "".join(events)
+        finally:
+            self.close()
+
+    async def aevents(self):
+        """Event generator for ASGI; waits on the store without a thread"""
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def watcher(version: int):
+            # The loop may close before this stream removes its watcher
+            try:
+                loop.call_soon_threadsafe(changed.set)
+            except RuntimeError:
+                pass
+
+        refresh = sync_to_async(self.hub.refresh, thread_sensitive=False)
+        self.store.add_watcher(watcher)
+        try:
+            await refresh(self.sensor_ids)
+            yield "".join(self.opening_events())
+            started = last_sent = time.monotonic()
+            while True:
+                expired, wait = self._timing(started, last_sent)
+                if expired:
+                    return
+                changed.clear()
+                if self.store.version <= self.version:
+                    try:
+                        await asyncio.wait_for(changed.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+                await refresh(self.sensor_ids)
+                events = self.pending_events()
+                if not events and (
+                    time.monotonic() - last_sent >= self.hub.heartbeat_seconds
+                ):
+                    events = [self.heartbeat()]
+                if events:
+                    last_sent = time.monotonic()
+                    yield "".join(events)
+        finally:
+            self.store.remove_watcher(watcher)
+            self.close()
+
+
+class SyncEventBody:
+    """StreamingHttpResponse content whose close() frees the stream's slot"""
+
+    def __init__(self, stream: SensorStream):
+        self.stream = stream
+
+    def __iter__(self):
+        return self.stream.events()
+
+    def close(self):
+        self.stream.close()
+
+
+class AsyncEventBody:
+    """Async counterpart of SyncEventBody, streamed by Django under ASGI"""
+
+    def __init__(self, stream: SensorStream):
+        self.stream = stream
+
+    def __aiter__(self):
+        return self.stream.aevents()
+
+    def close(self):
+        self.stream.close()
+
+
+# Global instance
+sensor_stream_hub = SensorStreamHub()
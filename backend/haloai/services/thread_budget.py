@@ -0,0 +1,172 @@
+"""
+Thread Budget
+Splits the machine's CPUs between the processes that run model inference so
+XGBoost, sklearn and the BLAS/OpenMP pools under NumPy do not each start one
+thread per core in every worker. Single-row requests run on one thread;
+batches get more threads as they grow, up to the process's share.
+Thread counts are never set on the shared models: each call gets a shallow
+copy configured for its thread count, so concurrent requests do not race.
+"""
+
+import copy
+import math
+import os
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (honours affinity masks and cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+class ThreadBudget:
+    """Per-process CPU share and the thread count each batch size gets"""
+
+    def __init__(
+        self,
+        processes: int = 1,
+        cpus: Optional[int] = None,
+        single_row_max: int = 1,
+        rows_per_thread: int = 1000,
+        enabled: bool = True,
+    ):
+        self.cpus = cpus or available_cpus()
+        self.processes = max(1, processes)
+        self.single_row_max = single_row_max
+        self.rows_per_thread = max(1, rows_per_thread)
+        self.enabled = enabled
+        self.profile = "web"
+
+        # model -> {threads: copy of the model using that many threads}
+        self._variants: "weakref.WeakKeyDictionary[Any, Dict[int, Any]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._native_limit: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def process_share(self) -> int:
+        """Threads one process may use without oversubscribing the machine"""
+        return max(1, self.cpus // self.processes)
+
+    def configure(self, processes: int, profile: str = "job"):
+        """
+        Re-split the CPUs, e.g. for a batch job that owns the machine
+        (processes=1) or a pool of N worker processes
+        """
+        with self._lock:
+            self.processes = max(1, processes)
+            self.profile = profile
+            self._variants = weakref.WeakKeyDictionary()
+        if self._native_limit is not None:
+            self.limit_native_pools()
+
+    def threads_for(self, n_rows: int) -> int:
+        """Threads for scoring a batch of n_rows"""
+        if n_rows <= self.single_row_max:
+            return 1
+        wanted = math.ceil(n_rows / self.rows_per_thread)
+        return max(1, min(wanted, self.process_share))
+
+    def apply(self, models: Dict[str, Any], n_rows: int) -> Dict[str, Any]:
+        """
+        Models to score n_rows with, each using threads_for(n_rows) threads
+        Models without a thread setting are returned as they are; the others
+        are replaced by cached copies, leaving the shared models untouched.
+        """
+        if not self.enabled:
+            return models
+        threads = self.threads_for(n_rows)
+        return {
+            model_name: self._variant(model, threads)
+            for model_name, model in models.items()
+        }
+
+    def _variant(self, model: Any, threads: int) -> Any:
+        """The model's copy for a thread count, made once per (model, threads)"""
+        try:
+            variants = self._variants.get(model)
+        except TypeError:
+            return model
+        if variants is None or threads not in variants:
+            with self._lock:
+                variants = self._variants.setdefault(model, {})
+                if threads not in variants:
+                    variants[threads] = _with_threads(model, threads)
+        return variants[threads]
+
+    def limit_native_pools(self):
+        """
+        Cap the BLAS and OpenMP pools used by NumPy, sklearn and XGBoost at
+        this process's share (threadpoolctl ships with scikit-learn)
+        """
+        if not self.enabled:
+            return
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError:
+            return
+        threadpool_limits(limits=self.process_share)
+        self._native_limit = self.process_share
+
+    def describe(self) -> Dict[str, Any]:
+        """Chosen configuration for diagnostics"""
+        return {
+            "enabled": self.enabled,
+            "profile": self.profile,
+            "cpus": self.cpus,
+            "processes": self.processes,
+            "process_share": self.process_share,
+            "single_row_threads": self.threads_for(1),
+            "rows_per_thread": self.rows_per_thread,
+            "native_pool_limit": self._native_limit,
+            "batch_threads": {
+                str(rows): self.threads_for(rows) for rows in (100, 1000, 10_000)
+            },
+        }
+
+
+def _with_threads(model: Any, threads: int) -> Any:
+    """
+    Shallow copy of a model (or a pipeline's steps) using n_jobs / nthread
+    threads; fitted arrays are shared. XGBoost keeps nthread on the booster,
+    so its copy gets a booster of its own. Other models are returned as-is.
+    """
+    if hasattr(model, "get_booster"):
+        booster = model.get_booster().copy()
+        booster.set_param({"nthread": threads})
+        variant = copy.copy(model)
+        variant._Booster = booster
+        variant.n_jobs = threads
+        return variant
+    if hasattr(model, "steps"):
+        steps = [(name, _with_threads(step, threads)) for name, step in model.steps]
+        if all(new is old for (_, new), (_, old) in zip(steps, model.steps)):
+            return model
+        variant = copy.copy(model)
+        variant.steps = steps
+        return variant
+    if hasattr(model, "n_jobs"):
+        variant = copy.copy(model)
+        variant.n_jobs = threads
+        return variant
+    return model
+
+
+def build_thread_budget() -> ThreadBudget:
+    """Create a ThreadBudget from the ML_THREAD_BUDGET setting"""
+    config = getattr(settings, "ML_THREAD_BUDGET", {})
+    return ThreadBudget(
+        processes=int(config.get("PROCESSES", 1)),
+        cpus=config.get("CPUS"),
+        single_row_max=int(config.get("SINGLE_ROW_MAX", 1)),
+        rows_per_thread=int(config.get("ROWS_PER_THREAD", 1000)),
+        enabled=bool(config.get("ENABLED", True)),
+    )
@@ -0,0 +1,326 @@
+"""
+Tree Ensemble Compiler
+Flattens trained Random Forest and XGBoost models into contiguous NumPy
+arrays (feature index, threshold, left, right, leaf value) and evaluates all
+trees for a whole batch at once, without per-call sklearn/xgboost overhead.
+"""
+
+import json
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+class CompiledTreeEnsemble:
+    """
+    Array-backed tree ensemble evaluator
+    Exposes predict / predict_proba / classes_ so it can stand in for the
+    original estimator inside the prediction services.
+    """
+
+    # Upper bound on gathered leaf values per chunk of rows (~16 MB of float64)
+    CHUNK_ELEMENTS = 2_000_000
+
+    def __init__(
+        self,
+        kind: str,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        right: np.ndarray,
+        default_left: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        tree_class: np.ndarray,
+        classes: np.ndarray,
+        base_margin: Optional[np.ndarray] = None,
+        max_depth: int = 0,
+    ):
+        self.kind = kind
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        # (n_nodes, 2) table indexed by [node, go_right]
+        self.children = np.ascontiguousarray(np.column_stack([left, right]))
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.tree_class = tree_class
+        self.classes_ = classes
+        self.base_margin = base_margin
+        self.max_depth = max_depth
+        self._tree_class_matrix = None
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def leaf_indices(self, X: np.ndarray) -> np.ndarray:
+        """Walk every tree for every row at once; returns (n_rows, n_trees) leaf ids"""
+        # Both libraries compare features in float32
+        X = np.asarray(X, dtype=np.float32)
+        has_missing = bool(np.isnan(X).any())
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.tile(self.roots, (X.shape[0], 1))
+
+        # Leaves point at themselves, so a fixed number of steps lands every row
+        for _ in range(self.max_depth):
+            values = X[rows, self.feature[nodes]]
+            thresholds = self.threshold[nodes]
+            if self.kind == "random_forest":
+                go_right = values > thresholds
+            else:
+                go_right = values >= thresholds
+                if has_missing:
+                    go_right = np.where(
+                        np.isnan(values), ~self.default_left[nodes], go_right
+                    )
+            nodes = self.children[nodes, go_right.view(np.int8)]
+
+        return nodes
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Class probabilities for a batch, matching the source estimator"""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        # Bound the (rows x trees x outputs) gather to a fixed element budget
+        width = self.n_trees * (self.value.shape[1] if self.value.ndim == 2 else 1)
+        chunk_rows = max(1, self.CHUNK_ELEMENTS // max(1, width))
+
+        return np.vstack(
+            [
+                self._predict_proba_chunk(X[start : start + chunk_rows])
+                for start in range(0, X.shape[0], chunk_rows)
+            ]
+            or [np.empty((0, len(self.classes_)))]
+        )
+
+    def _predict_proba_chunk(self, X: np.ndarray) -> np.ndarray:
+        """Probabilities for one chunk of rows"""
+        leaves = self.leaf_indices(X)
+
+        if self.kind == "random_forest":
+            # value holds per-leaf class distributions: average over trees
+            return self.value[leaves].mean(axis=1)
+
+        # XGBoost: sum leaf weights per class group, add the base margin, softmax
+        margins = self.value[leaves] @ self._class_matrix() + self.base_margin
+        margins -= margins.max(axis=1, keepdims=True)
+        exp_margins = np.exp(margins)
+        return exp_margins / exp_margins.sum(axis=1, keepdims=True)
+
+    def _class_matrix(self) -> np.ndarray:
+        """(n_trees, n_classes) one-hot map of each boosted tree to its class"""
+        if self._tree_class_matrix is None:
+            matrix = np.zeros((self.n_trees, len(self.classes_)))
+            matrix[np.arange(self.n_trees), self.tree_class] = 1.0
+            self._tree_class_matrix = matrix
+        return self._tree_class_matrix
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Most likely class label per row"""
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def describe(self) -> Dict[str, Any]:
+        """Size summary of the compiled arrays"""
+        arrays = [
+            self.feature,
+            self.threshold,
+            self.left,
+            self.right,
+            self.default_left,
+            self.value,
+            self.roots,
+            self.tree_class,
+        ]
+        return {
+            "kind": self.kind,
+            "trees": self.n_trees,
+            "nodes": int(len(self.feature)),
+            "max_depth": self.max_depth,
+            "array_bytes": int(sum(array.nbytes for array in arrays)),
+        }
+
+
+def compile_random_forest(model: Any) -> CompiledTreeEnsemble:
+    """Flatten a fitted sklearn RandomForestClassifier"""
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        is_leaf = tree.children_left < 0
+        node_ids = np.arange(n_nodes) + offset
+
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(tree.threshold.astype(np.float32))
+        # Leaves become self-loops so the batched walk needs no leaf checks
+        lefts.append(
+            np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.int32)
+        )
+        rights.append(
+            np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.int32)
+        )
+        # Normalise leaf counts/fractions into class probabilities
+        leaf_values = tree.value[:, 0, :].astype(np.float64)
+        totals = leaf_values.sum(axis=1, keepdims=True)
+        values.append(leaf_values / np.where(totals == 0, 1.0, totals))
+
+        roots.append(offset)
+        offset += n_nodes
+        max_depth = max(max_depth, int(tree.max_depth))
+
+    n_nodes_total = offset
+    return CompiledTreeEnsemble(
+        kind="random_forest",
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        left=np.concatenate(lefts),
+        right=np.concatenate(rights),
+        default_left=np.zeros(n_nodes_total, dtype=bool),
+        value=np.concatenate(values),
+        roots=np.array(roots, dtype=np.int32),
+        tree_class=np.zeros(len(roots), dtype=np.int32),
+        classes=np.asarray(model.classes_),
+        max_depth=max_depth,
+    )
+
+
+def compile_xgboost(model: Any) -> CompiledTreeEnsemble:
+    """Flatten a fitted multi-class XGBClassifier (gbtree booster)"""
+    booster = model.get_booster()
+    dump = json.loads(booster.save_raw(raw_format="json"))
+    gradient_booster = dump["learner"]["gradient_booster"]
+    if gradient_booster.get("name") != "gbtree":
+        raise ValueError(f"Unsupported booster: {gradient_booster.get('name')}")
+    trees = gradient_booster["model"]["trees"]
+    tree_info = gradient_booster["model"]["tree_info"]
+
+    features, thresholds, lefts, rights, defaults, values, roots = (
+        [],
+        [],
+        [],
+        [],
+        [],
+        [],
+        [],
+    )
+    offset = 0
+    max_depth = 0
+
+    for tree in trees:
+        left = np.asarray(tree["left_children"], dtype=np.int64)
+        right = np.asarray(tree["right_children"], dtype=np.int64)
+        conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+        is_leaf = left < 0
+        node_ids = np.arange(len(left)) + offset
+
+        features.append(
+            np.where(is_leaf, 0, np.asarray(tree["split_indices"])).astype(np.int32)
+        )
+        thresholds.append(conditions)
+        lefts.append(np.where(is_leaf, node_ids, left + offset).astype(np.int32))
+        rights.append(np.where(is_leaf, node_ids, right + offset).astype(np.int32))
+        defaults.append(np.asarray(tree["default_left"], dtype=bool))
+        # Leaf weights live in split_conditions for leaf nodes
+        values.append(np.where(is_leaf, conditions, 0.0).astype(np.float64))
+
+        roots.append(offset)
+        offset += len(left)
+        max_depth = max(max_depth, _tree_depth(left, right))
+
+    classes = np.asarray(getattr(model, "classes_", np.arange(max(tree_info) + 1)))
+    compiled = CompiledTreeEnsemble(
+        kind="xgboost",
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        left=np.concatenate(lefts),
+        right=np.concatenate(rights),
+        default_left=np.concatenate(defaults),
+        value=np.concatenate(values),
+        roots=np.array(roots, dtype=np.int32),
+        tree_class=np.asarray(tree_info, dtype=np.int32),
+        classes=classes,
+        base_margin=np.zeros(len(classes)),
+        max_depth=max_depth,
+    )
+
+    # Recover the per-class base margin from one probe row rather than
+    # decoding base_score, whose stored form differs between XGBoost versions
+    import xgboost
+
+    probe = np.zeros((1, int(booster.num_features())), dtype=np.float32)
+    margin = booster.predict(
+        xgboost.DMatrix(probe, feature_names=booster.feature_names),
+        output_margin=True,
+    ).reshape(1, -1)
+    tree_sums = compiled.value[compiled.leaf_indices(probe)] @ compiled._class_matrix()
+    compiled.base_margin = (margin - tree_sums)[0]
+
+    return compiled
+
+
+def compile_model(
+    model_name: str, model: Any, include_svm: bool = False
+) -> Optional[Any]:
+    """
+    Compile a registry model if it is a supported tree ensemble
+    RBF SVMs are compiled only with include_svm (ML_SVM_COMPILER_ENABLED).
+    """
+    if model_name == "random_forest" and hasattr(model, "estimators_"):
+        return compile_random_forest(model)
+    if model_name == "xgboost" and hasattr(model, "get_booster"):
+        return compile_xgboost(model)
+    if include_svm and model_name == "svm" and hasattr(model, "support_vectors_"):
+        from .svm_compiler import compile_svc
+
+        return compile_svc(model)
+    return None
+
+
+def compare_backends(
+    native: Any, compiled: CompiledTreeEnsemble, X: np.ndarray, repeats: int = 20
+) -> Dict[str, float]:
+    """Parity and latency of a compiled ensemble against its source model"""
+    native_proba = native.predict_proba(X)
+    compiled_proba = compiled.predict_proba(X)
+
+    def _time(fn, data):
+        started = time.perf_counter()
+        for _ in range(repeats):
+            fn(data)
+        return (time.perf_counter() - started) / repeats * 1000.0
+
+    single_row = X[:1]
+    return {
+        "max_abs_diff": float(np.max(np.abs(native_proba - compiled_proba))),
+        "argmax_agreement": float(
+            np.mean(native_proba.argmax(axis=1) == compiled_proba.argmax(axis=1))
+        ),
+        "native_single_ms": round(_time(native.predict_proba, single_row), 3),
+        "compiled_single_ms": round(_time(compiled.predict_proba, single_row), 3),
+        "native_batch_ms": round(_time(native.predict_proba, X), 3),
+        "compiled_batch_ms": round(_time(compiled.predict_proba, X), 3),
+        "batch_rows": int(X.shape[0]),
+    }
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    """Depth of a tree given its child index arrays (root is node 0)"""
+    depth = 0
+    frontier = [0]
+    while frontier:
+        next_frontier = []
+        for node in frontier:
+            if left[node] >= 0:
+                next_frontier.extend((int(left[node]), int(right[node])))
+        if next_frontier:
+            depth += 1
+        frontier = next_frontier
+    return depth
@@ -7,22 +7,135 @@ class RealtimeIoTClient {
     constructor(baseUrl = '/sensors/api/enhanced') {
         this.baseUrl = baseUrl;
         this.pollingInterval = null;
+        this.eventSource = null;
         this.updateCallback = null;
         this.errorCallback = null;
         this.isPolling = false;
         this.pollInterval = 5000; // 5 seconds default
+        this.readings = {}; // Latest full reading per sensor, built from stream deltas
     }
 
     /**
-     * Start real-time polling for sensor data
+     * Start real-time updates for sensor data
+     * Uses the Server-Sent Events stream; falls back to polling where
+     * EventSource is unavailable or the server refuses the stream (it
+     * answers 501 under WSGI, e.g. runserver).
      * @param {string} sensorId - Sensor ID to monitor
      * @param {function} onUpdate - Callback for data updates
      * @param {function} onError - Callback for errors
-     * @param {number} intervalMs - Polling interval in milliseconds (default: 5000)
+     * @param {number} intervalMs - Polling interval in milliseconds, fallback only (default: 5000)
      */
     startRealTimeUpdates(sensorId = 'bhairahawa_farm_1', onUpdate, onError, intervalMs = 5000) {
+        if (typeof EventSource !== 'undefined') {
+            this.startStream({ sensorIds: [sensorId] }, onUpdate, onError, () => {
+                this.startPolling(sensorId, onUpdate, onError, intervalMs);
+            });
+        } else {
+            this.startPolling(sensorId, onUpdate, onError, intervalMs);
+        }
+    }
+
+    /**
+     * Subscribe to pushed sensor updates
+     * The server sends a snapshot, then only changed fields; the browser
+     * reconnects on its own and resumes from the last event id.
+     * @param {object} options - { sensorIds: [...] } or { region: '...' } (all sensors if empty)
+     * @param {function} onUpdate - Called with (fullReading, metadata) per changed sensor
+     * @param {function} onError - Callback for errors
+     * @param {function} onUnavailable - Called once if the stream cannot be used
+     */
+    startStream(options = {}, onUpdate, onError, onUnavailable) {
+        this.stopRealTimeUpdates(); // Stop any existing stream or polling
+
+        this.updateCallback = onUpdate;
+        this.errorCallback = onError;
+        this.readings = {};
+
+        const params = new URLSearchParams();
+        if (options.sensorIds && options.sensorIds.length) {
+            params.set('sensor_id', options.sensorIds.join(','));
+        } else if (options.region) {
+            params.set('region', options.region);
+        }
+
+        console.log(`🔴 Starting sensor stream: ${params.toString() || 'all sensors'}`);
+        this.eventSource = new EventSource(`${this.baseUrl}/stream/?${params}`);
+        let connected = false;
+
+        this.eventSource.addEventListener('snapshot', (event) => {
+            connected = true;
+            this.readings = {};
+            this.applyReadings(JSON.parse(event.data).readings);
+        });
+        this.eventSource.addEventListener('update', (event) => {
+            this.applyReadings(JSON.parse(event.data).readings);
+        });
+        this.eventSource.addEventListener('heartbeat', (event) => {
+            const heartbeat = JSON.parse(event.data);
+            heartbeat.stale.forEach((sensorId) => {
+                if (this.readings[sensorId] && !this.readings[sensorId].stale) {
+                    this.applyReadings({ [sensorId]: { stale: true } });
+                }
+            });
+        });
+        this.eventSource.onerror = () => {
+            // Before the first snapshot, or once the browser gives up (an
+            // error response such as 501), the stream is not usable here
+            if (!connected || this.eventSource.readyState === EventSource.CLOSED) {
+                console.warn('⚠️ Sensor stream unavailable');
+                this.eventSource.close();
+                this.eventSource = null;
+                if (onUnavailable) {
+                    onUnavailable();
+                } else if (this.errorCallback) {
+                    this.errorCallback(new Error('Sensor stream unavailable'));
+                }
+                return;
+            }
+            // EventSource retries by itself; report so the UI can show it
+            console.warn('⚠️ Sensor stream interrupted, reconnecting');
+            if (this.errorCallback) {
+                this.errorCallback(new Error('Sensor stream interrupted, reconnecting'));
+            }
+        };
+    }
+
+    /**
+     * Merge streamed readings (full or changed fields only) and notify
+     * @param {object} readings - Sensor ID -> reading fields
+     */
+    applyReadings(readings) {
+        Object.entries(readings).forEach(([sensorId, fields]) => {
+            const reading = { ...(this.readings[sensorId] || {}), ...fields };
+            this.readings[sensorId] = reading;
+            console.log(`📊 Stream data for ${sensorId}:`, reading);
+
+            if (this.updateCallback) {
+                this.updateCallback(reading, {
+                    sensor_id: sensorId,
+                    reading,
+                    metadata: {
+                        data_source: 'sensor_stream',
+                        realtime: true,
+                        version: reading.version,
+                        stale: reading.stale,
+                        fetch_timestamp: reading.timestamp,
+                    },
+                });
+            }
+        });
+    }
+
+    /**
+     * Poll the live endpoint (fallback when EventSource is unavailable)
+     * @param {string} sensorId - Sensor ID to monitor
+     * @param {function} onUpdate - Callback for data updates
+     * @param {function} onError - Callback for errors
+     * @param {number} intervalMs - Polling interval in milliseconds (default: 5000)
+     */
+    startPolling(sensorId = 'bhairahawa_farm_1', onUpdate, onError, intervalMs = 5000) {
         this.stopRealTimeUpdates(); // Stop any existing polling
-        
+
         this.updateCallback = onUpdate;
         this.errorCallback = onError;
         this.pollInterval = intervalMs;
@@ -43,9 +156,13 @@ class RealtimeIoTClient {
     }
 
     /**
-     * Stop real-time polling
+     * Stop real-time updates (stream or polling)
      */
     stopRealTimeUpdates() {
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
         if (this.pollingInterval) {
             clearInterval(this.pollingInterval);
             this.pollingInterval = null;
@@ -82,14 +199,14 @@ class RealtimeIoTClient {
     }
 
     /**
-     * Fetch continuous stream data with diagnostics
+     * Fetch a one-off stream snapshot with diagnostics (JSON, not SSE)
      * @param {string} sensorId - Sensor ID
      * @param {boolean} includeDiagnostics - Include health diagnostics
      */
     async fetchStreamData(sensorId, includeDiagnostics = false) {
         try {
             const url = `${this.baseUrl}/stream/?sensor_id=${sensorId}&diagnostics=${includeDiagnostics}`;
-            const response = await fetch(url);
+            const response = await fetch(url, { headers: { Accept: 'application/json' } });
             const data = await response.json();
 
             if (data.status === 'success') {
@@ -202,7 +319,7 @@ function startSensorMonitoring(sensorId = 'bhairahawa_farm_1') {
             // Show error notification
             showErrorNotification('Failed to fetch sensor data: ' + error.message);
         },
-        3000 // Update every 3 seconds
+        3000 // Polling interval, only used without EventSource support
     );
 }
 